@@ -0,0 +1,967 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Backtesting das estratégias de taxas
+Este módulo reproduz o histórico armazenado (channel_stats e peer_fees) através das
+estratégias de taxas e estima a frequência de mudanças, os níveis de taxa e a receita
+"""
+
+import os
+import json
+import mmap
+import time
+import random
+import struct
+import logging
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, chain, compress, repeat
+from operator import itemgetter, methodcaller, mul, ne, sub
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from strategies import (ChannelInput, StrategyFeatures, available_strategies, controller_base_fee, controller_rate,
+                        get_strategy)
+from flow_estimators import HALF_LIFE_SECONDS, SLOW_HALF_LIFE_FACTOR, ewma_alpha, ewma_step, update_flow_estimators
+from volume_deltas import interval_volumes
+from history_store import HISTORY_DIR, load_channel_stats
+
+logger = logging.getLogger("backtest")
+
+# Formato binário do histórico colunar (mapeável em memória)
+HISTORY_MAGIC = b"LFAH"
+HISTORY_VERSION = 1
+HISTORY_COLUMNS = (
+    ("timestamps", "q"),
+    ("inbound_ratio", "d"),
+    ("outbound_ratio", "d"),
+    ("balance_ratio", "d"),
+    ("volume_out", "d"),
+    ("volume_out_delta", "d"),
+    ("drain_volume", "d"),
+    ("peer_start", "q"),
+    ("peer_base_fee", "d"),
+    ("peer_fee_rate", "d")
+)
+
+# Runs por amostra acima do qual a receita é somada com as políticas expandidas
+# por amostra em vez de fatias por run (1 run a cada 4 amostras)
+DENSE_RUNS_RATIO = 4
+
+class ChannelSeries:
+    """
+    Série temporal colunar de um canal, pronta para replay
+
+    As amostras de fluxo ficam em colunas (uma posição por amostra). A política
+    do peer é guardada como segmentos: peer_start[i] é o índice da primeira
+    amostra em que a política i está vigente.
+    """
+
+    __slots__ = ("chan_id", "remote_pubkey", "timestamps", "inbound_ratio", "outbound_ratio",
+                 "balance_ratio", "volume_out", "volume_out_delta", "drain_volume",
+                 "peer_start", "peer_base_fee", "peer_fee_rate")
+
+    def __init__(self, chan_id: str, remote_pubkey: str = ""):
+        """
+        Inicializa a série vazia
+
+        Args:
+            chan_id: ID do canal
+            remote_pubkey: Chave pública do peer
+        """
+        self.chan_id = chan_id
+        self.remote_pubkey = remote_pubkey
+        self.timestamps = array('q')
+        self.inbound_ratio = array('d')
+        self.outbound_ratio = array('d')
+        self.balance_ratio = array('d')
+        # Volume como registrado no histórico (entrada da estratégia)
+        self.volume_out = array('d')
+        # Volume encaminhado no intervalo desde a amostra anterior (para a receita)
+        self.volume_out_delta = array('d')
+        # Volume encaminhado com o canal já abaixo de 50% de saldo local,
+        # ponderado pelo déficit (independe da configuração avaliada)
+        self.drain_volume = array('d')
+        # Segmentos de política do peer
+        self.peer_start = array('q')
+        self.peer_base_fee = array('d')
+        self.peer_fee_rate = array('d')
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def peer_segments(self) -> List[Tuple[int, int, Optional[float], Optional[float]]]:
+        """
+        Lista os intervalos de amostras com a mesma política do peer
+
+        Returns:
+            Lista de (início, fim, base_fee_msat, fee_rate); a política é None
+            antes da primeira política conhecida
+        """
+        segments = []
+        size = len(self.timestamps)
+        first = self.peer_start[0] if self.peer_start else size
+        if first > 0:
+            segments.append((0, first, None, None))
+
+        for index, start in enumerate(self.peer_start):
+            end = self.peer_start[index + 1] if index + 1 < len(self.peer_start) else size
+            if end > start:
+                segments.append((start, end, self.peer_base_fee[index], self.peer_fee_rate[index]))
+
+        return segments
+
+    def add_peer_policy(self, start: int, base_fee_msat: float, fee_rate: float) -> None:
+        """
+        Registra uma política do peer vigente a partir da amostra start
+
+        Políticas repetidas não criam novo segmento.
+        """
+        if self.peer_start and self.peer_base_fee[-1] == base_fee_msat and self.peer_fee_rate[-1] == fee_rate:
+            return
+        if self.peer_start and self.peer_start[-1] == start:
+            self.peer_base_fee[-1] = base_fee_msat
+            self.peer_fee_rate[-1] = fee_rate
+            return
+        self.peer_start.append(start)
+        self.peer_base_fee.append(base_fee_msat)
+        self.peer_fee_rate.append(fee_rate)
+
+class ReplayHistory:
+    """Histórico de todos os canais em formato colunar"""
+
+    def __init__(self, channels: Optional[Dict[str, ChannelSeries]] = None):
+        """
+        Inicializa o histórico
+
+        Args:
+            channels: Séries por chan_id
+        """
+        self.channels = channels or {}
+        # Mapeamento de memória que sustenta as colunas (ver open_mapped)
+        self._mapped = None
+
+    @property
+    def samples(self) -> int:
+        """Número total de amostras"""
+        return sum(len(series) for series in self.channels.values())
+
+    @classmethod
+    def from_stats(cls, channel_stats: Dict, peer_fees: Dict) -> "ReplayHistory":
+        """
+        Constrói o histórico colunar a partir das estruturas do FeeManager
+
+        Args:
+            channel_stats: Estatísticas dos canais (channel_stats.json)
+            peer_fees: Histórico de taxas dos peers (peer_fees.json)
+
+        Returns:
+            Histórico pronto para replay
+        """
+        # Separar o histórico de taxas dos peers por canal, em ordem cronológica
+        peer_by_channel = {}
+        for records in peer_fees.values():
+            for record in records:
+                peer_by_channel.setdefault(record.get("chan_id"), []).append(record)
+        for records in peer_by_channel.values():
+            records.sort(key=lambda record: record["timestamp"])
+
+        channels = {}
+        for chan_id, stats in channel_stats.items():
+            series = ChannelSeries(chan_id, stats.get("remote_pubkey", ""))
+            flow_history = sorted(stats.get("flow_history", []), key=lambda sample: sample["timestamp"])
+            peer_records = peer_by_channel.get(chan_id, [])
+
+            peer_index = -1
+            previous = None
+            previous_ratio = 0.5
+            for position, sample in enumerate(flow_history):
+                timestamp = sample["timestamp"]
+
+                # Política do peer vigente no momento da amostra (junção as-of)
+                advanced = False
+                while peer_index + 1 < len(peer_records) and peer_records[peer_index + 1]["timestamp"] <= timestamp:
+                    peer_index += 1
+                    advanced = True
+                if advanced:
+                    record = peer_records[peer_index]
+                    series.add_peer_policy(position, record["base_fee_msat"], record["fee_rate"])
+
+                # Amostras antigas guardam o contador acumulado e as novas o volume do
+                # intervalo; volume_out é sempre o contador e volume_out_delta o intervalo
+                _, delta = interval_volumes(sample, previous)
+                volume = sample.get("forwarding_volume_out_total", sample.get("forwarding_volume_out", 0))
+                previous = sample
+                balance_ratio = sample.get("balance_ratio", 0.5)
+
+                series.timestamps.append(timestamp)
+                series.inbound_ratio.append(sample["inbound_ratio"])
+                series.outbound_ratio.append(sample["outbound_ratio"])
+                series.balance_ratio.append(balance_ratio)
+                series.volume_out.append(volume)
+                series.volume_out_delta.append(delta)
+                series.drain_volume.append(_drain(delta, previous_ratio))
+                previous_ratio = balance_ratio
+
+            if len(series):
+                channels[chan_id] = series
+
+        return cls(channels)
+
+    @classmethod
+    def load(cls, stats_path: str = "channel_stats.json", peer_fees_path: str = "peer_fees.json",
+             history_dir: str = HISTORY_DIR) -> "ReplayHistory":
+        """
+        Carrega o histórico a partir dos arquivos do FeeManager
+
+        Args:
+            stats_path: Caminho do channel_stats.json
+            peer_fees_path: Caminho do peer_fees.json
+            history_dir: Diretório dos históricos por canal (lazy_history)
+
+        Returns:
+            Histórico pronto para replay
+        """
+        channel_stats = {}
+        peer_fees = {}
+
+        if os.path.exists(stats_path):
+            with open(stats_path, 'r') as f:
+                channel_stats = json.load(f)
+
+        if os.path.exists(peer_fees_path):
+            with open(peer_fees_path, 'r') as f:
+                peer_fees = json.load(f)
+
+        return cls.from_stats(load_channel_stats(channel_stats, history_dir), peer_fees)
+
+    def save(self, path: str) -> int:
+        """
+        Grava o histórico em formato binário colunar
+
+        O arquivo pode ser aberto com open_mapped() e compartilhado, somente
+        leitura, entre vários processos.
+
+        Args:
+            path: Caminho do arquivo
+
+        Returns:
+            Número de bytes gravados
+        """
+        index = []
+        offset = 0
+        for chan_id, series in self.channels.items():
+            columns = {}
+            for name, code in HISTORY_COLUMNS:
+                column = getattr(series, name)
+                columns[name] = [offset, len(column)]
+                offset += len(column) * 8
+            index.append({"chan_id": chan_id, "remote_pubkey": series.remote_pubkey, "columns": columns})
+
+        header = json.dumps(index).encode("utf-8")
+        prefix = HISTORY_MAGIC + struct.pack("<HQ", HISTORY_VERSION, len(header)) + header
+        padding = b"\0" * (-len(prefix) % 8)
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(prefix + padding)
+            for series in self.channels.values():
+                for name, code in HISTORY_COLUMNS:
+                    column = getattr(series, name)
+                    f.write(column.tobytes() if isinstance(column, array) else bytes(column))
+            size = f.tell()
+        os.replace(temp_path, path)
+        return size
+
+    @classmethod
+    def open_mapped(cls, path: str) -> "ReplayHistory":
+        """
+        Abre um histórico binário mapeado em memória, sem copiar as colunas
+
+        Args:
+            path: Caminho do arquivo gravado por save()
+
+        Returns:
+            Histórico cujas colunas são memoryviews somente leitura
+        """
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if mapped[:4] != HISTORY_MAGIC:
+            mapped.close()
+            raise ValueError(f"Arquivo de histórico inválido: {path}")
+
+        version, header_size = struct.unpack_from("<HQ", mapped, 4)
+        if version != HISTORY_VERSION:
+            mapped.close()
+            raise ValueError(f"Versão de histórico não suportada: {version}")
+
+        header_end = 4 + struct.calcsize("<HQ") + header_size
+        index = json.loads(mapped[4 + struct.calcsize("<HQ"):header_end].decode("utf-8"))
+        data_start = header_end + (-header_end % 8)
+        view = memoryview(mapped)
+
+        channels = {}
+        for entry in index:
+            series = ChannelSeries(entry["chan_id"], entry["remote_pubkey"])
+            for name, code in HISTORY_COLUMNS:
+                offset, length = entry["columns"][name]
+                start = data_start + offset
+                setattr(series, name, view[start:start + length * 8].cast(code))
+            channels[entry["chan_id"]] = series
+
+        history = cls(channels)
+        history._mapped = mapped
+        return history
+
+def _drain(volume_delta: float, balance_ratio: float) -> float:
+    """Volume de saída ponderado pelo déficit de saldo local no início do intervalo"""
+    if volume_delta <= 0 or balance_ratio >= 0.5:
+        return 0.0
+    return volume_delta * (0.5 - balance_ratio) * 2
+
+def _float_column(values) -> array:
+    """Coluna como array (memoryviews mapeadas são copiadas de uma vez, sem laço em Python)"""
+    if isinstance(values, array):
+        return values
+    column = array('d')
+    column.frombytes(memoryview(values).cast("B"))
+    return column
+
+def _random_values(rng: random.Random, choices: tuple, size: int) -> Iterable:
+    """
+    Valores sorteados entre choices (sintético)
+
+    Sorteia um byte por posição e o converte por tabela, bem mais rápido que
+    rng.choices para colunas longas (o viés da tabela é desprezível).
+    """
+    table = tuple(choices[index % len(choices)] for index in range(256))
+    data = rng.getrandbits(8 * size).to_bytes(size, "little") if size else b""
+    return map(table.__getitem__, data)
+
+def synthetic_history(n_channels: int, n_samples: int, interval: int = 3600,
+                      start: int = 1700000000, seed: int = 42) -> ReplayHistory:
+    """
+    Gera um histórico sintético para testes e benchmarks
+
+    Args:
+        n_channels: Número de canais
+        n_samples: Amostras por canal
+        interval: Intervalo entre amostras (segundos)
+        start: Timestamp inicial
+        seed: Semente do gerador aleatório
+
+    Returns:
+        Histórico sintético
+    """
+    rng = random.Random(seed)
+    rates = (1, 50, 100, 250, 500, 1000)
+    timestamps = array('q', range(start, start + n_samples * interval, interval))
+    channels = {}
+
+    # O saldo anda em passos de 1% e é refletido nas bordas: a posição do
+    # passeio módulo 200 indexa tabelas com o saldo e o déficit de cada nível
+    levels = [1 - abs(position / 100 - 1) for position in range(200)]
+    outbound_table = tuple(levels)
+    inbound_table = tuple(1 - ratio for ratio in levels)
+    deficit_table = tuple(max(0.0, 0.5 - ratio) * 2 for ratio in levels)
+
+    for index in range(n_channels):
+        chan_id = str(700000000000000000 + index)
+        series = ChannelSeries(chan_id, f"peer{index}")
+        series.timestamps = timestamps
+
+        # Passeio aleatório do saldo, limitado a [0, 1]
+        walk = accumulate(_random_values(rng, (-3, -1, 0, 1, 3), n_samples), initial=rng.randint(0, 100))
+        next(walk)
+        positions = bytes(map((200).__rmod__, walk))
+        outbound = array('d', map(outbound_table.__getitem__, positions))
+        series.outbound_ratio = outbound
+        series.balance_ratio = outbound
+        series.inbound_ratio = array('d', map(inbound_table.__getitem__, positions))
+
+        # Encaminhamentos esporádicos
+        deltas = array('d', _random_values(rng, (0.0, 0.0, 0.0, 5000.0, 20000.0, 80000.0), n_samples))
+        series.volume_out_delta = deltas
+        series.volume_out = array('d', accumulate(deltas))
+        # Como _drain: volume ponderado pelo déficit de saldo no início do intervalo
+        series.drain_volume = array('d', [0.0])
+        series.drain_volume.extend(map(mul, deltas[1:], map(deficit_table.__getitem__, positions[:-1])))
+
+        # Os peers mudam de política raramente
+        base_fee = float(rng.choice((0, 500, 1000, 1500, 3000)))
+        step = 0
+        while step < n_samples:
+            series.add_peer_policy(step, base_fee, rng.choice(rates) / 1000000)
+            step += rng.randint(24, 24 * 60)
+
+        channels[chan_id] = series
+
+    return ReplayHistory(channels)
+
+def _append_run(runs: Tuple[List, List, List], start: int, base_fee_msat: int, fee_rate: float) -> None:
+    """
+    Adiciona uma política ao resultado se ela diferir da anterior
+
+    A taxa em ppm é arredondada como nos envios ao LND e em policy_key.
+    """
+    starts, base_fees, fee_rates_ppm = runs
+    fee_rate_ppm = int(round(fee_rate * 1000000))
+    if base_fees and base_fees[-1] == base_fee_msat and fee_rates_ppm[-1] == fee_rate_ppm:
+        return
+    starts.append(start)
+    base_fees.append(base_fee_msat)
+    fee_rates_ppm.append(fee_rate_ppm)
+
+def _extend_runs(runs: Tuple[List, List, List], start: int, keys: List[Tuple[int, int]]) -> None:
+    """
+    Adiciona as políticas de amostras consecutivas ao resultado
+
+    Equivale a chamar _append_run para cada amostra, mas as mudanças são
+    encontradas comparando a sequência com ela mesma deslocada, sem laço em Python.
+
+    Args:
+        runs: Resultado run-length
+        start: Índice da primeira amostra
+        keys: Política (base_fee_msat, fee_rate_ppm) de cada amostra
+    """
+    if not keys:
+        return
+    starts, base_fees, fee_rates_ppm = runs
+    first = keys[0]
+    if not base_fees or base_fees[-1] != first[0] or fee_rates_ppm[-1] != first[1]:
+        starts.append(start)
+        base_fees.append(first[0])
+        fee_rates_ppm.append(first[1])
+
+    flags = list(map(ne, keys[1:], keys))
+    changes = list(compress(keys[1:], flags))
+    starts.extend(compress(range(start + 1, start + len(keys)), flags))
+    base_fees.extend(map(itemgetter(0), changes))
+    fee_rates_ppm.extend(map(itemgetter(1), changes))
+
+class _PolicyCache(dict):
+    """Política por valor de entrada, calculada uma única vez por valor distinto"""
+
+    def __init__(self, function):
+        super().__init__()
+        self.function = function
+
+    def __missing__(self, key):
+        value = self[key] = self.function(key)
+        return value
+
+def _smoothed_ratios(series: ChannelSeries, half_life: float) -> Tuple[array, array]:
+    """
+    Médias móveis de inbound_ratio e outbound_ratio em cada amostra
+
+    Reproduz update_flow_estimators, reaproveitando o peso de intervalos repetidos.
+    """
+    inbound = array('d', series.inbound_ratio)
+    outbound = array('d', series.outbound_ratio)
+    if not len(series):
+        return inbound, outbound
+
+    alphas = {}
+    last_timestamp = series.timestamps[0]
+    inbound_value = inbound[0]
+    outbound_value = outbound[0]
+    for position in range(1, len(series)):
+        timestamp = series.timestamps[position]
+        elapsed = timestamp - last_timestamp
+        alpha = alphas.get(elapsed)
+        if alpha is None:
+            alpha = alphas[elapsed] = ewma_alpha(elapsed, half_life)
+        inbound_value = inbound[position] = ewma_step(inbound_value, inbound[position], alpha)
+        outbound_value = outbound[position] = ewma_step(outbound_value, outbound[position], alpha)
+        last_timestamp = max(timestamp, last_timestamp)
+
+    return inbound, outbound
+
+def _balanced_series(series: ChannelSeries, config: Dict):
+    """Versão em lote de FeeManager._calculate_balanced_fees sobre uma série"""
+    min_base_fee = config["min_base_fee_msat"]
+    max_base_fee = config["max_base_fee_msat"]
+    min_fee_rate = config["min_fee_rate"]
+    max_fee_rate = config["max_fee_rate"]
+    flow_weight = config["flow_weight"]
+    peer_weight = config["peer_weight"]
+    high_flow = config["high_flow_threshold"]
+    low_flow = config["low_flow_threshold"]
+    base_span = max_base_fee - min_base_fee
+    rate_span = max_fee_rate - min_fee_rate
+
+    inbound_ratios = series.inbound_ratio
+    outbound_ratios = series.outbound_ratio
+    if config.get("smooth_flow"):
+        inbound_ratios, outbound_ratios = _smoothed_ratios(
+            series, config.get("ewma_half_life_seconds", HALF_LIFE_SECONDS))
+
+    runs = ([], [], [])
+    for start, end, peer_base_fee, peer_fee_rate in series.peer_segments():
+        if peer_base_fee is not None:
+            norm_peer_base_fee = max(0, min(1, (peer_base_fee - min_base_fee) / base_span))
+            norm_peer_fee_rate = max(0, min(1, (peer_fee_rate - min_fee_rate) / rate_span))
+            peer_factor = (norm_peer_base_fee + norm_peer_fee_rate) / 2
+        else:
+            peer_factor = 0.5
+
+        # O resultado só muda quando a classe de fluxo muda dentro do segmento
+        previous_factor = None
+        position = start
+        for inbound_ratio, outbound_ratio in zip(inbound_ratios[start:end], outbound_ratios[start:end]):
+            if inbound_ratio > high_flow:
+                flow_factor = 0.2
+            elif outbound_ratio > high_flow:
+                flow_factor = 0.8
+            elif inbound_ratio < low_flow:
+                flow_factor = 0.7
+            elif outbound_ratio < low_flow:
+                flow_factor = 0.3
+            else:
+                flow_factor = 0.5
+
+            if flow_factor != previous_factor:
+                previous_factor = flow_factor
+                combined_factor = flow_factor * flow_weight + peer_factor * peer_weight
+                _append_run(runs, position,
+                            int(min_base_fee + combined_factor * base_span),
+                            min_fee_rate + combined_factor * rate_span)
+            position += 1
+
+    return runs
+
+def _competitive_series(series: ChannelSeries, config: Dict):
+    """Versão em lote de FeeManager._calculate_competitive_fees sobre uma série"""
+    min_base_fee = config["min_base_fee_msat"]
+    max_base_fee = config["max_base_fee_msat"]
+    min_fee_rate = config["min_fee_rate"]
+    max_fee_rate = config["max_fee_rate"]
+
+    # Depende apenas da política do peer
+    runs = ([], [], [])
+    for start, end, peer_base_fee, peer_fee_rate in series.peer_segments():
+        if peer_base_fee is not None:
+            _append_run(runs, start,
+                        max(min_base_fee, min(max_base_fee, int(peer_base_fee * 0.9))),
+                        max(min_fee_rate, min(max_fee_rate, peer_fee_rate * 0.9)))
+        else:
+            _append_run(runs, start, min_base_fee, min_fee_rate)
+
+    return runs
+
+def _profitable_series(series: ChannelSeries, config: Dict):
+    """Versão em lote de FeeManager._calculate_profitable_fees sobre uma série"""
+    min_base_fee = config["min_base_fee_msat"]
+    max_base_fee = config["max_base_fee_msat"]
+    min_fee_rate = config["min_fee_rate"]
+    max_fee_rate = config["max_fee_rate"]
+
+    runs = ([], [], [])
+    for start, end, peer_base_fee, peer_fee_rate in series.peer_segments():
+        def policy(forwarding_volume):
+            if forwarding_volume >= 1000000:
+                volume_factor = 1.0
+            elif forwarding_volume > 0:
+                volume_factor = forwarding_volume / 1000000
+            else:
+                volume_factor = 0.2
+
+            if peer_base_fee is not None:
+                factor = 0.8 + (volume_factor * 0.4)
+                base_fee_msat = int(peer_base_fee * factor)
+                fee_rate = peer_fee_rate * factor
+            else:
+                base_fee_msat = int(min_base_fee + volume_factor * (max_base_fee - min_base_fee))
+                fee_rate = min_fee_rate + volume_factor * (max_fee_rate - min_fee_rate)
+            return (max(min_base_fee, min(max_base_fee, base_fee_msat)),
+                    int(round(max(min_fee_rate, min(max_fee_rate, fee_rate)) * 1000000)))
+
+        # A política depende apenas do volume do intervalo: calculada uma vez
+        # por volume distinto do segmento
+        policies = _PolicyCache(policy)
+        _extend_runs(runs, start, list(map(policies.__getitem__, series.volume_out_delta[start:end])))
+
+    return runs
+
+def _controller_series(series: ChannelSeries, config: Dict):
+    """
+    Versão em lote de ControllerStrategy sobre uma série
+
+    Os estimadores e a saída do controlador são calculados em um único laço,
+    com os ganhos lidos da configuração uma vez. Amostras na zona morta ou
+    dentro da histerese mantêm a taxa em vigor sem chamar controller_rate, que
+    calcula a nova taxa apenas quando ela pode mudar.
+    """
+    if not len(series):
+        return ([], [], [])
+
+    half_life = config.get("ewma_half_life_seconds", HALF_LIFE_SECONDS)
+    target = config.get("controller_target_ratio", 0.5)
+    kp = config.get("controller_kp", 1.0)
+    ki = config.get("controller_ki", 0.5)
+    kd = config.get("controller_kd", 2.0)
+    deadband = config.get("controller_deadband", 0.05)
+    min_fee_rate_ppm = config["min_fee_rate"] * 1000000
+    rate_span_ppm = config["max_fee_rate"] * 1000000 - min_fee_rate_ppm
+    hold_ppm = max(1, config.get("controller_hysteresis_steps", 3)) * max(1, config.get("controller_step_ppm", 25))
+    rate = controller_rate(config)
+    alphas = {}
+    runs = ([], [], [])
+
+    # Estimadores reproduzidos como em update_flow_estimators (ewma_step em linha)
+    timestamps = series.timestamps
+    ratios = series.balance_ratio
+    last_timestamp = timestamps[0]
+    previous = balance_ratio = balance_ratio_slow = ratios[0]
+    drift_per_hour = 0.0
+    fee_rate_ppm = None
+    for position, (timestamp, sample) in enumerate(zip(timestamps, ratios)):
+        if position:
+            elapsed = timestamp - last_timestamp
+            pair = alphas.get(elapsed)
+            if pair is None:
+                pair = alphas[elapsed] = (ewma_alpha(elapsed, half_life),
+                                          ewma_alpha(elapsed, half_life * SLOW_HALF_LIFE_FACTOR))
+            alpha, slow_alpha = pair
+            balance_ratio = balance_ratio + alpha * (sample - balance_ratio)
+            balance_ratio_slow = balance_ratio_slow + slow_alpha * (sample - balance_ratio_slow)
+            if elapsed > 0:
+                drift = (sample - previous) / (elapsed / 3600)
+                drift_per_hour = drift_per_hour + alpha * (drift - drift_per_hour)
+            if timestamp > last_timestamp:
+                last_timestamp = timestamp
+            previous = sample
+
+        # Como controller_output; a política anterior do replay é a política em vigor
+        output = kp * (target - balance_ratio) + ki * (target - balance_ratio_slow) - kd * drift_per_hour
+        if fee_rate_ppm is not None:
+            # Zona morta ou taxa dentro da histerese: a política em vigor não muda
+            if -deadband <= output <= deadband:
+                continue
+            factor = 0.5 + (output - deadband if output > 0 else output + deadband)
+            factor = 0.0 if factor < 0.0 else 1.0 if factor > 1.0 else factor
+            if -hold_ppm < min_fee_rate_ppm + factor * rate_span_ppm - fee_rate_ppm < hold_ppm:
+                continue
+        updated = rate(None if fee_rate_ppm is None else fee_rate_ppm / 1000000, output)
+        if updated != fee_rate_ppm:
+            _append_run(runs, position, controller_base_fee(updated, config), updated / 1000000)
+        fee_rate_ppm = updated
+
+    return runs
+
+# Núcleos em lote: recebem a série de um canal e devolvem as políticas em
+# formato run-length (índice inicial, base_fee_msat, fee_rate_ppm)
+SERIES_KERNELS = {
+    "balanced": _balanced_series,
+    "competitive": _competitive_series,
+    "profitable": _profitable_series,
+    "controller": _controller_series
+}
+
+def _generic_series(strategy):
+    """
+    Cria um núcleo de replay que chama a estratégia amostra por amostra
+
+    Usado por estratégias registradas que não fornecem replay_series().
+    """
+    def kernel(series: ChannelSeries, config: Dict):
+        runs = ([], [], [])
+        half_life = config.get("ewma_half_life_seconds", HALF_LIFE_SECONDS)
+        estimators = None
+        previous = None
+        features = StrategyFeatures()
+        for start, end, peer_base_fee, peer_fee_rate in series.peer_segments():
+            peer_fee_data = None
+            if peer_base_fee is not None:
+                peer_fee_data = {"chan_id": series.chan_id, "base_fee_msat": peer_base_fee, "fee_rate": peer_fee_rate}
+            for position in range(start, end):
+                flow_data = {
+                    "timestamp": series.timestamps[position],
+                    "inbound_ratio": series.inbound_ratio[position],
+                    "outbound_ratio": series.outbound_ratio[position],
+                    "balance_ratio": series.balance_ratio[position],
+                    "forwarding_volume_out": series.volume_out_delta[position],
+                    "forwarding_volume_out_total": series.volume_out[position]
+                }
+                # Estimadores atualizados amostra a amostra, como no FeeManager
+                estimators = update_flow_estimators(estimators, flow_data, previous, half_life)
+                features.ewma_flows[series.chan_id] = estimators
+                previous = flow_data
+                row = ChannelInput(series.chan_id, series.remote_pubkey, flow_data, peer_fee_data)
+                fees = strategy.compute(row, features, config)
+                _append_run(runs, position, fees["base_fee_msat"], fees["fee_rate"])
+                # A política calculada passa a ser a política em vigor
+                features.current_policies[series.chan_id] = fees
+        return runs
+    return kernel
+
+def get_series_kernel(name: str):
+    """
+    Obtém o núcleo de replay de uma estratégia
+
+    Args:
+        name: Nome da estratégia registrada
+
+    Returns:
+        Função (série, configuração) -> políticas run-length
+
+    Raises:
+        ValueError: Se a estratégia não estiver registrada
+    """
+    try:
+        strategy = get_strategy(name)
+    except KeyError:
+        raise ValueError(f"Estratégia desconhecida: {name}")
+
+    replay_series = getattr(strategy, "replay_series", None)
+    if replay_series is not None:
+        return replay_series
+    if name in SERIES_KERNELS:
+        return SERIES_KERNELS[name]
+    return _generic_series(strategy)
+
+def _run_totals(series: ChannelSeries, runs: Tuple[List, List, List], weights: Dict[int, float]) -> Tuple[float, float]:
+    """
+    Receita e pressão de rebalanceamento de uma série com as políticas do replay
+
+    A política vale para o volume dos intervalos seguintes às suas amostras: o
+    run que começa em start cobra as posições start + 1 até o início do próximo
+    run, inclusive. Com poucos runs, as somas são feitas sobre fatias das
+    colunas; com muitos (a política muda quase a cada amostra), as políticas
+    são expandidas para uma por amostra e multiplicadas pelas colunas. Nos dois
+    casos, as somas são feitas com map, sem laço em Python por run ou amostra.
+
+    Args:
+        series: Série do canal
+        runs: Políticas em formato run-length
+        weights: Peso da pressão por taxa proporcional (ppm)
+
+    Returns:
+        Tupla (receita em msat, pressão de rebalanceamento)
+    """
+    starts, base_fees, fee_rates_ppm = runs
+    size = len(series)
+    deltas = _float_column(series.volume_out_delta)
+    drains = _float_column(series.drain_volume)
+
+    if len(starts) * DENSE_RUNS_RATIO > size:
+        lengths = list(map(sub, starts[1:] + [size], starts))
+
+        def expand(values):
+            return chain.from_iterable(map(repeat, values, lengths))
+
+        charged = slice(starts[0] + 1, None)
+        forwards = sum(compress(expand(base_fees), deltas[charged]))
+        volume = sum(map(mul, expand(fee_rates_ppm), deltas[charged]))
+        pressure = sum(map(mul, expand(map(weights.__getitem__, fee_rates_ppm)), drains[charged]))
+        return forwards + volume / 1000, pressure
+
+    lows = [start + 1 for start in starts]
+    highs = lows[1:]
+    highs.append(size)
+
+    def run_slices(column):
+        return map(column.__getitem__, map(slice, lows, highs))
+
+    idle = map(methodcaller("count", 0.0), run_slices(deltas))
+    forwards = map(sub, map(sub, highs, lows), idle)
+    revenue_msat = (sum(map(mul, base_fees, forwards)) +
+                    sum(map(mul, fee_rates_ppm, map(sum, run_slices(deltas)))) / 1000)
+    pressure = sum(map(mul, map(sum, run_slices(drains)), map(weights.__getitem__, fee_rates_ppm)))
+    return revenue_msat, pressure
+
+def _accumulate_levels(buckets: Dict[int, List], timestamps, runs: Tuple[List, List, List],
+                       bucket_seconds: int) -> None:
+    """
+    Acumula os níveis de taxa de uma série por janela de tempo
+
+    A soma das políticas até cada fronteira de janela sai das somas acumuladas
+    por run, então o custo é proporcional ao número de janelas.
+
+    Args:
+        buckets: Contagem e somas (base_fee_msat e ppm) por janela, alteradas no lugar
+        timestamps: Timestamps da série
+        runs: Políticas em formato run-length
+        bucket_seconds: Granularidade das janelas
+    """
+    starts, base_fees, fee_rates_ppm = runs
+    size = len(timestamps)
+    lengths = list(map(sub, starts[1:] + [size], starts))
+    base_totals = list(accumulate(map(mul, base_fees, lengths), initial=0))
+    rate_totals = list(accumulate(map(mul, fee_rates_ppm, lengths), initial=0))
+
+    position = starts[0]
+    base_before = rate_before = 0
+    while position < size:
+        key = timestamps[position] // bucket_seconds
+        boundary = bisect_left(timestamps, (key + 1) * bucket_seconds, position, size)
+        run = bisect_right(starts, boundary) - 1
+        offset = boundary - starts[run]
+        base_until = base_totals[run] + base_fees[run] * offset
+        rate_until = rate_totals[run] + fee_rates_ppm[run] * offset
+
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [0, 0, 0]
+        bucket[0] += boundary - position
+        bucket[1] += base_until - base_before
+        bucket[2] += rate_until - rate_before
+        base_before, rate_before = base_until, rate_until
+        position = boundary
+
+class Backtester:
+    """Reproduz o histórico através das estratégias de taxas"""
+
+    def __init__(self, history: ReplayHistory, config: Dict):
+        """
+        Inicializa o backtester
+
+        Args:
+            history: Histórico colunar dos canais
+            config: Configuração do FeeManager a ser avaliada
+        """
+        self.history = history
+        self.config = config
+
+    def run(self, strategy: Optional[str] = None, bucket_seconds: int = 86400,
+            include_channels: bool = False) -> Dict:
+        """
+        Executa o replay de uma estratégia
+
+        A receita é estimada a partir do volume encaminhado em cada intervalo,
+        cobrado pela taxa vigente no início do intervalo, assumindo um
+        encaminhamento (uma taxa base) por intervalo com volume. A pressão de
+        rebalanceamento soma o volume que saiu de canais já abaixo de 50% de
+        saldo local, ponderado pelo déficit e por quão baratas estavam as taxas.
+
+        Args:
+            strategy: Estratégia a avaliar (padrão: fee_strategy da configuração)
+            bucket_seconds: Granularidade da série de níveis de taxa
+            include_channels: Incluir o detalhamento por canal no relatório
+
+        Returns:
+            Relatório com mudanças de taxa (total e por semana de histórico),
+            níveis ao longo do tempo e receita estimada
+        """
+        strategy = strategy or self.config.get("fee_strategy", "balanced")
+        kernel = get_series_kernel(strategy)
+        started = time.perf_counter()
+
+        if self.config.get("use_market_fees"):
+            # O histórico não guarda o grafo da rede: o replay usa apenas as taxas do peer
+            logger.warning("use_market_fees ignorado no backtesting (sem histórico do grafo)")
+        if strategy == "profitable" and self.config.get("use_elasticity"):
+            # O volume histórico respondeu às taxas antigas, e não às taxas do replay
+            logger.warning("use_elasticity ignorado no backtesting (a demanda não responde às taxas do replay)")
+
+        min_fee_rate_ppm = self.config["min_fee_rate"] * 1000000
+        fee_rate_span_ppm = (self.config["max_fee_rate"] - self.config["min_fee_rate"]) * 1000000 or 1
+
+        total_changes = 0
+        total_revenue_msat = 0.0
+        total_pressure = 0.0
+        buckets = {}
+        channels = {}
+        first_timestamp = last_timestamp = None
+
+        for chan_id, series in self.history.channels.items():
+            starts, base_fees, fee_rates_ppm = kernel(series, self.config)
+            timestamps = series.timestamps
+            size = len(series)
+            if size:
+                first_timestamp = min(first_timestamp, timestamps[0]) if first_timestamp is not None else timestamps[0]
+                last_timestamp = max(last_timestamp, timestamps[-1]) if last_timestamp is not None else timestamps[-1]
+
+            revenue_msat = 0.0
+            pressure = 0.0
+            if starts:
+                # Saída barata de um canal já esvaziado precisará ser rebalanceada
+                weights = {fee_rate_ppm: 1 - min(1.0, max(0.0, (fee_rate_ppm - min_fee_rate_ppm) / fee_rate_span_ppm))
+                           for fee_rate_ppm in set(fee_rates_ppm)}
+                revenue_msat, pressure = _run_totals(series, (starts, base_fees, fee_rates_ppm), weights)
+                _accumulate_levels(buckets, timestamps, (starts, base_fees, fee_rates_ppm), bucket_seconds)
+
+            changes = max(0, len(starts) - 1)
+            total_changes += changes
+            total_revenue_msat += revenue_msat
+            total_pressure += pressure
+
+            if include_channels:
+                channels[chan_id] = {
+                    "samples": size,
+                    "fee_changes": changes,
+                    "final_base_fee_msat": base_fees[-1] if base_fees else None,
+                    "final_fee_rate_ppm": fee_rates_ppm[-1] if fee_rates_ppm else None,
+                    "estimated_revenue_sat": revenue_msat / 1000,
+                    "rebalance_pressure": pressure
+                }
+
+        fee_levels = [
+            {
+                "timestamp": key * bucket_seconds,
+                "mean_base_fee_msat": values[1] / values[0],
+                "mean_fee_rate_ppm": values[2] / values[0]
+            }
+            for key, values in sorted(buckets.items())
+        ]
+
+        channel_count = len(self.history.channels)
+        weeks = (last_timestamp - first_timestamp) / 604800 if first_timestamp is not None else 0
+        report = {
+            "strategy": strategy,
+            "channels": channel_count,
+            "samples": self.history.samples,
+            "fee_changes": total_changes,
+            "fee_changes_per_channel": total_changes / channel_count if channel_count else 0,
+            "fee_changes_per_week": total_changes / weeks if weeks > 0 else total_changes,
+            "estimated_revenue_sat": total_revenue_msat / 1000,
+            "rebalance_pressure": total_pressure,
+            "fee_levels": fee_levels,
+            "elapsed_seconds": time.perf_counter() - started
+        }
+
+        if include_channels:
+            report["channel_results"] = channels
+
+        return report
+
+    def compare(self, strategies: Optional[Iterable[str]] = None, **kwargs) -> Dict[str, Dict]:
+        """
+        Executa o replay de várias estratégias sobre o mesmo histórico
+
+        Args:
+            strategies: Estratégias a avaliar (padrão: todas as registradas)
+            **kwargs: Argumentos repassados para run()
+
+        Returns:
+            Relatórios por estratégia
+        """
+        return {strategy: self.run(strategy, **kwargs) for strategy in strategies or available_strategies()}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backtesting das estratégias de taxas")
+    parser.add_argument("--config", default="fee_config.json", help="Arquivo de configuração")
+    parser.add_argument("--stats", default="channel_stats.json", help="Histórico dos canais")
+    parser.add_argument("--peer-fees", default="peer_fees.json", help="Histórico de taxas dos peers")
+    parser.add_argument("--history-dir", default=HISTORY_DIR, help="Históricos por canal (lazy_history)")
+    parser.add_argument("--strategy", action="append", choices=available_strategies(), help="Estratégia (pode repetir)")
+    parser.add_argument("--bucket", type=int, default=86400, help="Granularidade dos níveis de taxa (segundos)")
+    parser.add_argument("--synthetic", type=int, nargs=2, metavar=("CANAIS", "AMOSTRAS"),
+                        help="Usar histórico sintético em vez dos arquivos")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+
+    if args.synthetic:
+        history = synthetic_history(*args.synthetic)
+    else:
+        history = ReplayHistory.load(args.stats, args.peer_fees, args.history_dir)
+
+    backtester = Backtester(history, config)
+    results = backtester.compare(args.strategy or [config.get("fee_strategy", "balanced")], bucket_seconds=args.bucket)
+    print(json.dumps(results, indent=2))
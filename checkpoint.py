@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Checkpoint binário do estado do motor
+Este módulo serializa o estado completo do FeeManager (históricos, índices,
+cursores e políticas enviadas) em um arquivo binário compacto com cabeçalho de
+versão e checksum, carregado em milissegundos em um reinício
+"""
+
+import os
+import zlib
+import struct
+import marshal
+from typing import Dict, Optional
+
+# Arquivo padrão do checkpoint
+CHECKPOINT_PATH = "engine_state.ckpt"
+
+# Assinatura e versão do formato
+MAGIC = b"LFAC"
+CHECKPOINT_VERSION = 1
+
+# Cabeçalho: assinatura, versão do formato, versão do marshal, flags, tamanho e CRC32 do conteúdo
+_HEADER = struct.Struct("<4sHBBQI")
+
+# Conteúdo compactado com zlib
+FLAG_ZLIB = 1
+
+def encode_checkpoint(state: Dict, compress: bool = True) -> bytes:
+    """
+    Serializa o estado
+
+    Args:
+        state: Estado com tipos nativos (dict, list, tuple, str, int, float, None, frozenset)
+        compress: Compactar o conteúdo com zlib
+
+    Returns:
+        Cabeçalho seguido do conteúdo
+    """
+    payload = marshal.dumps(state)
+    flags = 0
+    if compress:
+        payload = zlib.compress(payload, 1)
+        flags |= FLAG_ZLIB
+    header = _HEADER.pack(MAGIC, CHECKPOINT_VERSION, marshal.version, flags, len(payload), zlib.crc32(payload))
+    return header + payload
+
+def decode_checkpoint(data: bytes) -> Dict:
+    """
+    Lê um checkpoint serializado
+
+    Args:
+        data: Conteúdo do arquivo
+
+    Returns:
+        Estado
+
+    Raises:
+        ValueError: Arquivo truncado, corrompido ou de outra versão
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("Checkpoint truncado")
+    magic, version, marshal_version, flags, length, crc = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Arquivo não é um checkpoint")
+    if version != CHECKPOINT_VERSION or marshal_version != marshal.version:
+        raise ValueError(f"Versão de checkpoint incompatível: {version}/{marshal_version}")
+
+    payload = data[_HEADER.size:]
+    if len(payload) != length or zlib.crc32(payload) != crc:
+        raise ValueError("Checkpoint corrompido")
+    if flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    return marshal.loads(payload)
+
+def is_current(path: str = CHECKPOINT_PATH, stats_path: str = "channel_stats.json") -> bool:
+    """
+    Verifica se o checkpoint existe e não é mais antigo que o channel_stats.json
+
+    O checkpoint é gravado depois dos arquivos JSON; se o JSON for mais recente
+    (por exemplo, a gravação do checkpoint falhou), o checkpoint está defasado.
+
+    Args:
+        path: Caminho do checkpoint
+        stats_path: Caminho do channel_stats.json
+
+    Returns:
+        True se o checkpoint pode substituir os arquivos JSON
+    """
+    if not os.path.exists(path):
+        return False
+    return not os.path.exists(stats_path) or os.path.getmtime(stats_path) <= os.path.getmtime(path)
+
+def read_checkpoint(path: str = CHECKPOINT_PATH) -> Optional[Dict]:
+    """
+    Lê o checkpoint de um arquivo
+
+    Args:
+        path: Caminho do arquivo
+
+    Returns:
+        Estado ou None se o arquivo não existir
+
+    Raises:
+        ValueError: Arquivo truncado, corrompido ou de outra versão
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    return decode_checkpoint(data)
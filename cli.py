@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Linha de comando do LND Fee Automation
+Este módulo oferece subcomandos para uso em scripts e cron (run-once, plan,
+apply, status, export e backtest). Cada subcomando importa apenas os módulos de que
+precisa: status e export leem o estado gravado sem carregar o cliente LND
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Dict, List, Optional
+
+def _read_state(checkpoint_path: str, stats_path: str, peer_fees_path: str) -> Dict:
+    """
+    Lê o estado gravado pelo FeeManager, do checkpoint se ele estiver atualizado
+
+    Returns:
+        Estado com channel_stats, peer_fees e, se vierem do checkpoint, os metadados do ciclo
+    """
+    from checkpoint import is_current, read_checkpoint
+
+    if is_current(checkpoint_path, stats_path):
+        try:
+            state = read_checkpoint(checkpoint_path)
+            state["source"] = checkpoint_path
+            return state
+        except ValueError as e:
+            print(f"Checkpoint ignorado: {e}", file=sys.stderr)
+
+    state = {"source": stats_path, "channel_stats": {}, "peer_fees": {}}
+    for key, path in (("channel_stats", stats_path), ("peer_fees", peer_fees_path)):
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                state[key] = json.load(f)
+    return state
+
+def _load_config(path: str) -> Dict:
+    """Lê o arquivo de configuração do gerenciador (vazio se não existir)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _print(data, output: Optional[str] = None) -> None:
+    """Escreve JSON no terminal ou em um arquivo"""
+    encoded = json.dumps(data, indent=2, default=str)
+    if output:
+        with open(output, 'w') as f:
+            f.write(encoded + "\n")
+    else:
+        print(encoded)
+
+def _create_fee_manager(args, connect: bool):
+    """
+    Cria o gerenciador de taxas
+
+    Args:
+        args: Argumentos da linha de comando
+        connect: Criar o cliente LND (importa requests) ou apenas ler o estado gravado
+
+    Returns:
+        FeeManager
+    """
+    from fee_manager import FeeManager, configure_logging
+
+    configure_logging(args.log_file, level=args.log_level)
+    lnd_client = None
+    if connect:
+        from lnd_client_rest import LNDClient
+        lnd_client = LNDClient(lnd_host=args.host, lnd_port=args.port, cert_path=args.cert,
+                               macaroon_path=args.macaroon, dev_mode=args.dev)
+    return FeeManager(lnd_client, config_path=args.config)
+
+def cmd_status(args) -> int:
+    """Resumo do estado gravado, sem consultar o LND"""
+    state = _read_state(args.checkpoint, args.stats, args.peer_fees)
+    config = _load_config(args.config)
+
+    saved_at = state.get("saved_at")
+    status = {
+        "source": state["source"],
+        "saved_at": int(saved_at) if saved_at else None,
+        "age_seconds": int(time.time() - saved_at) if saved_at else None,
+        "cycle": state.get("cycle"),
+        "fee_strategy": config.get("fee_strategy"),
+        "channels": len(state["channel_stats"]),
+        "peers": len(state["peer_fees"]),
+        "last_update": state.get("last_update_stats") or None
+    }
+
+    if args.format == "json":
+        _print(status)
+    else:
+        for key, value in status.items():
+            print(f"{key:<14} {json.dumps(value) if isinstance(value, dict) else value}")
+    return 0
+
+def cmd_export(args) -> int:
+    """Exporta as estatísticas gravadas, com os históricos completos"""
+    from history_store import load_channel_stats
+
+    state = _read_state(args.checkpoint, args.stats, args.peer_fees)
+    channel_stats = state["channel_stats"]
+    if args.channel:
+        channel_stats = {chan_id: channel for chan_id, channel in channel_stats.items() if chan_id in args.channel}
+
+    _print({
+        "exported_at": int(time.time()),
+        "channel_stats": load_channel_stats(channel_stats, args.history_dir),
+        "peer_fees": state["peer_fees"]
+    }, args.output)
+    return 0
+
+def cmd_run_once(args) -> int:
+    """Executa um ciclo completo (coleta e envio das taxas)"""
+    fee_manager = _create_fee_manager(args, connect=True)
+    fee_manager.run_once()
+    fee_manager.state_writer.flush()
+    _print(fee_manager.last_update_stats)
+    return 1 if fee_manager.last_update_stats.get("failed") else 0
+
+def cmd_plan(args) -> int:
+    """Mostra as políticas que seriam enviadas, sem enviá-las"""
+    fee_manager = _create_fee_manager(args, connect=args.collect)
+    if args.collect:
+        fee_manager.collect_channel_data()
+    plan = fee_manager.plan_fees(force=args.force)
+
+    if args.format == "json" or args.output:
+        _print(plan, args.output)
+        if not args.output:
+            return 0
+
+    print(f"{'canal':<20} {'base atual':>10} {'ppm atual':>9} {'base alvo':>10} {'ppm alvo':>9} "
+          f"{'Δppm':>6}  {'motivo':<16} ação")
+    for entry in plan["entries"]:
+        current = entry["current"] or {"base_fee_msat": "-", "fee_rate_ppm": "-"}
+        target = entry["target"]
+        delta = "-" if entry["delta_ppm"] is None else f"{entry['delta_ppm']:+d}"
+        action = "skip (histerese)" if entry["hysteresis"] else \
+            "skip (em vigor)" if entry.get("applied") else entry["action"]
+        print(f"{entry['chan_id']:<20} {current['base_fee_msat']:>10} {current['fee_rate_ppm']:>9} "
+              f"{target['base_fee_msat']:>10} {target['fee_rate_ppm']:>9} {delta:>6}  {entry['reason']:<16} {action}")
+    summary = plan["summary"]
+    print(f"{summary['push']} a enviar, {summary['skipped']} sem mudanças, {summary['hysteresis']} "
+          f"dentro da histerese e {summary.get('applied', 0)} já em vigor, de {plan['channels']} canais")
+    return 0
+
+def cmd_apply(args) -> int:
+    """Aplica exatamente um plano gravado por plan --output"""
+    with open(args.plan, 'r') as f:
+        plan = json.load(f)
+
+    fee_manager = _create_fee_manager(args, connect=True)
+    fee_manager.update_channel_fees(plan=plan)
+    fee_manager.state_writer.flush()
+    _print(fee_manager.last_update_stats)
+    return 1 if fee_manager.last_update_stats.get("failed") else 0
+
+def cmd_backtest(args) -> int:
+    """Reproduz o histórico gravado através das estratégias"""
+    from backtest import Backtester, ReplayHistory, synthetic_history
+
+    config = _load_config(args.config)
+    if args.synthetic:
+        history = synthetic_history(*args.synthetic)
+    else:
+        history = ReplayHistory.load(args.stats, args.peer_fees, args.history_dir)
+
+    strategies = args.strategy or [config.get("fee_strategy", "balanced")]
+    _print(Backtester(history, config).compare(strategies, bucket_seconds=args.bucket), args.output)
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    """Monta o parser dos subcomandos"""
+    from checkpoint import CHECKPOINT_PATH
+    from history_store import HISTORY_DIR
+
+    parser = argparse.ArgumentParser(description="Automação de taxas do LND")
+    parser.add_argument("--config", default="fee_config.json", help="Arquivo de configuração do gerenciador")
+    parser.add_argument("--stats", default="channel_stats.json", help="Estatísticas dos canais")
+    parser.add_argument("--peer-fees", default="peer_fees.json", help="Histórico de taxas dos peers")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Checkpoint binário do estado")
+    parser.add_argument("--history-dir", default=HISTORY_DIR, help="Históricos por canal (lazy_history)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # Conexão com o LND e logging dos subcomandos que criam o gerenciador
+    lnd = argparse.ArgumentParser(add_help=False)
+    lnd.add_argument("--host", default="localhost", help="Host do LND")
+    lnd.add_argument("--port", type=int, default=8080, help="Porta REST do LND")
+    lnd.add_argument("--cert", help="Certificado TLS do LND")
+    lnd.add_argument("--macaroon", help="Macaroon de admin do LND")
+    lnd.add_argument("--dev", action="store_true", help="Modo de desenvolvimento (respostas simuladas)")
+    lnd.add_argument("--log-file", default="fee_manager.log", help="Arquivo de log (vazio: apenas o terminal)")
+    lnd.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+
+    status = subparsers.add_parser("status", help="Resumo do estado gravado")
+    status.add_argument("--format", choices=["table", "json"], default="table")
+    status.set_defaults(func=cmd_status)
+
+    export = subparsers.add_parser("export", help="Exportar as estatísticas com os históricos completos")
+    export.add_argument("--channel", action="append", help="Exportar apenas este canal (pode repetir)")
+    export.add_argument("--output", help="Arquivo de saída (padrão: terminal)")
+    export.set_defaults(func=cmd_export)
+
+    run_once = subparsers.add_parser("run-once", parents=[lnd], help="Executar um ciclo de coleta e atualização")
+    run_once.set_defaults(func=cmd_run_once)
+
+    plan = subparsers.add_parser("plan", parents=[lnd], help="Simular a atualização de taxas sem enviar")
+    plan.add_argument("--collect", action="store_true", help="Coletar os dados dos canais no LND antes de simular")
+    plan.add_argument("--force", action="store_true", help="Ignorar impressões digitais e histerese")
+    plan.add_argument("--format", choices=["table", "json"], default="table")
+    plan.add_argument("--output", help="Gravar o plano em JSON para aplicar depois com apply")
+    plan.set_defaults(func=cmd_plan)
+
+    apply = subparsers.add_parser("apply", parents=[lnd], help="Aplicar exatamente um plano gravado")
+    apply.add_argument("plan", help="Arquivo do plano (plan --output)")
+    apply.set_defaults(func=cmd_apply)
+
+    backtest = subparsers.add_parser("backtest", help="Comparar estratégias sobre o histórico gravado")
+    backtest.add_argument("--strategy", action="append", help="Estratégia (pode repetir)")
+    backtest.add_argument("--bucket", type=int, default=86400, help="Granularidade dos níveis de taxa (segundos)")
+    backtest.add_argument("--synthetic", type=int, nargs=2, metavar=("CANAIS", "AMOSTRAS"),
+                          help="Usar histórico sintético em vez dos arquivos")
+    backtest.add_argument("--output", help="Arquivo de saída (padrão: terminal)")
+    backtest.set_defaults(func=cmd_backtest)
+
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Executa um subcomando
+
+    Args:
+        argv: Argumentos (padrão: sys.argv)
+
+    Returns:
+        Código de saída
+    """
+    args = build_parser().parse_args(argv)
+    if getattr(args, "log_file", None) == "":
+        args.log_file = None
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -90,11 +90,12 @@ def create_config():
     # Configuração de estratégias de taxas
     print("\n--- Configuração de Estratégias de Taxas ---")
     
-    strategies = ["balanced", "competitive", "profitable"]
+    strategies = ["balanced", "competitive", "profitable", "controller"]
     print("Estratégias disponíveis:")
     print("  balanced    - Equilibra receita e competitividade")
     print("  competitive - Prioriza competitividade (taxas menores)")
     print("  profitable  - Prioriza receita (taxas maiores)")
+    print("  controller  - Leva o saldo local ao alvo com poucas mudanças de taxa")
     
     strategy = ""
     while strategy not in strategies:
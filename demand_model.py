@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Modelo de demanda por canal
+Este módulo estima a elasticidade da demanda de cada canal: uma regressão
+linear ponderada do volume encaminhado por hora contra a nossa taxa
+proporcional, mantida por estatísticas suficientes com decaimento exponencial.
+Cada nova amostra atualiza o modelo em O(1), e o ajuste de cada canal é feito
+em forma fechada a partir dessas estatísticas, sem percorrer o histórico
+"""
+
+import math
+from typing import Dict, List, Optional
+
+from flow_estimators import ewma_alpha
+from policy_history import policy_at
+from volume_deltas import interval_volumes
+
+# Meia-vida das estatísticas do modelo (segundos)
+DEMAND_HALF_LIFE_SECONDS = 7 * 86400
+
+# Estatísticas suficientes, ponderadas pelas horas de cada intervalo
+SUM_KEYS = ("weight", "sum_fee", "sum_volume", "sum_fee_sq", "sum_fee_volume")
+
+# Desvio padrão mínimo das taxas observadas para que a inclinação seja estimada (ppm)
+MIN_FEE_STDDEV_PPM = 1.0
+
+# Faixa de taxas coberta pelo ajuste: média ponderada ± este número de desvios padrão
+FEE_RANGE_STDDEVS = 2.0
+
+def update_demand(demand: Optional[Dict], timestamp: int, fee_rate_ppm: float, volume: float,
+                  elapsed: float, half_life: float = DEMAND_HALF_LIFE_SECONDS) -> Dict:
+    """
+    Acrescenta um intervalo de encaminhamento ao modelo
+
+    Um novo dicionário é devolvido; o anterior não é alterado, então ele pode
+    continuar exposto em snapshots.
+
+    Args:
+        demand: Estatísticas atuais (None para começar)
+        timestamp: Fim do intervalo
+        fee_rate_ppm: Nossa taxa proporcional vigente no intervalo
+        volume: Volume encaminhado para fora no intervalo (sats)
+        elapsed: Duração do intervalo (segundos)
+        half_life: Meia-vida das estatísticas (segundos)
+
+    Returns:
+        Estatísticas atualizadas
+    """
+    updated = dict(demand) if demand else {key: 0.0 for key in SUM_KEYS}
+    if elapsed <= 0:
+        return updated
+
+    # Intervalos antigos perdem peso; o peso do intervalo é a sua duração
+    decay = 1 - ewma_alpha(elapsed, half_life) if demand else 1.0
+    hours = elapsed / 3600
+    rate = volume / hours
+    for key in SUM_KEYS:
+        updated[key] *= decay
+    updated["weight"] += hours
+    updated["sum_fee"] += hours * fee_rate_ppm
+    updated["sum_volume"] += hours * rate
+    updated["sum_fee_sq"] += hours * fee_rate_ppm * fee_rate_ppm
+    updated["sum_fee_volume"] += hours * fee_rate_ppm * rate
+
+    # Extremos de toda a vida do canal, gravados por versões anteriores: a faixa
+    # agora vem das somas com decaimento (fit_demand)
+    updated.pop("fee_min_ppm", None)
+    updated.pop("fee_max_ppm", None)
+    updated["timestamp"] = max(timestamp, updated.get("timestamp", 0))
+    updated["samples"] = updated.get("samples", 0) + 1
+    return updated
+
+def fit_demand(demand: Optional[Dict], min_hours: float = 0) -> Optional[Dict]:
+    """
+    Ajusta a reta de demanda (volume por hora = intercept + slope * taxa em ppm)
+
+    A faixa de taxas coberta pelo ajuste é a média ponderada das taxas ±
+    FEE_RANGE_STDDEVS desvios padrão, com o mesmo decaimento das somas: uma
+    taxa antiga e isolada deixa de alargar a faixa com o tempo.
+
+    Args:
+        demand: Estatísticas do canal
+        min_hours: Peso mínimo (horas de histórico ponderadas) para ajustar
+
+    Returns:
+        Reta ajustada com a faixa de taxas coberta, ou None se o histórico
+        for curto ou a taxa não tiver variado o suficiente
+    """
+    if not demand or demand["weight"] <= 0 or demand["weight"] < min_hours:
+        return None
+
+    weight = demand["weight"]
+    mean_fee = demand["sum_fee"] / weight
+    mean_volume = demand["sum_volume"] / weight
+    variance = demand["sum_fee_sq"] / weight - mean_fee * mean_fee
+    if variance < MIN_FEE_STDDEV_PPM ** 2:
+        return None
+
+    slope = (demand["sum_fee_volume"] / weight - mean_fee * mean_volume) / variance
+    spread = FEE_RANGE_STDDEVS * math.sqrt(variance)
+    return {
+        "intercept": mean_volume - slope * mean_fee,
+        "slope": slope,
+        "mean_fee_ppm": mean_fee,
+        "mean_volume_per_hour": mean_volume,
+        "fee_min_ppm": max(0.0, mean_fee - spread),
+        "fee_max_ppm": mean_fee + spread,
+        "weight": weight
+    }
+
+def fit_demand_batch(demands: Dict[str, Optional[Dict]], min_hours: float = 0) -> Dict[str, Dict]:
+    """
+    Ajusta a reta de demanda de vários canais
+
+    Cada canal é ajustado por fit_demand, um de cada vez; o custo é O(1) por canal.
+
+    Args:
+        demands: Estatísticas por chan_id
+        min_hours: Peso mínimo para ajustar
+
+    Returns:
+        Retas ajustadas por chan_id (canais sem ajuste são omitidos)
+    """
+    fits = {}
+    for chan_id, demand in demands.items():
+        fit = fit_demand(demand, min_hours)
+        if fit is not None:
+            fits[chan_id] = fit
+    return fits
+
+def combine_fits(fits: List[Dict]) -> Dict:
+    """
+    Reta de demanda de um conjunto de canais com a mesma taxa
+
+    A demanda total é a soma das demandas de cada canal.
+
+    Args:
+        fits: Retas ajustadas dos canais
+
+    Returns:
+        Reta combinada
+    """
+    weight = sum(fit["weight"] for fit in fits)
+    return {
+        "intercept": sum(fit["intercept"] for fit in fits),
+        "slope": sum(fit["slope"] for fit in fits),
+        "mean_fee_ppm": sum(fit["mean_fee_ppm"] * fit["weight"] for fit in fits) / weight if weight else 0.0,
+        "mean_volume_per_hour": sum(fit["mean_volume_per_hour"] for fit in fits),
+        "fee_min_ppm": min(fit["fee_min_ppm"] for fit in fits),
+        "fee_max_ppm": max(fit["fee_max_ppm"] for fit in fits),
+        "weight": weight
+    }
+
+def revenue_maximizing_fee(fit: Dict, min_fee_rate_ppm: float, max_fee_rate_ppm: float,
+                           explore_ratio: float = 0.25, current_fee_rate_ppm: Optional[float] = None) -> float:
+    """
+    Taxa proporcional que maximiza a receita prevista pela reta de demanda
+
+    Com demanda decrescente, a receita taxa * (intercept + slope * taxa) é
+    máxima em -intercept / (2 * slope). Sem queda de demanda observada, a reta
+    não tem ótimo finito; a taxa em vigor é mantida (a taxa média observada se
+    ela for desconhecida), em vez de subir explore_ratio a cada ciclo. O
+    resultado fica dentro dos limites e a no máximo explore_ratio além da faixa
+    de taxas coberta pelo ajuste, para não extrapolar a reta para longe dos dados.
+
+    Args:
+        fit: Reta ajustada (fit_demand)
+        min_fee_rate_ppm: Taxa proporcional mínima (ppm)
+        max_fee_rate_ppm: Taxa proporcional máxima (ppm)
+        explore_ratio: Fração além da faixa coberta pelo ajuste permitida
+        current_fee_rate_ppm: Taxa proporcional em vigor (ppm), se conhecida
+
+    Returns:
+        Taxa proporcional em ppm
+    """
+    if fit["slope"] < 0:
+        optimum = -fit["intercept"] / (2 * fit["slope"])
+    elif current_fee_rate_ppm is not None:
+        optimum = current_fee_rate_ppm
+    else:
+        optimum = fit["mean_fee_ppm"]
+
+    lower = max(min_fee_rate_ppm, fit["fee_min_ppm"] / (1 + explore_ratio))
+    upper = min(max_fee_rate_ppm, fit["fee_max_ppm"] * (1 + explore_ratio))
+    return max(min_fee_rate_ppm, min(max_fee_rate_ppm, max(lower, min(upper, optimum))))
+
+def bootstrap_demand(channel: Dict, half_life: float = DEMAND_HALF_LIFE_SECONDS) -> Optional[Dict]:
+    """
+    Reconstrói o modelo de um canal a partir do histórico armazenado
+
+    Usado uma única vez para estados gravados antes do modelo existir. A taxa
+    de cada intervalo é a última registrada antes da amostra que o encerra,
+    como na atualização incremental feita durante a coleta.
+
+    Args:
+        channel: Estatísticas do canal (flow_history e fee_history)
+        half_life: Meia-vida das estatísticas (segundos)
+
+    Returns:
+        Estatísticas ou None se não houver intervalos com taxa conhecida
+    """
+    demand = None
+    fee_history = channel.get("fee_history", [])
+    previous = None
+    for sample in channel.get("flow_history", []):
+        policy = policy_at(fee_history, sample["timestamp"] - 1) if previous else None
+        if policy is not None:
+            _, volume_out = interval_volumes(sample, previous)
+            demand = update_demand(demand, sample["timestamp"], policy["fee_rate"] * 1000000, volume_out,
+                                   sample["timestamp"] - previous["timestamp"], half_life)
+        previous = sample
+    return demand
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Snapshots imutáveis do estado do gerenciador de taxas
+Este módulo implementa a publicação copy-on-write do estado do motor, permitindo
+que as threads da API web leiam estatísticas e configuração sem locks
+"""
+
+import time
+from typing import Dict, Iterable, Optional
+
+
+class FrozenDict(dict):
+    """Dicionário somente leitura (continua serializável como JSON)"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Snapshot imutável não pode ser alterado")
+
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    clear = _readonly
+    pop = _readonly
+    popitem = _readonly
+    setdefault = _readonly
+    update = _readonly
+
+    def __copy__(self) -> Dict:
+        return dict(self)
+
+    def __deepcopy__(self, memo) -> Dict:
+        import copy
+        return {key: copy.deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+def freeze(value):
+    """
+    Converte recursivamente dicionários e listas em estruturas imutáveis
+
+    Args:
+        value: Valor a ser congelado
+
+    Returns:
+        Valor equivalente somente leitura
+    """
+    if isinstance(value, FrozenDict):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def _freeze_records(records: Iterable[Dict]) -> tuple:
+    """
+    Congela uma lista de amostras do histórico
+
+    As amostras (flow_data, fee_data, peer_fee_data) nunca são alteradas depois
+    de anexadas ao histórico, portanto basta copiar a sequência de referências.
+    """
+    return tuple(records)
+
+
+def _freeze_channel(stats: Dict) -> FrozenDict:
+    """Congela as estatísticas de um canal compartilhando as amostras"""
+    frozen = {}
+    for key, value in stats.items():
+        if key.endswith("_history") and isinstance(value, list):
+            frozen[key] = _freeze_records(value)
+        else:
+            frozen[key] = freeze(value)
+    return FrozenDict(frozen)
+
+
+class EngineSnapshot:
+    """Visão imutável do estado do motor ao final de uma etapa do ciclo"""
+
+    __slots__ = ("stage", "cycle", "timestamp", "config", "channel_stats", "peer_fees", "update_budget")
+
+    def __init__(self, stage: str, cycle: int, timestamp: int, config: FrozenDict,
+                 channel_stats: FrozenDict, peer_fees: FrozenDict,
+                 update_budget: Optional[FrozenDict] = None):
+        """
+        Inicializa o snapshot
+
+        Args:
+            stage: Etapa que publicou o snapshot (load, collect, update, config)
+            cycle: Número do ciclo de atualização
+            timestamp: Momento da publicação
+            config: Configuração congelada
+            channel_stats: Estatísticas dos canais congeladas
+            peer_fees: Histórico de taxas dos peers congelado
+            update_budget: Resumo da fila de envios congelado (UpdateBudget.stats)
+        """
+        object.__setattr__(self, "stage", stage)
+        object.__setattr__(self, "cycle", cycle)
+        object.__setattr__(self, "timestamp", timestamp)
+        object.__setattr__(self, "config", config)
+        object.__setattr__(self, "channel_stats", channel_stats)
+        object.__setattr__(self, "peer_fees", peer_fees)
+        object.__setattr__(self, "update_budget", FrozenDict() if update_budget is None else update_budget)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("EngineSnapshot é imutável")
+
+    def __delattr__(self, name):
+        raise AttributeError("EngineSnapshot é imutável")
+
+    def summary(self) -> Dict:
+        """
+        Resume os metadados do snapshot
+
+        Returns:
+            Dicionário com etapa, ciclo, horário e contagens
+        """
+        return {
+            "stage": self.stage,
+            "cycle": self.cycle,
+            "timestamp": self.timestamp,
+            "channels": len(self.channel_stats),
+            "peers": len(self.peer_fees)
+        }
+
+
+class SnapshotBuilder:
+    """
+    Constrói snapshots com compartilhamento estrutural (copy-on-write)
+
+    Apenas canais e peers marcados como alterados desde a última publicação são
+    copiados; os demais reutilizam a visão congelada do snapshot anterior.
+    """
+
+    def __init__(self):
+        self._channels = {}
+        self._peers = {}
+        self._dirty_channels = set()
+        self._dirty_peers = set()
+        self._all_dirty = True
+        self._config_source = None
+        self._config = FrozenDict()
+
+    def mark_channel(self, chan_id: str) -> None:
+        """Marca um canal como alterado"""
+        self._dirty_channels.add(chan_id)
+
+    def mark_peer(self, peer_pubkey: str) -> None:
+        """Marca um peer como alterado"""
+        self._dirty_peers.add(peer_pubkey)
+
+    def mark_all(self) -> None:
+        """Força a cópia completa no próximo snapshot"""
+        self._all_dirty = True
+
+    def build(self, stage: str, cycle: int, config: Dict, channel_stats: Dict,
+              peer_fees: Dict, timestamp: Optional[int] = None,
+              update_budget: Optional[Dict] = None) -> EngineSnapshot:
+        """
+        Constrói um novo snapshot a partir do estado mutável do motor
+
+        Deve ser chamado pela thread que altera o estado (o loop de taxas).
+
+        Args:
+            stage: Etapa que está publicando
+            cycle: Número do ciclo
+            config: Configuração atual
+            channel_stats: Estatísticas mutáveis dos canais
+            peer_fees: Histórico mutável de taxas dos peers
+            timestamp: Momento da publicação (padrão: agora)
+            update_budget: Resumo da fila de envios, montado pela mesma thread
+
+        Returns:
+            Novo snapshot imutável
+        """
+        if config is not self._config_source:
+            self._config_source = config
+            self._config = freeze(config)
+
+        self._channels = self._refresh(self._channels, channel_stats,
+                                       self._dirty_channels, _freeze_channel)
+        self._peers = self._refresh(self._peers, peer_fees,
+                                    self._dirty_peers, _freeze_records)
+        self._dirty_channels = set()
+        self._dirty_peers = set()
+        self._all_dirty = False
+
+        return EngineSnapshot(
+            stage=stage,
+            cycle=cycle,
+            timestamp=int(time.time()) if timestamp is None else timestamp,
+            config=self._config,
+            channel_stats=FrozenDict(self._channels),
+            peer_fees=FrozenDict(self._peers),
+            update_budget=freeze(update_budget or {})
+        )
+
+    def _refresh(self, previous: Dict, source: Dict, dirty: set, freezer) -> Dict:
+        """Reaproveita entradas inalteradas e congela apenas as alteradas"""
+        refreshed = {}
+        for key, value in source.items():
+            if self._all_dirty or key in dirty or key not in previous:
+                refreshed[key] = freezer(value)
+            else:
+                refreshed[key] = previous[key]
+        return refreshed
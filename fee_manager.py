@@ -16,19 +16,52 @@ import threading
 import statistics
 
 # Importar o cliente LND
-from lnd_client_rest import LNDClient
+from lnd_client_rest import LNDClient, parse_channel_point, parse_failed_updates
+from engine_snapshot import EngineSnapshot, SnapshotBuilder, freeze
+from strategies import ChannelInput, FeeStrategy, StrategyFeatures, get_strategy
+from graph_index import FeeQuantileIndex
+from graph_analytics import DEFAULT_SAMPLES, GraphAnalytics
+from demand_model import bootstrap_demand, update_demand
+from seasonality import bootstrap_profile, build_schedule, combine_profiles, demand_multipliers, hour_of_week, scheduled_policy, update_profile
+from flow_estimators import HALF_LIFE_SECONDS, bootstrap_estimators, update_fee_estimator, update_flow_estimators
+from volume_deltas import bootstrap_windows, collect_interval, interval_volumes, update_windows
+from peer_aggregates import aggregate_features, build_peer_aggregates
+from rollups import add_fee_record, add_flow_sample, bootstrap_rollups, tier_key
+from policy_history import compact_history, policy_applied, policy_at, policy_key, record_policy
+from persistence import StateWriter
+from checkpoint import CHECKPOINT_PATH, encode_checkpoint, is_current, read_checkpoint
+from history_store import TIER_KEYS, HistoryStore
+from update_budget import UpdateBudget
+from stats_archive import ARCHIVE_PATH, DEFAULT_GRACE_SECONDS, archive_entries, select_stale
+
+# Intervalo antes de assinar novamente o gossip após uma falha (segundos)
+GRAPH_RESUBSCRIBE_SECONDS = 30
+
+# Limite dos históricos brutos: 30 dias (assumindo uma atualização por hora)
+MAX_HISTORY = 24 * 30
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("fee_manager.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger("fee_manager")
 
+def configure_logging(log_file: Optional[str] = "fee_manager.log", level: Union[int, str] = logging.INFO) -> None:
+    """
+    Configura o logging do processo
+    
+    Chamado pelos pontos de entrada (linha de comando, script); importar o
+    módulo não altera o logging de quem o importa.
+    
+    Args:
+        log_file: Arquivo de log (None: apenas o terminal)
+        level: Nível mínimo das mensagens (número ou nome)
+    """
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.insert(0, logging.FileHandler(log_file))
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
 class FeeManager:
     """Gerenciador de taxas para o LND"""
     
@@ -47,9 +80,54 @@ class FeeManager:
         self.peer_fees = {}
         self.running = False
         self.thread = None
+        self.graph_thread = None
+        self.cycle = 0
+        
+        # Quantis das taxas da rede, atualizados pelo gossip
+        self.graph_index = FeeQuantileIndex()
+        
+        # Centralidade dos nossos canais, recalculada quando o grafo muda
+        self.graph_analytics = GraphAnalytics()
+        self.graph_loaded_at = 0
+        
+        # Resumo da última atualização de taxas (canais recalculados, pulados e enviados)
+        self.last_update_stats: Dict = {}
+        
+        # Liquidez combinada e política de cada peer no último cálculo (aggregate_peers)
+        self.peer_aggregates: Dict[str, Dict] = {}
+        
+        # Histórico de canais fechados e peers que saíram
+        self.archive_path = ARCHIVE_PATH
+        
+        # Gravação atômica do estado, em segundo plano enquanto o gerenciador está em execução
+        self.state_writer = StateWriter()
+        self.checkpoint_path = CHECKPOINT_PATH
+        
+        # Mudanças de política aguardando o orçamento de envios (token bucket)
+        self.update_budget = UpdateBudget()
+        self.update_budget.configure(self.config)
+        
+        # Agendas sazonais dos canais abertos e a hora da semana da última aplicação
+        self.fee_schedules: Dict[str, Dict] = {}
+        self.schedule_hour: Optional[int] = None
+        
+        # Históricos completos dos canais fora da memória (lazy_history)
+        self.history_store = HistoryStore(max_records=MAX_HISTORY)
+        
+        # Chave pública do nosso node (consultada uma única vez) e posições de
+        # leitura de fontes incrementais do LND, preservadas no checkpoint
+        self.our_pubkey: Optional[str] = None
+        self.cursors: Dict[str, int] = {}
+        
+        # Snapshots imutáveis publicados para leitores (API web); o lock ordena
+        # apenas as publicações do loop e as trocas de configuração da API
+        self._snapshot_builder = SnapshotBuilder()
+        self._snapshot = None
+        self._publish_lock = threading.Lock()
         
         # Carregar estatísticas anteriores se existirem
         self._load_stats()
+        self.publish_snapshot("load")
     
     def _load_config(self) -> Dict:
         """
@@ -60,7 +138,7 @@ class FeeManager:
         """
         default_config = {
             "update_interval_seconds": 3600,  # 1 hora
-            "fee_strategy": "balanced",  # balanced, competitive, profitable
+            "fee_strategy": "balanced",  # balanced, competitive, profitable, controller
             "min_base_fee_msat": 1000,
             "max_base_fee_msat": 5000,
             "min_fee_rate": 0.000001,  # 1 ppm
@@ -70,6 +148,39 @@ class FeeManager:
             "peer_weight": 0.3,        # Peso das taxas dos peers no cálculo
             "high_flow_threshold": 0.8, # Percentual de capacidade considerado alto fluxo
             "low_flow_threshold": 0.2,  # Percentual de capacidade considerado baixo fluxo
+            "smooth_flow": False,       # Usar as médias móveis de fluxo em vez da amostra mais recente
+            "ewma_half_life_seconds": 21600,  # Meia-vida das médias móveis de fluxo (6 horas)
+            "use_elasticity": False,    # Estratégia profitable: taxa que maximiza a receita pela demanda estimada
+            "elasticity_min_hours": 72,  # Horas de histórico (ponderadas) antes de usar a demanda estimada
+            "elasticity_explore_ratio": 0.25,  # Fração além da faixa de taxas recentes permitida
+            "controller_target_ratio": 0.5,  # Saldo local alvo da estratégia controller
+            "controller_kp": 1.0,       # Ganho proporcional (erro do saldo médio)
+            "controller_ki": 0.5,       # Ganho integral (erro do saldo médio lento)
+            "controller_kd": 2.0,       # Ganho derivativo (deriva do saldo por hora)
+            "controller_deadband": 0.05,  # Saídas do controlador menores que isto mantêm a taxa em vigor
+            "controller_step_ppm": 25,  # Passo da taxa proporcional do controlador (ppm)
+            "controller_hysteresis_steps": 3,  # Passos de distância da taxa em vigor para enviar uma nova política
+            "seasonal_fees": False,     # Modular a taxa proporcional pela demanda de cada hora da semana
+            "seasonal_strength": 0.5,   # Fração da variação da demanda aplicada à taxa (0 = sem modulação)
+            "seasonal_step": 0.1,       # Passo do fator sazonal da taxa
+            "seasonal_min_samples": 2,  # Observações de uma hora da semana antes de modulá-la
+            "seasonal_max_multiplier": 2.0,  # Limite da demanda relativa de uma hora (e do seu inverso)
+            "use_market_fees": False,   # Usar os quantis de taxas da rede como referência
+            "use_centrality": False,    # Calcular a centralidade dos canais no grafo
+            "centrality_samples": 256,  # Nodes de origem amostrados no cálculo da centralidade
+            "graph_refresh_seconds": 86400,  # Intervalo entre cargas completas do grafo
+            "aggregate_peers": False,   # Mesma taxa para todos os canais paralelos de um peer
+            "prune_grace_seconds": DEFAULT_GRACE_SECONDS,  # Ausência antes de arquivar canais e peers (0 = nunca)
+            "state_checkpoint": True,   # Gravar o checkpoint binário para reinícios rápidos
+            "lazy_history": False,      # Manter em memória apenas o resumo recente de cada canal
+            "fee_hysteresis_ppm": 0,    # Mudanças da taxa proporcional até este valor não são enviadas
+            "fee_hysteresis_ratio": 0.0,  # Idem, como fração da taxa proporcional atual
+            "policy_updates_per_minute": 0,  # Orçamento global de envios de políticas (0 = sem limite)
+            "policy_update_burst": 0,   # Envios seguidos com o orçamento cheio (0 = um minuto de envios)
+            "min_update_interval_seconds": 0,  # Intervalo mínimo entre atualizações do mesmo canal
+            "policy_update_priority": "delta",  # Ordem da fila de envios: delta ou imbalance
+            "policy_retry_base_seconds": 60,  # Espera antes da primeira nova tentativa de um envio recusado
+            "policy_retry_max_attempts": 5,  # Tentativas de envio de um canal antes de aguardar o próximo plano
             "enabled_channels": [],     # Lista vazia significa todos os canais
             "excluded_channels": []     # Canais a serem excluídos da automação
         }
@@ -101,9 +212,167 @@ class FeeManager:
         except Exception as e:
             logger.error(f"Erro ao salvar configuração: {e}")
     
+    def update_config(self, changes: Dict) -> Dict:
+        """
+        Atualiza a configuração sem alterar o dicionário em uso pelo loop
+        
+        Uma nova cópia é criada, alterada e trocada atomicamente (copy-on-write).
+        Pode ser chamado pela API web: a troca é serializada com as publicações
+        do loop, então um snapshot mais novo nunca é substituído por um antigo.
+        
+        Args:
+            changes: Chaves e valores a alterar (chaves desconhecidas são ignoradas)
+            
+        Returns:
+            Nova configuração
+        """
+        with self._publish_lock:
+            new_config = dict(self.config)
+            for key, value in changes.items():
+                if key in new_config:
+                    new_config[key] = value
+            self.config = new_config
+            
+            # Publicar a nova configuração reaproveitando o estado do último snapshot,
+            # sem tocar nas estruturas que o loop de taxas está alterando
+            current = self._snapshot
+            self._snapshot = EngineSnapshot(
+                stage="config",
+                cycle=current.cycle,
+                timestamp=int(time.time()),
+                config=freeze(new_config),
+                channel_stats=current.channel_stats,
+                peer_fees=current.peer_fees,
+                update_budget=current.update_budget
+            )
+        
+        self.save_config()
+        return new_config
+    
+    def publish_snapshot(self, stage: str) -> EngineSnapshot:
+        """
+        Publica um snapshot imutável do estado atual
+        
+        Deve ser chamado apenas pela thread que altera o estado. A troca da
+        referência é atômica, então leitores nunca veem um ciclo pela metade.
+        
+        Args:
+            stage: Etapa do ciclo que está publicando
+            
+        Returns:
+            Snapshot publicado
+        """
+        with self._publish_lock:
+            snapshot = self._snapshot_builder.build(
+                stage=stage,
+                cycle=self.cycle,
+                config=self.config,
+                channel_stats=self.channel_stats,
+                peer_fees=self.peer_fees,
+                update_budget=self.update_budget.stats()
+            )
+            self._snapshot = snapshot
+        return snapshot
+    
+    def _publish_update_budget(self) -> None:
+        """
+        Publica o resumo da fila de envios sem copiar o restante do estado
+        
+        Deve ser chamado apenas pela thread que altera o estado, após selecionar
+        os envios de uma drenagem sem mudanças nos canais.
+        """
+        with self._publish_lock:
+            current = self._snapshot
+            self._snapshot = EngineSnapshot(
+                stage=current.stage,
+                cycle=current.cycle,
+                timestamp=current.timestamp,
+                config=current.config,
+                channel_stats=current.channel_stats,
+                peer_fees=current.peer_fees,
+                update_budget=freeze(self.update_budget.stats())
+            )
+    
+    def get_snapshot(self) -> EngineSnapshot:
+        """
+        Obtém o snapshot mais recente sem bloquear o loop de taxas
+        
+        Returns:
+            Último snapshot publicado
+        """
+        return self._snapshot
+    
+    def _checkpoint_state(self) -> Dict:
+        """Estado completo do motor gravado no checkpoint binário"""
+        return {
+            "saved_at": time.time(),
+            "cycle": self.cycle,
+            "our_pubkey": self.our_pubkey,
+            "cursors": dict(self.cursors),
+            "channel_stats": self.channel_stats,
+            "peer_fees": self.peer_fees,
+            "graph_loaded_at": self.graph_loaded_at,
+            "graph_index": self.graph_index.export_state(),
+            "graph_analytics": self.graph_analytics.export_state(),
+            "last_update_stats": self.last_update_stats,
+            "update_budget": self.update_budget.bucket.export_state()
+        }
+    
+    def _load_checkpoint(self) -> bool:
+        """
+        Restaura o estado a partir do checkpoint binário
+        
+        O checkpoint é gravado depois dos arquivos JSON; se o JSON for mais
+        recente (por exemplo, a gravação do checkpoint falhou), ele é ignorado.
+        
+        Returns:
+            True se o estado foi restaurado
+        """
+        if not self.config.get("state_checkpoint", True) or not os.path.exists(self.checkpoint_path):
+            return False
+        if not is_current(self.checkpoint_path):
+            logger.info("Checkpoint mais antigo que channel_stats.json, carregando o JSON")
+            return False
+        
+        started = time.perf_counter()
+        try:
+            state = read_checkpoint(self.checkpoint_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Checkpoint ignorado: {e}")
+            return False
+        
+        self.cycle = state["cycle"]
+        self.our_pubkey = state["our_pubkey"]
+        self.cursors = state["cursors"]
+        self.channel_stats = state["channel_stats"]
+        self.peer_fees = state["peer_fees"]
+        self.graph_loaded_at = state["graph_loaded_at"]
+        self.graph_index.restore_state(state["graph_index"])
+        self.graph_analytics.restore_state(state["graph_analytics"])
+        self.last_update_stats = state["last_update_stats"]
+        if state.get("update_budget"):
+            self.update_budget.bucket.restore_state(state["update_budget"])
+        
+        logger.info(f"Estado restaurado do checkpoint em {(time.perf_counter() - started) * 1000:.1f} ms "
+                    f"({len(self.channel_stats)} canais)")
+        return True
+    
+    def _get_our_pubkey(self) -> str:
+        """Chave pública do nosso node, consultada no LND apenas na primeira vez"""
+        if not self.our_pubkey:
+            self.our_pubkey = self.lnd_client.get_info().get("identity_pubkey") or None
+        return self.our_pubkey or ""
+    
     def _load_stats(self) -> None:
         """Carrega estatísticas anteriores de canais e peers"""
         try:
+            if self._load_checkpoint():
+                for channel in self.channel_stats.values():
+                    channel.pop(tier_key("hourly"), None)
+                self._load_histories()
+                self._snapshot_builder.mark_all()
+                return
+            
             if os.path.exists("channel_stats.json"):
                 with open("channel_stats.json", 'r') as f:
                     self.channel_stats = json.load(f)
@@ -111,19 +380,168 @@ class FeeManager:
             if os.path.exists("peer_fees.json"):
                 with open("peer_fees.json", 'r') as f:
                     self.peer_fees = json.load(f)
+            
+            # Estados gravados antes dos estimadores, do modelo de demanda e das curvas sazonais: reconstruir uma única vez a partir do histórico
+            half_life = self._half_life()
+            for channel in self.channel_stats.values():
+                if "estimators" not in channel:
+                    estimators = bootstrap_estimators(channel, half_life)
+                    if estimators:
+                        channel["estimators"] = estimators
+                if "demand" not in channel:
+                    demand = bootstrap_demand(channel)
+                    if demand:
+                        channel["demand"] = demand
+                if "seasonal_profile" not in channel:
+                    profile = bootstrap_profile(channel)
+                    if profile:
+                        channel["seasonal_profile"] = profile
+                if "volume_windows" not in channel and channel.get("flow_history"):
+                    channel["volume_windows"] = bootstrap_windows(channel["flow_history"])
+                # A camada horária deixou de existir (as amostras brutas cobrem o período)
+                channel.pop(tier_key("hourly"), None)
+                if tier_key("daily") not in channel:
+                    bootstrap_rollups(channel)
+                # Históricos com um registro por coleta viram eventos de mudança
+                if any("last_seen" not in record for record in channel.get("fee_history", [])):
+                    channel["fee_history"] = compact_history(channel["fee_history"])
+            
+            for pubkey, records in self.peer_fees.items():
+                if any("last_seen" not in record for record in records):
+                    self.peer_fees[pubkey] = compact_history(records)
+            
+            self._load_histories()
+            self._snapshot_builder.mark_all()
         except Exception as e:
             logger.error(f"Erro ao carregar estatísticas: {e}")
     
-    def _save_stats(self) -> None:
-        """Salva estatísticas atuais de canais e peers"""
-        try:
-            with open("channel_stats.json", 'w') as f:
-                json.dump(self.channel_stats, f, indent=2)
+    def _load_histories(self) -> None:
+        """Traz de volta para a memória os históricos gravados em modo lazy_history, se ele foi desligado (as camadas continuam no log)"""
+        if self.config.get("lazy_history"):
+            return
+        for chan_id, channel in self.channel_stats.items():
+            log = channel.get("history_log")
+            if log and log.get("lazy", True):
+                full = self.history_store.materialize(chan_id, channel)
+                for key in TIER_KEYS & set(full):
+                    full[key] = full[key][-self.history_store.hot_records:]
+                full["history_log"] = dict(log, lazy=False)
+                self.channel_stats[chan_id] = full
+    
+    def _spill_histories(self) -> None:
+        """Grava os registros novos no armazenamento e mantém em memória só os recentes (todos os históricos com lazy_history, senão apenas as camadas)"""
+        keys = None if self.config.get("lazy_history") else TIER_KEYS
+        for chan_id, channel in self.channel_stats.items():
+            try:
+                if self.history_store.spill(chan_id, channel, keys):
+                    self._snapshot_builder.mark_channel(chan_id)
+            except Exception as e:
+                logger.error(f"Erro ao gravar o histórico do canal {chan_id}: {e}")
+    
+    def load_history(self, chan_id: str) -> Optional[Dict]:
+        """
+        Obtém as estatísticas de um canal com os históricos completos
+        
+        Com lazy_history, os históricos são lidos do armazenamento apenas nesta
+        consulta. Usa o snapshot publicado, então pode ser chamado pela API web.
+        
+        Args:
+            chan_id: ID do canal
             
-            with open("peer_fees.json", 'w') as f:
-                json.dump(self.peer_fees, f, indent=2)
-        except Exception as e:
-            logger.error(f"Erro ao salvar estatísticas: {e}")
+        Returns:
+            Estatísticas do canal ou None se o canal for desconhecido
+        """
+        snapshot = self.get_snapshot()
+        channel = (snapshot.channel_stats if snapshot else self.channel_stats).get(chan_id)
+        if channel is None or "history_log" not in channel:
+            return channel
+        return self.history_store.materialize(chan_id, channel)
+    
+    def _half_life(self) -> float:
+        """Meia-vida configurada das médias móveis de fluxo"""
+        return self.config.get("ewma_half_life_seconds", HALF_LIFE_SECONDS)
+    
+    def _append_flow_sample(self, chan_id: str, flow_data: Dict, max_history: int) -> None:
+        """
+        Adiciona uma amostra de fluxo e atualiza os estimadores, o modelo de demanda, a curva sazonal, as janelas de volume e os agregados do canal
+        
+        Args:
+            chan_id: ID do canal
+            flow_data: Nova amostra de fluxo
+            max_history: Número máximo de amostras mantidas
+        """
+        channel = self.channel_stats[chan_id]
+        history = channel["flow_history"]
+        previous = history[-1] if history else None
+        
+        channel["estimators"] = update_flow_estimators(channel.get("estimators"), flow_data,
+                                                       previous, self._half_life())
+        volume_in, volume_out = interval_volumes(flow_data, previous)
+        
+        # Modelo de demanda: volume do intervalo contra a nossa taxa vigente nele
+        if previous is not None and channel["fee_history"]:
+            channel["demand"] = update_demand(channel.get("demand"), flow_data["timestamp"],
+                                              channel["fee_history"][-1]["fee_rate"] * 1000000, volume_out,
+                                              flow_data["timestamp"] - previous["timestamp"])
+        if previous is not None:
+            channel["seasonal_profile"] = update_profile(channel.get("seasonal_profile"), flow_data["timestamp"],
+                                                         volume_out, flow_data["timestamp"] - previous["timestamp"])
+        channel["volume_windows"] = update_windows(channel.get("volume_windows"), flow_data["timestamp"],
+                                                   volume_in, volume_out)
+        add_flow_sample(channel, flow_data, volume_in, volume_out)
+        history.append(flow_data)
+        
+        if len(history) > max_history:
+            channel["flow_history"] = history[-max_history:]
+    
+    def _append_fee_record(self, chan_id: str, fee_data: Dict, max_history: int) -> None:
+        """
+        Registra uma observação da nossa política e atualiza a taxa de mudanças e os agregados do canal
+        
+        O histórico guarda apenas as mudanças de política; observações sem
+        mudança apenas atualizam last_seen do registro vigente.
+        
+        Args:
+            chan_id: ID do canal
+            fee_data: Política observada
+            max_history: Número máximo de mudanças mantidas
+        """
+        channel = self.channel_stats[chan_id]
+        history = channel["fee_history"]
+        previous = history[-1] if history else None
+        if previous is not None:
+            # A taxa de mudanças é medida desde a observação anterior
+            previous = dict(previous, timestamp=previous.get("last_seen", previous["timestamp"]))
+        
+        channel["estimators"] = update_fee_estimator(channel.get("estimators"), fee_data,
+                                                     previous, self._half_life())
+        add_fee_record(channel, fee_data)
+        
+        if record_policy(history, fee_data) and len(history) > max_history:
+            channel["fee_history"] = history[-max_history:]
+    
+    def _save_stats(self) -> None:
+        """
+        Salva as estatísticas de canais e peers do último snapshot publicado
+        
+        O snapshot é imutável, então a gravação pode ocorrer na thread de
+        persistência enquanto o loop continua alterando o estado. Pedidos feitos
+        durante uma gravação são agrupados e só o estado mais recente é escrito.
+        """
+        snapshot = self._snapshot
+        files = {
+            "channel_stats.json": snapshot.channel_stats,
+            "peer_fees.json": snapshot.peer_fees
+        }
+        
+        # O checkpoint é serializado aqui, pela thread dona do estado, e gravado por último
+        if self.config.get("state_checkpoint", True):
+            try:
+                files[self.checkpoint_path] = encode_checkpoint(self._checkpoint_state())
+            except Exception as e:
+                logger.error(f"Erro ao serializar o checkpoint: {e}")
+        
+        self.state_writer.request(files)
     
     def collect_channel_data(self) -> None:
         """Coleta dados sobre os canais e atualiza as estatísticas"""
@@ -140,6 +558,11 @@ class FeeManager:
             for channel in channels:
                 chan_id = channel["chan_id"]
                 
+                # Canais abertos continuam no conjunto de trabalho mesmo fora da automação
+                if chan_id in self.channel_stats:
+                    self.channel_stats[chan_id]["last_seen"] = timestamp
+                    self._snapshot_builder.mark_channel(chan_id)
+                
                 # Pular canais excluídos
                 if chan_id in self.config["excluded_channels"]:
                     continue
@@ -153,10 +576,13 @@ class FeeManager:
                     self.channel_stats[chan_id] = {
                         "capacity": int(channel["capacity"]),
                         "remote_pubkey": channel["remote_pubkey"],
+                        "last_seen": timestamp,
                         "flow_history": [],
                         "fee_history": []
                     }
                 
+                self._snapshot_builder.mark_channel(chan_id)
+                
                 # Atualizar capacidade se mudou
                 self.channel_stats[chan_id]["capacity"] = int(channel["capacity"])
                 
@@ -170,11 +596,20 @@ class FeeManager:
                 outbound_ratio = local_balance / capacity if capacity > 0 else 0
                 balance_ratio = local_balance / (local_balance + remote_balance) if (local_balance + remote_balance) > 0 else 0.5
                 
-                # Obter histórico de encaminhamento para este canal
-                # Em um ambiente real, isso seria obtido da API do LND
-                # Aqui estamos simulando com dados fictícios
-                forwarding_volume_in = int(channel.get("total_satoshis_received", 0))
-                forwarding_volume_out = int(channel.get("total_satoshis_sent", 0))
+                # Volume encaminhado no intervalo desde a amostra anterior, a partir dos
+                # contadores acumulados do LND (contador reiniciado ou canal reaberto
+                # com outro channel_point contam como volume novo)
+                stats = self.channel_stats[chan_id]
+                channel_point = channel.get("channel_point")
+                reopened = bool(stats.get("channel_point")) and stats["channel_point"] != channel_point
+                if channel_point:
+                    stats["channel_point"] = channel_point
+                
+                previous = stats["flow_history"][-1] if stats["flow_history"] else None
+                volumes = collect_interval(previous,
+                                           total_in=int(channel.get("total_satoshis_received", 0)),
+                                           total_out=int(channel.get("total_satoshis_sent", 0)),
+                                           reopened=reopened)
                 
                 # Adicionar dados de fluxo ao histórico
                 flow_data = {
@@ -183,23 +618,19 @@ class FeeManager:
                     "remote_balance": remote_balance,
                     "inbound_ratio": inbound_ratio,
                     "outbound_ratio": outbound_ratio,
-                    "balance_ratio": balance_ratio,
-                    "forwarding_volume_in": forwarding_volume_in,
-                    "forwarding_volume_out": forwarding_volume_out
+                    "balance_ratio": balance_ratio
                 }
-                
-                self.channel_stats[chan_id]["flow_history"].append(flow_data)
+                flow_data.update(volumes)
                 
                 # Limitar o histórico a 30 dias (assumindo uma atualização por hora)
-                max_history = 24 * 30
-                if len(self.channel_stats[chan_id]["flow_history"]) > max_history:
-                    self.channel_stats[chan_id]["flow_history"] = self.channel_stats[chan_id]["flow_history"][-max_history:]
+                max_history = MAX_HISTORY
+                self._append_flow_sample(chan_id, flow_data, max_history)
                 
                 # Obter informações detalhadas do canal para ver as taxas atuais
                 chan_info = self.lnd_client.get_channel_info(chan_id)
                 if "error" not in chan_info:
                     # Determinar qual política é a nossa (node1 ou node2)
-                    our_pubkey = self.lnd_client.get_info().get("identity_pubkey", "")
+                    our_pubkey = self._get_our_pubkey()
                     
                     if chan_info.get("node1_pub") == our_pubkey:
                         our_policy = chan_info.get("node1_policy", {})
@@ -208,7 +639,9 @@ class FeeManager:
                         our_policy = chan_info.get("node2_policy", {})
                         their_policy = chan_info.get("node1_policy", {})
                     
-                    # Registrar taxas atuais
+                    # Registrar taxas atuais e o horário da última atualização anunciada
+                    if our_policy.get("last_update"):
+                        self.channel_stats[chan_id]["edge_last_update"] = int(our_policy["last_update"])
                     if our_policy:
                         fee_data = {
                             "timestamp": timestamp,
@@ -217,17 +650,15 @@ class FeeManager:
                             "time_lock_delta": our_policy.get("time_lock_delta", 40)
                         }
                         
-                        self.channel_stats[chan_id]["fee_history"].append(fee_data)
-                        
                         # Limitar o histórico de taxas
-                        if len(self.channel_stats[chan_id]["fee_history"]) > max_history:
-                            self.channel_stats[chan_id]["fee_history"] = self.channel_stats[chan_id]["fee_history"][-max_history:]
+                        self._append_fee_record(chan_id, fee_data, max_history)
                     
                     # Registrar taxas do peer
                     if their_policy:
                         peer_pubkey = channel["remote_pubkey"]
                         if peer_pubkey not in self.peer_fees:
                             self.peer_fees[peer_pubkey] = []
+                        records = self.peer_fees[peer_pubkey]
                         
                         peer_fee_data = {
                             "timestamp": timestamp,
@@ -237,191 +668,537 @@ class FeeManager:
                             "time_lock_delta": their_policy.get("time_lock_delta", 40)
                         }
                         
-                        self.peer_fees[peer_pubkey].append(peer_fee_data)
-                        
-                        # Limitar o histórico de taxas dos peers
-                        if len(self.peer_fees[peer_pubkey]) > max_history:
-                            self.peer_fees[peer_pubkey] = self.peer_fees[peer_pubkey][-max_history:]
+                        # Apenas mudanças de política são acrescentadas ao histórico
+                        self._snapshot_builder.mark_peer(peer_pubkey)
+                        if record_policy(records, peer_fee_data) and len(records) > max_history:
+                            self.peer_fees[peer_pubkey] = records[-max_history:]
+            
+            # Arquivar canais fechados e peers que saíram
+            self.prune_stats(channels, timestamp)
+            
+            # Recarregar o grafo completo apenas se o índice de taxas da rede estiver expirado
+            self.refresh_graph_index()
             
-            # Salvar estatísticas atualizadas
+            # Publicar e salvar as estatísticas atualizadas
+            self._spill_histories()
+            self.publish_snapshot("collect")
             self._save_stats()
             logger.info(f"Dados de {len(channels)} canais coletados e salvos")
             
         except Exception as e:
             logger.error(f"Erro ao coletar dados dos canais: {e}")
     
-    def calculate_optimal_fees(self, chan_id: str) -> Dict:
+    def prune_stats(self, channels: List[Dict], now: Optional[int] = None) -> Tuple[List[str], List[str]]:
         """
-        Calcula as taxas ótimas para um canal com base no fluxo e nas taxas dos peers
+        Move para o arquivo compactado os canais e peers ausentes há mais que o período de tolerância
         
         Args:
-            chan_id: ID do canal
+            channels: Canais abertos retornados por list_channels
+            now: Momento atual (padrão: agora)
             
         Returns:
-            Dicionário com as taxas ótimas
+            Tupla (chan_ids, pubkeys) arquivados
         """
-        if chan_id not in self.channel_stats:
-            logger.warning(f"Canal {chan_id} não encontrado nas estatísticas")
-            return {
-                "base_fee_msat": self.config["min_base_fee_msat"],
-                "fee_rate": self.config["min_fee_rate"],
-                "time_lock_delta": self.config["time_lock_delta"]
-            }
+        grace_seconds = self.config.get("prune_grace_seconds", DEFAULT_GRACE_SECONDS)
+        if not grace_seconds:
+            return [], []
         
-        channel = self.channel_stats[chan_id]
+        now = int(time.time()) if now is None else now
+        open_channels = {channel["chan_id"] for channel in channels}
+        open_peers = {channel["remote_pubkey"] for channel in channels}
+        stale_channels, stale_peers = select_stale(self.channel_stats, self.peer_fees,
+                                                   open_channels, open_peers, now, grace_seconds)
+        if not stale_channels and not stale_peers:
+            return [], []
         
-        # Obter dados de fluxo mais recentes
-        flow_data = channel["flow_history"][-1] if channel["flow_history"] else None
+        entries = [{"kind": "channel", "key": chan_id, "data": self._full_channel(chan_id)}
+                   for chan_id in stale_channels]
+        entries += [{"kind": "peer", "key": pubkey, "data": self.peer_fees[pubkey]}
+                    for pubkey in stale_peers]
+        try:
+            archive_entries(entries, self.archive_path)
+        except Exception as e:
+            # Sem arquivo gravado, nada é removido
+            logger.error(f"Erro ao arquivar estatísticas: {e}")
+            return [], []
         
-        if not flow_data:
-            logger.warning(f"Sem dados de fluxo para o canal {chan_id}")
-            return {
-                "base_fee_msat": self.config["min_base_fee_msat"],
-                "fee_rate": self.config["min_fee_rate"],
-                "time_lock_delta": self.config["time_lock_delta"]
-            }
+        for chan_id in stale_channels:
+            del self.channel_stats[chan_id]
+            self.history_store.delete(chan_id)
+        for pubkey in stale_peers:
+            del self.peer_fees[pubkey]
         
-        # Obter taxas atuais do peer
-        peer_pubkey = channel["remote_pubkey"]
-        peer_fee_data = None
+        logger.info(f"{len(stale_channels)} canais e {len(stale_peers)} peers arquivados em {self.archive_path}")
+        return stale_channels, stale_peers
+    
+    def _full_channel(self, chan_id: str, channel_stats: Optional[Dict] = None) -> Dict:
+        """Estatísticas do canal (mutáveis, ou as de channel_stats), com os históricos do armazenamento se houver"""
+        channel = (self.channel_stats if channel_stats is None else channel_stats)[chan_id]
+        if "history_log" not in channel:
+            return channel
+        return self.history_store.materialize(chan_id, channel)
+    
+    def refresh_graph_index(self, force: bool = False) -> bool:
+        """
+        Recarrega o grafo completo da rede e atualiza as análises que dependem dele
         
-        if peer_pubkey in self.peer_fees and self.peer_fees[peer_pubkey]:
-            # Encontrar a taxa mais recente para este canal específico
-            for fee_data in reversed(self.peer_fees[peer_pubkey]):
-                if fee_data["chan_id"] == chan_id:
-                    peer_fee_data = fee_data
-                    break
+        O índice de taxas da rede é reconstruído (use_market_fees) e, entre as
+        cargas completas, é mantido pelas atualizações de gossip (ver _watch_graph).
+        A centralidade dos canais (use_centrality) só é recalculada se o grafo
+        mudou materialmente desde o último cálculo. Nada é feito se as duas
+        opções estiverem desabilitadas.
         
-        # Calcular taxas com base na estratégia selecionada
-        strategy = self.config["fee_strategy"]
+        Args:
+            force: Recarrega mesmo que o grafo ainda seja válido
+            
+        Returns:
+            True se o grafo foi recarregado
+        """
+        use_market_fees = self.config.get("use_market_fees")
+        use_centrality = self.config.get("use_centrality")
+        if not use_market_fees and not use_centrality:
+            return False
         
-        if strategy == "balanced":
-            return self._calculate_balanced_fees(chan_id, flow_data, peer_fee_data)
-        elif strategy == "competitive":
-            return self._calculate_competitive_fees(chan_id, flow_data, peer_fee_data)
-        elif strategy == "profitable":
-            return self._calculate_profitable_fees(chan_id, flow_data, peer_fee_data)
-        else:
+        expired = time.time() - self.graph_loaded_at >= self.config.get("graph_refresh_seconds", 86400)
+        missing = (use_market_fees and not self.graph_index.loaded_at) or \
+                  (use_centrality and not self.graph_analytics.computed_at)
+        if not force and not expired and not missing:
+            return False
+        
+        try:
+            graph = self.lnd_client.describe_graph()
+            if "error" in graph:
+                logger.error(f"Erro ao obter o grafo da rede: {graph['error']}")
+                return False
+            self.graph_loaded_at = time.time()
+            
+            if use_market_fees:
+                self.graph_index.load_graph(graph)
+            
+            if use_centrality:
+                our_pubkey = self._get_our_pubkey()
+                self.graph_analytics.samples = self.config.get("centrality_samples", DEFAULT_SAMPLES)
+                self.graph_analytics.update(graph, our_pubkey)
+            
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao carregar o grafo da rede: {e}")
+            return False
+    
+    def _watch_graph(self) -> None:
+        """Aplica as atualizações de gossip ao índice de taxas da rede"""
+        while self.running:
+            if self.config.get("use_market_fees") and self.graph_index.loaded_at:
+                try:
+                    for update in self.lnd_client.subscribe_channel_graph():
+                        if not self.running:
+                            return
+                        if "error" in update:
+                            logger.error(f"Erro na assinatura do grafo: {update['error']}")
+                            break
+                        self.graph_index.apply_topology_update(update)
+                except Exception as e:
+                    logger.error(f"Erro ao processar atualizações do grafo: {e}")
+            
+            # Aguardar antes de assinar novamente, verificando a flag running a cada segundo
+            for _ in range(GRAPH_RESUBSCRIBE_SECONDS):
+                if not self.running:
+                    return
+                time.sleep(1)
+    
+    def _default_fees(self) -> Dict:
+        """Taxas mínimas usadas quando não há dados suficientes do canal"""
+        return {
+            "base_fee_msat": self.config["min_base_fee_msat"],
+            "fee_rate": self.config["min_fee_rate"],
+            "time_lock_delta": self.config["time_lock_delta"]
+        }
+    
+    def _get_strategy(self) -> FeeStrategy:
+        """
+        Obtém a estratégia configurada no registro de estratégias
+        
+        Returns:
+            Estratégia configurada (ou 'balanced' se for desconhecida)
+        """
+        strategy = self.config["fee_strategy"]
+        try:
+            return get_strategy(strategy)
+        except KeyError:
             logger.warning(f"Estratégia desconhecida: {strategy}, usando 'balanced'")
-            return self._calculate_balanced_fees(chan_id, flow_data, peer_fee_data)
+            return get_strategy("balanced")
     
-    def _calculate_balanced_fees(self, chan_id: str, flow_data: Dict, peer_fee_data: Dict) -> Dict:
+    def _latest_peer_fees(self, peer_fees: Dict) -> Dict[str, Dict]:
         """
-        Calcula taxas balanceadas que consideram tanto o fluxo quanto as taxas dos peers
+        Indexa a taxa mais recente do peer para cada canal
         
         Args:
-            chan_id: ID do canal
-            flow_data: Dados de fluxo do canal
-            peer_fee_data: Dados de taxas do peer
+            peer_fees: Histórico de taxas dos peers
             
         Returns:
-            Dicionário com as taxas calculadas
+            Dados de taxas do peer por chan_id
         """
-        # Parâmetros de configuração
-        min_base_fee = self.config["min_base_fee_msat"]
-        max_base_fee = self.config["max_base_fee_msat"]
-        min_fee_rate = self.config["min_fee_rate"]
-        max_fee_rate = self.config["max_fee_rate"]
-        flow_weight = self.config["flow_weight"]
-        peer_weight = self.config["peer_weight"]
-        high_flow = self.config["high_flow_threshold"]
-        low_flow = self.config["low_flow_threshold"]
-        
-        # Calcular fator de fluxo
-        inbound_ratio = flow_data["inbound_ratio"]
-        outbound_ratio = flow_data["outbound_ratio"]
-        
-        # Se o canal está desequilibrado (muito inbound ou muito outbound)
-        # ajustar as taxas para incentivar o fluxo na direção oposta
-        if inbound_ratio > high_flow:
-            # Muito inbound, reduzir taxas para incentivar outbound
-            flow_factor = 0.2
-        elif outbound_ratio > high_flow:
-            # Muito outbound, aumentar taxas para desincentivar mais outbound
-            flow_factor = 0.8
-        elif inbound_ratio < low_flow:
-            # Pouco inbound, aumentar taxas para preservar liquidez outbound
-            flow_factor = 0.7
-        elif outbound_ratio < low_flow:
-            # Pouco outbound, reduzir taxas para atrair inbound
-            flow_factor = 0.3
-        else:
-            # Canal bem balanceado, usar taxas moderadas
-            flow_factor = 0.5
-        
-        # Calcular fator de peer
-        peer_factor = 0.5  # Valor padrão
+        latest = {}
+        for records in peer_fees.values():
+            for fee_data in reversed(records):
+                latest.setdefault(fee_data["chan_id"], fee_data)
+        return latest
+    
+    def _build_batch(self, chan_ids: List[str], channel_stats: Dict,
+                     latest_peer_fees: Dict[str, Dict]) -> List[ChannelInput]:
+        """
+        Monta as entradas das estratégias para os canais com dados de fluxo
         
-        if peer_fee_data:
-            peer_base_fee = peer_fee_data["base_fee_msat"]
-            peer_fee_rate = peer_fee_data["fee_rate"]
-            
-            # Normalizar as taxas do peer em relação aos nossos limites
-            norm_peer_base_fee = (peer_base_fee - min_base_fee) / (max_base_fee - min_base_fee)
-            norm_peer_base_fee = max(0, min(1, norm_peer_base_fee))
+        Args:
+            chan_ids: IDs dos canais
+            channel_stats: Estatísticas dos canais
+            latest_peer_fees: Taxa mais recente do peer por chan_id
             
-            norm_peer_fee_rate = (peer_fee_rate - min_fee_rate) / (max_fee_rate - min_fee_rate)
-            norm_peer_fee_rate = max(0, min(1, norm_peer_fee_rate))
+        Returns:
+            Lista de entradas (canais sem estatísticas ou sem fluxo são omitidos)
+        """
+        batch = []
+        for chan_id in chan_ids:
+            channel = channel_stats.get(chan_id)
+            if not channel or not channel["flow_history"]:
+                continue
+            batch.append(ChannelInput(
+                chan_id=chan_id,
+                remote_pubkey=channel["remote_pubkey"],
+                flow_data=channel["flow_history"][-1],
+                peer_fee_data=latest_peer_fees.get(chan_id)
+            ))
+        return batch
+    
+    def _prepare_batch(self, chan_ids: List[str], channel_stats: Optional[Dict] = None,
+                       peer_fees: Optional[Dict] = None) -> Tuple[List[ChannelInput], StrategyFeatures,
+                                                                   Dict[str, List[str]], Dict[str, Dict]]:
+        """
+        Monta o lote e calcula os atributos compartilhados
+        
+        Com aggregate_peers habilitado, os canais paralelos de um mesmo peer
+        viram uma única entrada (liquidez combinada e política única do peer),
+        representada pelo primeiro canal do peer, e o resultado vale para todos.
+        Os agregados são apenas devolvidos: quem os publica em peer_aggregates
+        é a thread do loop (update_channel_fees), pois o plano também é
+        calculado pela API web.
+        
+        Args:
+            chan_ids: IDs dos canais
+            channel_stats: Estatísticas dos canais (padrão: o estado mutável)
+            peer_fees: Histórico de taxas dos peers (padrão: o estado mutável)
             
-            # Média das taxas normalizadas do peer
-            peer_factor = (norm_peer_base_fee + norm_peer_fee_rate) / 2
+        Returns:
+            Tupla (lote, atributos, canais que recebem o resultado de cada entrada,
+            agregados dos peers por remote_pubkey, vazio sem aggregate_peers)
+        """
+        channel_stats = self.channel_stats if channel_stats is None else channel_stats
+        peer_fees = self.peer_fees if peer_fees is None else peer_fees
+        strategy = self._get_strategy()
+        batch = self._build_batch(chan_ids, channel_stats, self._latest_peer_fees(peer_fees))
+        features = StrategyFeatures.compute(batch, channel_stats, peer_fees,
+                                            graph_index=self.graph_index,
+                                            centrality=self.graph_analytics.channel_scores(),
+                                            feature_keys=strategy.feature_keys)
+        
+        # Com agendas sazonais, a política em vigor é a da estratégia modulada pela
+        # hora; as estratégias recebem a taxa sem modulação, senão o fator da hora
+        # seria aplicado de novo sobre a taxa já modulada a cada recálculo
+        if self.config.get("seasonal_fees"):
+            for chan_id, current in list(features.current_policies.items()):
+                schedule = channel_stats.get(chan_id, {}).get("fee_schedule")
+                if schedule and "strategy_fee_rate" in schedule:
+                    features.current_policies[chan_id] = dict(current, fee_rate=schedule["strategy_fee_rate"])
+        
+        # Históricos completos apenas para estratégias que os consultam
+        history_keys = strategy.history_keys
+        if history_keys:
+            for row in batch:
+                channel = self._full_channel(row.chan_id, channel_stats)
+                features.histories[row.chan_id] = {key: channel.get(key, []) for key in history_keys}
+        if not self.config.get("aggregate_peers"):
+            return batch, features, {row.chan_id: [row.chan_id] for row in batch}, {}
+        
+        aggregates = build_peer_aggregates(batch, channel_stats)
+        members = {aggregate.channels[0]: aggregate.channels for aggregate in aggregates.values()}
+        return ([aggregate.row for aggregate in aggregates.values()],
+                aggregate_features(features, aggregates), members,
+                {pubkey: aggregate.to_dict() for pubkey, aggregate in aggregates.items()})
+    
+    def _with_peer_channels(self, chan_id: str) -> List[str]:
+        """
+        Canal e os outros canais ativos do mesmo peer
         
-        # Combinar fatores com pesos
-        combined_factor = flow_factor * flow_weight + peer_factor * peer_weight
+        Canais ativos são os que têm amostra de fluxo do mesmo ciclo de coleta.
+        """
+        channel = self.channel_stats[chan_id]
+        if not channel["flow_history"]:
+            return [chan_id]
+        timestamp = channel["flow_history"][-1]["timestamp"]
+        return [other_id for other_id, other in self.channel_stats.items()
+                if other_id == chan_id or (other["remote_pubkey"] == channel["remote_pubkey"] and
+                                           other["flow_history"] and
+                                           other["flow_history"][-1]["timestamp"] == timestamp and
+                                           other_id not in self.config["excluded_channels"])]
+    
+    def policy_at(self, chan_id: str, timestamp: int) -> Dict[str, Optional[Dict]]:
+        """
+        Obtém a nossa política e a do peer vigentes em um canal em um momento
         
-        # Calcular taxas finais
-        base_fee_msat = int(min_base_fee + combined_factor * (max_base_fee - min_base_fee))
-        fee_rate = min_fee_rate + combined_factor * (max_fee_rate - min_fee_rate)
+        Args:
+            chan_id: ID do canal
+            timestamp: Momento consultado
+            
+        Returns:
+            Registros vigentes ("local" e "peer"; None se não houver)
+        """
+        snapshot = self.get_snapshot()
+        peer_fees = snapshot.peer_fees if snapshot else self.peer_fees
         
+        channel = self.load_history(chan_id) or {}
         return {
-            "base_fee_msat": base_fee_msat,
-            "fee_rate": fee_rate,
-            "time_lock_delta": self.config["time_lock_delta"]
+            "local": policy_at(channel.get("fee_history", ()), timestamp),
+            "peer": policy_at(peer_fees.get(channel.get("remote_pubkey"), ()), timestamp, chan_id)
         }
     
-    def _calculate_competitive_fees(self, chan_id: str, flow_data: Dict, peer_fee_data: Dict) -> Dict:
+    def _current_policy(self, chan_id: str, channel_stats: Optional[Dict] = None) -> Optional[Dict]:
+        """Política mais recente registrada para o canal (nossa)"""
+        channel_stats = self.channel_stats if channel_stats is None else channel_stats
+        fee_history = channel_stats.get(chan_id, {}).get("fee_history")
+        return fee_history[-1] if fee_history else None
+    
+    def calculate_batch_fees(self, chan_ids: List[str]) -> Dict[str, Dict]:
         """
-        Calcula taxas competitivas que são ligeiramente menores que as dos peers
+        Calcula as taxas ótimas de vários canais de uma só vez
+        
+        Os atributos compartilhados (medianas dos peers, médias de fluxo) são
+        calculados uma única vez e a estratégia recebe o lote inteiro.
         
         Args:
-            chan_id: ID do canal
-            flow_data: Dados de fluxo do canal
-            peer_fee_data: Dados de taxas do peer
+            chan_ids: IDs dos canais
             
         Returns:
-            Dicionário com as taxas calculadas
+            Taxas ótimas por chan_id
         """
-        # Parâmetros de configuração
-        min_base_fee = self.config["min_base_fee_msat"]
-        max_base_fee = self.config["max_base_fee_msat"]
-        min_fee_rate = self.config["min_fee_rate"]
-        max_fee_rate = self.config["max_fee_rate"]
+        batch, features, members, _ = self._prepare_batch(chan_ids)
+        computed = self._get_strategy().compute_batch(batch, features, self.config)
+        results = {chan_id: computed[row_id] for row_id, channels in members.items()
+                   for chan_id in channels if row_id in computed}
+        
+        for chan_id in chan_ids:
+            if chan_id not in results:
+                logger.warning(f"Sem dados de fluxo para o canal {chan_id}")
+                results[chan_id] = self._default_fees()
         
-        # Valores padrão
-        base_fee_msat = min_base_fee
-        fee_rate = min_fee_rate
+        return results
+    
+    def _within_hysteresis(self, current: Optional[Dict], target: Dict) -> bool:
+        """
+        Indica se a mudança da política atual para a alvo é pequena demais para ser enviada
         
-        if peer_fee_data:
-            # Definir taxas ligeiramente menores que as do peer (10% menores)
-            peer_base_fee = peer_fee_data["base_fee_msat"]
-            peer_fee_rate = peer_fee_data["fee_rate"]
+        Apenas a taxa proporcional tem tolerância; mudanças na taxa base ou no
+        time_lock_delta são sempre enviadas.
+        """
+        tolerance_ppm = self.config.get("fee_hysteresis_ppm", 0)
+        tolerance_ratio = self.config.get("fee_hysteresis_ratio", 0.0)
+        if not current or (not tolerance_ppm and not tolerance_ratio):
+            return False
+        current_key, target_key = policy_key(current), policy_key(target)
+        if current_key[0] != target_key[0] or \
+                current.get("time_lock_delta", target["time_lock_delta"]) != target["time_lock_delta"]:
+            return False
+        return abs(target_key[1] - current_key[1]) <= max(tolerance_ppm, tolerance_ratio * current_key[1])
+    
+    def _already_applied(self, chan_id: str, target: Dict, channel_stats: Optional[Dict] = None) -> bool:
+        """
+        Indica se a política alvo já está em vigor no canal
+        
+        Compara com a política observada mais recente e com o registro do
+        último envio confirmado pelo LND (applied_policy), que é gravado com o
+        estado e sobrevive a reinícios.
+        """
+        channel_stats = self.channel_stats if channel_stats is None else channel_stats
+        return policy_applied(target, self._current_policy(chan_id, channel_stats),
+                              channel_stats.get(chan_id, {}).get("applied_policy"))
+    
+    def _plan(self, channels: List[Dict], channel_stats: Dict, peer_fees: Dict,
+              force: bool) -> Tuple[Dict, Dict[str, Dict]]:
+        """
+        Calcula o plano de atualização de taxas em um único lote
+        
+        Args:
+            channels: Canais da automação (chan_id, channel_point e remote_pubkey)
+            channel_stats: Estatísticas dos canais
+            peer_fees: Histórico de taxas dos peers
+            force: Recalcula e envia todos os canais, ignorando as impressões digitais, a histerese e as políticas em vigor
+            
+        Returns:
+            Tupla (plano com uma entrada por canal e o resumo das ações, agregados dos peers)
+        """
+        strategy = self._get_strategy()
+        chan_ids = [channel["chan_id"] for channel in channels]
+        batch, features, members, aggregates = self._prepare_batch(chan_ids, channel_stats, peer_fees)
+        
+        # Selecionar os canais cujas entradas mudaram; canais do mesmo peer
+        # compartilham a entrada e cada um compara a impressão digital com a
+        # própria política em vigor
+        rows = {}
+        changed = []
+        changed_channels = {}
+        for row in batch:
+            stale = []
+            for chan_id in members[row.chan_id]:
+                rows[chan_id] = row
+                fingerprint = strategy.fingerprint(row, features, self.config,
+                                                   self._current_policy(chan_id, channel_stats))
+                if force or fingerprint != channel_stats[chan_id].get("fingerprint"):
+                    stale.append(chan_id)
+            if stale:
+                changed.append(row)
+                changed_channels[row.chan_id] = stale
+        
+        # Calcular as taxas ótimas dos canais alterados em um único lote
+        computed = strategy.compute_batch(changed, features, self.config)
+        targets = {chan_id: computed[row_id] for row_id, stale in changed_channels.items()
+                   for chan_id in stale if row_id in computed}
+        
+        # Agendas sazonais (seasonal_fees): a política da estratégia modulada pela
+        # demanda de cada hora da semana; a política alvo é a da hora atual
+        schedules = {}
+        if self.config.get("seasonal_fees"):
+            hour = hour_of_week(time.time())
+            for row_id, stale in changed_channels.items():
+                profiles = [channel_stats[chan_id]["seasonal_profile"] for chan_id in members[row_id]
+                            if channel_stats[chan_id].get("seasonal_profile")]
+                if row_id not in computed or not profiles:
+                    continue
+                multipliers = demand_multipliers(combine_profiles(profiles),
+                                                 self.config.get("seasonal_min_samples", 2),
+                                                 self.config.get("seasonal_max_multiplier", 2.0))
+                if multipliers is None:
+                    continue
+                schedule = build_schedule(computed[row_id], multipliers, self.config)
+                for chan_id in stale:
+                    schedules[chan_id] = schedule
+                    targets[chan_id] = scheduled_policy(schedule, hour)
+        
+        entries = []
+        summary = {"computed": len(changed), "push": 0, "skipped": 0, "hysteresis": 0, "applied": 0}
+        for channel in channels:
+            chan_id = channel["chan_id"]
+            current = self._current_policy(chan_id, channel_stats)
+            if chan_id not in rows:
+                target, reason = self._default_fees(), "no_flow_data"
+            elif chan_id in targets:
+                target, reason = targets[chan_id], "forced" if force else "inputs_changed"
+            else:
+                # Entradas iguais às do último envio: a política alvo é a atual
+                target, reason = current or self._default_fees(), "inputs_unchanged"
+            
+            hysteresis = not force and reason != "inputs_unchanged" and self._within_hysteresis(current, target)
+            applied = not force and reason != "inputs_unchanged" and not hysteresis and \
+                self._already_applied(chan_id, target, channel_stats)
+            action = "skip" if reason == "inputs_unchanged" or hysteresis or applied else "push"
+            summary["push" if action == "push" else "hysteresis" if hysteresis
+                    else "applied" if applied else "skipped"] += 1
             
-            base_fee_msat = int(peer_base_fee * 0.9)
-            fee_rate = peer_fee_rate * 0.9
+            # Impressão digital das entradas com a política alvo, gravada após o envio
+            # (ou de imediato, se a política alvo já está em vigor)
+            fingerprint = None
+            if (action == "push" or applied) and chan_id in rows:
+                fingerprint = strategy.fingerprint(rows[chan_id], features, self.config, target)
             
-            # Garantir que as taxas estejam dentro dos limites
-            base_fee_msat = max(min_base_fee, min(max_base_fee, base_fee_msat))
-            fee_rate = max(min_fee_rate, min(max_fee_rate, fee_rate))
+            current_key, target_key = policy_key(current), policy_key(target)
+            flow_data = rows[chan_id].flow_data if chan_id in rows else {}
+            entries.append({
+                "chan_id": chan_id,
+                "channel_point": channel.get("channel_point"),
+                "remote_pubkey": channel.get("remote_pubkey"),
+                "balance_ratio": flow_data.get("balance_ratio"),
+                "current": dict(current, fee_rate_ppm=current_key[1]) if current else None,
+                "target": {
+                    "base_fee_msat": target["base_fee_msat"],
+                    "fee_rate": target["fee_rate"],
+                    "fee_rate_ppm": target_key[1],
+                    "time_lock_delta": target["time_lock_delta"]
+                },
+                "delta_ppm": target_key[1] - current_key[1] if current else None,
+                "reason": reason,
+                "hysteresis": hysteresis,
+                "applied": applied,
+                "action": action,
+                "fingerprint": fingerprint,
+                "schedule": schedules.get(chan_id)
+            })
         
         return {
-            "base_fee_msat": base_fee_msat,
-            "fee_rate": fee_rate,
-            "time_lock_delta": self.config["time_lock_delta"]
-        }
+            "created_at": int(time.time()),
+            "cycle": self.cycle,
+            "strategy": strategy.name,
+            "force": force,
+            "channels": len(entries),
+            "summary": summary,
+            "entries": entries
+        }, aggregates
     
-    def _calculate_profitable_fees(self, chan_id: str, flow_data: Dict, peer_fee_data: Dict) -> Dict:
+    def _automated(self, chan_id: str) -> bool:
+        """Indica se o canal faz parte da automação (enabled_channels e excluded_channels)"""
+        if chan_id in self.config["excluded_channels"]:
+            return False
+        return not self.config["enabled_channels"] or chan_id in self.config["enabled_channels"]
+    
+    def plan_fees(self, force: bool = False) -> Dict:
         """
-        Calcula taxas que maximizam o lucro com base no histórico de encaminhamento
+        Calcula o plano de atualização de taxas sem enviá-lo ao LND (simulação)
+        
+        Usa o último snapshot publicado, então pode ser chamado pela API web ou
+        pela linha de comando enquanto o loop está em execução. Entram os canais
+        da automação vistos na coleta mais recente. O plano pode ser gravado e
+        aplicado depois com update_channel_fees(plan=...).
+        
+        Args:
+            force: Recalcula e envia todos os canais, ignorando as impressões digitais, a histerese e as políticas em vigor
+            
+        Returns:
+            Plano com a política atual e a alvo de cada canal, o motivo, as
+            indicações de histerese e de política já em vigor e a ação (push ou skip)
+        """
+        snapshot = self.get_snapshot()
+        channel_stats = snapshot.channel_stats
+        latest = max((channel.get("last_seen", 0) for channel in channel_stats.values()), default=0)
+        channels = [{"chan_id": chan_id, "channel_point": channel.get("channel_point"),
+                     "remote_pubkey": channel.get("remote_pubkey")}
+                    for chan_id, channel in channel_stats.items()
+                    if channel.get("last_seen", 0) == latest and self._automated(chan_id)]
+        plan, _ = self._plan(channels, channel_stats, snapshot.peer_fees, force)
+        return plan
+    
+    def calculate_optimal_fees(self, chan_id: str) -> Dict:
+        """
+        Calcula as taxas ótimas para um canal com base no fluxo e nas taxas dos peers
+        
+        Args:
+            chan_id: ID do canal
+            
+        Returns:
+            Dicionário com as taxas ótimas
+        """
+        if chan_id not in self.channel_stats:
+            logger.warning(f"Canal {chan_id} não encontrado nas estatísticas")
+            return self._default_fees()
+        
+        chan_ids = self._with_peer_channels(chan_id) if self.config.get("aggregate_peers") else [chan_id]
+        return self.calculate_batch_fees(chan_ids)[chan_id]
+    
+    def _calculate_with(self, strategy: str, chan_id: str, flow_data: Dict, peer_fee_data: Dict) -> Dict:
+        """Calcula as taxas de um canal com uma estratégia registrada"""
+        row = ChannelInput(chan_id, self.channel_stats.get(chan_id, {}).get("remote_pubkey", ""),
+                           flow_data, peer_fee_data)
+        return get_strategy(strategy).compute(row, StrategyFeatures(), self.config)
+    
+    def _calculate_balanced_fees(self, chan_id: str, flow_data: Dict, peer_fee_data: Dict) -> Dict:
+        """
+        Calcula taxas balanceadas que consideram tanto o fluxo quanto as taxas dos peers
         
         Args:
             chan_id: ID do canal
@@ -431,54 +1208,52 @@ class FeeManager:
         Returns:
             Dicionário com as taxas calculadas
         """
-        # Parâmetros de configuração
-        min_base_fee = self.config["min_base_fee_msat"]
-        max_base_fee = self.config["max_base_fee_msat"]
-        min_fee_rate = self.config["min_fee_rate"]
-        max_fee_rate = self.config["max_fee_rate"]
-        
-        # Analisar o histórico de encaminhamento para determinar a elasticidade de preço
-        # Em um ambiente real, isso seria baseado em dados reais de encaminhamento
-        # Aqui estamos usando uma abordagem simplificada
-        
-        # Verificar se há volume de encaminhamento
-        forwarding_volume = flow_data.get("forwarding_volume_out", 0)
-        
-        if forwarding_volume > 0:
-            # Canal com alto volume pode suportar taxas mais altas
-            volume_factor = min(1.0, forwarding_volume / 1000000)  # Normalizar para 1M sats
-        else:
-            # Sem volume, usar taxas mais baixas para atrair fluxo
-            volume_factor = 0.2
+        return self._calculate_with("balanced", chan_id, flow_data, peer_fee_data)
+    
+    def _calculate_competitive_fees(self, chan_id: str, flow_data: Dict, peer_fee_data: Dict) -> Dict:
+        """
+        Calcula taxas competitivas que são ligeiramente menores que as dos peers
         
-        # Calcular taxas com base no volume e nas taxas do peer
-        if peer_fee_data:
-            peer_base_fee = peer_fee_data["base_fee_msat"]
-            peer_fee_rate = peer_fee_data["fee_rate"]
+        Args:
+            chan_id: ID do canal
+            flow_data: Dados de fluxo do canal
+            peer_fee_data: Dados de taxas do peer
             
-            # Usar taxas do peer como referência, ajustadas pelo volume
-            base_fee_factor = 0.8 + (volume_factor * 0.4)  # 0.8 a 1.2 vezes a taxa do peer
-            rate_factor = 0.8 + (volume_factor * 0.4)
+        Returns:
+            Dicionário com as taxas calculadas
+        """
+        return self._calculate_with("competitive", chan_id, flow_data, peer_fee_data)
+    
+    def _calculate_profitable_fees(self, chan_id: str, flow_data: Dict, peer_fee_data: Dict) -> Dict:
+        """
+        Calcula taxas que maximizam o lucro com base no histórico de encaminhamento
+        
+        Args:
+            chan_id: ID do canal
+            flow_data: Dados de fluxo do canal
+            peer_fee_data: Dados de taxas do peer
             
-            base_fee_msat = int(peer_base_fee * base_fee_factor)
-            fee_rate = peer_fee_rate * rate_factor
-        else:
-            # Sem dados do peer, calcular com base apenas no volume
-            base_fee_msat = int(min_base_fee + volume_factor * (max_base_fee - min_base_fee))
-            fee_rate = min_fee_rate + volume_factor * (max_fee_rate - min_fee_rate)
+        Returns:
+            Dicionário com as taxas calculadas
+        """
+        return self._calculate_with("profitable", chan_id, flow_data, peer_fee_data)
+    
+    def update_channel_fees(self, force: bool = False, plan: Optional[Dict] = None) -> None:
+        """
+        Atualiza as taxas dos canais com base nas taxas ótimas calculadas
         
-        # Garantir que as taxas estejam dentro dos limites
-        base_fee_msat = max(min_base_fee, min(max_base_fee, base_fee_msat))
-        fee_rate = max(min_fee_rate, min(max_fee_rate, fee_rate))
+        Apenas os canais cujas entradas mudaram desde a última atualização são
+        recalculados e enviados ao LND: cada canal guarda a impressão digital
+        (fingerprint) das entradas usadas no último cálculo. Mudanças dentro da
+        histerese configurada não são enviadas, nem políticas que já estão em
+        vigor no canal: cada envio confirmado pelo LND é registrado em
+        applied_policy com o horário da confirmação, então reiniciar o motor ou
+        aplicar o mesmo plano de novo não reenvia as mesmas políticas.
         
-        return {
-            "base_fee_msat": base_fee_msat,
-            "fee_rate": fee_rate,
-            "time_lock_delta": self.config["time_lock_delta"]
-        }
-    
-    def update_channel_fees(self) -> None:
-        """Atualiza as taxas de todos os canais com base nas taxas ótimas calculadas"""
+        Args:
+            force: Recalcula e envia todos os canais, ignorando as impressões digitais, a histerese e as políticas em vigor
+            plan: Plano gravado (plan_fees); suas ações são aplicadas exatamente, sem recálculo
+        """
         try:
             # Obter lista de canais
             channels_response = self.lnd_client.list_channels()
@@ -486,69 +1261,249 @@ class FeeManager:
                 logger.error(f"Erro ao listar canais: {channels_response['error']}")
                 return
             
-            channels = channels_response.get("channels", [])
+            open_channels = {channel["chan_id"]: channel for channel in channels_response.get("channels", [])}
+            if plan is None:
+                channels = [channel for chan_id, channel in open_channels.items() if self._automated(chan_id)]
+                plan, self.peer_aggregates = self._plan(channels, self.channel_stats, self.peer_fees, force)
             
-            for channel in channels:
-                chan_id = channel["chan_id"]
+            applied = 0
+            candidates = []
+            for entry in plan["entries"]:
+                chan_id = entry["chan_id"]
+                if entry["reason"] == "no_flow_data":
+                    logger.warning(f"Sem dados de fluxo para o canal {chan_id}")
                 
-                # Pular canais excluídos
-                if chan_id in self.config["excluded_channels"]:
-                    continue
+                # Agenda sazonal recalculada junto com a política do canal; sem
+                # agenda nova, a anterior deixa de valer
+                if entry["reason"] != "inputs_unchanged" and chan_id in self.channel_stats:
+                    if entry.get("schedule"):
+                        self.channel_stats[chan_id]["fee_schedule"] = entry["schedule"]
+                    else:
+                        self.channel_stats[chan_id].pop("fee_schedule", None)
+                    self._snapshot_builder.mark_channel(chan_id)
                 
-                # Pular canais não incluídos se a lista de canais habilitados não estiver vazia
-                if self.config["enabled_channels"] and chan_id not in self.config["enabled_channels"]:
+                # Política já em vigor (no plano ou desde que o plano foi gravado)
+                if entry["action"] == "push" and not plan.get("force") and self._already_applied(chan_id, entry["target"]):
+                    entry = dict(entry, applied=True, action="skip")
+                if entry["action"] != "push":
+                    if entry.get("applied"):
+                        applied += 1
+                        if entry.get("fingerprint") and chan_id in self.channel_stats:
+                            self.channel_stats[chan_id]["fingerprint"] = entry["fingerprint"]
+                            self._snapshot_builder.mark_channel(chan_id)
                     continue
-                
-                # Calcular taxas ótimas
-                optimal_fees = self.calculate_optimal_fees(chan_id)
-                
-                # Preparar ponto do canal
-                funding_txid = channel["channel_point"].split(":")[0]
-                output_index = int(channel["channel_point"].split(":")[1])
-                chan_point = {
-                    "funding_txid_str": funding_txid,
-                    "output_index": output_index
-                }
-                
-                # Atualizar taxas do canal
-                update_result = self.lnd_client.update_channel_policy(
-                    global_update=False,
-                    chan_point=chan_point,
-                    base_fee_msat=optimal_fees["base_fee_msat"],
-                    fee_rate=optimal_fees["fee_rate"],
-                    time_lock_delta=optimal_fees["time_lock_delta"]
-                )
-                
-                if "error" in update_result:
-                    logger.error(f"Erro ao atualizar taxas do canal {chan_id}: {update_result['error']}")
-                else:
-                    logger.info(f"Taxas do canal {chan_id} atualizadas: base_fee={optimal_fees['base_fee_msat']}, rate={optimal_fees['fee_rate']}")
-                    
-                    # Registrar a atualização no histórico
-                    if chan_id in self.channel_stats:
-                        timestamp = int(time.time())
-                        fee_data = {
-                            "timestamp": timestamp,
-                            "base_fee_msat": optimal_fees["base_fee_msat"],
-                            "fee_rate": optimal_fees["fee_rate"],
-                            "time_lock_delta": optimal_fees["time_lock_delta"]
-                        }
-                        
-                        self.channel_stats[chan_id]["fee_history"].append(fee_data)
-                        
-                        # Limitar o histórico
-                        max_history = 24 * 30
-                        if len(self.channel_stats[chan_id]["fee_history"]) > max_history:
-                            self.channel_stats[chan_id]["fee_history"] = self.channel_stats[chan_id]["fee_history"][-max_history:]
+                if chan_id not in open_channels:
+                    logger.warning(f"Canal {chan_id} do plano não está mais aberto")
+                    continue
+                candidates.append(dict(entry, channel_point=open_channels[chan_id]["channel_point"]))
             
-            # Salvar estatísticas atualizadas
+            # Enviar em ordem de prioridade dentro do orçamento de envios; o
+            # restante fica na fila e é enviado entre os ciclos (drain_updates)
+            self.update_budget.schedule(candidates)
+            pushed, failed = self._send_due_updates()
+            
+            # Canais cujas agendas o agendador aplica a cada hora (apply_fee_schedules)
+            self.fee_schedules = {chan_id: self.channel_stats[chan_id]["fee_schedule"] for chan_id in open_channels
+                                  if self._automated(chan_id) and self.channel_stats.get(chan_id, {}).get("fee_schedule")}
+            self.schedule_hour = hour_of_week(time.time())
+            
+            summary = plan["summary"]
+            self.last_update_stats = {
+                "timestamp": int(time.time()),
+                "channels": plan["channels"],
+                "computed": summary["computed"],
+                "skipped": summary["skipped"],
+                "hysteresis": summary["hysteresis"],
+                "applied": applied,
+                "pushed": pushed,
+                "failed": failed,
+                "deferred": len(self.update_budget),
+                "retrying": len(self.update_budget.retries)
+            }
+            logger.info(f"Atualização de taxas: {summary['computed']} canais recalculados, "
+                        f"{summary['skipped']} sem mudanças, {summary['hysteresis']} dentro da histerese, "
+                        f"{applied} já em vigor, {pushed} enviados, {failed} com erro, "
+                        f"{len(self.update_budget)} aguardando o orçamento de envios")
+            
+            # Publicar e salvar as estatísticas atualizadas
+            self._spill_histories()
+            self.publish_snapshot("update")
             self._save_stats()
             
         except Exception as e:
             logger.error(f"Erro ao atualizar taxas dos canais: {e}")
     
+    def _last_policy_update(self, chan_id: str) -> float:
+        """Última atualização da nossa política no canal (last_update da aresta ou envio confirmado)"""
+        channel = self.channel_stats.get(chan_id, {})
+        return max(channel.get("edge_last_update", 0), (channel.get("applied_policy") or {}).get("applied_at", 0))
+    
+    def _push_policy(self, entry: Dict) -> Optional[Dict]:
+        """
+        Envia a política alvo de uma entrada do plano ao LND e registra o envio
+        
+        A atualização só é registrada se o LND não devolver erro nem uma falha
+        do canal em failed_updates.
+        
+        Args:
+            entry: Entrada do plano com channel_point
+            
+        Returns:
+            None se o LND confirmou a atualização; senão, a falha (reason e error)
+        """
+        chan_id = entry["chan_id"]
+        optimal_fees = entry["target"]
+        
+        # Preparar ponto do canal
+        chan_point = parse_channel_point(entry["channel_point"])
+        
+        # Atualizar taxas do canal
+        update_result = self.lnd_client.update_channel_policy(
+            global_update=False,
+            chan_point=chan_point,
+            base_fee_msat=optimal_fees["base_fee_msat"],
+            fee_rate=optimal_fees["fee_rate"],
+            time_lock_delta=optimal_fees["time_lock_delta"]
+        )
+        
+        if "error" in update_result:
+            logger.error(f"Erro ao atualizar taxas do canal {chan_id}: {update_result['error']}")
+            return {"reason": "REQUEST_ERROR", "error": update_result["error"]}
+        
+        failures = [failure for failure in parse_failed_updates(update_result)
+                    if failure["channel_point"] in (None, entry["channel_point"])]
+        if failures:
+            logger.error(f"LND recusou a atualização do canal {chan_id}: "
+                         f"{failures[0]['reason']} {failures[0]['error']}".rstrip())
+            return failures[0]
+        
+        logger.info(f"Taxas do canal {chan_id} atualizadas: base_fee={optimal_fees['base_fee_msat']}, rate={optimal_fees['fee_rate']}")
+        
+        # Registrar a atualização no histórico
+        if chan_id in self.channel_stats:
+            timestamp = int(time.time())
+            fee_data = {
+                "timestamp": timestamp,
+                "base_fee_msat": optimal_fees["base_fee_msat"],
+                "fee_rate": optimal_fees["fee_rate"],
+                "time_lock_delta": optimal_fees["time_lock_delta"]
+            }
+            
+            # Limitar o histórico
+            self._append_fee_record(chan_id, fee_data, max_history=MAX_HISTORY)
+            
+            # Último envio confirmado pelo LND
+            self.channel_stats[chan_id]["applied_policy"] = dict(fee_data, applied_at=timestamp)
+            
+            # Impressão digital das entradas com a política recém-enviada
+            if entry.get("fingerprint"):
+                self.channel_stats[chan_id]["fingerprint"] = entry["fingerprint"]
+            self._snapshot_builder.mark_channel(chan_id)
+        return None
+    
+    def _send_due_updates(self) -> tuple:
+        """
+        Envia as mudanças pendentes permitidas pelo orçamento de envios, em ordem de prioridade
+        
+        Canais cujo envio falhou voltam para a fila com espera exponencial.
+        
+        Returns:
+            Número de políticas enviadas e com erro
+        """
+        self.update_budget.configure(self.config)
+        last_updates = {chan_id: self._last_policy_update(chan_id) for chan_id in self.update_budget.queue}
+        now = time.time()
+        pushed = 0
+        failed = 0
+        for entry in self.update_budget.due(now, last_updates):
+            failure = self._push_policy(entry)
+            if failure is None:
+                pushed += 1
+                self.update_budget.succeed(entry["chan_id"])
+                continue
+            
+            failed += 1
+            retry_at = self.update_budget.fail(entry, now, failure["reason"], failure["error"])
+            if retry_at is not None:
+                logger.info(f"Nova tentativa do canal {entry['chan_id']} em {int(retry_at - now)} segundos")
+        return pushed, failed
+    
+    def drain_updates(self) -> int:
+        """
+        Envia, entre os ciclos, as mudanças que aguardavam o orçamento de envios
+        
+        Chamado pelo loop do gerenciador; não faz nada se a fila estiver vazia.
+        
+        Returns:
+            Número de políticas enviadas
+        """
+        if not len(self.update_budget):
+            return 0
+        
+        pushed, failed = self._send_due_updates()
+        if pushed or failed:
+            self.last_update_stats = dict(self.last_update_stats,
+                                          pushed=self.last_update_stats.get("pushed", 0) + pushed,
+                                          failed=self.last_update_stats.get("failed", 0) + failed,
+                                          deferred=len(self.update_budget),
+                                          retrying=len(self.update_budget.retries))
+            logger.info(f"Fila de envios: {pushed} enviados, {failed} com erro, "
+                        f"{len(self.update_budget)} aguardando")
+            self._spill_histories()
+            self.publish_snapshot("update")
+            self._save_stats()
+        else:
+            # Envios retidos pelo intervalo, pelo orçamento ou pela espera mudam apenas o resumo da fila
+            self._publish_update_budget()
+        return pushed
+    
+    def apply_fee_schedules(self) -> int:
+        """
+        Aplica as agendas sazonais na virada de cada hora da semana
+        
+        Chamado pelo loop do gerenciador; fora da virada da hora não faz nada.
+        Na virada, a política de cada canal é lida da agenda pré-calculada (sem
+        recalcular a estratégia) e as que ainda não estão em vigor entram na
+        fila do orçamento de envios.
+        
+        Returns:
+            Número de políticas enviadas
+        """
+        if not self.config.get("seasonal_fees") or not self.fee_schedules:
+            return 0
+        hour = hour_of_week(time.time())
+        if hour == self.schedule_hour:
+            return 0
+        self.schedule_hour = hour
+        
+        entries = []
+        for chan_id, schedule in self.fee_schedules.items():
+            channel = self.channel_stats.get(chan_id)
+            target = scheduled_policy(schedule, hour)
+            if channel is None or self._already_applied(chan_id, target):
+                continue
+            current = self._current_policy(chan_id)
+            target_ppm = policy_key(target)[1]
+            entries.append({
+                "chan_id": chan_id,
+                "channel_point": channel.get("channel_point"),
+                "balance_ratio": (channel["flow_history"][-1] if channel.get("flow_history") else {}).get("balance_ratio"),
+                "target": dict(target, fee_rate_ppm=target_ppm),
+                "delta_ppm": target_ppm - policy_key(current)[1] if current else None,
+                "reason": "scheduled",
+                "action": "push",
+                "fingerprint": None
+            })
+        if not entries:
+            return 0
+        
+        logger.info(f"Agendas sazonais: {len(entries)} canais mudam de taxa na hora {hour} da semana")
+        self.update_budget.enqueue(entries)
+        return self.drain_updates()
+    
     def run_once(self) -> None:
         """Executa uma iteração do gerenciador de taxas"""
+        self.cycle += 1
         logger.info("Iniciando ciclo de atualização de taxas")
         
         # Coletar dados dos canais
@@ -566,10 +1521,15 @@ class FeeManager:
             return
         
         self.running = True
+        self.state_writer.start()
         self.thread = threading.Thread(target=self._run_loop)
         self.thread.daemon = True
         self.thread.start()
         
+        self.graph_thread = threading.Thread(target=self._watch_graph)
+        self.graph_thread.daemon = True
+        self.graph_thread.start()
+        
         logger.info("Gerenciador de taxas iniciado")
     
     def stop(self) -> None:
@@ -582,6 +1542,9 @@ class FeeManager:
         if self.thread:
             self.thread.join(timeout=10)
         
+        # Gravar o último estado pendente antes de parar
+        self.state_writer.stop()
+        
         logger.info("Gerenciador de taxas parado")
     
     def _run_loop(self) -> None:
@@ -595,9 +1558,12 @@ class FeeManager:
                 logger.info(f"Aguardando {interval} segundos até o próximo ciclo")
                 
                 # Verificar a flag running a cada segundo para permitir parada rápida
+                # e enviar as mudanças que aguardam o orçamento de envios
                 for _ in range(interval):
                     if not self.running:
                         break
+                    self.apply_fee_schedules()
+                    self.drain_updates()
                     time.sleep(1)
                 
             except Exception as e:
@@ -612,6 +1578,7 @@ if __name__ == "__main__":
     
     # Definir modo de desenvolvimento para simular respostas
     os.environ["LND_DEV_MODE"] = "1"
+    configure_logging()
     
     # Criar cliente LND
     client = LNDClient()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Estimadores de fluxo por média móvel exponencial
+Este módulo mantém, para cada canal, médias móveis exponenciais do saldo (rápida
+e lenta), da deriva do saldo, do volume encaminhado e das mudanças de taxa. Cada
+nova amostra atualiza os estimadores em O(1), sem percorrer o histórico
+"""
+
+import math
+from typing import Dict, Optional
+
+from volume_deltas import interval_volumes
+
+# Meia-vida padrão das médias móveis (segundos)
+HALF_LIFE_SECONDS = 6 * 3600
+
+# A média lenta do saldo (balance_ratio_slow) usa uma meia-vida este número de vezes maior
+SLOW_HALF_LIFE_FACTOR = 4
+
+def ewma_alpha(elapsed: float, half_life: float = HALF_LIFE_SECONDS) -> float:
+    """
+    Peso da nova amostra em função do tempo decorrido desde a anterior
+
+    Com amostras irregulares, o peso cresce com o intervalo: depois de uma
+    meia-vida sem amostras, a nova amostra vale metade da média.
+
+    Args:
+        elapsed: Segundos desde a amostra anterior
+        half_life: Meia-vida da média (segundos)
+
+    Returns:
+        Peso entre 0 e 1
+    """
+    if elapsed <= 0:
+        return 0.0
+    return 1 - math.exp(-elapsed * math.log(2) / half_life)
+
+def ewma_step(value: float, sample: float, alpha: float) -> float:
+    """Aplica uma amostra à média"""
+    return value + alpha * (sample - value)
+
+def update_flow_estimators(estimators: Optional[Dict], sample: Dict, previous: Optional[Dict],
+                           half_life: float = HALF_LIFE_SECONDS) -> Dict:
+    """
+    Atualiza os estimadores de fluxo com uma nova amostra
+
+    Um novo dicionário é devolvido; o anterior não é alterado, então ele pode
+    continuar exposto em snapshots.
+
+    Args:
+        estimators: Estimadores atuais (None para começar)
+        sample: Nova amostra de fluxo
+        previous: Amostra anterior do histórico (para deltas de volume e saldo)
+        half_life: Meia-vida das médias (segundos)
+
+    Returns:
+        Estimadores atualizados
+    """
+    timestamp = sample.get("timestamp", 0)
+
+    if not estimators or "timestamp" not in estimators:
+        # Primeira amostra: as médias começam no valor observado
+        updated = dict(estimators or {})
+        updated.update({
+            "timestamp": timestamp,
+            "samples": 1,
+            "balance_ratio": sample["balance_ratio"],
+            "balance_ratio_slow": sample["balance_ratio"],
+            "inbound_ratio": sample["inbound_ratio"],
+            "outbound_ratio": sample["outbound_ratio"],
+            "balance_drift_per_hour": 0.0,
+            "volume_in_per_hour": 0.0,
+            "volume_out_per_hour": 0.0
+        })
+        updated.setdefault("fee_changes_per_day", 0.0)
+        return updated
+
+    elapsed = timestamp - estimators["timestamp"]
+    alpha = ewma_alpha(elapsed, half_life)
+    updated = dict(estimators)
+    updated["timestamp"] = max(timestamp, estimators["timestamp"])
+    updated["samples"] = estimators["samples"] + 1
+
+    for key in ("balance_ratio", "inbound_ratio", "outbound_ratio"):
+        updated[key] = ewma_step(estimators[key], sample[key], alpha)
+
+    # Estimadores gravados antes da média lenta existir começam na média rápida
+    updated["balance_ratio_slow"] = ewma_step(estimators.get("balance_ratio_slow", estimators["balance_ratio"]),
+                                              sample["balance_ratio"],
+                                              ewma_alpha(elapsed, half_life * SLOW_HALF_LIFE_FACTOR))
+
+    if previous and elapsed > 0:
+        hours = elapsed / 3600
+        drift = (sample["balance_ratio"] - previous["balance_ratio"]) / hours
+        volume_in, volume_out = interval_volumes(sample, previous)
+        updated["balance_drift_per_hour"] = ewma_step(estimators["balance_drift_per_hour"], drift, alpha)
+        updated["volume_in_per_hour"] = ewma_step(estimators["volume_in_per_hour"], volume_in / hours, alpha)
+        updated["volume_out_per_hour"] = ewma_step(estimators["volume_out_per_hour"], volume_out / hours, alpha)
+
+    return updated
+
+def update_fee_estimator(estimators: Optional[Dict], fee_data: Dict, previous: Optional[Dict],
+                         half_life: float = HALF_LIFE_SECONDS) -> Dict:
+    """
+    Atualiza a taxa de mudanças de política (mudanças por dia) com um novo registro de taxas
+
+    Args:
+        estimators: Estimadores atuais
+        fee_data: Novo registro de taxas
+        previous: Registro de taxas anterior
+        half_life: Meia-vida da média (segundos)
+
+    Returns:
+        Estimadores atualizados
+    """
+    updated = dict(estimators or {})
+    updated.setdefault("fee_changes_per_day", 0.0)
+
+    elapsed = fee_data["timestamp"] - previous["timestamp"] if previous else 0
+    if elapsed <= 0:
+        return updated
+
+    changed = (fee_data["base_fee_msat"] != previous["base_fee_msat"] or
+               fee_data["fee_rate"] != previous["fee_rate"])
+    rate = (1 if changed else 0) / (elapsed / 86400)
+    updated["fee_changes_per_day"] = ewma_step(updated["fee_changes_per_day"], rate,
+                                               ewma_alpha(elapsed, half_life))
+    return updated
+
+def bootstrap_estimators(channel: Dict, half_life: float = HALF_LIFE_SECONDS) -> Optional[Dict]:
+    """
+    Reconstrói os estimadores de um canal a partir do histórico armazenado
+
+    Usado uma única vez para estados gravados antes dos estimadores existirem.
+
+    Args:
+        channel: Estatísticas do canal (flow_history e fee_history)
+        half_life: Meia-vida das médias (segundos)
+
+    Returns:
+        Estimadores ou None se não houver amostras de fluxo
+    """
+    estimators = None
+    previous = None
+    for sample in channel.get("flow_history", []):
+        estimators = update_flow_estimators(estimators, sample, previous, half_life)
+        previous = sample
+
+    if estimators is None:
+        return None
+
+    previous = None
+    for fee_data in channel.get("fee_history", []):
+        estimators = update_fee_estimator(estimators, fee_data, previous, half_life)
+        previous = fee_data
+
+    return estimators
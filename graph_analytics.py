@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Análise de centralidade do grafo da rede
+Este módulo monta uma representação compacta (CSR) do grafo obtido pelo
+describegraph, estima a centralidade de intermediação (betweenness) dos nossos
+canais por amostragem em vários processos e mantém o resultado em cache entre
+os ciclos
+"""
+
+import os
+import time
+import random
+import logging
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("graph_analytics")
+
+# Número padrão de nodes de origem amostrados
+DEFAULT_SAMPLES = 256
+
+# Fração de canais do grafo que precisa mudar para recalcular
+DEFAULT_CHANGE_THRESHOLD = 0.05
+
+# Idade máxima do resultado antes de recalcular mesmo sem mudanças (segundos)
+DEFAULT_MAX_AGE_SECONDS = 7 * 86400
+
+def _policy_enabled(policy: Optional[Dict]) -> bool:
+    """Verifica se o lado do canal pode encaminhar pagamentos"""
+    return bool(policy) and not policy.get("disabled")
+
+class CompactGraph:
+    """
+    Grafo direcionado em formato CSR (compressed sparse row)
+
+    Os arcos de saída do node v ocupam as posições offsets[v]:offsets[v + 1]
+    de targets. Um arco u -> v existe quando u anuncia uma política habilitada
+    no canal u-v. owners indica, para cada arco, o índice do nosso canal em
+    our_channels ou -1 se o arco não é nosso.
+    """
+
+    __slots__ = ("pubkeys", "offsets", "targets", "owners", "our_channels", "channel_ids")
+
+    def __init__(self, pubkeys: List[str], offsets: array, targets: array, owners: array,
+                 our_channels: List[str], channel_ids: frozenset):
+        self.pubkeys = pubkeys
+        self.offsets = offsets
+        self.targets = targets
+        self.owners = owners
+        self.our_channels = our_channels
+        self.channel_ids = channel_ids
+
+    def __len__(self) -> int:
+        """Número de nodes"""
+        return len(self.pubkeys)
+
+    @property
+    def arc_count(self) -> int:
+        """Número de arcos direcionados"""
+        return len(self.targets)
+
+    @classmethod
+    def from_graph(cls, graph: Dict, our_pubkey: str) -> "CompactGraph":
+        """
+        Monta o grafo a partir de um describegraph
+
+        Args:
+            graph: Resposta de describegraph
+            our_pubkey: Chave pública do nosso node
+
+        Returns:
+            Grafo compacto
+        """
+        index = {}
+        pubkeys = []
+        arcs = []
+        our_channels = []
+        channel_ids = set()
+
+        def node_index(pubkey):
+            position = index.get(pubkey)
+            if position is None:
+                position = index[pubkey] = len(pubkeys)
+                pubkeys.append(pubkey)
+            return position
+
+        for edge in graph.get("edges", []):
+            chan_id = str(edge.get("channel_id", ""))
+            node1 = edge.get("node1_pub")
+            node2 = edge.get("node2_pub")
+            if not chan_id or not node1 or not node2:
+                continue
+            channel_ids.add(chan_id)
+
+            owner = -1
+            if our_pubkey in (node1, node2):
+                owner = len(our_channels)
+                our_channels.append(chan_id)
+
+            u = node_index(node1)
+            v = node_index(node2)
+            if _policy_enabled(edge.get("node1_policy")):
+                arcs.append((u, v, owner))
+            if _policy_enabled(edge.get("node2_policy")):
+                arcs.append((v, u, owner))
+
+        # Ordenação por contagem: grau de saída, somas prefixadas e preenchimento
+        offsets = array('q', [0]) * (len(pubkeys) + 1)
+        for u, _, _ in arcs:
+            offsets[u + 1] += 1
+        for position in range(len(pubkeys)):
+            offsets[position + 1] += offsets[position]
+
+        targets = array('q', [0]) * len(arcs)
+        owners = array('q', [-1]) * len(arcs)
+        cursor = array('q', offsets[:-1])
+        for u, v, owner in arcs:
+            slot = cursor[u]
+            targets[slot] = v
+            owners[slot] = owner
+            cursor[u] = slot + 1
+
+        return cls(pubkeys, offsets, targets, owners, our_channels, frozenset(channel_ids))
+
+def _accumulate(sources: List[int], offsets: List[int], targets: List[int],
+                owners: List[int], n_owned: int) -> List[float]:
+    """
+    Algoritmo de Brandes (grafo não ponderado) a partir de um conjunto de origens
+
+    Apenas a dependência acumulada nos nossos arcos é guardada.
+
+    Returns:
+        Soma das dependências por canal nosso
+    """
+    scores = [0.0] * n_owned
+    n = len(offsets) - 1
+
+    for source in sources:
+        sigma = [0] * n
+        dist = [-1] * n
+        preds = {}
+        sigma[source] = 1
+        dist[source] = 0
+        order = [source]
+
+        # Busca em largura; order serve também de fila
+        position = 0
+        while position < len(order):
+            v = order[position]
+            position += 1
+            next_dist = dist[v] + 1
+            sigma_v = sigma[v]
+            for slot in range(offsets[v], offsets[v + 1]):
+                w = targets[slot]
+                if dist[w] < 0:
+                    dist[w] = next_dist
+                    order.append(w)
+                    preds[w] = [(v, slot)]
+                    sigma[w] = sigma_v
+                elif dist[w] == next_dist:
+                    preds[w].append((v, slot))
+                    sigma[w] += sigma_v
+
+        # Acumulação das dependências em ordem inversa de distância
+        delta = {}
+        for w in reversed(order[1:]):
+            coefficient = (1 + delta.get(w, 0.0)) / sigma[w]
+            for v, slot in preds[w]:
+                contribution = sigma[v] * coefficient
+                delta[v] = delta.get(v, 0.0) + contribution
+                owner = owners[slot]
+                if owner >= 0:
+                    scores[owner] += contribution
+
+    return scores
+
+# Grafo carregado uma única vez por processo trabalhador
+_worker_graph = None
+
+def _init_worker(offsets: array, targets: array, owners: array, n_owned: int) -> None:
+    """Guarda o grafo no processo trabalhador (listas são mais rápidas que array para indexação)"""
+    global _worker_graph
+    _worker_graph = (list(offsets), list(targets), list(owners), n_owned)
+
+def _evaluate(sources: List[int]) -> List[float]:
+    """Calcula as dependências de um bloco de origens no processo trabalhador"""
+    return _accumulate(sources, *_worker_graph)
+
+def sampled_betweenness(graph: CompactGraph, samples: int = DEFAULT_SAMPLES,
+                        workers: Optional[int] = None, seed: int = 0) -> Dict[str, float]:
+    """
+    Estima a centralidade de intermediação dos nossos canais
+
+    As origens são sorteadas uniformemente e o resultado é escalado por
+    n / amostras (estimador não enviesado), somando os dois sentidos do canal e
+    normalizando pelo número de pares ordenados de nodes.
+
+    Args:
+        graph: Grafo compacto
+        samples: Número de nodes de origem (0 ou >= número de nodes usa todos)
+        workers: Número de processos (padrão: número de núcleos)
+        seed: Semente do sorteio das origens
+
+    Returns:
+        Centralidade normalizada por chan_id
+    """
+    n = len(graph)
+    n_owned = len(graph.our_channels)
+    if n < 2 or not n_owned:
+        return {chan_id: 0.0 for chan_id in graph.our_channels}
+
+    if samples and samples < n:
+        sources = random.Random(seed).sample(range(n), samples)
+    else:
+        sources = list(range(n))
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(sources)))
+    if workers == 1:
+        totals = _accumulate(sources, list(graph.offsets), list(graph.targets), list(graph.owners), n_owned)
+    else:
+        chunks = [sources[start::workers * 4] for start in range(workers * 4)]
+        totals = [0.0] * n_owned
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(graph.offsets, graph.targets, graph.owners, n_owned)) as executor:
+            for partial in executor.map(_evaluate, [chunk for chunk in chunks if chunk]):
+                for owner, value in enumerate(partial):
+                    totals[owner] += value
+
+    scale = n / len(sources) / (n * (n - 1))
+    return {chan_id: totals[owner] * scale for owner, chan_id in enumerate(graph.our_channels)}
+
+class GraphAnalytics:
+    """Centralidade dos nossos canais com cache entre os ciclos"""
+
+    def __init__(self, samples: int = DEFAULT_SAMPLES, workers: Optional[int] = None,
+                 change_threshold: float = DEFAULT_CHANGE_THRESHOLD,
+                 max_age_seconds: int = DEFAULT_MAX_AGE_SECONDS):
+        """
+        Inicializa a análise
+
+        Args:
+            samples: Número de nodes de origem amostrados
+            workers: Número de processos (padrão: número de núcleos)
+            change_threshold: Fração de canais alterados que invalida o cache
+            max_age_seconds: Idade máxima do resultado
+        """
+        self.samples = samples
+        self.workers = workers
+        self.change_threshold = change_threshold
+        self.max_age_seconds = max_age_seconds
+        self.computed_at = 0
+        self.elapsed_seconds = 0.0
+        self._channel_ids = frozenset()
+        self._our_channels = frozenset()
+        self._scores: Dict[str, Dict] = {}
+
+    def is_stale(self, graph: CompactGraph) -> bool:
+        """
+        Verifica se o grafo mudou o suficiente para recalcular
+
+        Args:
+            graph: Grafo compacto atual
+
+        Returns:
+            True se não há resultado, se ele expirou, se nossos canais mudaram
+            ou se a fração de canais abertos/fechados passou do limite
+        """
+        if not self.computed_at or time.time() - self.computed_at > self.max_age_seconds:
+            return True
+        if frozenset(graph.our_channels) != self._our_channels:
+            return True
+        changed = len(graph.channel_ids ^ self._channel_ids)
+        return changed > self.change_threshold * max(1, len(self._channel_ids))
+
+    def update(self, graph_data: Dict, our_pubkey: str, force: bool = False) -> bool:
+        """
+        Atualiza a centralidade se o grafo mudou materialmente
+
+        Args:
+            graph_data: Resposta de describegraph
+            our_pubkey: Chave pública do nosso node
+            force: Recalcula mesmo sem mudanças
+
+        Returns:
+            True se a centralidade foi recalculada
+        """
+        graph = CompactGraph.from_graph(graph_data, our_pubkey)
+        if not force and not self.is_stale(graph):
+            return False
+
+        started = time.perf_counter()
+        betweenness = sampled_betweenness(graph, self.samples, self.workers)
+
+        # Percentil de cada canal entre os nossos canais
+        ranked = sorted(betweenness, key=betweenness.get)
+        denominator = max(1, len(ranked) - 1)
+        scores = {
+            chan_id: {"betweenness": betweenness[chan_id], "rank": position / denominator}
+            for position, chan_id in enumerate(ranked)
+        }
+
+        self._scores = scores
+        self._channel_ids = graph.channel_ids
+        self._our_channels = frozenset(graph.our_channels)
+        self.computed_at = time.time()
+        self.elapsed_seconds = time.perf_counter() - started
+
+        logger.info(f"Centralidade de {len(scores)} canais calculada em {self.elapsed_seconds:.2f}s "
+                    f"({len(graph)} nodes, {graph.arc_count} arcos)")
+        return True
+
+    def export_state(self) -> Dict:
+        """
+        Cópia do resultado em cache para o checkpoint do motor
+
+        Returns:
+            Centralidade, canais considerados e horário do cálculo
+        """
+        return {
+            "scores": dict(self._scores),
+            "channel_ids": self._channel_ids,
+            "our_channels": self._our_channels,
+            "computed_at": self.computed_at,
+            "elapsed_seconds": self.elapsed_seconds
+        }
+
+    def restore_state(self, state: Dict) -> None:
+        """
+        Restaura o resultado em cache a partir de export_state
+
+        Args:
+            state: Estado exportado
+        """
+        self._scores = dict(state["scores"])
+        self._channel_ids = frozenset(state["channel_ids"])
+        self._our_channels = frozenset(state["our_channels"])
+        self.computed_at = state["computed_at"]
+        self.elapsed_seconds = state["elapsed_seconds"]
+
+    def channel_scores(self) -> Dict[str, Dict]:
+        """
+        Obtém a centralidade dos nossos canais
+
+        Returns:
+            betweenness (normalizada) e rank (percentil entre nossos canais) por chan_id
+        """
+        return self._scores
+
+    def stats(self) -> Dict:
+        """
+        Obtém um resumo do último cálculo
+
+        Returns:
+            Número de canais, horário e duração do cálculo
+        """
+        return {
+            "channels": len(self._scores),
+            "computed_at": int(self.computed_at),
+            "elapsed_seconds": self.elapsed_seconds,
+            "samples": self.samples
+        }
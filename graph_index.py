@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Índice de quantis de taxas da rede
+Este módulo mantém, para cada node do grafo, a distribuição das taxas cobradas
+por quem encaminha pagamentos até ele, atualizada incrementalmente a partir das
+mensagens de gossip
+"""
+
+import time
+import bisect
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("graph_index")
+
+# Quantis publicados para cada node
+QUANTILES = (("p10", 0.1), ("p50", 0.5), ("p90", 0.9))
+
+def _quantile(values: List[int], q: float) -> float:
+    """
+    Quantil com interpolação linear sobre uma lista já ordenada (O(1))
+
+    Args:
+        values: Valores ordenados
+        q: Quantil entre 0 e 1
+
+    Returns:
+        Valor do quantil
+    """
+    position = q * (len(values) - 1)
+    lower = int(position)
+    if lower + 1 >= len(values):
+        return float(values[lower])
+    return values[lower] + (values[lower + 1] - values[lower]) * (position - lower)
+
+def _parse_policy(policy: Optional[Dict]) -> Optional[Tuple[int, int]]:
+    """
+    Extrai (base_fee_msat, fee_rate_ppm) de uma política de roteamento do LND
+
+    Políticas ausentes ou desabilitadas não participam do índice.
+    """
+    if not policy or policy.get("disabled"):
+        return None
+    try:
+        return int(policy.get("fee_base_msat", 0)), int(policy.get("fee_rate_milli_msat", 0))
+    except (TypeError, ValueError):
+        return None
+
+class FeeQuantileIndex:
+    """
+    Distribuição das taxas de entrada de cada node do grafo
+
+    A política anunciada por A no canal A-B é a taxa que A cobra para encaminhar
+    até B, então ela entra na distribuição de B. As taxas de cada node ficam em
+    listas ordenadas: uma atualização de gossip custa uma remoção e uma inserção
+    por bisect e a leitura dos quantis é O(1).
+    """
+
+    def __init__(self):
+        """Inicializa um índice vazio"""
+        # chan_id -> {node anunciante: (node de destino, base_fee_msat, fee_rate_ppm)}
+        self._edges: Dict[str, Dict[str, Tuple[str, int, int]]] = {}
+        # node de destino -> taxas ordenadas
+        self._base_fees: Dict[str, List[int]] = {}
+        self._fee_rates: Dict[str, List[int]] = {}
+        self._lock = threading.RLock()
+        self.loaded_at = 0
+        self.updated_at = 0
+        self.updates_applied = 0
+
+    def __len__(self) -> int:
+        """Número de nodes com pelo menos uma taxa de entrada"""
+        return len(self._fee_rates)
+
+    def _insert(self, target: str, base_fee: int, fee_rate: int) -> None:
+        bisect.insort(self._base_fees.setdefault(target, []), base_fee)
+        bisect.insort(self._fee_rates.setdefault(target, []), fee_rate)
+
+    def _remove(self, target: str, base_fee: int, fee_rate: int) -> None:
+        for index, value in ((self._base_fees, base_fee), (self._fee_rates, fee_rate)):
+            values = index[target]
+            del values[bisect.bisect_left(values, value)]
+            if not values:
+                del index[target]
+
+    def _set_policy(self, chan_id: str, advertising_node: str, target: str, policy: Optional[Dict]) -> None:
+        """Substitui a política de um lado do canal (deve ser chamado com o lock)"""
+        sides = self._edges.setdefault(chan_id, {})
+        old = sides.pop(advertising_node, None)
+        if old:
+            self._remove(*old)
+
+        parsed = _parse_policy(policy)
+        if parsed:
+            entry = (target, parsed[0], parsed[1])
+            sides[advertising_node] = entry
+            self._insert(*entry)
+
+        if not sides:
+            del self._edges[chan_id]
+
+    def load_graph(self, graph: Dict) -> None:
+        """
+        Reconstrói o índice a partir de um describegraph completo
+
+        Args:
+            graph: Resposta de describegraph (com a lista edges)
+        """
+        edges = {}
+        base_fees = {}
+        fee_rates = {}
+
+        for edge in graph.get("edges", []):
+            chan_id = str(edge.get("channel_id", ""))
+            node1 = edge.get("node1_pub")
+            node2 = edge.get("node2_pub")
+            if not chan_id or not node1 or not node2:
+                continue
+
+            sides = {}
+            for advertising_node, target, policy in ((node1, node2, edge.get("node1_policy")),
+                                                     (node2, node1, edge.get("node2_policy"))):
+                parsed = _parse_policy(policy)
+                if parsed:
+                    sides[advertising_node] = (target, parsed[0], parsed[1])
+                    base_fees.setdefault(target, []).append(parsed[0])
+                    fee_rates.setdefault(target, []).append(parsed[1])
+            if sides:
+                edges[chan_id] = sides
+
+        # Ordenar uma única vez na carga completa
+        for values in base_fees.values():
+            values.sort()
+        for values in fee_rates.values():
+            values.sort()
+
+        with self._lock:
+            self._edges = edges
+            self._base_fees = base_fees
+            self._fee_rates = fee_rates
+            self.loaded_at = self.updated_at = time.time()
+
+        logger.info(f"Índice de taxas da rede carregado: {len(edges)} canais, {len(fee_rates)} nodes")
+
+    def apply_channel_update(self, chan_id: str, advertising_node: str, connecting_node: str,
+                             policy: Optional[Dict]) -> None:
+        """
+        Aplica uma atualização de política recebida por gossip
+
+        Args:
+            chan_id: ID do canal
+            advertising_node: Node que anunciou a política
+            connecting_node: Outro node do canal (destino do encaminhamento)
+            policy: Nova política de roteamento (None ou desabilitada remove o lado)
+        """
+        with self._lock:
+            self._set_policy(str(chan_id), advertising_node, connecting_node, policy)
+            self.updated_at = time.time()
+            self.updates_applied += 1
+
+    def close_channel(self, chan_id: str) -> None:
+        """
+        Remove um canal fechado do índice
+
+        Args:
+            chan_id: ID do canal
+        """
+        with self._lock:
+            for entry in self._edges.pop(str(chan_id), {}).values():
+                self._remove(*entry)
+            self.updated_at = time.time()
+            self.updates_applied += 1
+
+    def apply_topology_update(self, update: Dict) -> int:
+        """
+        Aplica uma mensagem de SubscribeChannelGraph
+
+        Args:
+            update: Atualização de topologia (channel_updates e closed_chans)
+
+        Returns:
+            Número de alterações aplicadas
+        """
+        applied = 0
+        for channel_update in update.get("channel_updates", []):
+            chan_id = channel_update.get("chan_id")
+            advertising_node = channel_update.get("advertising_node")
+            connecting_node = channel_update.get("connecting_node")
+            if not chan_id or not advertising_node or not connecting_node:
+                continue
+            self.apply_channel_update(chan_id, advertising_node, connecting_node,
+                                      channel_update.get("routing_policy"))
+            applied += 1
+
+        for closed in update.get("closed_chans", []):
+            if closed.get("chan_id"):
+                self.close_channel(closed["chan_id"])
+                applied += 1
+
+        return applied
+
+    def export_state(self) -> Dict:
+        """
+        Cópia do estado do índice para o checkpoint do motor
+
+        Returns:
+            Canais, listas ordenadas e horários
+        """
+        with self._lock:
+            return {
+                "edges": {chan_id: dict(sides) for chan_id, sides in self._edges.items()},
+                "base_fees": {target: list(values) for target, values in self._base_fees.items()},
+                "fee_rates": {target: list(values) for target, values in self._fee_rates.items()},
+                "loaded_at": self.loaded_at,
+                "updated_at": self.updated_at,
+                "updates_applied": self.updates_applied
+            }
+
+    def restore_state(self, state: Dict) -> None:
+        """
+        Restaura o índice a partir de export_state, sem reordenar as listas
+
+        Args:
+            state: Estado exportado
+        """
+        edges = {chan_id: {node: tuple(entry) for node, entry in sides.items()}
+                 for chan_id, sides in state["edges"].items()}
+        with self._lock:
+            self._edges = edges
+            self._base_fees = {target: list(values) for target, values in state["base_fees"].items()}
+            self._fee_rates = {target: list(values) for target, values in state["fee_rates"].items()}
+            self.loaded_at = state["loaded_at"]
+            self.updated_at = state["updated_at"]
+            self.updates_applied = state["updates_applied"]
+
+    def node_quantiles(self, pubkey: str) -> Optional[Dict]:
+        """
+        Obtém a distribuição das taxas cobradas para encaminhar até um node
+
+        Args:
+            pubkey: Chave pública do node
+
+        Returns:
+            Número de canais e quantis de fee_rate_ppm e base_fee_msat, ou None
+        """
+        with self._lock:
+            fee_rates = self._fee_rates.get(pubkey)
+            if not fee_rates:
+                return None
+            base_fees = self._base_fees[pubkey]
+            return {
+                "channels": len(fee_rates),
+                "fee_rate_ppm": {name: _quantile(fee_rates, q) for name, q in QUANTILES},
+                "base_fee_msat": {name: _quantile(base_fees, q) for name, q in QUANTILES}
+            }
+
+    def stats(self) -> Dict:
+        """
+        Obtém um resumo do índice
+
+        Returns:
+            Número de canais e nodes, horário da última carga e atualizações aplicadas
+        """
+        with self._lock:
+            return {
+                "channels": len(self._edges),
+                "nodes": len(self._fee_rates),
+                "loaded_at": int(self.loaded_at),
+                "updated_at": int(self.updated_at),
+                "updates_applied": self.updates_applied
+            }
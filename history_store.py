@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Armazenamento do histórico completo de cada canal fora da memória
+Este módulo grava os registros dos históricos (amostras de fluxo, políticas e
+buckets das camadas) em um log por canal, só acrescentado, e mantém em memória
+apenas os registros mais recentes. As camadas sempre ficam no log; os
+históricos brutos, apenas com lazy_history. O histórico completo é remontado a
+partir do log apenas quando alguém o consulta
+"""
+
+import os
+import json
+from typing import Dict, Iterable, List, Optional
+
+from persistence import atomic_write_bytes
+from rollups import ROLLUP_TIERS, tier_key, trim_tiers
+
+# Diretório padrão dos logs por canal
+HISTORY_DIR = "history"
+
+# Registros mais recentes de cada histórico mantidos em memória
+HOT_RECORDS = 1
+
+# Históricos das camadas (a retenção é por tempo, não por número de registros)
+TIER_KEYS = {tier_key(tier) for tier in ROLLUP_TIERS}
+
+# Registros acrescentados antes de considerar a compactação do log
+COMPACT_MIN_RECORDS = 256
+
+def record_key(record: Dict) -> int:
+    """
+    Identidade de um registro no histórico (início do bucket ou timestamp)
+
+    Um registro substituído (bucket atualizado, política com last_seen novo)
+    mantém a identidade, então a versão mais recente prevalece.
+    """
+    return record.get("start", record.get("timestamp", 0))
+
+def history_keys(channel: Dict) -> List[str]:
+    """Chaves dos históricos nas estatísticas do canal"""
+    return [key for key, value in channel.items()
+            if key.endswith("_history") and isinstance(value, (list, tuple))]
+
+def merge_records(*sources) -> List[Dict]:
+    """
+    Junta sequências de registros em ordem cronológica
+
+    Registros com a mesma identidade são substituídos pelos das sequências
+    seguintes.
+    """
+    merged = {}
+    for records in sources:
+        for record in records:
+            merged[record_key(record)] = record
+    return [merged[key] for key in sorted(merged)]
+
+class HistoryStore:
+    """
+    Log dos históricos por canal
+
+    Cada linha do log é um registro de um histórico ({"k": chave, "r": registro}).
+    Linhas incompletas de uma gravação interrompida são ignoradas na leitura.
+    """
+
+    def __init__(self, directory: str = HISTORY_DIR, max_records: int = 24 * 30,
+                 hot_records: int = HOT_RECORDS):
+        """
+        Inicializa o armazenamento
+
+        Args:
+            directory: Diretório dos logs
+            max_records: Número máximo de registros dos históricos brutos
+            hot_records: Registros mais recentes mantidos em memória
+        """
+        self.directory = directory
+        self.max_records = max_records
+        self.hot_records = hot_records
+
+        # Registros em memória já gravados no log, por canal e histórico
+        self._logged: Dict[str, Dict[str, tuple]] = {}
+
+    def path(self, chan_id: str) -> str:
+        """Caminho do log do canal"""
+        return os.path.join(self.directory, f"{chan_id}.jsonl")
+
+    def read(self, chan_id: str) -> Dict[str, List[Dict]]:
+        """
+        Lê os históricos gravados de um canal
+
+        Args:
+            chan_id: ID do canal
+
+        Returns:
+            Registros por histórico, em ordem cronológica (vazio se não houver log)
+        """
+        histories = {}
+        try:
+            with open(self.path(chan_id), "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    histories.setdefault(entry["k"], []).append(entry["r"])
+        except FileNotFoundError:
+            return {}
+        return {key: merge_records(records) for key, records in histories.items()}
+
+    def materialize(self, chan_id: str, channel: Dict) -> Dict:
+        """
+        Remonta as estatísticas completas do canal
+
+        Args:
+            chan_id: ID do canal
+            channel: Estatísticas em memória (mutáveis ou de um snapshot)
+
+        Returns:
+            Cópia das estatísticas com os históricos completos e a retenção aplicada
+        """
+        stored = self.read(chan_id)
+        full = dict(channel)
+        for key in set(stored) | set(history_keys(channel)):
+            full[key] = merge_records(stored.get(key, ()), channel.get(key, ()))
+            if key not in TIER_KEYS:
+                full[key] = full[key][-self.max_records:]
+        trim_tiers(full)
+        return full
+
+    def spill(self, chan_id: str, channel: Dict, keys: Optional[Iterable[str]] = None) -> int:
+        """
+        Grava no log os registros novos do canal e mantém em memória apenas os mais recentes
+
+        Registros são imutáveis (substituições criam um novo objeto), então os
+        novos são os que não estavam em memória na gravação anterior. O log é
+        compactado quando cresce além do dobro do tamanho compactado.
+
+        Args:
+            chan_id: ID do canal
+            channel: Estatísticas mutáveis do canal
+            keys: Históricos gravados (padrão: todos, como em lazy_history)
+
+        Returns:
+            Número de registros gravados
+        """
+        logged = self._logged.get(chan_id, {})
+        lines = []
+        tails = {}
+        for key in history_keys(channel):
+            if keys is not None and key not in keys:
+                continue
+            previous = logged.get(key, ())
+            records = channel[key]
+            lines += [json.dumps({"k": key, "r": record}) + "\n"
+                      for record in records if not any(record is item for item in previous)]
+            if len(records) > self.hot_records:
+                channel[key] = records[-self.hot_records:]
+            tails[key] = tuple(channel[key])
+        self._logged[chan_id] = tails
+        if not lines:
+            return 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(chan_id), "a") as f:
+            f.writelines(lines)
+
+        # lazy indica que o log guarda também os históricos brutos
+        log = dict(channel.get("history_log") or {"records": 0, "compacted": 0, "lazy": False})
+        log["lazy"] = log.get("lazy", True) or keys is None
+        log["records"] += len(lines)
+        if log["records"] > max(COMPACT_MIN_RECORDS, 2 * log["compacted"]):
+            log["records"] = log["compacted"] = self.compact(chan_id, channel, None if log["lazy"] else keys)
+        channel["history_log"] = log
+        return len(lines)
+
+    def compact(self, chan_id: str, channel: Dict, keys: Optional[Iterable[str]] = None) -> int:
+        """
+        Reescreve o log do canal apenas com os registros retidos
+
+        Args:
+            chan_id: ID do canal
+            channel: Estatísticas em memória do canal
+            keys: Históricos mantidos no log (padrão: todos)
+
+        Returns:
+            Número de registros no log compactado
+        """
+        full = self.materialize(chan_id, channel)
+        lines = [json.dumps({"k": key, "r": record}) + "\n"
+                 for key in history_keys(full) if keys is None or key in keys for record in full[key]]
+        atomic_write_bytes(self.path(chan_id), "".join(lines).encode("utf-8"))
+        return len(lines)
+
+    def delete(self, chan_id: str) -> None:
+        """Remove o log do canal"""
+        self._logged.pop(chan_id, None)
+        try:
+            os.unlink(self.path(chan_id))
+        except FileNotFoundError:
+            pass
+
+def load_channel_stats(channel_stats: Dict, directory: str = HISTORY_DIR,
+                       max_records: Optional[int] = None) -> Dict:
+    """
+    Remonta os históricos completos dos canais gravados em modo lazy_history
+
+    Args:
+        channel_stats: Estatísticas dos canais (channel_stats.json)
+        directory: Diretório dos logs
+        max_records: Número máximo de registros dos históricos brutos
+
+    Returns:
+        Estatísticas com os históricos completos
+    """
+    store = HistoryStore(directory, max_records or 24 * 30)
+    return {chan_id: store.materialize(chan_id, channel) if "history_log" in channel else channel
+            for chan_id, channel in channel_stats.items()}
@@ -7,10 +7,57 @@ Cliente LND usando API REST com suporte aprimorado para autenticação
 
 import os
 import json
+import time
 import base64
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
 
+# Tempo de validade do índice chan_id -> channel_point (segundos)
+CHAN_POINT_INDEX_TTL = 300
+
+# Número máximo de atualizações de política simultâneas
+DEFAULT_MAX_CONCURRENCY = 8
+MAX_CONCURRENCY = 16
+
+def parse_channel_point(channel_point):
+    """
+    Converte um channel_point no formato "txid:index" para o formato da API
+    
+    Args:
+        channel_point (str): Ponto do canal
+        
+    Returns:
+        dict: Ponto do canal (funding_txid_str e output_index)
+    """
+    funding_txid, output_index = channel_point.split(":")
+    return {
+        "funding_txid_str": funding_txid,
+        "output_index": int(output_index)
+    }
+
+def parse_failed_updates(response):
+    """
+    Extrai as falhas por canal da resposta de updatechanpolicy
+    
+    Args:
+        response (dict): Resposta de update_channel_policy
+        
+    Returns:
+        list: Falhas com channel_point ("txid:index", ou None se o LND não informar), reason e error
+    """
+    failures = []
+    for failure in response.get("failed_updates") or []:
+        outpoint = failure.get("outpoint") or {}
+        channel_point = None
+        if outpoint.get("txid_str"):
+            channel_point = f"{outpoint['txid_str']}:{outpoint.get('output_index', 0)}"
+        failures.append({
+            "channel_point": channel_point,
+            "reason": failure.get("reason") or "UPDATE_FAILURE_UNKNOWN",
+            "error": failure.get("update_error", "")
+        })
+    return failures
+
 class LNDClient:
     """Cliente para interagir com a API REST do LND"""
     
@@ -30,6 +77,12 @@ class LNDClient:
         self.lnd_port = lnd_port
         self.base_url = f"https://{lnd_host}:{lnd_port}/v1/"
         
+        # Índice chan_id -> channel_point, atualizado a cada listagem de canais,
+        # e os canais não encontrados na última listagem (cache negativo)
+        self._chan_point_index = {}
+        self._chan_point_index_time = 0
+        self._chan_point_misses = {}
+        
         # Verificar modo de desenvolvimento
         self.dev_mode = dev_mode or os.environ.get("LND_DEV_MODE") == "1"
         
@@ -55,9 +108,12 @@ class LNDClient:
                 macaroon_bytes = f.read()
             self.macaroon = macaroon_bytes.hex()
             
-            # Configurar sessão
+            # Configurar sessão (requests só é importado fora do modo de desenvolvimento)
+            import requests
             self.session = requests.Session()
             self.session.verify = self.cert_path
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=MAX_CONCURRENCY)
+            self.session.mount("https://", adapter)
             self.headers = {
                 'Grpc-Metadata-macaroon': self.macaroon,
                 'Content-Type': 'application/json'
@@ -79,6 +135,7 @@ class LNDClient:
         if self.dev_mode:
             return self._simulate_response(endpoint, params, data)
         
+        import requests
         url = urljoin(self.base_url, endpoint)
         
         try:
@@ -200,6 +257,41 @@ class LNDClient:
                 }
             }
         
+        # Simular describegraph
+        elif endpoint == 'graph':
+            our_pubkey = "03a5a9ecbafb4ca0d9c7b508cfd7e3e153d4168f61d5d71efb9f5a4797f7f25722"
+            peers = [
+                "02a5a9ecbafb4ca0d9c7b508cfd7e3e153d4168f61d5d71efb9f5a4797f7f25722",
+                "03b5a9ecbafb4ca0d9c7b508cfd7e3e153d4168f61d5d71efb9f5a4797f7f25722"
+            ]
+            edges = []
+            for index, node in enumerate(peers + [f"02{i:064x}" for i in range(8)]):
+                for peer_index, peer in enumerate(peers):
+                    if node == peer:
+                        continue
+                    edges.append({
+                        "channel_id": str(724725106597970000 + index * 10 + peer_index),
+                        "node1_pub": node,
+                        "node2_pub": peer,
+                        "capacity": "2000000",
+                        "node1_policy": {
+                            "time_lock_delta": 40,
+                            "fee_base_msat": str(1000 * (index % 3)),
+                            "fee_rate_milli_msat": str(50 * (index + 1)),
+                            "disabled": False
+                        },
+                        "node2_policy": {
+                            "time_lock_delta": 40,
+                            "fee_base_msat": "1000",
+                            "fee_rate_milli_msat": "100",
+                            "disabled": False
+                        }
+                    })
+            return {
+                "nodes": [{"pub_key": our_pubkey}] + [{"pub_key": peer} for peer in peers],
+                "edges": edges
+            }
+        
         # Simular updatechanpolicy
         elif endpoint == 'chanpolicy':
             return {
@@ -225,7 +317,72 @@ class LNDClient:
         Returns:
             dict: Lista de canais
         """
-        return self._request('GET', 'channels')
+        response = self._request('GET', 'channels')
+        if "error" not in response:
+            self._index_channel_points(response.get("channels", []))
+        return response
+    
+    def _index_channel_points(self, channels):
+        """
+        Reconstrói o índice chan_id -> channel_point
+        
+        Args:
+            channels (list): Canais retornados por list_channels
+        """
+        self._chan_point_index = {
+            channel["chan_id"]: channel["channel_point"]
+            for channel in channels
+            if "chan_id" in channel and "channel_point" in channel
+        }
+        self._chan_point_index_time = time.time()
+    
+    def _refresh_chan_points(self, chan_ids, refresh=False):
+        """
+        Recarrega o índice se estiver expirado ou se algum canal for desconhecido
+        
+        Um canal que não estava na última listagem (ex: canal fechado) não gera
+        nova listagem até o índice expirar; canais abertos recentemente entram
+        na primeira listagem em que aparecerem.
+        
+        Args:
+            chan_ids (list): IDs dos canais consultados
+            refresh (bool): Força a recarga do índice
+        """
+        now = time.time()
+        expired = now - self._chan_point_index_time > CHAN_POINT_INDEX_TTL
+        unknown = [chan_id for chan_id in chan_ids if chan_id not in self._chan_point_index and
+                   now - self._chan_point_misses.get(chan_id, 0) > CHAN_POINT_INDEX_TTL]
+        if not (refresh or expired or unknown):
+            return
+        
+        self.list_channels()
+        self._chan_point_misses = {
+            chan_id: missed_at for chan_id, missed_at in self._chan_point_misses.items()
+            if now - missed_at <= CHAN_POINT_INDEX_TTL
+        }
+        for chan_id in chan_ids:
+            if chan_id not in self._chan_point_index:
+                self._chan_point_misses[chan_id] = now
+    
+    def get_chan_point(self, chan_id, refresh=False):
+        """
+        Resolve o ponto de um canal a partir do índice em cache
+        
+        O índice só é recarregado se estiver expirado, se refresh for True
+        ou se o canal não for encontrado (ex: canal aberto recentemente); um
+        canal não encontrado não recarrega o índice de novo até ele expirar.
+        
+        Args:
+            chan_id (str): ID do canal
+            refresh (bool): Força a recarga do índice
+            
+        Returns:
+            dict: Ponto do canal ou None se o canal não existir
+        """
+        self._refresh_chan_points([chan_id], refresh)
+        
+        channel_point = self._chan_point_index.get(chan_id)
+        return parse_channel_point(channel_point) if channel_point else None
     
     def get_channel_info(self, chan_id):
         """
@@ -239,6 +396,46 @@ class LNDClient:
         """
         return self._request('GET', f'graph/edge/{chan_id}')
     
+    def describe_graph(self):
+        """
+        Obtém o grafo completo de canais conhecido pelo node
+        
+        Returns:
+            dict: Nodes e canais (edges) com as políticas de cada lado
+        """
+        return self._request('GET', 'graph')
+    
+    def subscribe_channel_graph(self):
+        """
+        Assina as atualizações de topologia do grafo (gossip)
+        
+        A conexão fica aberta e cada mensagem recebida é devolvida assim que
+        chega. Em caso de erro, um dicionário com a chave "error" é devolvido
+        e a assinatura termina.
+        
+        Yields:
+            dict: Atualização de topologia (channel_updates e closed_chans)
+        """
+        if self.dev_mode:
+            return
+        
+        import requests
+        url = urljoin(self.base_url, 'graph/subscribe')
+        
+        try:
+            with self.session.get(url, headers=self.headers, stream=True, timeout=None) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    message = json.loads(line)
+                    if "error" in message:
+                        yield {"error": message["error"]}
+                        return
+                    yield message.get("result", message)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            yield {"error": str(e)}
+    
     def update_channel_policy(self, global_update=False, chan_point=None, 
                              base_fee_msat=1000, fee_rate=0.000001, time_lock_delta=40):
         """
@@ -254,8 +451,9 @@ class LNDClient:
         Returns:
             dict: Resultado da atualização
         """
-        # Converter fee_rate para fee_rate_ppm (partes por milhão)
-        fee_rate_ppm = int(fee_rate * 1000000)
+        # Converter fee_rate para fee_rate_ppm (partes por milhão), arredondando para
+        # que erros de ponto flutuante (ex: 0.000002 * 1000000 = 1.9999...) não percam 1 ppm
+        fee_rate_ppm = int(round(fee_rate * 1000000))
         
         data = {
             "base_fee_msat": str(base_fee_msat),
@@ -270,6 +468,57 @@ class LNDClient:
             }
         
         return self._request('POST', 'chanpolicy', data=data)
+    
+    def update_channel_policies(self, policies, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """
+        Atualiza as políticas de vários canais com concorrência limitada
+        
+        Args:
+            policies (list): Políticas com chan_id, base_fee_msat, fee_rate e time_lock_delta
+            max_concurrency (int): Número máximo de requisições simultâneas
+            
+        Returns:
+            list: Resultado por canal, na mesma ordem das políticas
+        """
+        # Recarregar o índice uma única vez se algum canal for desconhecido ou o índice estiver expirado
+        self._refresh_chan_points([policy.get("chan_id") for policy in policies])
+        
+        def apply(policy):
+            chan_id = policy.get("chan_id")
+            result = {"chan_id": chan_id}
+            
+            channel_point = self._chan_point_index.get(chan_id)
+            if not channel_point:
+                result["success"] = False
+                result["error"] = f"Canal {chan_id} não encontrado"
+                return result
+            
+            try:
+                response = self.update_channel_policy(
+                    global_update=False,
+                    chan_point=parse_channel_point(channel_point),
+                    base_fee_msat=policy["base_fee_msat"],
+                    fee_rate=policy["fee_rate"],
+                    time_lock_delta=policy.get("time_lock_delta", 40)
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                result["success"] = False
+                result["error"] = f"Política inválida: {e}"
+                return result
+            
+            if "error" in response:
+                result["success"] = False
+                result["error"] = response["error"]
+            elif response.get("failed_updates"):
+                result["success"] = False
+                result["failed_updates"] = response["failed_updates"]
+            else:
+                result["success"] = True
+            return result
+        
+        max_concurrency = max(1, min(MAX_CONCURRENCY, int(max_concurrency)))
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            return list(executor.map(apply, policies))
 
 # Exemplo de uso
 if __name__ == "__main__":
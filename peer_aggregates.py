@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Agregação dos canais por peer
+Este módulo agrupa os canais paralelos que compartilham o mesmo peer e calcula,
+uma vez por peer, a liquidez combinada e uma visão única da política do peer,
+para que todos os canais do peer recebam a mesma taxa
+"""
+
+import statistics
+from typing import Dict, List, Optional
+
+from demand_model import combine_fits
+from strategies import ChannelInput, StrategyFeatures
+
+# Campos de fluxo somados entre os canais do peer
+SUM_KEYS = ("local_balance", "remote_balance", "forwarding_volume_in", "forwarding_volume_out",
+            "forwarding_volume_in_total", "forwarding_volume_out_total")
+
+# Médias móveis de proporções, ponderadas pela capacidade
+EWMA_RATIO_KEYS = ("balance_ratio", "balance_ratio_slow", "inbound_ratio", "outbound_ratio")
+
+# Médias móveis de taxas por hora, somadas entre os canais
+EWMA_RATE_KEYS = ("balance_drift_per_hour", "volume_in_per_hour", "volume_out_per_hour")
+
+class PeerAggregate:
+    """Canais de um peer e as entradas combinadas usadas no cálculo das taxas"""
+
+    __slots__ = ("pubkey", "channels", "capacities", "flow_data", "peer_fee_data")
+
+    def __init__(self, pubkey: str, channels: List[str], capacities: Dict[str, int],
+                 flow_data: Dict, peer_fee_data: Optional[Dict]):
+        """
+        Inicializa o agregado
+
+        Args:
+            pubkey: Chave pública do peer
+            channels: IDs dos canais do peer (ordenados; o primeiro representa o peer)
+            capacities: Capacidade de cada canal
+            flow_data: Amostra de fluxo combinada
+            peer_fee_data: Política combinada do peer (None se não houver)
+        """
+        self.pubkey = pubkey
+        self.channels = channels
+        self.capacities = capacities
+        self.flow_data = flow_data
+        self.peer_fee_data = peer_fee_data
+
+    @property
+    def capacity(self) -> int:
+        """Capacidade total dos canais do peer"""
+        return sum(self.capacities.values())
+
+    @property
+    def row(self) -> ChannelInput:
+        """Entrada única do peer, identificada pelo canal representante"""
+        return ChannelInput(self.channels[0], self.pubkey, self.flow_data, self.peer_fee_data)
+
+    def to_dict(self) -> Dict:
+        """Resumo do agregado"""
+        return {
+            "channels": list(self.channels),
+            "capacity": self.capacity,
+            "flow": self.flow_data,
+            "peer_policy": self.peer_fee_data
+        }
+
+def aggregate_flow(rows: List[ChannelInput], capacities: Dict[str, int]) -> Dict:
+    """
+    Combina as amostras de fluxo mais recentes dos canais de um peer
+
+    Saldos e volumes são somados e as proporções recalculadas sobre a
+    capacidade total, como se os canais fossem um só.
+
+    Args:
+        rows: Entradas dos canais do peer
+        capacities: Capacidade de cada canal
+
+    Returns:
+        Amostra de fluxo combinada
+    """
+    flow = {"timestamp": max(row.flow_data.get("timestamp", 0) for row in rows)}
+    for key in SUM_KEYS:
+        if all(key in row.flow_data for row in rows):
+            flow[key] = sum(row.flow_data[key] for row in rows)
+
+    local_balance = flow.get("local_balance", 0)
+    remote_balance = flow.get("remote_balance", 0)
+    capacity = sum(capacities.values())
+    flow["inbound_ratio"] = remote_balance / capacity if capacity > 0 else 0
+    flow["outbound_ratio"] = local_balance / capacity if capacity > 0 else 0
+    flow["balance_ratio"] = local_balance / (local_balance + remote_balance) if (local_balance + remote_balance) > 0 else 0.5
+    return flow
+
+def aggregate_policy(rows: List[ChannelInput]) -> Optional[Dict]:
+    """
+    Visão única da política do peer nos seus canais
+
+    Usa a mediana baixa de cada campo, que é sempre um valor realmente
+    anunciado pelo peer.
+
+    Args:
+        rows: Entradas dos canais do peer
+
+    Returns:
+        Política combinada ou None se o peer não tiver política conhecida
+    """
+    policies = [row.peer_fee_data for row in rows if row.peer_fee_data]
+    if not policies:
+        return None
+    return {
+        "timestamp": max(policy.get("timestamp", 0) for policy in policies),
+        "base_fee_msat": statistics.median_low(policy["base_fee_msat"] for policy in policies),
+        "fee_rate": statistics.median_low(policy["fee_rate"] for policy in policies),
+        "time_lock_delta": statistics.median_low(policy.get("time_lock_delta", 40) for policy in policies)
+    }
+
+def build_peer_aggregates(batch: List[ChannelInput], channel_stats: Dict) -> Dict[str, PeerAggregate]:
+    """
+    Agrupa o lote por peer e combina as entradas de cada peer
+
+    Peers com um único canal mantêm a entrada original do canal.
+
+    Args:
+        batch: Canais do lote
+        channel_stats: Estatísticas dos canais (para a capacidade)
+
+    Returns:
+        Agregados por remote_pubkey
+    """
+    groups: Dict[str, List[ChannelInput]] = {}
+    for row in batch:
+        groups.setdefault(row.remote_pubkey, []).append(row)
+
+    aggregates = {}
+    for pubkey, rows in groups.items():
+        rows.sort(key=lambda row: row.chan_id)
+        capacities = {}
+        for row in rows:
+            capacity = channel_stats.get(row.chan_id, {}).get("capacity")
+            if capacity is None:
+                capacity = row.flow_data.get("local_balance", 0) + row.flow_data.get("remote_balance", 0)
+            capacities[row.chan_id] = capacity
+
+        if len(rows) == 1:
+            flow_data, peer_fee_data = rows[0].flow_data, rows[0].peer_fee_data
+        else:
+            flow_data, peer_fee_data = aggregate_flow(rows, capacities), aggregate_policy(rows)
+        aggregates[pubkey] = PeerAggregate(pubkey, [row.chan_id for row in rows], capacities,
+                                           flow_data, peer_fee_data)
+    return aggregates
+
+def _combine_estimators(estimators: List[Dict], weights: List[int]) -> Dict:
+    """Combina os estimadores de fluxo dos canais de um peer"""
+    total_weight = sum(weights) or len(weights)
+    combined = {
+        "timestamp": max(item.get("timestamp", 0) for item in estimators),
+        "samples": min(item.get("samples", 0) for item in estimators),
+        "fee_changes_per_day": max(item.get("fee_changes_per_day", 0.0) for item in estimators)
+    }
+    for key in EWMA_RATIO_KEYS:
+        if all(key in item for item in estimators):
+            combined[key] = sum(item[key] * (weight or 1) for item, weight in zip(estimators, weights)) / total_weight
+    for key in EWMA_RATE_KEYS:
+        if all(key in item for item in estimators):
+            combined[key] = sum(item[key] for item in estimators)
+    return combined
+
+def aggregate_features(features: StrategyFeatures, aggregates: Dict[str, PeerAggregate]) -> StrategyFeatures:
+    """
+    Atributos por canal combinados para o canal representante de cada peer
+
+    Atributos por peer (medianas e quantis da rede) já são compartilhados e
+    não mudam. Médias móveis de proporções são ponderadas pela capacidade,
+    volumes e retas de demanda são somados e a centralidade é a do canal mais
+    central.
+
+    Args:
+        features: Atributos calculados por canal
+        aggregates: Agregados por peer
+
+    Returns:
+        Atributos indexados pelo canal representante de cada peer
+    """
+    ewma_flows = {}
+    volume_windows = {}
+    centrality = {}
+    demand = {}
+    for aggregate in aggregates.values():
+        representative = aggregate.channels[0]
+        if len(aggregate.channels) == 1:
+            for source, target in ((features.ewma_flows, ewma_flows), (features.volume_windows, volume_windows),
+                                   (features.centrality, centrality), (features.demand, demand)):
+                if representative in source:
+                    target[representative] = source[representative]
+            continue
+
+        estimators = [(features.ewma_flows[chan_id], aggregate.capacities[chan_id])
+                      for chan_id in aggregate.channels if chan_id in features.ewma_flows]
+        if estimators:
+            ewma_flows[representative] = _combine_estimators([item for item, _ in estimators],
+                                                             [weight for _, weight in estimators])
+
+        windows = [features.volume_windows[chan_id] for chan_id in aggregate.channels
+                   if chan_id in features.volume_windows]
+        if windows:
+            volume_windows[representative] = {
+                name: {"in": sum(totals[name]["in"] for totals in windows),
+                       "out": sum(totals[name]["out"] for totals in windows)}
+                for name in windows[0]
+            }
+
+        fits = [features.demand[chan_id] for chan_id in aggregate.channels if chan_id in features.demand]
+        if fits:
+            demand[representative] = combine_fits(fits)
+
+        scores = [features.centrality[chan_id] for chan_id in aggregate.channels if chan_id in features.centrality]
+        if scores:
+            centrality[representative] = max(scores, key=lambda score: score["betweenness"])
+
+    return StrategyFeatures(peer_medians=features.peer_medians, ewma_flows=ewma_flows,
+                            market_fees=features.market_fees, centrality=centrality,
+                            volume_windows=volume_windows, histories=features.histories,
+                            current_policies=features.current_policies, demand=demand)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Persistência atômica e assíncrona do estado do motor
+Este módulo grava os arquivos de estado em um arquivo temporário, sincroniza com
+o disco (fsync) e o renomeia sobre o original, de modo que uma queda no meio da
+gravação nunca deixa um arquivo corrompido. A gravação roda em uma thread
+própria, que junta vários pedidos seguidos em uma única escrita
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger("persistence")
+
+def _fsync_directory(directory: str) -> None:
+    """Sincroniza a entrada do diretório após a troca do arquivo (ignorado onde não é suportado)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def atomic_write_bytes(path: str, encoded: bytes) -> int:
+    """
+    Grava um arquivo de forma atômica
+
+    Args:
+        path: Caminho do arquivo
+        encoded: Conteúdo
+
+    Returns:
+        Número de bytes gravados
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(encoded)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    _fsync_directory(directory)
+    return len(encoded)
+
+def atomic_write_json(path: str, data, indent: Optional[int] = 2) -> int:
+    """
+    Grava um arquivo JSON de forma atômica
+
+    Args:
+        path: Caminho do arquivo
+        data: Conteúdo serializável em JSON
+        indent: Indentação do JSON
+
+    Returns:
+        Número de bytes gravados
+    """
+    return atomic_write_bytes(path, json.dumps(data, indent=indent).encode("utf-8"))
+
+class StateWriter:
+    """
+    Gravação dos arquivos de estado em segundo plano
+
+    Cada pedido traz o conteúdo completo de cada arquivo: estruturas
+    serializadas em JSON (por exemplo, as de um snapshot imutável) ou bytes já
+    serializados, gravados na ordem do pedido. Enquanto uma gravação está em
+    andamento, novos pedidos substituem o pendente: apenas o estado mais
+    recente é escrito. Sem a thread iniciada, os pedidos são gravados na hora.
+    """
+
+    def __init__(self, indent: Optional[int] = 2):
+        """
+        Inicializa o gravador
+
+        Args:
+            indent: Indentação dos arquivos JSON
+        """
+        self.indent = indent
+        self._condition = threading.Condition()
+        self._pending: Optional[Dict[str, object]] = None
+        self._writing = False
+        self._running = False
+        self._thread = None
+        self._stats = {
+            "requests": 0,
+            "writes": 0,
+            "coalesced": 0,
+            "errors": 0,
+            "last_latency_seconds": 0.0,
+            "max_latency_seconds": 0.0,
+            "last_bytes": 0,
+            "bytes_written": 0,
+            "last_write_at": 0
+        }
+
+    @property
+    def running(self) -> bool:
+        """Indica se a thread de gravação está ativa"""
+        return self._running
+
+    def start(self) -> None:
+        """Inicia a thread de gravação"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="state-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Grava o pedido pendente e para a thread
+
+        Args:
+            timeout: Tempo máximo de espera (segundos)
+        """
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def request(self, files: Dict[str, object]) -> None:
+        """
+        Pede a gravação do estado
+
+        Args:
+            files: Conteúdo de cada arquivo por caminho
+        """
+        with self._condition:
+            self._stats["requests"] += 1
+            if self._running:
+                if self._pending is not None:
+                    self._stats["coalesced"] += 1
+                self._pending = files
+                self._condition.notify_all()
+                return
+        self._write(files)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera até que não haja pedido pendente nem gravação em andamento
+
+        Args:
+            timeout: Tempo máximo de espera (segundos)
+
+        Returns:
+            True se tudo foi gravado dentro do prazo
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending is None and not self._writing, timeout)
+
+    def stats(self) -> Dict:
+        """
+        Obtém as métricas de gravação
+
+        Returns:
+            Pedidos, gravações, pedidos agrupados, erros, latência e bytes gravados
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats["pending"] = self._pending is not None
+            return stats
+
+    def _run(self) -> None:
+        """Loop da thread de gravação"""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None or not self._running)
+                files = self._pending
+                if files is None:
+                    return
+                self._pending = None
+                self._writing = True
+            try:
+                self._write(files)
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+    def _write(self, files: Dict[str, object]) -> None:
+        """Grava todos os arquivos de um pedido e registra as métricas"""
+        started = time.perf_counter()
+        written = 0
+        try:
+            for path, data in files.items():
+                if isinstance(data, bytes):
+                    written += atomic_write_bytes(path, data)
+                else:
+                    written += atomic_write_json(path, data, self.indent)
+        except Exception as e:
+            with self._condition:
+                self._stats["errors"] += 1
+            logger.error(f"Erro ao salvar estatísticas: {e}")
+            return
+
+        latency = time.perf_counter() - started
+        with self._condition:
+            self._stats["writes"] += 1
+            self._stats["last_latency_seconds"] = latency
+            self._stats["max_latency_seconds"] = max(self._stats["max_latency_seconds"], latency)
+            self._stats["last_bytes"] = written
+            self._stats["bytes_written"] += written
+            self._stats["last_write_at"] = int(time.time())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Histórico de políticas por eventos de mudança
+Este módulo grava as políticas de taxas (nossas e dos peers) apenas quando elas
+mudam. Cada registro vale do seu timestamp até o registro seguinte do mesmo
+canal, e last_seen indica a última coleta em que a política foi observada. A
+política vigente em um momento qualquer é obtida por busca binária
+"""
+
+from typing import Dict, List, Optional
+
+def policy_key(policy: Optional[Dict]) -> Optional[tuple]:
+    """
+    Forma canônica de uma política (base_fee_msat, fee_rate em ppm inteiro e time_lock_delta)
+
+    Políticas registradas após um envio e lidas de volta do LND ficam iguais.
+    """
+    if not policy:
+        return None
+    return (int(policy["base_fee_msat"]), int(round(policy["fee_rate"] * 1000000)),
+            int(policy.get("time_lock_delta", 40)))
+
+def _latest_index(history: List[Dict], chan_id: Optional[str]) -> int:
+    """Posição do registro mais recente do canal (-1 se não houver)"""
+    for index in range(len(history) - 1, -1, -1):
+        if chan_id is None or history[index].get("chan_id") == chan_id:
+            return index
+    return -1
+
+def record_policy(history: List[Dict], record: Dict) -> bool:
+    """
+    Grava uma observação de política no histórico
+
+    Se a política do canal não mudou, o registro vigente é substituído por uma
+    cópia com last_seen atualizado (registros gravados nunca são alterados,
+    pois podem estar em snapshots); senão, o registro é acrescentado.
+
+    Args:
+        history: Histórico de políticas (de um canal, ou de um peer com chan_id nos registros)
+        record: Política observada (timestamp, base_fee_msat, fee_rate, time_lock_delta)
+
+    Returns:
+        True se a política mudou e um novo registro foi acrescentado
+    """
+    index = _latest_index(history, record.get("chan_id"))
+    if index >= 0 and policy_key(history[index]) == policy_key(record):
+        current = history[index]
+        history[index] = dict(current, last_seen=max(current.get("last_seen", current["timestamp"]),
+                                                     record["timestamp"]))
+        return False
+
+    history.append(dict(record, last_seen=record["timestamp"]))
+    return True
+
+def compact_history(history: List[Dict]) -> List[Dict]:
+    """
+    Converte um histórico com um registro por coleta em eventos de mudança
+
+    Args:
+        history: Registros em ordem cronológica
+
+    Returns:
+        Novo histórico apenas com as mudanças
+    """
+    compacted = []
+    for record in history:
+        record_policy(compacted, record)
+    return compacted
+
+def policy_at(history: List[Dict], timestamp: int, chan_id: Optional[str] = None) -> Optional[Dict]:
+    """
+    Política vigente em um momento
+
+    Args:
+        history: Histórico de políticas em ordem cronológica
+        timestamp: Momento consultado
+        chan_id: Canal (para históricos de peers com vários canais)
+
+    Returns:
+        Registro vigente ou None se o momento for anterior ao primeiro registro
+    """
+    # Busca binária do último registro com timestamp <= timestamp
+    lower, upper = 0, len(history)
+    while lower < upper:
+        middle = (lower + upper) // 2
+        if history[middle]["timestamp"] <= timestamp:
+            lower = middle + 1
+        else:
+            upper = middle
+    index = lower - 1
+    while index >= 0:
+        if chan_id is None or history[index].get("chan_id") == chan_id:
+            return history[index]
+        index -= 1
+    return None
+
+def policy_applied(target: Dict, live: Optional[Dict], applied: Optional[Dict]) -> bool:
+    """
+    Indica se a política alvo já está em vigor no canal
+
+    A política observada mais recente (live) prevalece: se ela é igual à alvo,
+    não há o que enviar. O registro do último envio confirmado pelo LND
+    (applied, com applied_at) evita um novo envio da mesma política quando
+    nenhuma observação posterior ao envio mostra uma política diferente.
+
+    Args:
+        target: Política alvo
+        live: Registro mais recente do histórico de políticas do canal
+        applied: Última política enviada e confirmada pelo LND
+
+    Returns:
+        True se enviar a política alvo seria redundante
+    """
+    if live and policy_key(live) == policy_key(target):
+        return True
+    if not applied or policy_key(applied) != policy_key(target):
+        return False
+    return not live or live.get("last_seen", live["timestamp"]) < applied["applied_at"]
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Retenção em camadas do histórico dos canais
+Este módulo mantém, além das amostras brutas recentes, agregados diários e
+semanais de cada canal (saldo mínimo/máximo/médio, volume somado e
+taxas), atualizados a cada amostra, e escolhe a camada adequada para consultas
+por intervalo de tempo
+"""
+
+import bisect
+from typing import Dict, List, Optional
+
+from volume_deltas import interval_volumes
+
+# Camadas: nome -> (duração do bucket, retenção) em segundos, da mais fina para a mais grossa;
+# as amostras brutas já cobrem o período recente com resolução horária
+ROLLUP_TIERS = {
+    "daily": (86400, 3 * 365 * 86400),
+    "weekly": (7 * 86400, 10 * 365 * 86400)
+}
+
+def tier_key(tier: str) -> str:
+    """
+    Chave da camada nas estatísticas do canal
+
+    O sufixo _history faz os snapshots compartilharem os registros, que nunca
+    são alterados depois de gravados (um bucket atualizado é substituído).
+    """
+    return f"{tier}_history"
+
+def _new_record(start: int) -> Dict:
+    """Bucket vazio iniciado em start"""
+    return {
+        "start": start,
+        "samples": 0,
+        "balance_ratio_min": None,
+        "balance_ratio_max": None,
+        "balance_ratio_mean": None,
+        "volume_in": 0,
+        "volume_out": 0,
+        "fee_records": 0,
+        "fee_rate_min": None,
+        "fee_rate_max": None,
+        "fee_rate": None,
+        "base_fee_msat": None
+    }
+
+def _update_bucket(records: List[Dict], start: int, update) -> None:
+    """
+    Substitui (ou cria) o bucket iniciado em start pelo resultado de update
+
+    Amostras fora de ordem caem no bucket correto via bisect.
+    """
+    if records and records[-1]["start"] == start:
+        records[-1] = update(dict(records[-1]))
+        return
+    if not records or records[-1]["start"] < start:
+        records.append(update(_new_record(start)))
+        return
+
+    index = bisect.bisect_left([record["start"] for record in records], start)
+    if index < len(records) and records[index]["start"] == start:
+        records[index] = update(dict(records[index]))
+    else:
+        records.insert(index, update(_new_record(start)))
+
+def _trim(records: List[Dict], retention: int) -> None:
+    """Descarta buckets mais antigos que a retenção, contada a partir do mais recente"""
+    if not records:
+        return
+    cutoff = records[-1]["start"] - retention
+    index = 0
+    while index < len(records) and records[index]["start"] <= cutoff:
+        index += 1
+    if index:
+        del records[:index]
+
+def trim_tiers(channel: Dict) -> None:
+    """
+    Aplica a retenção de cada camada às estatísticas do canal
+
+    Args:
+        channel: Estatísticas do canal
+    """
+    for tier, (_, retention) in ROLLUP_TIERS.items():
+        records = channel.get(tier_key(tier))
+        if records:
+            _trim(records, retention)
+
+def add_flow_sample(channel: Dict, sample: Dict, volume_in: int, volume_out: int) -> None:
+    """
+    Soma uma amostra de fluxo aos buckets de todas as camadas do canal
+
+    Args:
+        channel: Estatísticas do canal
+        sample: Amostra de fluxo
+        volume_in: Volume de entrada do intervalo que termina na amostra
+        volume_out: Volume de saída do intervalo que termina na amostra
+    """
+    timestamp = sample.get("timestamp", 0)
+    ratio = sample["balance_ratio"]
+
+    def update(record):
+        record["samples"] += 1
+        if record["balance_ratio_mean"] is None:
+            record["balance_ratio_min"] = record["balance_ratio_max"] = record["balance_ratio_mean"] = ratio
+        else:
+            record["balance_ratio_min"] = min(record["balance_ratio_min"], ratio)
+            record["balance_ratio_max"] = max(record["balance_ratio_max"], ratio)
+            record["balance_ratio_mean"] += (ratio - record["balance_ratio_mean"]) / record["samples"]
+        record["volume_in"] += volume_in
+        record["volume_out"] += volume_out
+        return record
+
+    for tier, (bucket_seconds, retention) in ROLLUP_TIERS.items():
+        records = channel.setdefault(tier_key(tier), [])
+        _update_bucket(records, timestamp - timestamp % bucket_seconds, update)
+        _trim(records, retention)
+
+def add_fee_record(channel: Dict, fee_data: Dict) -> None:
+    """
+    Soma um registro de taxas aos buckets de todas as camadas do canal
+
+    Args:
+        channel: Estatísticas do canal
+        fee_data: Registro de taxas (nossa política)
+    """
+    timestamp = fee_data.get("timestamp", 0)
+    fee_rate = fee_data["fee_rate"]
+
+    def update(record):
+        record["fee_records"] += 1
+        if record["fee_rate"] is None:
+            record["fee_rate_min"] = record["fee_rate_max"] = fee_rate
+        else:
+            record["fee_rate_min"] = min(record["fee_rate_min"], fee_rate)
+            record["fee_rate_max"] = max(record["fee_rate_max"], fee_rate)
+        record["fee_rate"] = fee_rate
+        record["base_fee_msat"] = fee_data["base_fee_msat"]
+        return record
+
+    for tier, (bucket_seconds, retention) in ROLLUP_TIERS.items():
+        records = channel.setdefault(tier_key(tier), [])
+        _update_bucket(records, timestamp - timestamp % bucket_seconds, update)
+        _trim(records, retention)
+
+def bootstrap_rollups(channel: Dict) -> None:
+    """
+    Monta as camadas a partir do histórico bruto armazenado
+
+    Usado uma única vez para estados gravados antes das camadas existirem.
+
+    Args:
+        channel: Estatísticas do canal (flow_history e fee_history)
+    """
+    previous = None
+    for sample in channel.get("flow_history", []):
+        add_flow_sample(channel, sample, *interval_volumes(sample, previous))
+        previous = sample
+    for fee_data in channel.get("fee_history", []):
+        add_fee_record(channel, fee_data)
+
+def query_range(channel: Dict, start: int, end: int, tier: Optional[str] = None) -> Dict:
+    """
+    Consulta o histórico de um canal em um intervalo de tempo
+
+    Sem camada explícita, usa as amostras brutas se elas cobrem o início do
+    intervalo; senão, a camada mais fina que o cobre; senão, a mais grossa.
+
+    Args:
+        channel: Estatísticas do canal
+        start: Início do intervalo
+        end: Fim do intervalo
+        tier: Camada ("raw", "daily" ou "weekly"), opcional
+
+    Returns:
+        Camada usada e registros do intervalo
+    """
+    if tier is None:
+        raw = channel.get("flow_history", [])
+        if raw and raw[0].get("timestamp", 0) <= start:
+            tier = "raw"
+        else:
+            covering = [name for name in ROLLUP_TIERS
+                        if channel.get(tier_key(name)) and channel[tier_key(name)][0]["start"] <= start]
+            tier = covering[0] if covering else list(ROLLUP_TIERS)[-1]
+
+    if tier == "raw":
+        records = channel.get("flow_history", [])
+        timestamps = [record.get("timestamp", 0) for record in records]
+        lower = bisect.bisect_left(timestamps, start)
+        upper = bisect.bisect_right(timestamps, end)
+        return {"tier": tier, "records": records[lower:upper]}
+
+    if tier not in ROLLUP_TIERS:
+        raise ValueError(f"Camada desconhecida: {tier}")
+
+    # Buckets que se sobrepõem ao intervalo
+    bucket_seconds = ROLLUP_TIERS[tier][0]
+    records = channel.get(tier_key(tier), [])
+    starts = [record["start"] for record in records]
+    lower = bisect.bisect_right(starts, start - bucket_seconds)
+    upper = bisect.bisect_right(starts, end)
+    return {"tier": tier, "bucket_seconds": bucket_seconds, "records": records[lower:upper]}
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Perfis sazonais de demanda e agendas de taxas
+Este módulo mantém, para cada canal, a curva de demanda por hora da semana (168
+horas: dia da semana e hora do dia, em UTC), atualizada em O(1) a cada amostra, e
+converte a curva em uma agenda de taxas pré-calculada: a taxa proporcional de
+cada hora da semana, guardada apenas nas horas em que ela muda. O agendador
+consulta a agenda por busca binária na virada de cada hora, sem recalcular as
+estratégias
+"""
+
+import time
+import bisect
+from typing import Dict, List, Optional
+
+from volume_deltas import interval_volumes
+
+# Horas da semana (dia da semana * 24 + hora do dia)
+HOURS_PER_WEEK = 7 * 24
+
+# Peso mínimo de cada nova observação de uma hora da semana (meia-vida de 4 semanas)
+PROFILE_ALPHA = 1 - 0.5 ** (1 / 4)
+
+def hour_of_week(timestamp: float) -> int:
+    """Hora da semana de um momento, em UTC (0 = segunda-feira, 0h)"""
+    moment = time.gmtime(timestamp)
+    return moment.tm_wday * 24 + moment.tm_hour
+
+def update_profile(profile: Optional[Dict], timestamp: int, volume: float, elapsed: float) -> Dict:
+    """
+    Acrescenta um intervalo de encaminhamento à curva semanal
+
+    O volume por hora do intervalo entra na hora da semana do seu ponto médio,
+    como média das observações dessa hora (média móvel depois das primeiras).
+    Um novo dicionário é devolvido; o anterior não é alterado, então ele pode
+    continuar exposto em snapshots.
+
+    Args:
+        profile: Curva atual (None para começar)
+        timestamp: Fim do intervalo
+        volume: Volume encaminhado para fora no intervalo (sats)
+        elapsed: Duração do intervalo (segundos)
+
+    Returns:
+        Curva atualizada (rates e samples por hora da semana)
+    """
+    if profile is None:
+        profile = {"rates": [0.0] * HOURS_PER_WEEK, "samples": [0] * HOURS_PER_WEEK}
+    if elapsed <= 0:
+        return profile
+
+    hour = hour_of_week(timestamp - elapsed / 2)
+    rates = list(profile["rates"])
+    samples = list(profile["samples"])
+    samples[hour] += 1
+    alpha = max(1 / samples[hour], PROFILE_ALPHA)
+    rates[hour] += alpha * (volume / (elapsed / 3600) - rates[hour])
+    return {"rates": rates, "samples": samples}
+
+def combine_profiles(profiles: List[Dict]) -> Dict:
+    """
+    Curva de um conjunto de canais com a mesma taxa (volumes somados)
+
+    Args:
+        profiles: Curvas dos canais
+
+    Returns:
+        Curva combinada
+    """
+    return {
+        "rates": [sum(values) for values in zip(*(profile["rates"] for profile in profiles))],
+        "samples": [min(values) for values in zip(*(profile["samples"] for profile in profiles))]
+    }
+
+def demand_multipliers(profile: Optional[Dict], min_samples: int = 2,
+                       max_multiplier: float = 2.0) -> Optional[List[float]]:
+    """
+    Demanda relativa de cada hora da semana
+
+    Horas com menos de min_samples observações valem 1 (demanda média).
+
+    Args:
+        profile: Curva do canal
+        min_samples: Observações mínimas de uma hora da semana
+        max_multiplier: Limite da demanda relativa (e do seu inverso)
+
+    Returns:
+        168 multiplicadores ou None se a curva não tiver horas suficientes ou volume
+    """
+    if not profile:
+        return None
+    covered = [rate for rate, samples in zip(profile["rates"], profile["samples"]) if samples >= min_samples]
+    if not covered:
+        return None
+    mean = sum(covered) / len(covered)
+    if mean <= 0:
+        return None
+
+    return [max(1 / max_multiplier, min(max_multiplier, rate / mean)) if samples >= min_samples else 1.0
+            for rate, samples in zip(profile["rates"], profile["samples"])]
+
+def build_schedule(policy: Dict, multipliers: List[float], config: Dict) -> Dict:
+    """
+    Agenda semanal da taxa proporcional a partir da política calculada pela estratégia
+
+    A taxa de cada hora é a taxa da estratégia multiplicada por
+    1 + seasonal_strength * (demanda relativa - 1), com o fator arredondado para
+    múltiplos de seasonal_step, para que pequenas diferenças entre horas
+    vizinhas não gerem novas políticas. A taxa base e o time_lock_delta não mudam.
+
+    Args:
+        policy: Política calculada pela estratégia
+        multipliers: Demanda relativa de cada hora da semana
+        config: Configuração do gerenciador
+
+    Returns:
+        Agenda com a taxa base, o time_lock_delta, a taxa da estratégia sem
+        modulação (strategy_fee_rate) e as horas da semana em que a taxa muda
+        (hours), com a taxa em ppm de cada uma (fee_rates_ppm)
+    """
+    min_fee_rate_ppm = config["min_fee_rate"] * 1000000
+    max_fee_rate_ppm = config["max_fee_rate"] * 1000000
+    strength = config.get("seasonal_strength", 0.5)
+    step = config.get("seasonal_step", 0.1)
+    fee_rate_ppm = policy["fee_rate"] * 1000000
+
+    hours = []
+    fee_rates_ppm = []
+    for hour, multiplier in enumerate(multipliers):
+        factor = 1 + strength * (multiplier - 1)
+        if step > 0:
+            factor = round(factor / step) * step
+        hour_ppm = int(round(max(min_fee_rate_ppm, min(max_fee_rate_ppm, fee_rate_ppm * factor))))
+        if not fee_rates_ppm or fee_rates_ppm[-1] != hour_ppm:
+            hours.append(hour)
+            fee_rates_ppm.append(hour_ppm)
+
+    return {
+        "base_fee_msat": policy["base_fee_msat"],
+        "time_lock_delta": policy["time_lock_delta"],
+        "strategy_fee_rate": policy["fee_rate"],
+        "hours": hours,
+        "fee_rates_ppm": fee_rates_ppm
+    }
+
+def scheduled_policy(schedule: Dict, hour: int) -> Dict:
+    """
+    Política da agenda em uma hora da semana
+
+    Args:
+        schedule: Agenda (build_schedule)
+        hour: Hora da semana
+
+    Returns:
+        Política (base_fee_msat, fee_rate e time_lock_delta)
+    """
+    index = bisect.bisect_right(schedule["hours"], hour) - 1
+    return {
+        "base_fee_msat": schedule["base_fee_msat"],
+        "fee_rate": schedule["fee_rates_ppm"][index] / 1000000,
+        "time_lock_delta": schedule["time_lock_delta"]
+    }
+
+def bootstrap_profile(channel: Dict) -> Optional[Dict]:
+    """
+    Reconstrói a curva de um canal a partir do histórico de fluxo armazenado
+
+    Usado uma única vez para estados gravados antes das curvas existirem.
+
+    Args:
+        channel: Estatísticas do canal (flow_history)
+
+    Returns:
+        Curva ou None se não houver intervalos
+    """
+    profile = None
+    previous = None
+    for sample in channel.get("flow_history", []):
+        if previous is not None:
+            _, volume_out = interval_volumes(sample, previous)
+            profile = update_profile(profile, sample["timestamp"], volume_out,
+                                     sample["timestamp"] - previous["timestamp"])
+        previous = sample
+    return profile
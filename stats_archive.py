@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Arquivo de estatísticas de canais fechados e peers que saíram
+Este módulo identifica canais e peers ausentes da lista de canais abertos por
+mais tempo que o período de tolerância e move o histórico deles para um arquivo
+compactado (JSON Lines com gzip), fora do conjunto de trabalho do motor
+"""
+
+import gzip
+import json
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# Arquivo padrão do histórico arquivado
+ARCHIVE_PATH = "stats_archive.jsonl.gz"
+
+# Período padrão de tolerância antes de arquivar (segundos)
+DEFAULT_GRACE_SECONDS = 7 * 86400
+
+def channel_last_seen(channel: Dict) -> int:
+    """Último momento em que o canal apareceu aberto (ou a amostra de fluxo mais recente)"""
+    if "last_seen" in channel:
+        return channel["last_seen"]
+    history = channel.get("flow_history")
+    return history[-1].get("timestamp", 0) if history else 0
+
+def peer_last_seen(records: List[Dict]) -> int:
+    """Última observação de uma política do peer"""
+    return max((record.get("last_seen", record.get("timestamp", 0)) for record in records), default=0)
+
+def select_stale(channel_stats: Dict, peer_fees: Dict, open_channels: Set[str], open_peers: Set[str],
+                 now: int, grace_seconds: int = DEFAULT_GRACE_SECONDS) -> Tuple[List[str], List[str]]:
+    """
+    Seleciona canais e peers que devem ser arquivados
+
+    Args:
+        channel_stats: Estatísticas dos canais
+        peer_fees: Histórico de taxas dos peers
+        open_channels: IDs dos canais abertos na coleta atual
+        open_peers: Peers com pelo menos um canal aberto
+        now: Momento atual
+        grace_seconds: Tempo mínimo de ausência
+
+    Returns:
+        Tupla (chan_ids, pubkeys) ausentes há mais que o período de tolerância
+    """
+    cutoff = now - grace_seconds
+    channels = [chan_id for chan_id, channel in channel_stats.items()
+                if chan_id not in open_channels and channel_last_seen(channel) < cutoff]
+    peers = [pubkey for pubkey, records in peer_fees.items()
+             if pubkey not in open_peers and peer_last_seen(records) < cutoff]
+    return channels, peers
+
+def archive_entries(entries: List[Dict], path: str = ARCHIVE_PATH) -> int:
+    """
+    Acrescenta entradas ao arquivo compactado
+
+    Cada chamada grava um novo membro gzip no fim do arquivo, então o conteúdo
+    já arquivado não é reescrito.
+
+    Args:
+        entries: Entradas com kind ("channel" ou "peer"), key e data
+        path: Caminho do arquivo
+
+    Returns:
+        Número de entradas gravadas
+    """
+    if not entries:
+        return 0
+    archived_at = int(time.time())
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(dict(entry, archived_at=archived_at)) + "\n")
+    return len(entries)
+
+def read_archive(path: str = ARCHIVE_PATH, kind: Optional[str] = None,
+                 key: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Lê as entradas arquivadas
+
+    Args:
+        path: Caminho do arquivo
+        kind: Filtrar por tipo ("channel" ou "peer")
+        key: Filtrar por chan_id ou pubkey
+
+    Yields:
+        Entradas na ordem em que foram arquivadas
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if kind is not None and entry["kind"] != kind:
+                    continue
+                if key is not None and entry["key"] != key:
+                    continue
+                yield entry
+    except FileNotFoundError:
+        return
@@ -0,0 +1,835 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Estratégias de taxas
+Este módulo implementa o registro de estratégias por nome, a interface em lote
+(todos os canais de uma vez, com atributos pré-calculados compartilhados) e um
+benchmark de desempenho de cada estratégia sobre dados sintéticos
+"""
+
+import time
+import json
+import random
+import hashlib
+import logging
+import statistics
+import tracemalloc
+from typing import Dict, Iterable, List, Optional
+
+from engine_snapshot import FrozenDict
+from demand_model import bootstrap_demand, fit_demand_batch, revenue_maximizing_fee
+from flow_estimators import bootstrap_estimators
+from policy_history import policy_key
+from volume_deltas import bootstrap_windows, window_totals
+
+logger = logging.getLogger("strategies")
+
+# Atributos do lote que as estratégias podem declarar em feature_keys
+FEATURE_KEYS = ("peer_medians", "ewma_flows", "market_fees", "centrality", "volume_windows",
+                "current_policies", "demand")
+
+class ChannelInput:
+    """Entrada de um canal para o cálculo das taxas"""
+
+    __slots__ = ("chan_id", "remote_pubkey", "flow_data", "peer_fee_data")
+
+    def __init__(self, chan_id: str, remote_pubkey: str, flow_data: Dict, peer_fee_data: Optional[Dict]):
+        """
+        Inicializa a entrada
+
+        Args:
+            chan_id: ID do canal
+            remote_pubkey: Chave pública do peer
+            flow_data: Amostra de fluxo mais recente
+            peer_fee_data: Taxas mais recentes do peer para este canal
+        """
+        self.chan_id = chan_id
+        self.remote_pubkey = remote_pubkey
+        self.flow_data = flow_data
+        self.peer_fee_data = peer_fee_data
+
+class StrategyFeatures:
+    """Atributos pré-calculados uma vez por lote e compartilhados pelas estratégias"""
+
+    def __init__(self, peer_medians: Optional[Dict[str, Dict]] = None,
+                 ewma_flows: Optional[Dict[str, Dict]] = None,
+                 market_fees: Optional[Dict[str, Dict]] = None,
+                 centrality: Optional[Dict[str, Dict]] = None,
+                 volume_windows: Optional[Dict[str, Dict]] = None,
+                 histories: Optional[Dict[str, Dict]] = None,
+                 current_policies: Optional[Dict[str, Dict]] = None,
+                 demand: Optional[Dict[str, Dict]] = None):
+        """
+        Inicializa os atributos
+
+        Args:
+            peer_medians: Mediana das taxas de cada peer (por remote_pubkey)
+            ewma_flows: Estimadores de fluxo por média móvel exponencial (por chan_id)
+            market_fees: Quantis das taxas da rede para chegar a cada peer (por remote_pubkey)
+            centrality: Centralidade de intermediação dos canais (por chan_id)
+            volume_windows: Volume encaminhado nas janelas de 1h, 24h e 7d (por chan_id)
+            histories: Históricos completos pedidos pela estratégia em history_keys (por chan_id)
+            current_policies: Nossa política em vigor em cada canal (por chan_id)
+            demand: Retas de demanda ajustadas (volume por hora contra a taxa em ppm, por chan_id)
+        """
+        self.peer_medians = peer_medians or {}
+        self.ewma_flows = ewma_flows or {}
+        self.market_fees = market_fees or {}
+        self.centrality = centrality or {}
+        self.volume_windows = volume_windows or {}
+        self.histories = histories or {}
+        self.current_policies = current_policies or {}
+        self.demand = demand or {}
+
+    @classmethod
+    def compute(cls, batch: List[ChannelInput], channel_stats: Dict, peer_fees: Dict,
+                graph_index=None, centrality: Optional[Dict[str, Dict]] = None,
+                feature_keys: Optional[Iterable[str]] = None) -> "StrategyFeatures":
+        """
+        Calcula os atributos para um lote de canais
+
+        Estados que faltam nas estatísticas (estimadores, janelas de volume e
+        modelo de demanda) são reconstruídos a partir do histórico e gravados de
+        volta no canal, para que a varredura aconteça uma única vez; estatísticas
+        de um snapshot imutável não são alteradas.
+
+        Args:
+            batch: Canais do lote
+            channel_stats: Estatísticas dos canais
+            peer_fees: Histórico de taxas dos peers
+            graph_index: Índice de quantis de taxas da rede (FeeQuantileIndex), opcional
+            centrality: Centralidade calculada por GraphAnalytics (por chan_id), opcional
+            feature_keys: Atributos a calcular (FeeStrategy.feature_keys; padrão: todos)
+
+        Returns:
+            Atributos do lote
+        """
+        wanted = set(FEATURE_KEYS if feature_keys is None else feature_keys)
+
+        peer_medians = {}
+        if "peer_medians" in wanted:
+            for pubkey in {row.remote_pubkey for row in batch}:
+                # Política mais recente de cada canal do peer
+                latest = {}
+                for record in reversed(peer_fees.get(pubkey, [])):
+                    latest.setdefault(record.get("chan_id"), record)
+                if latest:
+                    peer_medians[pubkey] = {
+                        "base_fee_msat": statistics.median(record["base_fee_msat"] for record in latest.values()),
+                        "fee_rate": statistics.median(record["fee_rate"] for record in latest.values())
+                    }
+
+        # Estimadores mantidos incrementalmente pelo FeeManager (O(1) por canal)
+        ewma_flows = {}
+        if "ewma_flows" in wanted:
+            for row in batch:
+                channel = channel_stats.get(row.chan_id)
+                if not channel:
+                    continue
+                estimators = _channel_state(channel, "estimators", bootstrap_estimators)
+                if estimators:
+                    ewma_flows[row.chan_id] = estimators
+
+        # Totais das janelas móveis no momento da amostra mais recente
+        volume_windows = {}
+        if "volume_windows" in wanted:
+            for row in batch:
+                channel = channel_stats.get(row.chan_id)
+                if not channel:
+                    continue
+                windows = _channel_state(channel, "volume_windows",
+                                         lambda channel: bootstrap_windows(channel.get("flow_history", [])))
+                if windows:
+                    volume_windows[row.chan_id] = window_totals(windows, row.flow_data.get("timestamp", 0))
+
+        market_fees = {}
+        if "market_fees" in wanted and graph_index is not None:
+            for pubkey in {row.remote_pubkey for row in batch}:
+                quantiles = graph_index.node_quantiles(pubkey)
+                if quantiles:
+                    market_fees[pubkey] = quantiles
+
+        # Modelos de demanda mantidos incrementalmente pelo FeeManager, ajustados canal a canal
+        demand = {}
+        if "demand" in wanted:
+            demands = {}
+            for row in batch:
+                channel = channel_stats.get(row.chan_id)
+                if channel:
+                    demands[row.chan_id] = _channel_state(channel, "demand", bootstrap_demand)
+            demand = fit_demand_batch(demands)
+
+        # Registro mais recente do histórico de taxas (mantido também com lazy_history)
+        current_policies = {}
+        if "current_policies" in wanted:
+            for row in batch:
+                fee_history = channel_stats.get(row.chan_id, {}).get("fee_history")
+                if fee_history:
+                    current_policies[row.chan_id] = fee_history[-1]
+
+        # Apenas os canais do lote; a consulta é O(1) por canal
+        channel_centrality = {}
+        if "centrality" in wanted and centrality:
+            for row in batch:
+                if row.chan_id in centrality:
+                    channel_centrality[row.chan_id] = centrality[row.chan_id]
+
+        return cls(peer_medians=peer_medians, ewma_flows=ewma_flows, market_fees=market_fees,
+                   centrality=channel_centrality, volume_windows=volume_windows,
+                   current_policies=current_policies, demand=demand)
+
+def _channel_state(channel: Dict, key: str, bootstrap) -> Optional[Dict]:
+    """
+    Estado incremental de um canal, reconstruído a partir do histórico quando falta
+
+    O resultado da reconstrução (mesmo vazio) é gravado no canal, exceto em
+    snapshots imutáveis; o FeeManager o atualiza a partir daí a cada coleta.
+    """
+    if key in channel:
+        return channel[key]
+    state = bootstrap(channel)
+    if not isinstance(channel, FrozenDict):
+        channel[key] = state
+    return state
+
+class FeeStrategy:
+    """
+    Interface das estratégias de taxas
+
+    Subclasses definem name, incrementam version quando a lógica muda e
+    implementam compute(); compute_batch() pode ser sobrescrito quando a
+    estratégia se beneficia de processar o lote inteiro.
+    """
+
+    name = None
+    version = 1
+    description = ""
+
+    # Chaves de configuração que influenciam compute() (None: a configuração inteira)
+    config_keys = None
+
+    # Históricos completos consultados por compute() (features.histories); com
+    # lazy_history eles são lidos do armazenamento a cada cálculo
+    history_keys = ()
+
+    # Atributos do lote consultados por compute() e fingerprint_features()
+    # (None: todos os de FEATURE_KEYS); os demais não são calculados
+    feature_keys = None
+
+    def compute(self, row: ChannelInput, features: StrategyFeatures, config: Dict) -> Dict:
+        """
+        Calcula as taxas de um canal
+
+        Args:
+            row: Entrada do canal
+            features: Atributos pré-calculados do lote
+            config: Configuração do gerenciador
+
+        Returns:
+            Dicionário com base_fee_msat, fee_rate e time_lock_delta
+        """
+        raise NotImplementedError
+
+    def compute_batch(self, batch: List[ChannelInput], features: StrategyFeatures, config: Dict) -> Dict[str, Dict]:
+        """
+        Calcula as taxas de todos os canais do lote
+
+        Args:
+            batch: Canais do lote
+            features: Atributos pré-calculados do lote
+            config: Configuração do gerenciador
+
+        Returns:
+            Taxas por chan_id
+        """
+        return {row.chan_id: self.compute(row, features, config) for row in batch}
+
+    def fingerprint_features(self, row: ChannelInput, features: StrategyFeatures, config: Dict) -> Dict:
+        """
+        Atributos pré-calculados usados por compute() para o canal
+
+        A implementação padrão inclui todos os atributos do canal e do peer
+        (sem os campos de controle dos estimadores); estratégias que usam apenas
+        parte deles devem sobrescrever este método para evitar recálculos
+        desnecessários.
+        """
+        ewma = features.ewma_flows.get(row.chan_id)
+        return {
+            "peer_median": features.peer_medians.get(row.remote_pubkey),
+            "ewma": {key: value for key, value in ewma.items()
+                     if key not in ("timestamp", "samples")} if ewma else None,
+            "market": features.market_fees.get(row.remote_pubkey),
+            "centrality": features.centrality.get(row.chan_id),
+            "volume_windows": features.volume_windows.get(row.chan_id)
+        }
+
+    def fingerprint(self, row: ChannelInput, features: StrategyFeatures, config: Dict,
+                    current_policy: Optional[Dict] = None) -> str:
+        """
+        Impressão digital das entradas do canal
+
+        Se nada mudou desde o último envio (saldos, política do peer, chaves de
+        configuração relevantes, versão da estratégia e a política em vigor no
+        canal), o resultado de compute() também não muda.
+
+        Args:
+            row: Entrada do canal
+            features: Atributos pré-calculados do lote
+            config: Configuração do gerenciador
+            current_policy: Política em vigor no canal (base_fee_msat e fee_rate)
+
+        Returns:
+            Hash hexadecimal das entradas
+        """
+        keys = self.config_keys if self.config_keys is not None else sorted(config)
+        payload = {
+            "strategy": [self.name, self.version],
+            "config": {key: config.get(key) for key in keys},
+            "flow": {key: value for key, value in row.flow_data.items()
+                     if key != "timestamp" and not key.endswith("_total")},
+            "peer": policy_key(row.peer_fee_data),
+            "features": self.fingerprint_features(row, features, config),
+            "policy": policy_key(current_policy)
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode()
+        return hashlib.sha1(encoded).hexdigest()
+
+# Limites de taxas usados por todas as estratégias embutidas
+FEE_LIMIT_KEYS = ("min_base_fee_msat", "max_base_fee_msat", "min_fee_rate", "max_fee_rate", "time_lock_delta")
+
+# Estratégias registradas por nome
+_REGISTRY: Dict[str, FeeStrategy] = {}
+
+def register_strategy(cls):
+    """
+    Registra uma estratégia pelo seu nome (pode ser usado como decorador)
+
+    Args:
+        cls: Subclasse de FeeStrategy
+
+    Returns:
+        A própria classe
+    """
+    if not cls.name:
+        raise ValueError(f"Estratégia {cls.__name__} sem nome")
+    _REGISTRY[cls.name] = cls()
+    return cls
+
+def unregister_strategy(name: str) -> None:
+    """
+    Remove uma estratégia do registro
+
+    Args:
+        name: Nome da estratégia
+    """
+    _REGISTRY.pop(name, None)
+
+def get_strategy(name: str) -> FeeStrategy:
+    """
+    Obtém uma estratégia registrada
+
+    Args:
+        name: Nome da estratégia
+
+    Returns:
+        Instância da estratégia
+
+    Raises:
+        KeyError: Se a estratégia não estiver registrada
+    """
+    return _REGISTRY[name]
+
+def available_strategies() -> List[str]:
+    """Lista os nomes das estratégias registradas"""
+    return sorted(_REGISTRY)
+
+@register_strategy
+class BalancedStrategy(FeeStrategy):
+    """Taxas que consideram tanto o fluxo quanto as taxas dos peers"""
+
+    name = "balanced"
+    version = 2
+    description = "Equilibra o fluxo do canal e as taxas dos peers"
+    config_keys = FEE_LIMIT_KEYS + ("flow_weight", "peer_weight", "high_flow_threshold",
+                                    "low_flow_threshold", "smooth_flow")
+    feature_keys = ("ewma_flows",)
+
+    def fingerprint_features(self, row: ChannelInput, features: StrategyFeatures, config: Dict) -> Dict:
+        smoothed = features.ewma_flows.get(row.chan_id) if config.get("smooth_flow") else None
+        if not smoothed:
+            return {}
+        return {"inbound_ratio": smoothed["inbound_ratio"], "outbound_ratio": smoothed["outbound_ratio"]}
+
+    def compute(self, row: ChannelInput, features: StrategyFeatures, config: Dict) -> Dict:
+        # Parâmetros de configuração
+        min_base_fee = config["min_base_fee_msat"]
+        max_base_fee = config["max_base_fee_msat"]
+        min_fee_rate = config["min_fee_rate"]
+        max_fee_rate = config["max_fee_rate"]
+        flow_weight = config["flow_weight"]
+        peer_weight = config["peer_weight"]
+        high_flow = config["high_flow_threshold"]
+        low_flow = config["low_flow_threshold"]
+
+        flow_data = row.flow_data
+        peer_fee_data = row.peer_fee_data
+
+        # Calcular fator de fluxo
+        inbound_ratio = flow_data["inbound_ratio"]
+        outbound_ratio = flow_data["outbound_ratio"]
+
+        # Com smooth_flow, usar as médias móveis para que um único HTLC grande
+        # não mude a classe de fluxo do canal
+        smoothed = features.ewma_flows.get(row.chan_id) if config.get("smooth_flow") else None
+        if smoothed:
+            inbound_ratio = smoothed["inbound_ratio"]
+            outbound_ratio = smoothed["outbound_ratio"]
+
+        # Se o canal está desequilibrado (muito inbound ou muito outbound)
+        # ajustar as taxas para incentivar o fluxo na direção oposta
+        if inbound_ratio > high_flow:
+            # Muito inbound, reduzir taxas para incentivar outbound
+            flow_factor = 0.2
+        elif outbound_ratio > high_flow:
+            # Muito outbound, aumentar taxas para desincentivar mais outbound
+            flow_factor = 0.8
+        elif inbound_ratio < low_flow:
+            # Pouco inbound, aumentar taxas para preservar liquidez outbound
+            flow_factor = 0.7
+        elif outbound_ratio < low_flow:
+            # Pouco outbound, reduzir taxas para atrair inbound
+            flow_factor = 0.3
+        else:
+            # Canal bem balanceado, usar taxas moderadas
+            flow_factor = 0.5
+
+        # Calcular fator de peer
+        peer_factor = 0.5  # Valor padrão
+
+        if peer_fee_data:
+            peer_base_fee = peer_fee_data["base_fee_msat"]
+            peer_fee_rate = peer_fee_data["fee_rate"]
+
+            # Normalizar as taxas do peer em relação aos nossos limites
+            norm_peer_base_fee = (peer_base_fee - min_base_fee) / (max_base_fee - min_base_fee)
+            norm_peer_base_fee = max(0, min(1, norm_peer_base_fee))
+
+            norm_peer_fee_rate = (peer_fee_rate - min_fee_rate) / (max_fee_rate - min_fee_rate)
+            norm_peer_fee_rate = max(0, min(1, norm_peer_fee_rate))
+
+            # Média das taxas normalizadas do peer
+            peer_factor = (norm_peer_base_fee + norm_peer_fee_rate) / 2
+
+        # Combinar fatores com pesos
+        combined_factor = flow_factor * flow_weight + peer_factor * peer_weight
+
+        # Calcular taxas finais
+        base_fee_msat = int(min_base_fee + combined_factor * (max_base_fee - min_base_fee))
+        fee_rate = min_fee_rate + combined_factor * (max_fee_rate - min_fee_rate)
+
+        return {
+            "base_fee_msat": base_fee_msat,
+            "fee_rate": fee_rate,
+            "time_lock_delta": config["time_lock_delta"]
+        }
+
+@register_strategy
+class CompetitiveStrategy(FeeStrategy):
+    """Taxas ligeiramente menores que as dos peers"""
+
+    name = "competitive"
+    version = 2
+    description = "Cobra 10% menos que o peer (ou que a mediana da rede)"
+    config_keys = FEE_LIMIT_KEYS + ("use_market_fees",)
+    feature_keys = ("market_fees",)
+
+    def fingerprint_features(self, row: ChannelInput, features: StrategyFeatures, config: Dict) -> Dict:
+        market = features.market_fees.get(row.remote_pubkey) if config.get("use_market_fees") else None
+        if not market:
+            return {}
+        return {"base_fee_msat": market["base_fee_msat"]["p50"], "fee_rate_ppm": market["fee_rate_ppm"]["p50"]}
+
+    def compute(self, row: ChannelInput, features: StrategyFeatures, config: Dict) -> Dict:
+        # Parâmetros de configuração
+        min_base_fee = config["min_base_fee_msat"]
+        max_base_fee = config["max_base_fee_msat"]
+        min_fee_rate = config["min_fee_rate"]
+        max_fee_rate = config["max_fee_rate"]
+
+        # Valores padrão
+        base_fee_msat = min_base_fee
+        fee_rate = min_fee_rate
+
+        peer_fee_data = row.peer_fee_data
+
+        # Opcionalmente, usar como referência a mediana do que a rede cobra para
+        # chegar ao peer em vez da taxa que o próprio peer cobra de volta
+        market = features.market_fees.get(row.remote_pubkey) if config.get("use_market_fees") else None
+        if market:
+            peer_fee_data = {
+                "base_fee_msat": market["base_fee_msat"]["p50"],
+                "fee_rate": market["fee_rate_ppm"]["p50"] / 1000000
+            }
+
+        if peer_fee_data:
+            # Definir taxas ligeiramente menores que as do peer (10% menores)
+            base_fee_msat = int(peer_fee_data["base_fee_msat"] * 0.9)
+            fee_rate = peer_fee_data["fee_rate"] * 0.9
+
+            # Garantir que as taxas estejam dentro dos limites
+            base_fee_msat = max(min_base_fee, min(max_base_fee, base_fee_msat))
+            fee_rate = max(min_fee_rate, min(max_fee_rate, fee_rate))
+
+        return {
+            "base_fee_msat": base_fee_msat,
+            "fee_rate": fee_rate,
+            "time_lock_delta": config["time_lock_delta"]
+        }
+
+@register_strategy
+class ProfitableStrategy(FeeStrategy):
+    """Taxas que maximizam o lucro com base no histórico de encaminhamento"""
+
+    name = "profitable"
+    version = 4
+    description = "Taxa proporcional que maximiza a receita pela demanda estimada do canal"
+    config_keys = FEE_LIMIT_KEYS + ("use_elasticity", "elasticity_min_hours", "elasticity_explore_ratio")
+    feature_keys = ("demand", "current_policies")
+
+    def _demand_fit(self, row: ChannelInput, features: StrategyFeatures, config: Dict) -> Optional[Dict]:
+        """Reta de demanda do canal, se a estimativa estiver habilitada e tiver histórico suficiente"""
+        if not config.get("use_elasticity"):
+            return None
+        fit = features.demand.get(row.chan_id)
+        if not fit or fit["weight"] < config.get("elasticity_min_hours", 72):
+            return None
+        return fit
+
+    def fingerprint_features(self, row: ChannelInput, features: StrategyFeatures, config: Dict) -> Dict:
+        fit = self._demand_fit(row, features, config)
+        if not fit:
+            return {}
+        current = features.current_policies.get(row.chan_id)
+        return {"demand": fit, "fee_rate": current["fee_rate"] if current else None}
+
+    def compute(self, row: ChannelInput, features: StrategyFeatures, config: Dict) -> Dict:
+        # Parâmetros de configuração
+        min_base_fee = config["min_base_fee_msat"]
+        max_base_fee = config["max_base_fee_msat"]
+        min_fee_rate = config["min_fee_rate"]
+        max_fee_rate = config["max_fee_rate"]
+
+        # Sem reta de demanda, aproximar a elasticidade pelo volume do último intervalo
+        # forwarding_volume_out é o volume encaminhado no intervalo desde a amostra
+        # anterior (não o contador acumulado do canal)
+        forwarding_volume = row.flow_data.get("forwarding_volume_out", 0)
+
+        if forwarding_volume > 0:
+            # Canal com alto volume pode suportar taxas mais altas
+            volume_factor = min(1.0, forwarding_volume / 1000000)  # Normalizar para 1M sats
+        else:
+            # Sem volume, usar taxas mais baixas para atrair fluxo
+            volume_factor = 0.2
+
+        # Calcular taxas com base no volume e nas taxas do peer
+        peer_fee_data = row.peer_fee_data
+        if peer_fee_data:
+            # Usar taxas do peer como referência, ajustadas pelo volume
+            factor = 0.8 + (volume_factor * 0.4)  # 0.8 a 1.2 vezes a taxa do peer
+            base_fee_msat = int(peer_fee_data["base_fee_msat"] * factor)
+            fee_rate = peer_fee_data["fee_rate"] * factor
+        else:
+            # Sem dados do peer, calcular com base apenas no volume
+            base_fee_msat = int(min_base_fee + volume_factor * (max_base_fee - min_base_fee))
+            fee_rate = min_fee_rate + volume_factor * (max_fee_rate - min_fee_rate)
+
+        # Com a demanda estimada, a taxa proporcional é a que maximiza a receita prevista
+        fit = self._demand_fit(row, features, config)
+        if fit:
+            current = features.current_policies.get(row.chan_id)
+            fee_rate = round(revenue_maximizing_fee(fit, min_fee_rate * 1000000, max_fee_rate * 1000000,
+                                                    config.get("elasticity_explore_ratio", 0.25),
+                                                    current["fee_rate"] * 1000000 if current else None)) / 1000000
+
+        # Garantir que as taxas estejam dentro dos limites
+        base_fee_msat = max(min_base_fee, min(max_base_fee, base_fee_msat))
+        fee_rate = max(min_fee_rate, min(max_fee_rate, fee_rate))
+
+        return {
+            "base_fee_msat": base_fee_msat,
+            "fee_rate": fee_rate,
+            "time_lock_delta": config["time_lock_delta"]
+        }
+
+@register_strategy
+class ControllerStrategy(FeeStrategy):
+    """Taxas definidas por um controlador PID sobre o saldo local do canal"""
+
+    name = "controller"
+    version = 2
+    description = "Controlador PID do saldo local em torno de um alvo, com amortecimento e passos fixos"
+    config_keys = FEE_LIMIT_KEYS + ("controller_target_ratio", "controller_kp", "controller_ki", "controller_kd",
+                                    "controller_deadband", "controller_step_ppm", "controller_hysteresis_steps")
+    feature_keys = ("ewma_flows", "current_policies")
+
+    def fingerprint_features(self, row: ChannelInput, features: StrategyFeatures, config: Dict) -> Dict:
+        return {"balance": controller_inputs(row, features)}
+
+    def compute(self, row: ChannelInput, features: StrategyFeatures, config: Dict) -> Dict:
+        balance_ratio, balance_ratio_slow, drift_per_hour = controller_inputs(row, features)
+        current = features.current_policies.get(row.chan_id)
+        base_fee_msat, fee_rate = controller_policy(balance_ratio, balance_ratio_slow, drift_per_hour, config,
+                                                    current["fee_rate"] if current else None)
+        return {
+            "base_fee_msat": base_fee_msat,
+            "fee_rate": fee_rate,
+            "time_lock_delta": config["time_lock_delta"]
+        }
+
+def controller_inputs(row: ChannelInput, features: StrategyFeatures) -> tuple:
+    """
+    Sinais do controlador: saldo médio, saldo médio lento e deriva do saldo por hora
+
+    Sem estimadores, usa o saldo da amostra mais recente e nenhuma deriva.
+    """
+    smoothed = features.ewma_flows.get(row.chan_id)
+    if not smoothed:
+        balance_ratio = row.flow_data["balance_ratio"]
+        return balance_ratio, balance_ratio, 0.0
+    return (smoothed["balance_ratio"], smoothed.get("balance_ratio_slow", smoothed["balance_ratio"]),
+            smoothed.get("balance_drift_per_hour", 0.0))
+
+def controller_output(balance_ratio: float, balance_ratio_slow: float, drift_per_hour: float, config: Dict) -> float:
+    """
+    Saída do controlador PID do saldo local
+
+    O erro é a distância entre o saldo alvo e o saldo médio (positivo quando
+    falta saldo local, o que eleva as taxas para conter a saída). O termo
+    integral usa a média lenta do saldo (integral com fuga, que não acumula sem
+    limite) e o termo derivativo usa a deriva do saldo, amortecendo a correção
+    quando o saldo já se move em direção ao alvo.
+
+    Args:
+        balance_ratio: Média móvel do saldo local (0-1)
+        balance_ratio_slow: Média móvel lenta do saldo local (0-1)
+        drift_per_hour: Média móvel da variação do saldo local por hora
+        config: Configuração do gerenciador
+
+    Returns:
+        Saída do controlador (0 corresponde ao meio da faixa de taxas)
+    """
+    target = config.get("controller_target_ratio", 0.5)
+    return (config.get("controller_kp", 1.0) * (target - balance_ratio) +
+            config.get("controller_ki", 0.5) * (target - balance_ratio_slow) -
+            config.get("controller_kd", 2.0) * drift_per_hour)
+
+def controller_rate(config: Dict):
+    """
+    Cria a função que converte a saída do controlador na taxa proporcional
+
+    Saídas dentro da zona morta mantêm a taxa em vigor (o meio da faixa se ela
+    for desconhecida). Fora dela, a taxa em vigor só muda quando a taxa
+    correspondente à saída se afasta dela por pelo menos
+    controller_hysteresis_steps passos de controller_step_ppm (histerese em
+    torno da última taxa enviada), e a nova taxa é arredondada para múltiplos
+    do passo. Assim, o ruído do saldo em torno de uma taxa não gera novas
+    políticas.
+
+    Args:
+        config: Configuração do gerenciador
+
+    Returns:
+        Função (taxa proporcional em vigor ou None, saída do controlador) -> taxa em ppm
+    """
+    min_fee_rate_ppm = config["min_fee_rate"] * 1000000
+    max_fee_rate_ppm = config["max_fee_rate"] * 1000000
+    rate_span_ppm = max_fee_rate_ppm - min_fee_rate_ppm
+    deadband = config.get("controller_deadband", 0.05)
+    step_ppm = max(1, config.get("controller_step_ppm", 25))
+    hold_ppm = max(1, config.get("controller_hysteresis_steps", 3)) * step_ppm
+
+    # Chamada a cada amostra pelo backtesting: comparações em vez de min/max
+    def fee_rate_ppm(current_fee_rate: Optional[float], output: float) -> float:
+        current_ppm = None if current_fee_rate is None else round(current_fee_rate * 1000000)
+        if -deadband <= output <= deadband:
+            if current_ppm is None:
+                factor = 0.5
+            else:
+                rate_ppm = current_ppm
+                factor = None
+        else:
+            factor = 0.5 + (output - deadband if output > 0 else output + deadband)
+            factor = 0.0 if factor < 0.0 else 1.0 if factor > 1.0 else factor
+
+        if factor is not None:
+            # Saída 0 corresponde ao meio da faixa de taxas
+            target_ppm = min_fee_rate_ppm + factor * rate_span_ppm
+            if current_ppm is not None and -hold_ppm < target_ppm - current_ppm < hold_ppm:
+                rate_ppm = current_ppm
+            else:
+                rate_ppm = round(target_ppm / step_ppm) * step_ppm
+        if rate_ppm > max_fee_rate_ppm:
+            rate_ppm = max_fee_rate_ppm
+        return min_fee_rate_ppm if rate_ppm < min_fee_rate_ppm else rate_ppm
+
+    return fee_rate_ppm
+
+def controller_base_fee(fee_rate_ppm: float, config: Dict) -> int:
+    """Taxa base do controlador, que acompanha a taxa proporcional já arredondada"""
+    min_base_fee = config["min_base_fee_msat"]
+    max_base_fee = config["max_base_fee_msat"]
+    min_fee_rate_ppm = config["min_fee_rate"] * 1000000
+    rate_span_ppm = config["max_fee_rate"] * 1000000 - min_fee_rate_ppm
+    factor = (fee_rate_ppm - min_fee_rate_ppm) / rate_span_ppm if rate_span_ppm > 0 else 0.5
+    return int(min_base_fee + factor * (max_base_fee - min_base_fee))
+
+def controller_policy(balance_ratio: float, balance_ratio_slow: float, drift_per_hour: float,
+                      config: Dict, current_fee_rate: Optional[float] = None) -> tuple:
+    """
+    Política do controlador PID do saldo local (controller_output e controller_rate)
+
+    Args:
+        balance_ratio: Média móvel do saldo local (0-1)
+        balance_ratio_slow: Média móvel lenta do saldo local (0-1)
+        drift_per_hour: Média móvel da variação do saldo local por hora
+        config: Configuração do gerenciador
+        current_fee_rate: Taxa proporcional em vigor no canal (None se desconhecida)
+
+    Returns:
+        Tupla (base_fee_msat, fee_rate)
+    """
+    fee_rate_ppm = controller_rate(config)(current_fee_rate, controller_output(balance_ratio, balance_ratio_slow,
+                                                                               drift_per_hour, config))
+    return controller_base_fee(fee_rate_ppm, config), fee_rate_ppm / 1000000
+
+def synthetic_batch(n_channels: int, history_length: int = 24, seed: int = 42):
+    """
+    Gera estatísticas sintéticas no formato do FeeManager
+
+    Args:
+        n_channels: Número de canais
+        history_length: Amostras de fluxo por canal
+        seed: Semente do gerador aleatório
+
+    Returns:
+        Tupla (lote, channel_stats, peer_fees)
+    """
+    rng = random.Random(seed)
+    channel_stats = {}
+    peer_fees = {}
+    batch = []
+
+    for index in range(n_channels):
+        chan_id = str(700000000000000000 + index)
+        # Alguns peers têm vários canais conosco
+        pubkey = f"peer{index // 3}"
+        capacity = rng.choice((1000000, 2000000, 5000000))
+
+        flow_history = []
+        total_in = total_out = 0
+        for step in range(history_length):
+            local_balance = rng.randint(0, capacity)
+            remote_balance = capacity - local_balance
+            volume_in = rng.randint(0, 2000000)
+            volume_out = rng.randint(0, 2000000)
+            total_in += volume_in
+            total_out += volume_out
+            flow_history.append({
+                "timestamp": 1700000000 + step * 3600,
+                "local_balance": local_balance,
+                "remote_balance": remote_balance,
+                "inbound_ratio": remote_balance / capacity,
+                "outbound_ratio": local_balance / capacity,
+                "balance_ratio": local_balance / capacity,
+                "forwarding_volume_in": volume_in,
+                "forwarding_volume_out": volume_out,
+                "forwarding_volume_in_total": total_in,
+                "forwarding_volume_out_total": total_out
+            })
+
+        peer_fee_data = {
+            "timestamp": flow_history[-1]["timestamp"],
+            "chan_id": chan_id,
+            "base_fee_msat": rng.choice((0, 1000, 1500)),
+            "fee_rate": rng.choice((1, 100, 500)) / 1000000,
+            "time_lock_delta": 40
+        }
+        peer_fees.setdefault(pubkey, []).append(peer_fee_data)
+
+        channel_stats[chan_id] = {
+            "capacity": capacity,
+            "remote_pubkey": pubkey,
+            "flow_history": flow_history,
+            "fee_history": []
+        }
+        # Estimadores e janelas como o FeeManager os mantém (fora da medição)
+        channel_stats[chan_id]["estimators"] = bootstrap_estimators(channel_stats[chan_id])
+        channel_stats[chan_id]["volume_windows"] = bootstrap_windows(flow_history)
+        batch.append(ChannelInput(chan_id, pubkey, flow_history[-1], peer_fee_data))
+
+    return batch, channel_stats, peer_fees
+
+def benchmark_strategies(config: Dict, n_channels: int = 1000, history_length: int = 24,
+                         repeat: int = 5, names: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """
+    Mede a vazão e o consumo de memória de cada estratégia registrada
+
+    Args:
+        config: Configuração do gerenciador
+        n_channels: Número de canais sintéticos
+        history_length: Amostras de fluxo por canal
+        repeat: Número de repetições (o melhor tempo é usado)
+        names: Estratégias a medir (padrão: todas as registradas)
+
+    Returns:
+        Resultados por estratégia, incluindo o custo dos atributos compartilhados
+    """
+    batch, channel_stats, peer_fees = synthetic_batch(n_channels, history_length)
+    results = {}
+
+    started = time.perf_counter()
+    features = StrategyFeatures.compute(batch, channel_stats, peer_fees)
+    results["features"] = {"seconds": time.perf_counter() - started}
+
+    for name in names or available_strategies():
+        strategy = get_strategy(name)
+
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            strategy.compute_batch(batch, features, config)
+            best = min(best, time.perf_counter() - started)
+
+        tracemalloc.start()
+        strategy.compute_batch(batch, features, config)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[name] = {
+            "version": strategy.version,
+            "channels": n_channels,
+            "seconds": best,
+            "channels_per_second": n_channels / best if best > 0 else float("inf"),
+            "peak_memory_bytes": peak
+        }
+
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark das estratégias de taxas")
+    parser.add_argument("--config", default="fee_config.json", help="Arquivo de configuração")
+    parser.add_argument("--channels", type=int, default=1000, help="Número de canais sintéticos")
+    parser.add_argument("--history", type=int, default=24, help="Amostras de fluxo por canal")
+    parser.add_argument("--repeat", type=int, default=5, help="Número de repetições")
+    parser.add_argument("--strategy", action="append", help="Estratégia a medir (pode repetir)")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+
+    results = benchmark_strategies(config, args.channels, args.history, args.repeat, args.strategy)
+    print(json.dumps(results, indent=2))
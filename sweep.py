@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Varredura de parâmetros das estratégias de taxas
+Este módulo avalia uma grade de configurações em paralelo (um processo por núcleo)
+sobre o histórico armazenado e classifica os resultados por um objetivo. O replay
+usa o volume registrado, que não responde às taxas: a receita estimada sempre
+cresce com os limites de taxa, que por isso ficam fora da grade do objetivo revenue
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from backtest import Backtester, ReplayHistory
+
+logger = logging.getLogger("sweep")
+
+# Objetivos de classificação: métrica do relatório e se maior é melhor
+OBJECTIVES = {
+    "revenue": ("estimated_revenue_sat", True),
+    "rebalancing": ("rebalance_pressure", False),
+    "updates": ("fee_changes", False)
+}
+
+# Limites de taxa: com o volume fixo do replay, a receita é máxima no maior valor
+# testado, então eles não são variados com o objetivo revenue
+FEE_BOUND_KEYS = ("min_base_fee_msat", "max_base_fee_msat", "min_fee_rate", "max_fee_rate")
+
+# Grade padrão (peer_weight acompanha 1 - flow_weight quando não informado)
+DEFAULT_GRID = {
+    "flow_weight": [0.5, 0.6, 0.7, 0.8, 0.9],
+    "high_flow_threshold": [0.7, 0.8, 0.9],
+    "low_flow_threshold": [0.1, 0.2, 0.3]
+}
+
+def build_grid(base_config: Dict, grid: Dict[str, List]) -> List[Tuple[Dict, Dict]]:
+    """
+    Gera as combinações de parâmetros da grade
+
+    Combinações inválidas (limiar baixo >= alto, mínimo >= máximo) são descartadas.
+    Se apenas flow_weight for variado, peer_weight é definido como 1 - flow_weight.
+
+    Args:
+        base_config: Configuração de partida
+        grid: Valores a testar por parâmetro
+
+    Returns:
+        Lista de (parâmetros variados, configuração completa)
+    """
+    keys = sorted(grid)
+    link_weights = "flow_weight" in grid and "peer_weight" not in grid
+    combinations = []
+
+    for values in itertools.product(*(grid[key] for key in keys)):
+        params = dict(zip(keys, values))
+        if link_weights:
+            params["peer_weight"] = round(1 - params["flow_weight"], 6)
+
+        config = dict(base_config)
+        config.update(params)
+
+        if config["low_flow_threshold"] >= config["high_flow_threshold"]:
+            continue
+        if config["min_base_fee_msat"] >= config["max_base_fee_msat"]:
+            continue
+        if config["min_fee_rate"] >= config["max_fee_rate"]:
+            continue
+
+        combinations.append((params, config))
+
+    return combinations
+
+# Histórico mapeado em memória, aberto uma única vez por processo trabalhador
+_worker_history = None
+
+def _init_worker(history_path: str) -> None:
+    """Abre o histórico compartilhado no processo trabalhador"""
+    global _worker_history
+    _worker_history = ReplayHistory.open_mapped(history_path)
+
+def _evaluate(task: Tuple[int, Dict, Dict, Optional[str]]) -> Dict:
+    """Executa o replay de uma configuração da grade"""
+    index, params, config, strategy = task
+    report = Backtester(_worker_history, config).run(strategy)
+    return {
+        "index": index,
+        "params": params,
+        "strategy": report["strategy"],
+        "estimated_revenue_sat": report["estimated_revenue_sat"],
+        "rebalance_pressure": report["rebalance_pressure"],
+        "fee_changes": report["fee_changes"],
+        "fee_changes_per_channel": report["fee_changes_per_channel"],
+        "elapsed_seconds": report["elapsed_seconds"]
+    }
+
+def rank_results(results: List[Dict], objective: str = "revenue") -> List[Dict]:
+    """
+    Ordena os resultados pelo objetivo, usando os demais como desempate
+
+    Args:
+        results: Resultados da varredura
+        objective: revenue, rebalancing ou updates
+
+    Returns:
+        Resultados do melhor para o pior
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Objetivo desconhecido: {objective}")
+
+    order = [objective] + [name for name in OBJECTIVES if name != objective]
+
+    def sort_key(result):
+        key = []
+        for name in order:
+            metric, maximize = OBJECTIVES[name]
+            key.append(-result[metric] if maximize else result[metric])
+        return key
+
+    return sorted(results, key=sort_key)
+
+def run_sweep(history: ReplayHistory, base_config: Dict, grid: Optional[Dict[str, List]] = None,
+              strategy: Optional[str] = None, objective: str = "revenue",
+              workers: Optional[int] = None) -> Dict:
+    """
+    Avalia a grade de configurações em paralelo
+
+    O histórico é gravado uma vez em formato binário e mapeado em memória por
+    cada processo trabalhador; as tarefas levam apenas os parâmetros.
+
+    Args:
+        history: Histórico a reproduzir
+        base_config: Configuração de partida
+        grid: Valores a testar por parâmetro (padrão: DEFAULT_GRID)
+        strategy: Estratégia avaliada (padrão: fee_strategy da configuração)
+        objective: Objetivo de classificação (com revenue, os limites de taxa
+            de FEE_BOUND_KEYS são retirados da grade)
+        workers: Número de processos (padrão: número de núcleos)
+
+    Returns:
+        Resultado com as configurações classificadas e a melhor configuração
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Objetivo desconhecido: {objective}")
+
+    grid = dict(grid or DEFAULT_GRID)
+    if objective == "revenue":
+        ignored = [key for key in FEE_BOUND_KEYS if key in grid]
+        for key in ignored:
+            del grid[key]
+        if ignored:
+            logger.warning(f"Limites de taxa ignorados no objetivo revenue (o volume do replay não responde "
+                           f"às taxas): {', '.join(ignored)}")
+
+    combinations = build_grid(base_config, grid)
+    tasks = [(index, params, config, strategy) for index, (params, config) in enumerate(combinations)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks) or 1))
+    started = time.perf_counter()
+
+    fd, history_path = tempfile.mkstemp(prefix="fee_history_", suffix=".bin")
+    os.close(fd)
+    try:
+        history.save(history_path)
+
+        if workers == 1:
+            _init_worker(history_path)
+            results = [_evaluate(task) for task in tasks]
+        else:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(history_path,)) as executor:
+                results = list(executor.map(_evaluate, tasks, chunksize=chunksize))
+    finally:
+        os.remove(history_path)
+
+    ranked = rank_results(results, objective)
+    logger.info(f"Varredura de {len(tasks)} configurações concluída em {time.perf_counter() - started:.2f}s")
+
+    return {
+        "objective": objective,
+        "grid": grid,
+        "configurations": len(tasks),
+        "workers": workers,
+        "elapsed_seconds": time.perf_counter() - started,
+        "best": ranked[0] if ranked else None,
+        "results": ranked
+    }
+
+def edge_params(sweep_result: Dict) -> List[str]:
+    """
+    Parâmetros cujo melhor valor é o menor ou o maior valor testado na grade
+
+    Um ótimo na borda da grade indica que o objetivo continuaria melhorando
+    além dela, e não um ótimo de fato.
+
+    Args:
+        sweep_result: Resultado de run_sweep()
+
+    Returns:
+        Nomes dos parâmetros na borda da grade
+    """
+    best = sweep_result.get("best")
+    if not best:
+        return []
+    edges = []
+    for key, values in sorted(sweep_result.get("grid", {}).items()):
+        if len(set(values)) > 1 and best["params"].get(key) in (min(values), max(values)):
+            edges.append(key)
+    return edges
+
+def write_best_config(sweep_result: Dict, config_path: str = "fee_config.json") -> Dict:
+    """
+    Grava os parâmetros da melhor configuração no arquivo de configuração
+
+    A gravação é recusada se algum parâmetro ficou na borda da grade (edge_params).
+
+    Args:
+        sweep_result: Resultado de run_sweep()
+        config_path: Arquivo de configuração do FeeManager
+
+    Returns:
+        Configuração gravada
+    """
+    best = sweep_result.get("best")
+    if not best:
+        raise ValueError("A varredura não produziu nenhuma configuração")
+    edges = edge_params(sweep_result)
+    if edges:
+        raise ValueError(f"Melhor valor na borda da grade para {', '.join(edges)}: amplie a grade antes de gravar")
+
+    config = {}
+    if os.path.exists(config_path):
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+    config.update(best["params"])
+
+    temp_path = f"{config_path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(config, f, indent=2, sort_keys=True)
+    os.replace(temp_path, config_path)
+
+    logger.info(f"Melhor configuração gravada em {config_path}: {best['params']}")
+    return config
+
+def parse_grid(specs: List[str]) -> Dict[str, List]:
+    """
+    Converte especificações "parametro=v1,v2,..." em uma grade
+
+    Args:
+        specs: Lista de especificações
+
+    Returns:
+        Grade de valores por parâmetro
+    """
+    grid = {}
+    for spec in specs:
+        key, _, values = spec.partition("=")
+        if not values:
+            raise ValueError(f"Especificação de grade inválida: {spec}")
+        grid[key.strip()] = [json.loads(value) for value in values.split(",")]
+    return grid
+
+
+if __name__ == "__main__":
+    import argparse
+    from backtest import synthetic_history
+    from history_store import HISTORY_DIR
+    from strategies import available_strategies
+
+    parser = argparse.ArgumentParser(
+        description="Varredura de parâmetros das estratégias de taxas",
+        epilog="O replay usa o volume registrado, que não responde às taxas: com o objetivo revenue, a receita "
+               "sempre cresce com as taxas, e os limites de taxa (min/max_base_fee_msat, min/max_fee_rate) "
+               "ficam fora da grade. --write recusa configurações com algum parâmetro na borda da grade.")
+    parser.add_argument("--config", default="fee_config.json", help="Arquivo de configuração")
+    parser.add_argument("--stats", default="channel_stats.json", help="Histórico dos canais")
+    parser.add_argument("--peer-fees", default="peer_fees.json", help="Histórico de taxas dos peers")
+    parser.add_argument("--history-dir", default=HISTORY_DIR, help="Históricos por canal (lazy_history)")
+    parser.add_argument("--strategy", choices=available_strategies(), help="Estratégia avaliada")
+    parser.add_argument("--grid", action="append", default=[], metavar="PARAM=V1,V2",
+                        help="Valores a testar para um parâmetro (pode repetir)")
+    parser.add_argument("--objective", choices=sorted(OBJECTIVES), default="revenue",
+                        help="Objetivo de classificação (revenue não varia os limites de taxa)")
+    parser.add_argument("--workers", type=int, help="Número de processos (padrão: núcleos)")
+    parser.add_argument("--top", type=int, default=10, help="Número de resultados exibidos")
+    parser.add_argument("--write", action="store_true",
+                        help="Gravar a melhor configuração no arquivo de configuração (recusado se algum "
+                             "parâmetro ficar na borda da grade)")
+    parser.add_argument("--synthetic", type=int, nargs=2, metavar=("CANAIS", "AMOSTRAS"),
+                        help="Usar histórico sintético em vez dos arquivos")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    with open(args.config, 'r') as f:
+        base_config = json.load(f)
+
+    if args.synthetic:
+        history = synthetic_history(*args.synthetic)
+    else:
+        history = ReplayHistory.load(args.stats, args.peer_fees, args.history_dir)
+
+    result = run_sweep(history, base_config, parse_grid(args.grid) or None, strategy=args.strategy,
+                       objective=args.objective, workers=args.workers)
+    result["results"] = result["results"][:args.top]
+    print(json.dumps(result, indent=2))
+
+    if args.write:
+        try:
+            write_best_config(result, args.config)
+        except ValueError as e:
+            logger.error(str(e))
+            raise SystemExit(1)
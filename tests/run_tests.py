@@ -17,6 +17,26 @@ from tests.test_lnd_client import TestLNDClient
 from tests.test_fee_manager import TestFeeManager
 from tests.test_web_api import TestWebAPI
 from tests.test_integration import TestIntegration
+from tests.test_engine_snapshot import TestEngineSnapshot
+from tests.test_backtest import TestBacktest
+from tests.test_sweep import TestSweep
+from tests.test_strategies import TestStrategies
+from tests.test_graph_index import TestGraphIndex
+from tests.test_graph_analytics import TestGraphAnalytics
+from tests.test_flow_estimators import TestFlowEstimators
+from tests.test_volume_deltas import TestVolumeDeltas
+from tests.test_peer_aggregates import TestPeerAggregates
+from tests.test_stats_archive import TestStatsArchive
+from tests.test_rollups import TestRollups
+from tests.test_policy_history import TestPolicyHistory
+from tests.test_persistence import TestPersistence
+from tests.test_checkpoint import TestCheckpoint
+from tests.test_history_store import TestHistoryStore
+from tests.test_cli import TestCLI
+from tests.test_fee_plan import TestFeePlan
+from tests.test_update_budget import TestUpdateBudget
+from tests.test_demand_model import TestDemandModel
+from tests.test_seasonality import TestSeasonality
 
 if __name__ == "__main__":
     # Criar suite de testes
@@ -27,6 +47,26 @@ if __name__ == "__main__":
     test_suite.addTest(unittest.makeSuite(TestFeeManager))
     test_suite.addTest(unittest.makeSuite(TestWebAPI))
     test_suite.addTest(unittest.makeSuite(TestIntegration))
+    test_suite.addTest(unittest.makeSuite(TestEngineSnapshot))
+    test_suite.addTest(unittest.makeSuite(TestBacktest))
+    test_suite.addTest(unittest.makeSuite(TestSweep))
+    test_suite.addTest(unittest.makeSuite(TestStrategies))
+    test_suite.addTest(unittest.makeSuite(TestGraphIndex))
+    test_suite.addTest(unittest.makeSuite(TestGraphAnalytics))
+    test_suite.addTest(unittest.makeSuite(TestFlowEstimators))
+    test_suite.addTest(unittest.makeSuite(TestVolumeDeltas))
+    test_suite.addTest(unittest.makeSuite(TestPeerAggregates))
+    test_suite.addTest(unittest.makeSuite(TestStatsArchive))
+    test_suite.addTest(unittest.makeSuite(TestRollups))
+    test_suite.addTest(unittest.makeSuite(TestPolicyHistory))
+    test_suite.addTest(unittest.makeSuite(TestPersistence))
+    test_suite.addTest(unittest.makeSuite(TestCheckpoint))
+    test_suite.addTest(unittest.makeSuite(TestHistoryStore))
+    test_suite.addTest(unittest.makeSuite(TestCLI))
+    test_suite.addTest(unittest.makeSuite(TestFeePlan))
+    test_suite.addTest(unittest.makeSuite(TestUpdateBudget))
+    test_suite.addTest(unittest.makeSuite(TestDemandModel))
+    test_suite.addTest(unittest.makeSuite(TestSeasonality))
     
     # Executar testes
     runner = unittest.TextTestRunner(verbosity=2)
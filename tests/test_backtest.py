@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para o backtesting das estratégias de taxas
+"""
+
+import os
+import sys
+import random
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from backtest import Backtester, ReplayHistory, SERIES_KERNELS, _generic_series, synthetic_history
+from strategies import get_strategy
+from policy_history import policy_key
+from fee_manager import FeeManager
+
+CONFIG = {
+    "fee_strategy": "balanced",
+    "min_base_fee_msat": 1000,
+    "max_base_fee_msat": 5000,
+    "min_fee_rate": 0.000001,
+    "max_fee_rate": 0.001,
+    "time_lock_delta": 40,
+    "flow_weight": 0.7,
+    "peer_weight": 0.3,
+    "high_flow_threshold": 0.8,
+    "low_flow_threshold": 0.2
+}
+
+# Meta de desempenho: um ano de amostras horárias de 1000 canais em segundos
+# (medida apenas com RUN_BENCHMARKS=1, pois depende da máquina)
+BENCHMARK_CHANNELS = 1000
+BENCHMARK_SAMPLES = 24 * 365
+BENCHMARK_MAX_SECONDS = 20
+RUN_BENCHMARKS = os.environ.get("RUN_BENCHMARKS") == "1"
+
+def expand_runs(runs, size):
+    """Converte o resultado run-length em uma política por amostra"""
+    starts, base_fees, fee_rates_ppm = runs
+    policies = []
+    for run, start in enumerate(starts):
+        end = starts[run + 1] if run + 1 < len(starts) else size
+        policies.extend([(base_fees[run], fee_rates_ppm[run])] * (end - start))
+    return policies
+
+class TestBacktest(unittest.TestCase):
+    """Testes para o backtester"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+        self.stats = {
+            "1": {
+                "capacity": 1000000,
+                "remote_pubkey": "peer1",
+                "flow_history": [
+                    {"timestamp": 100, "inbound_ratio": 0.5, "outbound_ratio": 0.5, "balance_ratio": 0.5, "forwarding_volume_out": 1000},
+                    {"timestamp": 200, "inbound_ratio": 0.9, "outbound_ratio": 0.1, "balance_ratio": 0.1, "forwarding_volume_out": 3000},
+                    {"timestamp": 300, "inbound_ratio": 0.9, "outbound_ratio": 0.1, "balance_ratio": 0.1, "forwarding_volume_out": 500}
+                ],
+                "fee_history": []
+            }
+        }
+        self.peer_fees = {
+            "peer1": [
+                {"timestamp": 150, "chan_id": "1", "base_fee_msat": 2000, "fee_rate": 0.0001, "time_lock_delta": 40}
+            ]
+        }
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_from_stats(self):
+        """Testa a junção as-of das taxas do peer e os deltas de volume"""
+        history = ReplayHistory.from_stats(self.stats, self.peer_fees)
+        series = history.channels["1"]
+
+        self.assertEqual(len(series), 3)
+        self.assertEqual(series.peer_segments(), [(0, 1, None, None), (1, 3, 2000, 0.0001)])
+        # O contador reiniciado na terceira amostra conta como volume do intervalo
+        self.assertEqual(list(series.volume_out_delta), [0, 2000, 500])
+
+        # Amostras no formato atual já trazem o volume do intervalo
+        self.stats["1"]["flow_history"].append({
+            "timestamp": 400, "inbound_ratio": 0.5, "outbound_ratio": 0.5, "balance_ratio": 0.5,
+            "forwarding_volume_out": 700, "forwarding_volume_out_total": 1200
+        })
+        series = ReplayHistory.from_stats(self.stats, self.peer_fees).channels["1"]
+        self.assertEqual(list(series.volume_out_delta), [0, 2000, 500, 700])
+        self.assertEqual(list(series.volume_out), [1000, 3000, 500, 1200])
+
+    def test_kernels_match_fee_manager(self):
+        """Testa que os núcleos em lote reproduzem as estratégias do FeeManager"""
+        fee_manager = FeeManager(lnd_client=MagicMock())
+        fee_manager.config = dict(CONFIG)
+
+        rng = random.Random(1)
+        flow_history = []
+        peer_records = []
+        total = 0
+        for step in range(300):
+            ratio = rng.random()
+            # Formato atual: volume do intervalo e contador acumulado separados
+            volume = rng.choice((0, 5000, 400000, 2000000))
+            total += volume
+            flow_history.append({
+                "timestamp": step,
+                "inbound_ratio": 1 - ratio,
+                "outbound_ratio": ratio,
+                "balance_ratio": ratio,
+                "forwarding_volume_out": volume,
+                "forwarding_volume_out_total": total
+            })
+            if step % 50 == 10:
+                peer_records.append({
+                    "timestamp": step,
+                    "chan_id": "1",
+                    "base_fee_msat": rng.choice((0, 1000, 8000)),
+                    "fee_rate": rng.choice((0.000001, 0.0002, 0.005)),
+                    "time_lock_delta": 40
+                })
+
+        history = ReplayHistory.from_stats({"1": {"remote_pubkey": "peer1", "flow_history": flow_history}},
+                                           {"peer1": peer_records})
+        series = history.channels["1"]
+
+        methods = {
+            "balanced": fee_manager._calculate_balanced_fees,
+            "competitive": fee_manager._calculate_competitive_fees,
+            "profitable": fee_manager._calculate_profitable_fees
+        }
+
+        for strategy, method in methods.items():
+            policies = expand_runs(SERIES_KERNELS[strategy](series, CONFIG), len(series))
+            for step, flow_data in enumerate(flow_history):
+                peer = [record for record in peer_records if record["timestamp"] <= step]
+                expected = method("1", flow_data, peer[-1] if peer else None)
+                self.assertEqual(policies[step], policy_key(expected)[:2],
+                                 f"{strategy} diverge na amostra {step}")
+
+        # Taxas fracionárias em ppm são arredondadas como nos envios ao LND (2,97 ppm -> 3)
+        peer_records[0]["fee_rate"] = 0.0000033
+        history = ReplayHistory.from_stats({"1": {"remote_pubkey": "peer1", "flow_history": flow_history}},
+                                           {"peer1": peer_records})
+        runs = SERIES_KERNELS["competitive"](history.channels["1"], CONFIG)
+        self.assertEqual(runs[2][runs[0].index(10)], 3)
+
+    def test_controller_kernel(self):
+        """Testa que o núcleo do controlador reproduz a estratégia amostra por amostra"""
+        history = synthetic_history(5, 24 * 14)
+        generic = _generic_series(get_strategy("controller"))
+        for series in history.channels.values():
+            self.assertEqual(SERIES_KERNELS["controller"](series, CONFIG), generic(series, CONFIG))
+
+        # Passos maiores geram menos mudanças de política
+        report = Backtester(history, CONFIG).run("controller")
+        coarse = Backtester(history, dict(CONFIG, controller_step_ppm=100)).run("controller")
+        self.assertLess(coarse["fee_changes"], report["fee_changes"])
+        self.assertAlmostEqual(report["fee_changes_per_week"], report["fee_changes"] / ((24 * 14 - 1) / (24 * 7)))
+
+        # Com a histerese em torno da taxa em vigor, o controlador muda as políticas menos vezes que a balanceada
+        history = synthetic_history(50, 24 * 30)
+        controller = Backtester(history, CONFIG).run("controller")
+        balanced = Backtester(history, CONFIG).run("balanced")
+        self.assertLess(controller["fee_changes_per_week"], balanced["fee_changes_per_week"])
+
+    def test_run_report(self):
+        """Testa as métricas do relatório de replay"""
+        history = ReplayHistory.from_stats(self.stats, self.peer_fees)
+        report = Backtester(history, CONFIG).run("competitive", bucket_seconds=100, include_channels=True)
+
+        # Sem peer na primeira amostra: taxas mínimas; depois 90% da taxa do peer
+        self.assertEqual(report["fee_changes"], 1)
+        self.assertEqual(report["samples"], 3)
+        self.assertEqual([level["timestamp"] for level in report["fee_levels"]], [100, 200, 300])
+        self.assertEqual(report["fee_levels"][0]["mean_fee_rate_ppm"], 1)
+        self.assertEqual(report["fee_levels"][1]["mean_fee_rate_ppm"], 90)
+
+        # Volume do 2º intervalo cobrado pela política mínima, o do 3º pela do peer
+        expected_msat = (1000 + 2000 * 1 / 1000) + (1800 + 500 * 90 / 1000)
+        self.assertAlmostEqual(report["estimated_revenue_sat"], expected_msat / 1000)
+        self.assertEqual(report["channel_results"]["1"]["final_fee_rate_ppm"], 90)
+
+    def test_compare_synthetic(self):
+        """Testa o replay de todas as estratégias sobre um histórico sintético"""
+        history = synthetic_history(20, 24 * 30, start=19675 * 86400)
+        results = Backtester(history, CONFIG).compare()
+
+        self.assertEqual(set(results), {"balanced", "competitive", "profitable", "controller"})
+        for report in results.values():
+            self.assertEqual(report["samples"], 20 * 24 * 30)
+            self.assertEqual(len(report["fee_levels"]), 30)
+            self.assertGreater(report["estimated_revenue_sat"], 0)
+
+        with self.assertRaises(ValueError):
+            Backtester(history, CONFIG).run("unknown")
+
+    def test_run_totals_paths(self):
+        """Testa que as somas por fatias e por políticas expandidas dão o mesmo relatório"""
+        history = synthetic_history(10, 24 * 30)
+        for strategy in ("competitive", "profitable"):
+            with patch("backtest.DENSE_RUNS_RATIO", 0):
+                sliced = Backtester(history, CONFIG).run(strategy, include_channels=True)
+            with patch("backtest.DENSE_RUNS_RATIO", 10 ** 9):
+                expanded = Backtester(history, CONFIG).run(strategy, include_channels=True)
+
+            self.assertAlmostEqual(sliced["estimated_revenue_sat"], expanded["estimated_revenue_sat"], places=3)
+            self.assertAlmostEqual(sliced["rebalance_pressure"], expanded["rebalance_pressure"], places=3)
+            self.assertEqual(sliced["fee_levels"], expanded["fee_levels"])
+            for chan_id, result in sliced["channel_results"].items():
+                self.assertAlmostEqual(result["estimated_revenue_sat"],
+                                       expanded["channel_results"][chan_id]["estimated_revenue_sat"], places=3)
+
+    def test_replay_year(self):
+        """Testa o replay de um ano de amostras horárias de poucos canais por todas as estratégias"""
+        history = synthetic_history(5, BENCHMARK_SAMPLES)
+        backtester = Backtester(history, CONFIG)
+        for strategy in ("balanced", "competitive", "profitable", "controller"):
+            report = backtester.run(strategy)
+            self.assertEqual(report["samples"], 5 * BENCHMARK_SAMPLES)
+            self.assertGreater(report["estimated_revenue_sat"], 0)
+
+    @unittest.skipUnless(RUN_BENCHMARKS, "benchmark opcional (RUN_BENCHMARKS=1)")
+    def test_benchmark_year(self):
+        """Testa o replay de um ano de amostras horárias de 1000 canais dentro da meta de tempo"""
+        history = synthetic_history(BENCHMARK_CHANNELS, BENCHMARK_SAMPLES)
+        backtester = Backtester(history, CONFIG)
+        for strategy in ("balanced", "competitive", "profitable", "controller"):
+            report = backtester.run(strategy)
+            self.assertEqual(report["samples"], BENCHMARK_CHANNELS * BENCHMARK_SAMPLES)
+            self.assertLess(report["elapsed_seconds"], BENCHMARK_MAX_SECONDS,
+                            f"{strategy}: {report['elapsed_seconds']:.1f} s para 1 ano de 1000 canais")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para o checkpoint binário do estado do motor
+"""
+
+import os
+import sys
+import time
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from checkpoint import decode_checkpoint, encode_checkpoint, read_checkpoint
+from fee_manager import FeeManager
+
+GRAPH = {
+    "nodes": [],
+    "edges": [
+        {"channel_id": "1", "node1_pub": "test_pubkey", "node2_pub": "peer1",
+         "node1_policy": {"fee_base_msat": "1000", "fee_rate_milli_msat": "100"},
+         "node2_policy": {"fee_base_msat": "2000", "fee_rate_milli_msat": "200"}},
+        {"channel_id": "2", "node1_pub": "other", "node2_pub": "peer1",
+         "node1_policy": {"fee_base_msat": "3000", "fee_rate_milli_msat": "300"},
+         "node2_policy": None}
+    ]
+}
+
+def mock_lnd_client():
+    """Cliente LND simulado com um canal"""
+    client = MagicMock()
+    client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+    client.list_channels.return_value = {"channels": [
+        {"chan_id": "1", "channel_point": "txid:0", "capacity": "1000000",
+         "local_balance": "500000", "remote_balance": "500000", "remote_pubkey": "peer1"}
+    ]}
+    client.get_channel_info.return_value = {
+        "node1_pub": "test_pubkey",
+        "node1_policy": {"fee_base_msat": "1000", "fee_rate_milli_msat": "100", "time_lock_delta": 40},
+        "node2_policy": {"fee_base_msat": "2000", "fee_rate_milli_msat": "200", "time_lock_delta": 40}
+    }
+    client.describe_graph.return_value = GRAPH
+    return client
+
+class TestCheckpoint(unittest.TestCase):
+    """Testes para o checkpoint binário"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_roundtrip(self):
+        """Testa a serialização com e sem compactação"""
+        state = {"a": [1, 2.5, None], "b": {"c": ("x", 1)}, "d": frozenset({"y"})}
+        for compress in (True, False):
+            self.assertEqual(decode_checkpoint(encode_checkpoint(state, compress)), state)
+        self.assertIsNone(read_checkpoint("missing.ckpt"))
+
+    def test_invalid(self):
+        """Testa a rejeição de arquivos truncados, corrompidos ou de outro formato"""
+        data = encode_checkpoint({"a": list(range(100))})
+
+        with self.assertRaises(ValueError):
+            decode_checkpoint(data[:10])
+        with self.assertRaises(ValueError):
+            decode_checkpoint(data[:-1])
+        with self.assertRaises(ValueError):
+            decode_checkpoint(data[:-1] + bytes([data[-1] ^ 0xFF]))
+        with self.assertRaises(ValueError):
+            decode_checkpoint(b"XXXX" + data[4:])
+        with self.assertRaises(ValueError):
+            decode_checkpoint(data[:4] + b"\x63\x00" + data[6:])
+
+    def test_warm_restart(self):
+        """Testa que o reinício restaura históricos, índices e a chave pública sem consultar o LND"""
+        client = mock_lnd_client()
+        fee_manager = FeeManager(lnd_client=client)
+        fee_manager.update_config({"use_market_fees": True})
+        fee_manager.cursors["forwarding_offset"] = 42
+        fee_manager.collect_channel_data()
+        self.assertTrue(os.path.exists(fee_manager.checkpoint_path))
+
+        restarted_client = mock_lnd_client()
+        restarted = FeeManager(lnd_client=restarted_client)
+
+        self.assertEqual(restarted.channel_stats, fee_manager.channel_stats)
+        self.assertEqual(restarted.peer_fees, fee_manager.peer_fees)
+        self.assertEqual(restarted.cursors, {"forwarding_offset": 42})
+        self.assertEqual(restarted.graph_index.node_quantiles("peer1"),
+                         fee_manager.graph_index.node_quantiles("peer1"))
+
+        # Primeiro ciclo após o reinício: grafo ainda válido e chave pública conhecida
+        restarted.collect_channel_data()
+        restarted_client.describe_graph.assert_not_called()
+        restarted_client.get_info.assert_not_called()
+        self.assertEqual(len(restarted.channel_stats["1"]["flow_history"]), 2)
+
+    def test_fallback_to_json(self):
+        """Testa que checkpoints corrompidos ou mais antigos que o JSON são ignorados"""
+        fee_manager = FeeManager(lnd_client=mock_lnd_client())
+        fee_manager.collect_channel_data()
+
+        with open(fee_manager.checkpoint_path, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            f.write(b"\x00")
+        restarted = FeeManager(lnd_client=mock_lnd_client())
+        self.assertEqual(len(restarted.channel_stats["1"]["flow_history"]), 1)
+
+        # JSON gravado depois do checkpoint (ex.: checkpoint desabilitado)
+        restarted.config["state_checkpoint"] = False
+        restarted.collect_channel_data()
+        future = time.time() + 10
+        os.utime("channel_stats.json", (future, future))
+        self.assertEqual(len(FeeManager(lnd_client=mock_lnd_client()).channel_stats["1"]["flow_history"]), 2)
+
+if __name__ == "__main__":
+    unittest.main()
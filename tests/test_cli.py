@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para a linha de comando
+"""
+
+import io
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+from contextlib import redirect_stdout
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Importar os módulos a serem testados
+import cli
+
+def run_cli(*argv):
+    """Executa a linha de comando e devolve o código de saída e a saída"""
+    output = io.StringIO()
+    with redirect_stdout(output):
+        code = cli.main(list(argv))
+    return code, output.getvalue()
+
+class TestCLI(unittest.TestCase):
+    """Testes para os subcomandos"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_run_once_plan_status_export(self):
+        """Testa um ciclo em modo de desenvolvimento seguido de plan, status e export"""
+        code, output = run_cli("run-once", "--dev", "--log-file", "")
+        self.assertEqual(code, 0)
+        self.assertEqual(json.loads(output)["pushed"], 2)
+
+        code, output = run_cli("plan", "--format", "json", "--log-file", "")
+        plan = json.loads(output)
+        self.assertEqual(plan["channels"], 2)
+        self.assertEqual(plan["summary"]["skipped"], 2)
+        entry = plan["entries"][0]
+        self.assertEqual(entry["action"], "skip")
+        self.assertEqual(entry["delta_ppm"], 0)
+
+        code, output = run_cli("status", "--format", "json")
+        status = json.loads(output)
+        self.assertEqual(status["source"], "engine_state.ckpt")
+        self.assertEqual(status["cycle"], 1)
+        self.assertEqual(status["channels"], 2)
+        self.assertEqual(status["last_update"]["pushed"], 2)
+
+        chan_id = entry["chan_id"]
+        run_cli("export", "--channel", chan_id, "--output", "export.json")
+        with open("export.json") as f:
+            exported = json.load(f)
+        self.assertEqual(list(exported["channel_stats"]), [chan_id])
+        self.assertEqual(len(exported["channel_stats"][chan_id]["flow_history"]), 1)
+
+    def test_status_without_state(self):
+        """Testa o status sem estado gravado"""
+        code, output = run_cli("status", "--format", "json")
+        self.assertEqual(code, 0)
+        self.assertEqual(json.loads(output)["channels"], 0)
+
+    def test_lazy_imports(self):
+        """Testa que status não importa o cliente LND, o gerenciador nem a interface web"""
+        script = ("import sys, cli; cli.main(['status']); "
+                  "print(sorted(m for m in ('requests', 'flask', 'numpy', 'fee_manager', 'lnd_client_rest') "
+                  "if m in sys.modules))")
+        result = subprocess.run([sys.executable, "-c", script], cwd=self.tmp_dir.name, capture_output=True,
+                                text=True, env=dict(os.environ, PYTHONPATH=ROOT))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.splitlines()[-1], "[]")
+
+    def test_import_does_not_configure_logging(self):
+        """Testa que importar o gerenciador não configura o logging nem cria o arquivo de log"""
+        script = "import logging, fee_manager; print(len(logging.getLogger().handlers))"
+        result = subprocess.run([sys.executable, "-c", script], cwd=self.tmp_dir.name, capture_output=True,
+                                text=True, env=dict(os.environ, PYTHONPATH=ROOT))
+        self.assertEqual(result.stdout.strip(), "0", result.stderr)
+        self.assertFalse(os.path.exists("fee_manager.log"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para o modelo de demanda (elasticidade do volume em relação à taxa)
+"""
+
+import os
+import sys
+import random
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from demand_model import bootstrap_demand, combine_fits, fit_demand, revenue_maximizing_fee, update_demand
+from strategies import ChannelInput, StrategyFeatures, get_strategy
+from fee_manager import FeeManager
+
+CONFIG = {
+    "min_base_fee_msat": 1000,
+    "max_base_fee_msat": 5000,
+    "min_fee_rate": 0.000001,
+    "max_fee_rate": 0.001,
+    "time_lock_delta": 40,
+    "use_elasticity": True,
+    "elasticity_min_hours": 72,
+    "elasticity_explore_ratio": 0.25
+}
+
+def linear_demand(fee_rate_ppm):
+    """Demanda simulada: 100 mil sats por hora a 0 ppm, zero a 1000 ppm"""
+    return max(0.0, 100000 - 100 * fee_rate_ppm)
+
+class TestDemandModel(unittest.TestCase):
+    """Testes para o modelo de demanda"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_fit(self):
+        """Testa que a regressão recupera a reta de demanda e a taxa de receita máxima"""
+        rng = random.Random(1)
+        demand = None
+        for hour in range(1, 24 * 14):
+            fee_rate_ppm = rng.choice((200, 300, 400, 600))
+            demand = update_demand(demand, hour * 3600, fee_rate_ppm, linear_demand(fee_rate_ppm), 3600)
+
+        fit = fit_demand(demand)
+        self.assertAlmostEqual(fit["slope"], -100, places=6)
+        self.assertAlmostEqual(fit["intercept"], 100000, places=3)
+        self.assertLess(fit["fee_min_ppm"], 200)
+        self.assertGreater(fit["fee_max_ppm"], 600)
+        self.assertIsNone(fit_demand(demand, min_hours=24 * 30))
+
+        # Receita máxima no meio da reta, dentro dos limites e perto da faixa observada
+        self.assertAlmostEqual(revenue_maximizing_fee(fit, 1, 1000), 500)
+        self.assertEqual(revenue_maximizing_fee(fit, 1, 450), 450)
+
+        # Sem queda de demanda não há ótimo finito: a taxa em vigor (ou a média) é mantida
+        rising = dict(fit, slope=1.0)
+        self.assertEqual(revenue_maximizing_fee(rising, 1, 1000, current_fee_rate_ppm=450), 450)
+        self.assertAlmostEqual(revenue_maximizing_fee(rising, 1, 1000, current_fee_rate_ppm=2000),
+                               min(1000, fit["fee_max_ppm"] * 1.25))
+        self.assertAlmostEqual(revenue_maximizing_fee(rising, 1, 1000), fit["mean_fee_ppm"])
+
+        # Uma taxa antiga e isolada deixa de alargar a faixa coberta pelo ajuste
+        demand = update_demand(None, 0, 5000, 0, 3600)
+        for hour in range(1, 24 * 28):
+            fee_rate_ppm = 300 if hour % 2 else 400
+            demand = update_demand(demand, hour * 3600, fee_rate_ppm, linear_demand(fee_rate_ppm), 3600)
+        recent = fit_demand(demand)
+        self.assertLess(recent["fee_max_ppm"], 1000)
+        self.assertLessEqual(revenue_maximizing_fee(dict(recent, slope=-1.0), 1, 5000), recent["fee_max_ppm"] * 1.25)
+
+        # Sem variação da taxa, a inclinação não é estimada
+        flat = None
+        for hour in range(1, 100):
+            flat = update_demand(flat, hour * 3600, 300, 5000, 3600)
+        self.assertIsNone(fit_demand(flat))
+
+        # Canais com a mesma taxa somam as demandas
+        combined = combine_fits([fit, fit])
+        self.assertAlmostEqual(combined["slope"], -200, places=6)
+        self.assertAlmostEqual(revenue_maximizing_fee(combined, 1, 1000), 500)
+
+    def test_profitable_strategy(self):
+        """Testa que a estratégia lucrativa usa a taxa de receita máxima quando há histórico suficiente"""
+        strategy = get_strategy("profitable")
+        row = ChannelInput("1", "peer1", {"forwarding_volume_out": 0}, None)
+
+        demand = None
+        for hour in range(1, 24 * 7):
+            fee_rate_ppm = 300 if hour % 2 else 450
+            demand = update_demand(demand, hour * 3600, fee_rate_ppm, linear_demand(fee_rate_ppm), 3600)
+        features = StrategyFeatures(demand={"1": fit_demand(demand)})
+
+        fees = strategy.compute(row, features, CONFIG)
+        self.assertEqual(round(fees["fee_rate"] * 1000000), 500)
+        self.assertIn("demand", strategy.fingerprint_features(row, features, CONFIG))
+
+        # Demanda que não cai com a taxa: a taxa em vigor é mantida a cada ciclo
+        rising = StrategyFeatures(demand={"1": dict(fit_demand(demand), slope=10.0)},
+                                  current_policies={"1": {"base_fee_msat": 1000, "fee_rate": 0.0004}})
+        for _ in range(3):
+            fees = strategy.compute(row, rising, CONFIG)
+            rising.current_policies["1"] = fees
+        self.assertEqual(round(fees["fee_rate"] * 1000000), 400)
+
+        # Desabilitado ou com histórico curto: aproximação pelo volume do último intervalo
+        heuristic = strategy.compute(row, StrategyFeatures(), CONFIG)
+        self.assertEqual(strategy.compute(row, features, dict(CONFIG, use_elasticity=False)), heuristic)
+        self.assertEqual(strategy.compute(row, features, dict(CONFIG, elasticity_min_hours=24 * 30)), heuristic)
+
+    def test_fee_manager_incremental(self):
+        """Testa que o FeeManager mantém o modelo a cada coleta, igual à reconstrução pelo histórico"""
+        client = MagicMock()
+        client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+        fee_manager = FeeManager(lnd_client=client)
+
+        total_sent = 0
+        for step, fee_rate_ppm in enumerate((100, 100, 300, 300, 500)):
+            total_sent += int(linear_demand(fee_rate_ppm))
+            client.list_channels.return_value = {"channels": [{
+                "chan_id": "1", "channel_point": "txid:0", "capacity": "1000000", "local_balance": "500000",
+                "remote_balance": "500000", "remote_pubkey": "peer1", "total_satoshis_sent": str(total_sent)
+            }]}
+            client.get_channel_info.return_value = {
+                "node1_pub": "test_pubkey",
+                "node1_policy": {"fee_base_msat": "1000", "fee_rate_milli_msat": str(fee_rate_ppm)},
+                "node2_policy": {"fee_base_msat": "1000", "fee_rate_milli_msat": "200"}
+            }
+            with patch("time.time", return_value=1700000000 + step * 3600):
+                fee_manager.collect_channel_data()
+
+        # O modelo é mantido mesmo com a estimativa desabilitada (padrão)
+        self.assertFalse(fee_manager.config["use_elasticity"])
+        channel = fee_manager.channel_stats["1"]
+        self.assertEqual(channel["demand"]["samples"], 4)
+        self.assertEqual(channel["demand"], bootstrap_demand(channel))
+
+if __name__ == "__main__":
+    unittest.main()
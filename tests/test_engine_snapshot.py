@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para os snapshots imutáveis do estado do motor
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from engine_snapshot import SnapshotBuilder, FrozenDict, freeze
+from fee_manager import FeeManager
+
+class TestEngineSnapshot(unittest.TestCase):
+    """Testes para os snapshots copy-on-write"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        # Executar em diretório temporário para não tocar nos arquivos reais
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+        self.mock_lnd_client = MagicMock()
+        self.mock_lnd_client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+        self.mock_lnd_client.list_channels.return_value = {
+            "channels": [
+                {
+                    "chan_id": "123456789",
+                    "channel_point": "txid:0",
+                    "capacity": "1000000",
+                    "local_balance": "600000",
+                    "remote_balance": "400000",
+                    "remote_pubkey": "peer1",
+                    "active": True
+                }
+            ]
+        }
+        self.mock_lnd_client.get_channel_info.return_value = {
+            "node1_pub": "test_pubkey",
+            "node1_policy": {"fee_base_msat": "1000", "fee_rate_milli_msat": "1", "time_lock_delta": 40},
+            "node2_policy": {"fee_base_msat": "1500", "fee_rate_milli_msat": "2", "time_lock_delta": 40}
+        }
+        self.mock_lnd_client.update_channel_policy.return_value = {"failed_updates": []}
+
+        self.fee_manager = FeeManager(lnd_client=self.mock_lnd_client)
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_frozen_dict_is_readonly(self):
+        """Testa que o snapshot não pode ser alterado"""
+        frozen = freeze({"a": [1, 2], "b": {"c": 3}})
+        self.assertIsInstance(frozen, FrozenDict)
+        self.assertEqual(frozen["a"], (1, 2))
+        with self.assertRaises(TypeError):
+            frozen["a"] = 1
+        with self.assertRaises(TypeError):
+            frozen["b"]["c"] = 4
+
+        # Continua serializável como JSON
+        self.assertEqual(json.loads(json.dumps(frozen)), {"a": [1, 2], "b": {"c": 3}})
+
+    def test_structural_sharing(self):
+        """Testa que canais inalterados são reaproveitados entre snapshots"""
+        builder = SnapshotBuilder()
+        stats = {
+            "a": {"capacity": 1, "flow_history": [{"timestamp": 1}], "fee_history": []},
+            "b": {"capacity": 2, "flow_history": [], "fee_history": []}
+        }
+        first = builder.build("collect", 1, {}, stats, {})
+
+        stats["a"]["flow_history"].append({"timestamp": 2})
+        builder.mark_channel("a")
+        second = builder.build("collect", 2, {}, stats, {})
+
+        self.assertIs(first.channel_stats["b"], second.channel_stats["b"])
+        self.assertEqual(len(first.channel_stats["a"]["flow_history"]), 1)
+        self.assertEqual(len(second.channel_stats["a"]["flow_history"]), 2)
+
+    def test_snapshot_published_per_stage(self):
+        """Testa a publicação de snapshots ao final de cada etapa"""
+        self.assertEqual(self.fee_manager.get_snapshot().stage, "load")
+
+        self.fee_manager.collect_channel_data()
+        collected = self.fee_manager.get_snapshot()
+        self.assertEqual(collected.stage, "collect")
+        self.assertIn("123456789", collected.channel_stats)
+
+        self.fee_manager.update_channel_fees()
+        updated = self.fee_manager.get_snapshot()
+        self.assertEqual(updated.stage, "update")
+
+        # O snapshot anterior não é afetado pelas etapas seguintes
+        self.assertEqual(len(collected.channel_stats["123456789"]["fee_history"]), 1)
+        self.assertEqual(len(updated.channel_stats["123456789"]["fee_history"]), 2)
+
+    def test_update_config_swaps_copy(self):
+        """Testa a atualização copy-on-write da configuração"""
+        old_config = self.fee_manager.config
+        new_config = self.fee_manager.update_config({"fee_strategy": "competitive", "unknown": 1})
+
+        self.assertIsNot(old_config, new_config)
+        self.assertEqual(old_config["fee_strategy"], "balanced")
+        self.assertEqual(self.fee_manager.config["fee_strategy"], "competitive")
+        self.assertNotIn("unknown", new_config)
+        self.assertEqual(self.fee_manager.get_snapshot().config["fee_strategy"], "competitive")
+
+    def test_update_config_during_publish(self):
+        """Testa que a troca de configuração pela API não substitui um snapshot mais novo do loop"""
+        build = self.fee_manager._snapshot_builder.build
+        updater = threading.Thread(target=self.fee_manager.update_config, args=({"fee_strategy": "competitive"},))
+
+        def slow_build(**kwargs):
+            updater.start()
+            time.sleep(0.05)
+            return build(**kwargs)
+
+        with patch.object(self.fee_manager._snapshot_builder, "build", side_effect=slow_build):
+            published = self.fee_manager.publish_snapshot("collect")
+        updater.join()
+
+        snapshot = self.fee_manager.get_snapshot()
+        self.assertEqual(snapshot.config["fee_strategy"], "competitive")
+        self.assertIs(snapshot.channel_stats, published.channel_stats)
+
+if __name__ == "__main__":
+    unittest.main()
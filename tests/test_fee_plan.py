@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para o plano de atualização de taxas (simulação, histerese e aplicação de planos gravados)
+"""
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from fee_manager import FeeManager
+
+def mock_lnd_client(channels):
+    """Cliente LND simulado com os canais informados e política local inicial de 100 ppm"""
+    client = MagicMock()
+    client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+    client.list_channels.return_value = {"channels": channels}
+    policies = {}
+
+    def get_channel_info(chan_id):
+        """Política local do canal (a última enviada) e política do peer"""
+        return {
+            "node1_pub": "test_pubkey",
+            "node1_policy": policies.get(chan_id, {"fee_base_msat": "1000", "fee_rate_milli_msat": "100",
+                                                   "time_lock_delta": 40}),
+            "node2_policy": {"fee_base_msat": "1000", "fee_rate_milli_msat": "200", "time_lock_delta": 40}
+        }
+
+    def update_channel_policy(chan_point, base_fee_msat, fee_rate, time_lock_delta, **kwargs):
+        """A política enviada passa a ser a política observada"""
+        chan_id = str(chan_point["output_index"] + 1)
+        policies[chan_id] = {"fee_base_msat": str(base_fee_msat),
+                             "fee_rate_milli_msat": str(int(round(fee_rate * 1000000))),
+                             "time_lock_delta": time_lock_delta}
+        return {}
+
+    client.get_channel_info.side_effect = get_channel_info
+    client.update_channel_policy.side_effect = update_channel_policy
+    return client
+
+class TestFeePlan(unittest.TestCase):
+    """Testes para o plano de atualização de taxas"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+        self.channels = [
+            {"chan_id": "1", "channel_point": "txid:0", "capacity": "1000000",
+             "local_balance": "500000", "remote_balance": "500000", "remote_pubkey": "peer1"},
+            {"chan_id": "2", "channel_point": "txid:1", "capacity": "1000000",
+             "local_balance": "950000", "remote_balance": "50000", "remote_pubkey": "peer2"}
+        ]
+        self.client = mock_lnd_client(self.channels)
+        self.fee_manager = FeeManager(lnd_client=self.client)
+        self.fee_manager.collect_channel_data()
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_plan_does_not_push(self):
+        """Testa que o plano traz a política atual e a alvo de cada canal sem enviar nada"""
+        stats_before = json.dumps(self.fee_manager.channel_stats, sort_keys=True)
+        plan = self.fee_manager.plan_fees()
+
+        self.client.update_channel_policy.assert_not_called()
+        self.assertEqual(json.dumps(self.fee_manager.channel_stats, sort_keys=True), stats_before)
+        self.assertEqual(plan["channels"], 2)
+        self.assertEqual(plan["strategy"], "balanced")
+
+        entry = plan["entries"][1]
+        self.assertEqual(entry["chan_id"], "2")
+        self.assertEqual(entry["current"]["fee_rate_ppm"], 100)
+        self.assertEqual(entry["delta_ppm"], entry["target"]["fee_rate_ppm"] - 100)
+        self.assertEqual(entry["reason"], "inputs_changed")
+        self.assertEqual(entry["action"], "push")
+        self.assertEqual(entry["balance_ratio"], 0.95)
+
+    def test_apply_saved_plan(self):
+        """Testa que um plano gravado é aplicado exatamente, sem recálculo e sem reenvios"""
+        plan = json.loads(json.dumps(self.fee_manager.plan_fees()))
+        plan["entries"][0]["target"] = dict(plan["entries"][0]["target"], base_fee_msat=1234, fee_rate=0.000777)
+
+        # Canal fechado depois do plano não é enviado
+        self.client.list_channels.return_value = {"channels": self.channels[1:]}
+        self.fee_manager.update_channel_fees(plan=plan)
+        self.assertEqual(self.client.update_channel_policy.call_count, 1)
+        pushed = self.client.update_channel_policy.call_args.kwargs
+        self.assertEqual(pushed["fee_rate"], plan["entries"][1]["target"]["fee_rate"])
+        self.assertEqual(self.fee_manager.channel_stats["2"]["fingerprint"], plan["entries"][1]["fingerprint"])
+
+        # Aplicar o plano de novo envia apenas o que ainda não está em vigor
+        self.client.list_channels.return_value = {"channels": self.channels}
+        self.fee_manager.update_channel_fees(plan=plan)
+        self.assertEqual(self.client.update_channel_policy.call_count, 2)
+        pushed = self.client.update_channel_policy.call_args.kwargs
+        self.assertEqual(pushed["base_fee_msat"], 1234)
+        self.assertEqual(pushed["fee_rate"], 0.000777)
+        self.assertEqual(self.fee_manager.last_update_stats["applied"], 1)
+        self.assertEqual(self.fee_manager.last_update_stats["pushed"], 1)
+
+    def test_hysteresis(self):
+        """Testa que mudanças pequenas da taxa proporcional não são enviadas"""
+        # Pequena mudança de saldo com histerese ampla (taxa base fixa)
+        self.fee_manager.config.update(fee_hysteresis_ratio=0.5, min_base_fee_msat=1000, max_base_fee_msat=1001)
+        self.fee_manager.update_channel_fees(force=True)
+        self.client.update_channel_policy.reset_mock()
+        pushed = self.fee_manager.channel_stats["2"]["fee_history"][-1]["fee_rate"]
+        self.channels[1] = dict(self.channels[1], local_balance="940000", remote_balance="60000")
+        self.fee_manager.collect_channel_data()
+
+        entry = self.fee_manager.plan_fees()["entries"][1]
+        self.assertEqual(entry["reason"], "inputs_changed")
+        self.assertTrue(entry["hysteresis"])
+        self.assertEqual(entry["action"], "skip")
+        self.assertEqual(self.fee_manager.plan_fees()["entries"][0]["reason"], "inputs_unchanged")
+
+        self.fee_manager.update_channel_fees()
+        self.client.update_channel_policy.assert_not_called()
+        self.assertEqual(self.fee_manager.last_update_stats["hysteresis"], 1)
+        self.assertEqual(self.fee_manager.channel_stats["2"]["fee_history"][-1]["fee_rate"], pushed)
+
+        # force ignora a histerese
+        self.fee_manager.update_channel_fees(force=True)
+        self.assertEqual(self.client.update_channel_policy.call_count, 2)
+
+    def test_restart_does_not_repush(self):
+        """Testa que as políticas confirmadas pelo LND não são reenviadas após um reinício"""
+        self.fee_manager.update_channel_fees()
+        self.assertEqual(self.client.update_channel_policy.call_count, 2)
+        self.assertIn("applied_at", self.fee_manager.channel_stats["2"]["applied_policy"])
+        self.fee_manager.state_writer.flush()
+
+        # Reinício com impressões digitais perdidas (por exemplo, estado de uma versão anterior)
+        restarted = FeeManager(lnd_client=self.client)
+        for channel in restarted.channel_stats.values():
+            del channel["fingerprint"]
+        restarted.update_channel_fees()
+        self.assertEqual(self.client.update_channel_policy.call_count, 2)
+        self.assertEqual(restarted.last_update_stats["applied"], 2)
+        self.assertIn("fingerprint", restarted.channel_stats["1"])
+
+        # Mudança externa da política é observada na coleta e a política alvo é reenviada
+        self.client.update_channel_policy(chan_point={"output_index": 0}, base_fee_msat=1000,
+                                          fee_rate=0.00005, time_lock_delta=40)
+        restarted.collect_channel_data()
+        restarted.update_channel_fees()
+        self.assertEqual(self.client.update_channel_policy.call_count, 4)
+        self.assertEqual(restarted.last_update_stats["pushed"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
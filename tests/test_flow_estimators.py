@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para os estimadores de fluxo por média móvel exponencial
+"""
+
+import os
+import sys
+import json
+import random
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from flow_estimators import (HALF_LIFE_SECONDS, bootstrap_estimators, ewma_alpha,
+                             update_fee_estimator, update_flow_estimators)
+from backtest import ReplayHistory, SERIES_KERNELS
+from strategies import ChannelInput, StrategyFeatures, get_strategy
+from fee_manager import FeeManager
+
+CONFIG = {
+    "fee_strategy": "balanced",
+    "min_base_fee_msat": 1000,
+    "max_base_fee_msat": 5000,
+    "min_fee_rate": 0.000001,
+    "max_fee_rate": 0.001,
+    "time_lock_delta": 40,
+    "flow_weight": 0.7,
+    "peer_weight": 0.3,
+    "high_flow_threshold": 0.8,
+    "low_flow_threshold": 0.2,
+    "smooth_flow": True,
+    "ewma_half_life_seconds": 21600
+}
+
+def sample(timestamp, outbound_ratio, volume_in=0, volume_out=0):
+    """Monta uma amostra de fluxo"""
+    return {
+        "timestamp": timestamp,
+        "inbound_ratio": 1 - outbound_ratio,
+        "outbound_ratio": outbound_ratio,
+        "balance_ratio": outbound_ratio,
+        "forwarding_volume_in": volume_in,
+        "forwarding_volume_out": volume_out
+    }
+
+class TestFlowEstimators(unittest.TestCase):
+    """Testes para os estimadores de fluxo"""
+
+    def test_time_aware_alpha(self):
+        """Testa o peso das amostras em função do intervalo"""
+        self.assertAlmostEqual(ewma_alpha(HALF_LIFE_SECONDS), 0.5)
+        self.assertEqual(ewma_alpha(0), 0.0)
+        self.assertGreater(ewma_alpha(7200), ewma_alpha(3600))
+
+        first = update_flow_estimators(None, sample(0, 0.0), None)
+        second = update_flow_estimators(first, sample(HALF_LIFE_SECONDS, 1.0), sample(0, 0.0))
+
+        self.assertEqual(first["balance_ratio"], 0.0)
+        self.assertAlmostEqual(second["balance_ratio"], 0.5)
+        # O dicionário anterior não é alterado (pode estar exposto em um snapshot)
+        self.assertEqual(first["samples"], 1)
+
+    def test_rates(self):
+        """Testa a deriva do saldo, o volume por hora e as mudanças de taxa"""
+        previous = sample(0, 0.5, volume_in=1000, volume_out=5000)
+        estimators = update_flow_estimators(None, previous, None)
+        # Uma meia-vida depois: metade do valor instantâneo
+        current = sample(HALF_LIFE_SECONDS, 0.2, volume_in=1000 + 6 * 600, volume_out=300)
+        estimators = update_flow_estimators(estimators, current, previous)
+
+        self.assertAlmostEqual(estimators["balance_drift_per_hour"], -0.3 / 6 / 2)
+        self.assertAlmostEqual(estimators["volume_in_per_hour"], 600 / 2)
+        # Contador reiniciado: o valor atual é o volume do intervalo
+        self.assertAlmostEqual(estimators["volume_out_per_hour"], 50 / 2)
+
+        fee = {"timestamp": 0, "base_fee_msat": 1000, "fee_rate": 0.0001}
+        changed = {"timestamp": HALF_LIFE_SECONDS, "base_fee_msat": 1000, "fee_rate": 0.0002}
+        estimators = update_fee_estimator(estimators, fee, None)
+        estimators = update_fee_estimator(estimators, changed, fee)
+        # Uma mudança em 6 horas = 4 por dia, com peso 0.5
+        self.assertAlmostEqual(estimators["fee_changes_per_day"], 2.0)
+
+    def test_incremental_matches_bootstrap(self):
+        """Testa que a atualização incremental do FeeManager equivale à reconstrução"""
+        old_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                mock_lnd_client = MagicMock()
+                mock_lnd_client.get_info.return_value = {"identity_pubkey": "us"}
+                mock_lnd_client.get_channel_info.return_value = {
+                    "node1_pub": "us",
+                    "node1_policy": {"fee_base_msat": "1000", "fee_rate_milli_msat": "100"},
+                    "node2_policy": {"fee_base_msat": "2000", "fee_rate_milli_msat": "200"}
+                }
+                fee_manager = FeeManager(lnd_client=mock_lnd_client)
+
+                rng = random.Random(3)
+                for step in range(30):
+                    local_balance = rng.randint(0, 1000000)
+                    mock_lnd_client.list_channels.return_value = {"channels": [{
+                        "chan_id": "1", "channel_point": "txid:0", "capacity": "1000000",
+                        "local_balance": str(local_balance), "remote_balance": str(1000000 - local_balance),
+                        "remote_pubkey": "peer", "total_satoshis_sent": str(step * 1000)
+                    }]}
+                    with unittest.mock.patch("fee_manager.time.time", return_value=1700000000 + step * 3600):
+                        fee_manager.collect_channel_data()
+
+                channel = fee_manager.channel_stats["1"]
+                self.assertEqual(channel["estimators"]["samples"], 30)
+                self.assertEqual(channel["estimators"], bootstrap_estimators(channel, 21600))
+
+                # Os estimadores são persistidos com o estado
+                with open("channel_stats.json", 'r') as f:
+                    saved = json.load(f)
+                self.assertEqual(saved["1"]["estimators"], channel["estimators"])
+
+                # Estados antigos sem estimadores são reconstruídos na carga
+                del saved["1"]["estimators"]
+                with open("channel_stats.json", 'w') as f:
+                    json.dump(saved, f)
+                reloaded = FeeManager(lnd_client=mock_lnd_client)
+                self.assertEqual(reloaded.channel_stats["1"]["estimators"], channel["estimators"])
+            finally:
+                os.chdir(old_cwd)
+
+    def test_smooth_flow(self):
+        """Testa que um pico isolado não muda a classe de fluxo com smooth_flow"""
+        flow_history = [sample(step * 3600, 0.5) for step in range(24)] + [sample(24 * 3600, 0.95)]
+        channel = {"remote_pubkey": "peer", "flow_history": flow_history}
+        row = ChannelInput("1", "peer", flow_history[-1], None)
+        features = StrategyFeatures.compute([row], {"1": channel}, {})
+        balanced = get_strategy("balanced")
+
+        smoothed = balanced.compute(row, features, CONFIG)
+        instantaneous = balanced.compute(row, features, dict(CONFIG, smooth_flow=False))
+        steady = balanced.compute(ChannelInput("1", "peer", flow_history[0], None), features,
+                                  dict(CONFIG, smooth_flow=False))
+
+        self.assertEqual(smoothed, steady)
+        self.assertGreater(instantaneous["fee_rate"], smoothed["fee_rate"])
+
+    def test_backtest_parity(self):
+        """Testa que o replay com smooth_flow reproduz a estratégia ao vivo"""
+        rng = random.Random(5)
+        flow_history = []
+        timestamp = 0
+        for step in range(200):
+            timestamp += rng.choice((1800, 3600, 3600, 7200))
+            flow_history.append(sample(timestamp, rng.random()))
+        channel = {"remote_pubkey": "peer", "flow_history": [], "fee_history": []}
+        series = ReplayHistory.from_stats({"1": dict(channel, flow_history=flow_history)}, {}).channels["1"]
+        starts, base_fees, fee_rates_ppm = SERIES_KERNELS["balanced"](series, CONFIG)
+
+        balanced = get_strategy("balanced")
+        estimators = None
+        previous = None
+        run = -1
+        for position, flow_data in enumerate(flow_history):
+            estimators = update_flow_estimators(estimators, flow_data, previous, 21600)
+            previous = flow_data
+            features = StrategyFeatures(ewma_flows={"1": estimators})
+            expected = balanced.compute(ChannelInput("1", "peer", flow_data, None), features, CONFIG)
+            if run + 1 < len(starts) and starts[run + 1] == position:
+                run += 1
+            self.assertEqual(base_fees[run], expected["base_fee_msat"], f"diverge na amostra {position}")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para a análise de centralidade do grafo
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from graph_analytics import CompactGraph, GraphAnalytics, sampled_betweenness
+from strategies import ChannelInput, StrategyFeatures
+from fee_manager import FeeManager
+
+POLICY = {"fee_base_msat": "1000", "fee_rate_milli_msat": "100", "disabled": False}
+
+def make_graph(channels):
+    """Monta um describegraph a partir de pares (chan_id, node1, node2)"""
+    return {"edges": [
+        {"channel_id": chan_id, "node1_pub": node1, "node2_pub": node2,
+         "node1_policy": dict(POLICY), "node2_policy": dict(POLICY)}
+        for chan_id, node1, node2 in channels
+    ]}
+
+# Linha A - us - C - D
+LINE = [("1", "A", "us"), ("2", "us", "C"), ("3", "C", "D")]
+
+# Losango: dois caminhos mínimos entre A e D, um deles passando por nós
+DIAMOND = [("1", "A", "us"), ("2", "us", "D"), ("3", "A", "C"), ("4", "C", "D")]
+
+class TestGraphAnalytics(unittest.TestCase):
+    """Testes para a centralidade dos canais"""
+
+    def test_compact_graph(self):
+        """Testa a representação CSR"""
+        graph_data = make_graph(LINE)
+        graph_data["edges"][2]["node2_policy"]["disabled"] = True
+        graph = CompactGraph.from_graph(graph_data, "us")
+
+        self.assertEqual(len(graph), 4)
+        self.assertEqual(graph.our_channels, ["1", "2"])
+        # Seis arcos possíveis, menos o lado desabilitado D -> C
+        self.assertEqual(graph.arc_count, 5)
+
+        def neighbours(pubkey):
+            v = graph.pubkeys.index(pubkey)
+            return sorted(graph.pubkeys[graph.targets[slot]]
+                          for slot in range(graph.offsets[v], graph.offsets[v + 1]))
+
+        self.assertEqual(neighbours("us"), ["A", "C"])
+        self.assertEqual(neighbours("C"), ["D", "us"])
+        self.assertEqual(neighbours("D"), [])
+
+    def test_exact_betweenness(self):
+        """Testa a centralidade exata (todas as origens) contra valores calculados à mão"""
+        line = sampled_betweenness(CompactGraph.from_graph(make_graph(LINE), "us"), samples=0, workers=1)
+        # 6 e 8 pares ordenados passam pelos canais, de 12 pares possíveis
+        self.assertAlmostEqual(line["1"], 6 / 12)
+        self.assertAlmostEqual(line["2"], 8 / 12)
+
+        diamond = sampled_betweenness(CompactGraph.from_graph(make_graph(DIAMOND), "us"), samples=0, workers=1)
+        # Caminhos mínimos divididos contam pela metade
+        self.assertAlmostEqual(diamond["1"], 4 / 12)
+        self.assertAlmostEqual(diamond["2"], 4 / 12)
+
+    def test_parallel_matches_serial(self):
+        """Testa que o cálculo em vários processos produz o mesmo resultado"""
+        channels = [(str(index), f"n{index}", f"n{(index * 7 + 3) % 40}") for index in range(80)]
+        channels += [("100", "us", "n1"), ("101", "us", "n17"), ("102", "n30", "us")]
+        graph = CompactGraph.from_graph(make_graph(channels), "us")
+
+        serial = sampled_betweenness(graph, samples=20, workers=1, seed=3)
+        parallel = sampled_betweenness(graph, samples=20, workers=2, seed=3)
+
+        self.assertEqual(set(serial), {"100", "101", "102"})
+        for chan_id, value in serial.items():
+            self.assertAlmostEqual(parallel[chan_id], value)
+
+    def test_cache(self):
+        """Testa que a centralidade só é recalculada quando o grafo muda materialmente"""
+        channels = [(str(index), f"n{index}", f"n{index + 1}") for index in range(40)] + [("100", "us", "n0")]
+        analytics = GraphAnalytics(samples=0, workers=1, change_threshold=0.05)
+
+        self.assertTrue(analytics.update(make_graph(channels), "us"))
+        self.assertFalse(analytics.update(make_graph(channels), "us"))
+
+        # Um canal novo em 41 (abaixo de 5%) não invalida o cache
+        self.assertFalse(analytics.update(make_graph(channels + [("200", "n5", "n9")]), "us"))
+
+        # Cinco canais novos passam do limite
+        extra = [(str(300 + index), f"n{index}", f"n{index + 10}") for index in range(5)]
+        self.assertTrue(analytics.update(make_graph(channels + extra), "us"))
+
+        # Um canal nosso novo sempre invalida o cache
+        self.assertTrue(analytics.update(make_graph(channels + extra + [("400", "us", "n20")]), "us"))
+        scores = analytics.channel_scores()
+        self.assertEqual(set(scores), {"100", "400"})
+        self.assertEqual(max(score["rank"] for score in scores.values()), 1.0)
+
+    def test_fee_manager_features(self):
+        """Testa a centralidade como atributo das estratégias"""
+        old_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                mock_lnd_client = MagicMock()
+                mock_lnd_client.get_info.return_value = {"identity_pubkey": "us"}
+                mock_lnd_client.describe_graph.return_value = make_graph(LINE)
+                fee_manager = FeeManager(lnd_client=mock_lnd_client)
+
+                # Desabilitado por padrão: o grafo não é carregado
+                self.assertFalse(fee_manager.refresh_graph_index())
+                mock_lnd_client.describe_graph.assert_not_called()
+
+                fee_manager.config["use_centrality"] = True
+                fee_manager.config["centrality_samples"] = 0
+                self.assertTrue(fee_manager.refresh_graph_index())
+                self.assertFalse(fee_manager.refresh_graph_index())
+
+                batch = [ChannelInput("2", "C", {}, None)]
+                features = StrategyFeatures.compute(batch, {}, {},
+                                                    centrality=fee_manager.graph_analytics.channel_scores())
+                self.assertEqual(set(features.centrality), {"2"})
+                self.assertAlmostEqual(features.centrality["2"]["betweenness"], 8 / 12)
+            finally:
+                os.chdir(old_cwd)
+
+if __name__ == "__main__":
+    unittest.main()
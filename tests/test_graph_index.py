@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para o índice de quantis de taxas da rede
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from graph_index import FeeQuantileIndex
+from fee_manager import FeeManager
+
+def policy(base_fee_msat, fee_rate_ppm, disabled=False):
+    """Monta uma política de roteamento no formato do LND"""
+    return {
+        "fee_base_msat": str(base_fee_msat),
+        "fee_rate_milli_msat": str(fee_rate_ppm),
+        "time_lock_delta": 40,
+        "disabled": disabled
+    }
+
+def star_graph(target, rates):
+    """Grafo em que cada node encaminha até target com uma taxa de rates"""
+    return {"edges": [
+        {
+            "channel_id": str(100 + index),
+            "node1_pub": f"node{index}",
+            "node2_pub": target,
+            "node1_policy": policy(index * 100, rate),
+            "node2_policy": policy(0, 1)
+        }
+        for index, rate in enumerate(rates)
+    ]}
+
+class TestGraphIndex(unittest.TestCase):
+    """Testes para o índice de quantis de taxas"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.index = FeeQuantileIndex()
+        self.index.load_graph(star_graph("peer", [10, 20, 30, 40, 50]))
+
+    def test_load_graph(self):
+        """Testa os quantis calculados a partir do grafo completo"""
+        quantiles = self.index.node_quantiles("peer")
+
+        self.assertEqual(quantiles["channels"], 5)
+        self.assertEqual(quantiles["fee_rate_ppm"]["p50"], 30)
+        self.assertAlmostEqual(quantiles["fee_rate_ppm"]["p10"], 14)
+        self.assertAlmostEqual(quantiles["fee_rate_ppm"]["p90"], 46)
+        self.assertEqual(quantiles["base_fee_msat"]["p50"], 200)
+
+        # A política de peer em cada canal entra na distribuição do outro lado
+        self.assertEqual(self.index.node_quantiles("node0")["fee_rate_ppm"]["p50"], 1)
+        self.assertIsNone(self.index.node_quantiles("unknown"))
+        self.assertEqual(self.index.stats()["channels"], 5)
+
+    def test_incremental_updates(self):
+        """Testa as atualizações de gossip"""
+        # Mudança de taxa substitui a política anterior
+        self.index.apply_channel_update("100", "node0", "peer", policy(0, 90))
+        self.assertEqual(self.index.node_quantiles("peer")["fee_rate_ppm"]["p50"], 40)
+
+        # Política desabilitada sai da distribuição
+        self.index.apply_channel_update("101", "node1", "peer", policy(100, 20, disabled=True))
+        self.assertEqual(self.index.node_quantiles("peer")["channels"], 4)
+
+        # Novo canal e canal fechado pela mensagem de topologia
+        applied = self.index.apply_topology_update({
+            "channel_updates": [{
+                "chan_id": "200",
+                "advertising_node": "node9",
+                "connecting_node": "peer",
+                "routing_policy": policy(0, 5)
+            }],
+            "closed_chans": [{"chan_id": "102"}]
+        })
+        self.assertEqual(applied, 2)
+
+        quantiles = self.index.node_quantiles("peer")
+        self.assertEqual(quantiles["channels"], 4)
+        self.assertEqual(quantiles["fee_rate_ppm"]["p50"], 45)
+
+        # O resultado incremental é igual ao de uma carga completa equivalente
+        rebuilt = FeeQuantileIndex()
+        rebuilt.load_graph(star_graph("peer", [5, 40, 50, 90]))
+        self.assertEqual(rebuilt.node_quantiles("peer")["fee_rate_ppm"], quantiles["fee_rate_ppm"])
+
+        # Fechar todos os canais remove o node
+        for chan_id in ("100", "101", "103", "104", "200"):
+            self.index.close_channel(chan_id)
+        self.assertIsNone(self.index.node_quantiles("peer"))
+
+    def test_competitive_uses_market_fees(self):
+        """Testa a estratégia competitiva com os quantis da rede"""
+        old_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                mock_lnd_client = MagicMock()
+                mock_lnd_client.describe_graph.return_value = star_graph("peer", [100, 200, 300])
+                fee_manager = FeeManager(lnd_client=mock_lnd_client)
+                fee_manager.channel_stats = {"1": {
+                    "remote_pubkey": "peer",
+                    "flow_history": [{"inbound_ratio": 0.5, "outbound_ratio": 0.5, "balance_ratio": 0.5}],
+                    "fee_history": []
+                }}
+                fee_manager.peer_fees = {"peer": [
+                    {"chan_id": "1", "base_fee_msat": 1000, "fee_rate": 0.0005, "time_lock_delta": 40}
+                ]}
+                fee_manager.config["fee_strategy"] = "competitive"
+
+                # Sem use_market_fees o grafo não é carregado e a referência é o peer
+                self.assertFalse(fee_manager.refresh_graph_index())
+                self.assertAlmostEqual(fee_manager.calculate_optimal_fees("1")["fee_rate"], 0.00045)
+
+                fee_manager.config["use_market_fees"] = True
+                self.assertTrue(fee_manager.refresh_graph_index())
+                self.assertFalse(fee_manager.refresh_graph_index())
+
+                # 90% da mediana da rede (200 ppm)
+                self.assertAlmostEqual(fee_manager.calculate_optimal_fees("1")["fee_rate"], 0.00018)
+            finally:
+                os.chdir(old_cwd)
+
+if __name__ == "__main__":
+    unittest.main()
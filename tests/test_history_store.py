@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para o armazenamento dos históricos por canal (lazy_history)
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from history_store import HistoryStore, load_channel_stats, merge_records
+from fee_manager import FeeManager
+
+def sample(timestamp, ratio=0.5):
+    """Amostra de fluxo de teste"""
+    return {"timestamp": timestamp, "balance_ratio": ratio}
+
+class TestHistoryStore(unittest.TestCase):
+    """Testes para o armazenamento dos históricos"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_merge_records(self):
+        """Testa que registros com a mesma identidade são substituídos pelos mais recentes"""
+        merged = merge_records([sample(1), sample(2, 0.1)], [sample(2, 0.9), {"start": 0}])
+        self.assertEqual([record.get("timestamp") for record in merged], [None, 1, 2])
+        self.assertEqual(merged[2]["balance_ratio"], 0.9)
+
+    def test_spill_and_materialize(self):
+        """Testa que apenas os registros recentes ficam em memória e o histórico completo é remontado"""
+        store = HistoryStore()
+        channel = {"capacity": 1000, "flow_history": [sample(t) for t in range(5)], "fee_history": []}
+
+        self.assertEqual(store.spill("1", channel), 5)
+        self.assertEqual(channel["flow_history"], [sample(4)])
+        self.assertEqual(channel["history_log"]["records"], 5)
+
+        # Apenas a nova amostra é acrescentada ao log
+        channel["flow_history"].append(sample(5))
+        self.assertEqual(store.spill("1", channel), 1)
+        self.assertEqual(store.spill("1", channel), 0)
+
+        full = store.materialize("1", channel)
+        self.assertEqual([record["timestamp"] for record in full["flow_history"]], list(range(6)))
+        self.assertEqual(full["capacity"], 1000)
+        self.assertEqual(len(channel["flow_history"]), 1)
+
+        # Linha incompleta de uma gravação interrompida
+        with open(store.path("1"), "a") as f:
+            f.write('{"k": "flow_history", "r": {"time')
+        self.assertEqual(len(store.materialize("1", channel)["flow_history"]), 6)
+
+        store.delete("1")
+        self.assertFalse(os.path.exists(store.path("1")))
+
+    def test_replaced_record(self):
+        """Testa que um registro substituído em memória prevalece sobre a versão gravada"""
+        store = HistoryStore()
+        channel = {"fee_history": [{"timestamp": 1, "fee_rate": 0.0001, "last_seen": 1}]}
+        store.spill("1", channel)
+
+        channel["fee_history"][-1] = dict(channel["fee_history"][-1], last_seen=5)
+        self.assertEqual(store.spill("1", channel), 1)
+        self.assertEqual(store.materialize("1", channel)["fee_history"],
+                         [{"timestamp": 1, "fee_rate": 0.0001, "last_seen": 5}])
+
+    def test_compaction(self):
+        """Testa que o log é compactado e respeita o limite de registros"""
+        store = HistoryStore(max_records=10)
+        channel = {"flow_history": []}
+        with patch("history_store.COMPACT_MIN_RECORDS", 20):
+            for timestamp in range(50):
+                channel["flow_history"].append(sample(timestamp))
+                store.spill("1", channel)
+
+        with open(store.path("1")) as f:
+            self.assertLessEqual(len(f.readlines()), 20)
+        full = load_channel_stats({"1": channel}, max_records=10)["1"]
+        self.assertEqual([record["timestamp"] for record in full["flow_history"]], list(range(40, 50)))
+
+    def test_fee_manager_lazy_history(self):
+        """Testa o modo lazy_history do FeeManager, inclusive após reinício e ao ser desligado"""
+        client = MagicMock()
+        client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+        client.list_channels.return_value = {"channels": [
+            {"chan_id": "1", "channel_point": "txid:0", "capacity": "1000000",
+             "local_balance": "500000", "remote_balance": "500000", "remote_pubkey": "peer1"}
+        ]}
+        client.get_channel_info.return_value = {
+            "node1_pub": "test_pubkey",
+            "node1_policy": {"fee_base_msat": "1000", "fee_rate_milli_msat": "100", "time_lock_delta": 40},
+            "node2_policy": {"fee_base_msat": "2000", "fee_rate_milli_msat": "200", "time_lock_delta": 40}
+        }
+
+        fee_manager = FeeManager(lnd_client=client)
+        fee_manager.update_config({"lazy_history": True})
+        for now in (1000, 4600, 8200):
+            with patch("time.time", return_value=float(now)):
+                fee_manager.collect_channel_data()
+
+        self.assertEqual(len(fee_manager.channel_stats["1"]["flow_history"]), 1)
+        self.assertEqual(len(fee_manager.load_history("1")["flow_history"]), 3)
+        self.assertEqual(fee_manager.policy_at("1", 4600)["local"]["fee_rate"], 0.0001)
+
+        # Reinício: apenas o resumo é carregado; o histórico continua disponível
+        restarted = FeeManager(lnd_client=client)
+        self.assertEqual(len(restarted.channel_stats["1"]["flow_history"]), 1)
+        self.assertEqual(len(restarted.load_history("1")["flow_history"]), 3)
+
+        # Desligado: os históricos voltam para a memória
+        restarted.update_config({"lazy_history": False})
+        self.assertEqual(len(FeeManager(lnd_client=client).channel_stats["1"]["flow_history"]), 3)
+
+    def test_fee_manager_tiers_in_log(self):
+        """Testa que sem lazy_history as camadas ficam no log e os históricos brutos em memória"""
+        client = MagicMock()
+        client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+        client.list_channels.return_value = {"channels": [
+            {"chan_id": "1", "channel_point": "txid:0", "capacity": "1000000",
+             "local_balance": "500000", "remote_balance": "500000", "remote_pubkey": "peer1"}
+        ]}
+        client.get_channel_info.return_value = {}
+
+        fee_manager = FeeManager(lnd_client=client)
+        for day in range(3):
+            with patch("time.time", return_value=float(10 * 86400 + day * 86400)):
+                fee_manager.collect_channel_data()
+
+        channel = fee_manager.channel_stats["1"]
+        self.assertEqual(len(channel["flow_history"]), 3)
+        self.assertEqual(len(channel["daily_history"]), 1)
+        self.assertFalse(channel["history_log"]["lazy"])
+        self.assertEqual(len(fee_manager.load_history("1")["daily_history"]), 3)
+
+        # Apenas as camadas são gravadas no log
+        self.assertEqual(set(HistoryStore().read("1")), {"daily_history", "weekly_history"})
+
+if __name__ == "__main__":
+    unittest.main()
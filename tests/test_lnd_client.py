@@ -14,7 +14,7 @@ from unittest.mock import patch, MagicMock
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Importar o módulo a ser testado
-from lnd_client_rest import LNDClient
+from lnd_client_rest import LNDClient, parse_failed_updates
 
 class TestLNDClient(unittest.TestCase):
     """Testes para o cliente LND"""
@@ -110,6 +110,71 @@ class TestLNDClient(unittest.TestCase):
         self.assertIn("failed_updates", result)
         self.assertEqual(len(result["failed_updates"]), 0)
     
+    def test_parse_failed_updates(self):
+        """Testa a extração das falhas por canal da resposta de updatechanpolicy"""
+        self.assertEqual(parse_failed_updates({"failed_updates": []}), [])
+        self.assertEqual(parse_failed_updates({}), [])
+
+        failures = parse_failed_updates({"failed_updates": [
+            {"outpoint": {"txid_str": "abc", "output_index": 1}, "reason": "UPDATE_FAILURE_PENDING",
+             "update_error": "pending"},
+            {"update_error": "falha"}
+        ]})
+        self.assertEqual(failures[0], {"channel_point": "abc:1", "reason": "UPDATE_FAILURE_PENDING",
+                                       "error": "pending"})
+        self.assertEqual(failures[1], {"channel_point": None, "reason": "UPDATE_FAILURE_UNKNOWN", "error": "falha"})
+    
+    def test_get_chan_point(self):
+        """Testa a resolução do chan_point pelo índice em cache"""
+        chan_point = self.client.get_chan_point("724725106597969920")
+        self.assertEqual(chan_point["output_index"], 0)
+        self.assertEqual(len(chan_point["funding_txid_str"]), 64)
+        
+        # Canal desconhecido
+        self.assertIsNone(self.client.get_chan_point("1"))
+        
+        # Índice válido não gera nova listagem de canais
+        with patch.object(LNDClient, 'list_channels') as mock_list:
+            self.client.get_chan_point("724725106597969921")
+            mock_list.assert_not_called()
+        
+        # Canal desconhecido não gera nova listagem até o índice expirar
+        with patch.object(LNDClient, 'list_channels') as mock_list:
+            self.assertIsNone(self.client.get_chan_point("1"))
+            self.client.update_channel_policies([{"chan_id": "1", "base_fee_msat": 1000, "fee_rate": 0.000001}])
+            mock_list.assert_not_called()
+    
+    def test_update_channel_policies(self):
+        """Testa a atualização de políticas em lote"""
+        policies = [
+            {"chan_id": "724725106597969920", "base_fee_msat": 1000, "fee_rate": 0.000001, "time_lock_delta": 40},
+            {"chan_id": "724725106597969921", "base_fee_msat": 2000, "fee_rate": 0.000002},
+            {"chan_id": "1", "base_fee_msat": 1000, "fee_rate": 0.000001},
+            {"chan_id": "724725106597969920"}
+        ]
+        
+        results = self.client.update_channel_policies(policies, max_concurrency=2)
+        
+        self.assertEqual(len(results), 4)
+        self.assertEqual([r["chan_id"] for r in results], [p["chan_id"] for p in policies])
+        self.assertTrue(results[0]["success"])
+        self.assertTrue(results[1]["success"])
+        self.assertFalse(results[2]["success"])
+        self.assertFalse(results[3]["success"])
+    
+    def test_describe_graph(self):
+        """Testa a obtenção do grafo da rede"""
+        graph = self.client.describe_graph()
+        self.assertIn("nodes", graph)
+        self.assertIn("edges", graph)
+        
+        edge = graph["edges"][0]
+        for key in ("channel_id", "node1_pub", "node2_pub", "node1_policy", "node2_policy"):
+            self.assertIn(key, edge)
+        
+        # Sem LND real não há gossip para assinar
+        self.assertEqual(list(self.client.subscribe_channel_graph()), [])
+    
     def test_error_handling(self):
         """Testa o tratamento de erros"""
         # Simular um erro na API
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para a agregação dos canais por peer
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from strategies import ChannelInput, StrategyFeatures
+from peer_aggregates import aggregate_features, aggregate_policy, build_peer_aggregates
+from fee_manager import FeeManager
+
+CONFIG = {
+    "fee_strategy": "balanced",
+    "update_interval_seconds": 3600,
+    "min_base_fee_msat": 1000,
+    "max_base_fee_msat": 5000,
+    "min_fee_rate": 0.000001,
+    "max_fee_rate": 0.001,
+    "time_lock_delta": 40,
+    "flow_weight": 0.7,
+    "peer_weight": 0.3,
+    "high_flow_threshold": 0.8,
+    "low_flow_threshold": 0.2,
+    "excluded_channels": [],
+    "enabled_channels": []
+}
+
+def flow(local_balance, remote_balance, volume_out=0):
+    """Amostra de fluxo de teste"""
+    total = local_balance + remote_balance
+    return {
+        "timestamp": 100,
+        "local_balance": local_balance,
+        "remote_balance": remote_balance,
+        "inbound_ratio": remote_balance / total,
+        "outbound_ratio": local_balance / total,
+        "balance_ratio": local_balance / total,
+        "forwarding_volume_in": 0,
+        "forwarding_volume_out": volume_out,
+        "forwarding_volume_in_total": 0,
+        "forwarding_volume_out_total": volume_out
+    }
+
+class TestPeerAggregates(unittest.TestCase):
+    """Testes para a agregação por peer"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+        self.batch = [
+            ChannelInput("2", "peer", flow(900000, 100000, 500), {"base_fee_msat": 1000, "fee_rate": 0.0001}),
+            ChannelInput("1", "peer", flow(100000, 2900000, 300), {"base_fee_msat": 3000, "fee_rate": 0.0003}),
+            ChannelInput("3", "other", flow(500000, 500000), None)
+        ]
+        self.channel_stats = {"1": {"capacity": 3000000}, "2": {"capacity": 1000000}, "3": {"capacity": 1000000}}
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_build_peer_aggregates(self):
+        """Testa a liquidez combinada dos canais paralelos"""
+        aggregates = build_peer_aggregates(self.batch, self.channel_stats)
+
+        peer = aggregates["peer"]
+        self.assertEqual(peer.channels, ["1", "2"])
+        self.assertEqual(peer.capacity, 4000000)
+        self.assertEqual(peer.flow_data["local_balance"], 1000000)
+        self.assertEqual(peer.flow_data["forwarding_volume_out"], 800)
+        self.assertAlmostEqual(peer.flow_data["outbound_ratio"], 0.25)
+        self.assertAlmostEqual(peer.flow_data["inbound_ratio"], 0.75)
+        self.assertEqual(peer.row.chan_id, "1")
+
+        # Peer com um único canal mantém a entrada original
+        self.assertIs(aggregates["other"].flow_data, self.batch[2].flow_data)
+        self.assertIsNone(aggregates["other"].peer_fee_data)
+
+    def test_aggregate_policy(self):
+        """Testa a política única do peer (mediana baixa, valor realmente anunciado)"""
+        policy = aggregate_policy(self.batch[:2])
+        self.assertEqual(policy["base_fee_msat"], 1000)
+        self.assertEqual(policy["fee_rate"], 0.0001)
+        self.assertIsNone(aggregate_policy(self.batch[2:]))
+
+    def test_aggregate_features(self):
+        """Testa os atributos por canal combinados para o canal representante"""
+        features = StrategyFeatures(
+            ewma_flows={"1": {"timestamp": 100, "samples": 3, "balance_ratio": 0.0, "volume_out_per_hour": 1.0},
+                        "2": {"timestamp": 90, "samples": 5, "balance_ratio": 1.0, "volume_out_per_hour": 2.0}},
+            volume_windows={"1": {"1h": {"in": 1, "out": 2}}, "2": {"1h": {"in": 3, "out": 4}}},
+            centrality={"1": {"betweenness": 0.1, "rank": 0.0}, "2": {"betweenness": 0.2, "rank": 1.0}}
+        )
+        combined = aggregate_features(features, build_peer_aggregates(self.batch, self.channel_stats))
+
+        # Média ponderada pela capacidade (3:1) e volumes somados
+        self.assertAlmostEqual(combined.ewma_flows["1"]["balance_ratio"], 0.25)
+        self.assertEqual(combined.ewma_flows["1"]["volume_out_per_hour"], 3.0)
+        self.assertEqual(combined.volume_windows["1"]["1h"], {"in": 4, "out": 6})
+        self.assertEqual(combined.centrality["1"]["betweenness"], 0.2)
+        self.assertNotIn("2", combined.ewma_flows)
+
+    def test_fee_manager_consistent_fees(self):
+        """Testa que os canais paralelos de um peer recebem a mesma taxa"""
+        mock_lnd_client = MagicMock()
+        mock_lnd_client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+        mock_lnd_client.list_channels.return_value = {"channels": [
+            {"chan_id": "1", "channel_point": "txid:0", "capacity": "1000000",
+             "local_balance": "900000", "remote_balance": "100000", "remote_pubkey": "peer"},
+            {"chan_id": "2", "channel_point": "txid:1", "capacity": "3000000",
+             "local_balance": "100000", "remote_balance": "2900000", "remote_pubkey": "peer"},
+            {"chan_id": "3", "channel_point": "txid:2", "capacity": "1000000",
+             "local_balance": "100000", "remote_balance": "900000", "remote_pubkey": "other"}
+        ]}
+        mock_lnd_client.get_channel_info.return_value = {"error": "sem dados"}
+        mock_lnd_client.update_channel_policy.return_value = {"failed_updates": []}
+
+        fee_manager = FeeManager(lnd_client=mock_lnd_client)
+        fee_manager.config = dict(CONFIG)
+        fee_manager.collect_channel_data()
+
+        # Sem agregação, os canais do peer têm classes de fluxo diferentes
+        fees = fee_manager.calculate_batch_fees(["1", "2", "3"])
+        self.assertNotEqual(fees["1"], fees["2"])
+
+        fee_manager.config["aggregate_peers"] = True
+        fees = fee_manager.calculate_batch_fees(["1", "2", "3"])
+        self.assertEqual(fees["1"], fees["2"])
+
+        # O cálculo de um único canal inclui os outros canais do peer
+        self.assertEqual(fee_manager.calculate_optimal_fees("2"), fees["2"])
+
+        # Cálculos e simulações (também feitos pela API web) não publicam os agregados
+        fee_manager.publish_snapshot("test")
+        fee_manager.plan_fees()
+        self.assertEqual(fee_manager.peer_aggregates, {})
+
+        fee_manager.update_channel_fees()
+        self.assertEqual(fee_manager.peer_aggregates["peer"]["capacity"], 4000000)
+        pushed = {call.kwargs["chan_point"]["output_index"]: call.kwargs["fee_rate"]
+                  for call in mock_lnd_client.update_channel_policy.call_args_list}
+        self.assertEqual(pushed[0], pushed[1])
+        self.assertEqual(fee_manager.last_update_stats["computed"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para a persistência atômica e assíncrona do estado
+"""
+
+import os
+import sys
+import json
+import threading
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+import persistence
+from persistence import StateWriter, atomic_write_json
+from fee_manager import FeeManager
+
+class TestPersistence(unittest.TestCase):
+    """Testes para a gravação do estado"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_atomic_write(self):
+        """Testa a gravação atômica e que uma falha preserva o arquivo anterior"""
+        size = atomic_write_json("state.json", {"a": [1, 2]})
+        self.assertEqual(size, os.path.getsize("state.json"))
+        with open("state.json") as f:
+            self.assertEqual(json.load(f), {"a": [1, 2]})
+
+        with self.assertRaises(TypeError):
+            atomic_write_json("state.json", {"a": object()})
+
+        with open("state.json") as f:
+            self.assertEqual(json.load(f), {"a": [1, 2]})
+        self.assertEqual(os.listdir("."), ["state.json"])
+
+    def test_synchronous_without_thread(self):
+        """Testa que, sem a thread iniciada, o pedido é gravado na hora"""
+        writer = StateWriter()
+        writer.request({"a.json": {"x": 1}, "b.json": [1]})
+
+        self.assertTrue(os.path.exists("a.json"))
+        stats = writer.stats()
+        self.assertEqual(stats["writes"], 1)
+        self.assertEqual(stats["bytes_written"], os.path.getsize("a.json") + os.path.getsize("b.json"))
+
+    def test_coalescing(self):
+        """Testa que pedidos feitos durante uma gravação são agrupados"""
+        started = threading.Event()
+        release = threading.Event()
+        real_write = persistence.atomic_write_json
+
+        def slow_write(path, data, indent=2):
+            started.set()
+            release.wait(5)
+            return real_write(path, data, indent)
+
+        writer = StateWriter()
+        writer.start()
+        try:
+            with patch("persistence.atomic_write_json", side_effect=slow_write):
+                writer.request({"state.json": {"version": 1}})
+                self.assertTrue(started.wait(5))
+
+                # Gravação em andamento: os dois pedidos seguintes viram uma única escrita
+                writer.request({"state.json": {"version": 2}})
+                writer.request({"state.json": {"version": 3}})
+                release.set()
+                self.assertTrue(writer.flush(5))
+        finally:
+            writer.stop()
+
+        with open("state.json") as f:
+            self.assertEqual(json.load(f), {"version": 3})
+        stats = writer.stats()
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["writes"], 2)
+        self.assertEqual(stats["coalesced"], 1)
+        self.assertGreater(stats["last_latency_seconds"], 0)
+
+    def test_write_error(self):
+        """Testa que erros de gravação são contados e não interrompem o gravador"""
+        writer = StateWriter()
+        writer.request({os.path.join("missing", "state.json"): {}})
+        self.assertEqual(writer.stats()["errors"], 1)
+
+        writer.request({"state.json": {}})
+        self.assertEqual(writer.stats()["writes"], 1)
+
+    def test_fee_manager_persists_snapshot(self):
+        """Testa que o FeeManager grava o snapshot publicado pela thread de persistência"""
+        mock_lnd_client = MagicMock()
+        mock_lnd_client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+        mock_lnd_client.list_channels.return_value = {"channels": [
+            {"chan_id": "1", "channel_point": "txid:0", "capacity": "1000000",
+             "local_balance": "500000", "remote_balance": "500000", "remote_pubkey": "peer1"}
+        ]}
+        mock_lnd_client.get_channel_info.return_value = {"error": "sem dados"}
+
+        fee_manager = FeeManager(lnd_client=mock_lnd_client)
+        fee_manager.state_writer.start()
+        try:
+            fee_manager.collect_channel_data()
+            self.assertTrue(fee_manager.state_writer.flush(5))
+        finally:
+            fee_manager.state_writer.stop()
+
+        with open("channel_stats.json") as f:
+            saved = json.load(f)
+        self.assertEqual(len(saved["1"]["flow_history"]), 1)
+        self.assertEqual(FeeManager(lnd_client=mock_lnd_client).channel_stats["1"]["capacity"], 1000000)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para o histórico de políticas por eventos de mudança
+"""
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from policy_history import compact_history, policy_applied, policy_at, policy_key, record_policy
+import strategies
+import fee_manager
+from fee_manager import FeeManager
+
+def policy(timestamp, fee_rate, chan_id=None, base_fee_msat=1000):
+    """Registro de política de teste"""
+    record = {"timestamp": timestamp, "base_fee_msat": base_fee_msat, "fee_rate": fee_rate, "time_lock_delta": 40}
+    if chan_id is not None:
+        record["chan_id"] = chan_id
+    return record
+
+class TestPolicyHistory(unittest.TestCase):
+    """Testes para o histórico de políticas"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_record_policy(self):
+        """Testa que apenas mudanças são acrescentadas e last_seen acompanha as observações"""
+        history = []
+        self.assertTrue(record_policy(history, policy(100, 0.0001)))
+        first = history[0]
+
+        self.assertFalse(record_policy(history, policy(200, 0.0001)))
+        self.assertEqual(len(history), 1)
+        self.assertEqual(history[0]["last_seen"], 200)
+        self.assertEqual(history[0]["timestamp"], 100)
+
+        # O registro gravado não é alterado (pode estar em um snapshot)
+        self.assertEqual(first["last_seen"], 100)
+
+        self.assertTrue(record_policy(history, policy(300, 0.0002)))
+        self.assertEqual(len(history), 2)
+
+    def test_peer_history_per_channel(self):
+        """Testa históricos de peers com vários canais"""
+        history = []
+        record_policy(history, policy(100, 0.0001, chan_id="1"))
+        record_policy(history, policy(100, 0.0003, chan_id="2"))
+
+        # Cada canal é comparado com o próprio registro mais recente
+        self.assertFalse(record_policy(history, policy(200, 0.0001, chan_id="1")))
+        self.assertFalse(record_policy(history, policy(200, 0.0003, chan_id="2")))
+        self.assertTrue(record_policy(history, policy(300, 0.0002, chan_id="1")))
+        self.assertEqual(len(history), 3)
+
+        self.assertEqual(policy_at(history, 250, chan_id="1")["fee_rate"], 0.0001)
+        self.assertEqual(policy_at(history, 350, chan_id="1")["fee_rate"], 0.0002)
+        self.assertEqual(policy_at(history, 350, chan_id="2")["fee_rate"], 0.0003)
+        self.assertIsNone(policy_at(history, 50, chan_id="1"))
+
+    def test_compact_history(self):
+        """Testa a conversão de um histórico por coleta em eventos de mudança"""
+        legacy = [policy(hour * 3600, 0.0001 if hour < 10 else 0.0002) for hour in range(24)]
+        compacted = compact_history(legacy)
+
+        self.assertEqual([record["timestamp"] for record in compacted], [0, 10 * 3600])
+        self.assertEqual(compacted[0]["last_seen"], 9 * 3600)
+        self.assertEqual(compacted[1]["last_seen"], 23 * 3600)
+        self.assertEqual(policy_at(compacted, 5 * 3600)["fee_rate"], 0.0001)
+
+    def test_policy_key(self):
+        """Testa a forma canônica única das políticas, compartilhada pelas estratégias e pelo gerenciador"""
+        self.assertIsNone(policy_key(None))
+        self.assertEqual(policy_key({"base_fee_msat": 1000.0, "fee_rate": 0.00010000001}), (1000, 100, 40))
+        self.assertNotEqual(policy_key(policy(0, 0.0001)), policy_key(dict(policy(0, 0.0001), time_lock_delta=80)))
+        self.assertIs(strategies.policy_key, policy_key)
+        self.assertIs(fee_manager.policy_key, policy_key)
+
+    def test_policy_at_binary_search(self):
+        """Testa a busca da política vigente em um histórico longo"""
+        history = [policy(step * 10, step / 1000000) for step in range(1000)]
+        self.assertEqual(policy_at(history, 0)["timestamp"], 0)
+        self.assertEqual(policy_at(history, 4999)["timestamp"], 4990)
+        self.assertEqual(policy_at(history, 5000)["timestamp"], 5000)
+        self.assertEqual(policy_at(history, 10 ** 9)["timestamp"], 9990)
+        self.assertIsNone(policy_at(history, -1))
+        self.assertIsNone(policy_at([], 100))
+
+    def test_policy_applied(self):
+        """Testa a decisão de reenvio a partir da política observada e do último envio confirmado"""
+        target = policy(0, 0.0002)
+        live = dict(policy(100, 0.0001), last_seen=150)
+        applied = dict(policy(200, 0.0002), applied_at=200)
+
+        self.assertTrue(policy_applied(target, dict(live, fee_rate=0.0002), None))
+        self.assertFalse(policy_applied(target, live, None))
+        self.assertFalse(policy_applied(target, live, dict(applied, fee_rate=0.0003)))
+
+        # Nenhuma observação desde a confirmação: a política enviada continua em vigor
+        self.assertTrue(policy_applied(target, live, applied))
+        self.assertTrue(policy_applied(target, None, applied))
+
+        # Observada outra política depois da confirmação (mudança externa): reenviar
+        self.assertFalse(policy_applied(target, dict(live, last_seen=300), applied))
+
+    def test_fee_manager_records_changes_only(self):
+        """Testa que coletas sem mudança de política não crescem o histórico"""
+        mock_lnd_client = MagicMock()
+        mock_lnd_client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+        mock_lnd_client.list_channels.return_value = {"channels": [
+            {"chan_id": "1", "channel_point": "txid:0", "capacity": "1000000",
+             "local_balance": "500000", "remote_balance": "500000", "remote_pubkey": "peer1"}
+        ]}
+        chan_info = {
+            "node1_pub": "test_pubkey",
+            "node1_policy": {"fee_base_msat": "1000", "fee_rate_milli_msat": "100", "time_lock_delta": 40},
+            "node2_policy": {"fee_base_msat": "2000", "fee_rate_milli_msat": "300", "time_lock_delta": 40}
+        }
+        mock_lnd_client.get_channel_info.return_value = chan_info
+
+        fee_manager = FeeManager(lnd_client=mock_lnd_client)
+        for _ in range(3):
+            fee_manager.collect_channel_data()
+
+        self.assertEqual(len(fee_manager.channel_stats["1"]["fee_history"]), 1)
+        self.assertEqual(len(fee_manager.peer_fees["peer1"]), 1)
+        self.assertEqual(len(fee_manager.channel_stats["1"]["flow_history"]), 3)
+
+        chan_info["node2_policy"] = dict(chan_info["node2_policy"], fee_rate_milli_msat="400")
+        fee_manager.collect_channel_data()
+        self.assertEqual(len(fee_manager.peer_fees["peer1"]), 2)
+
+        now = fee_manager.peer_fees["peer1"][-1]["timestamp"]
+        policies = fee_manager.policy_at("1", now)
+        self.assertEqual(policies["local"]["fee_rate"], 0.0001)
+        self.assertEqual(policies["peer"]["fee_rate"], 0.0004)
+
+    def test_load_compacts_legacy_stats(self):
+        """Testa que estatísticas antigas são compactadas na carga"""
+        channel_stats = {"1": {"capacity": 1000000, "remote_pubkey": "peer1", "flow_history": [],
+                               "fee_history": [policy(hour * 3600, 0.0001) for hour in range(5)]}}
+        peer_fees = {"peer1": [policy(hour * 3600, 0.0003, chan_id="1") for hour in range(5)]}
+        with open("channel_stats.json", "w") as f:
+            json.dump(channel_stats, f)
+        with open("peer_fees.json", "w") as f:
+            json.dump(peer_fees, f)
+
+        fee_manager = FeeManager(lnd_client=MagicMock())
+
+        self.assertEqual(len(fee_manager.channel_stats["1"]["fee_history"]), 1)
+        self.assertEqual(fee_manager.channel_stats["1"]["fee_history"][0]["last_seen"], 4 * 3600)
+        self.assertEqual(len(fee_manager.peer_fees["peer1"]), 1)
+
+if __name__ == "__main__":
+    unittest.main()
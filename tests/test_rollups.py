@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para a retenção em camadas do histórico dos canais
+"""
+
+import os
+import sys
+import unittest
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from rollups import ROLLUP_TIERS, add_fee_record, add_flow_sample, bootstrap_rollups, query_range, tier_key
+from engine_snapshot import SnapshotBuilder
+
+HOUR = 3600
+DAY = 86400
+
+def sample(timestamp, balance_ratio, volume_out=0):
+    """Amostra de fluxo de teste (volume do intervalo)"""
+    return {"timestamp": timestamp, "balance_ratio": balance_ratio, "inbound_ratio": 1 - balance_ratio,
+            "outbound_ratio": balance_ratio, "forwarding_volume_in": 0, "forwarding_volume_out": volume_out,
+            "forwarding_volume_in_total": 0, "forwarding_volume_out_total": 0}
+
+class TestRollups(unittest.TestCase):
+    """Testes para os agregados diários e semanais"""
+
+    def test_tiers(self):
+        """Testa que não há camada mais fina que as amostras brutas"""
+        self.assertEqual(list(ROLLUP_TIERS), ["daily", "weekly"])
+
+    def test_flow_buckets(self):
+        """Testa mínimo, máximo, média e volume somado de cada bucket"""
+        channel = {}
+        for hour, (ratio, volume) in enumerate([(0.2, 10), (0.6, 20), (0.4, 30)]):
+            add_flow_sample(channel, sample(14 * DAY + hour * HOUR, ratio), 0, volume)
+        add_flow_sample(channel, sample(15 * DAY, 0.9), 0, 5)
+
+        daily = channel[tier_key("daily")]
+        self.assertEqual([record["start"] for record in daily], [14 * DAY, 15 * DAY])
+        self.assertEqual(daily[0]["samples"], 3)
+        self.assertEqual(daily[0]["balance_ratio_min"], 0.2)
+        self.assertEqual(daily[0]["balance_ratio_max"], 0.6)
+        self.assertAlmostEqual(daily[0]["balance_ratio_mean"], 0.4)
+        self.assertEqual(daily[0]["volume_out"], 60)
+
+        weekly = channel[tier_key("weekly")]
+        self.assertEqual(len(weekly), 1)
+        self.assertEqual(weekly[0]["samples"], 4)
+        self.assertEqual(weekly[0]["volume_out"], 65)
+
+    def test_fee_buckets(self):
+        """Testa o registro das taxas nos buckets"""
+        channel = {}
+        add_fee_record(channel, {"timestamp": 10 * DAY, "base_fee_msat": 1000, "fee_rate": 0.0002})
+        add_fee_record(channel, {"timestamp": 10 * DAY + 60, "base_fee_msat": 2000, "fee_rate": 0.0001})
+
+        record = channel[tier_key("daily")][0]
+        self.assertEqual(record["fee_records"], 2)
+        self.assertEqual(record["fee_rate_min"], 0.0001)
+        self.assertEqual(record["fee_rate_max"], 0.0002)
+        self.assertEqual(record["fee_rate"], 0.0001)
+        self.assertEqual(record["base_fee_msat"], 2000)
+        self.assertEqual(record["samples"], 0)
+
+    def test_out_of_order_and_copy_on_write(self):
+        """Testa amostras fora de ordem e que buckets gravados não são alterados"""
+        channel = {}
+        add_flow_sample(channel, sample(10 * DAY, 0.5), 0, 1)
+        add_flow_sample(channel, sample(12 * DAY, 0.5), 0, 1)
+        first = channel[tier_key("daily")][0]
+
+        add_flow_sample(channel, sample(11 * DAY, 0.5), 0, 1)
+        add_flow_sample(channel, sample(10 * DAY + HOUR, 0.7), 0, 1)
+
+        daily = channel[tier_key("daily")]
+        self.assertEqual([record["start"] for record in daily], [10 * DAY, 11 * DAY, 12 * DAY])
+        self.assertEqual(daily[0]["samples"], 2)
+        self.assertEqual(first["samples"], 1)
+
+    def test_retention(self):
+        """Testa que cada camada descarta buckets mais antigos que a retenção"""
+        channel = {}
+        add_flow_sample(channel, sample(0, 0.5), 0, 1)
+        add_flow_sample(channel, sample(4 * 365 * DAY, 0.5), 0, 1)
+
+        self.assertEqual(len(channel[tier_key("daily")]), 1)
+        self.assertEqual(len(channel[tier_key("weekly")]), 2)
+
+    def test_query_range_picks_tier(self):
+        """Testa que a consulta escolhe a camada que cobre o início do intervalo"""
+        channel = {"flow_history": [sample(200 * DAY + hour * HOUR, 0.5) for hour in range(48)], "fee_history": []}
+        for day in range(200):
+            add_flow_sample(channel, sample(day * DAY, 0.5), 0, 1)
+        for record in channel["flow_history"]:
+            add_flow_sample(channel, record, 0, 1)
+
+        result = query_range(channel, 200 * DAY + HOUR, 200 * DAY + 3 * HOUR)
+        self.assertEqual(result["tier"], "raw")
+        self.assertEqual(len(result["records"]), 3)
+
+        result = query_range(channel, 150 * DAY, 151 * DAY)
+        self.assertEqual(result["tier"], "daily")
+        self.assertEqual([record["start"] for record in result["records"]], [150 * DAY, 151 * DAY])
+
+        self.assertEqual(query_range(channel, 10 * DAY, 20 * DAY, tier="weekly")["tier"], "weekly")
+        with self.assertRaises(ValueError):
+            query_range(channel, 0, 1, tier="hourly")
+
+    def test_bootstrap_and_snapshot(self):
+        """Testa a montagem das camadas a partir do histórico e a leitura pelo snapshot"""
+        channel = {
+            "flow_history": [
+                {"timestamp": 10 * DAY, "balance_ratio": 0.5, "forwarding_volume_out": 100},
+                {"timestamp": 10 * DAY + 60, "balance_ratio": 0.5, "forwarding_volume_out": 150}
+            ],
+            "fee_history": [{"timestamp": 10 * DAY, "base_fee_msat": 1000, "fee_rate": 0.0001}]
+        }
+        bootstrap_rollups(channel)
+
+        # Histórico antigo com contador acumulado: o intervalo é a diferença
+        self.assertEqual(channel[tier_key("daily")][0]["volume_out"], 50)
+        self.assertEqual(channel[tier_key("daily")][0]["fee_records"], 1)
+
+        snapshot = SnapshotBuilder().build("collect", 1, {}, {"1": channel}, {})
+        frozen = snapshot.channel_stats["1"]
+        for tier in ROLLUP_TIERS:
+            self.assertIsInstance(frozen[tier_key(tier)], tuple)
+        self.assertEqual(query_range(frozen, 10 * DAY, 11 * DAY, tier="daily")["records"][0]["samples"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para as curvas sazonais de demanda e as agendas de taxas
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from seasonality import (HOURS_PER_WEEK, bootstrap_profile, build_schedule, combine_profiles, demand_multipliers,
+                         hour_of_week, scheduled_policy, update_profile)
+from fee_manager import FeeManager
+
+CONFIG = {
+    "min_fee_rate": 0.000001,
+    "max_fee_rate": 0.001,
+    "seasonal_strength": 0.5,
+    "seasonal_step": 0.1
+}
+
+# Segunda-feira, 0h UTC
+MONDAY = 1699833600
+
+def hourly_volume(timestamp):
+    """Volume simulado: o triplo entre 18h e 22h UTC"""
+    return 3000 if 18 <= (timestamp // 3600) % 24 < 22 else 1000
+
+class TestSeasonality(unittest.TestCase):
+    """Testes para as curvas sazonais e as agendas"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_profile(self):
+        """Testa a curva semanal, a demanda relativa e a agenda com as horas de mudança"""
+        self.assertEqual(hour_of_week(MONDAY), 0)
+        self.assertEqual(hour_of_week(MONDAY + 6 * 86400 + 23 * 3600), HOURS_PER_WEEK - 1)
+
+        profile = None
+        for hour in range(1, 3 * HOURS_PER_WEEK + 1):
+            timestamp = MONDAY + hour * 3600
+            profile = update_profile(profile, timestamp, hourly_volume(timestamp - 3600), 3600)
+        self.assertEqual(profile["samples"], [3] * HOURS_PER_WEEK)
+        self.assertEqual(profile["rates"][18], 3000)
+
+        # Demanda média de 1333 sats por hora; o pico (2,25) fica no limite
+        multipliers = demand_multipliers(profile)
+        self.assertAlmostEqual(multipliers[18], 2.0)
+        self.assertAlmostEqual(multipliers[0], 0.75)
+        self.assertIsNone(demand_multipliers(profile, min_samples=4))
+        self.assertAlmostEqual(demand_multipliers(combine_profiles([profile, profile]))[0], 0.75)
+
+        # 300 ppm: 0.875 -> 0.9 fora do pico, 1.5 no pico; uma mudança na entrada e uma na saída de cada pico
+        policy = {"base_fee_msat": 1000, "fee_rate": 0.0003, "time_lock_delta": 40}
+        schedule = build_schedule(policy, multipliers, CONFIG)
+        self.assertEqual(schedule["hours"][:3], [0, 18, 22])
+        self.assertEqual(schedule["fee_rates_ppm"][:3], [270, 450, 270])
+        self.assertEqual(len(schedule["hours"]), 1 + 2 * 7)
+        self.assertEqual(scheduled_policy(schedule, 20), {"base_fee_msat": 1000, "fee_rate": 0.00045,
+                                                          "time_lock_delta": 40})
+        self.assertEqual(scheduled_policy(schedule, HOURS_PER_WEEK - 1)["fee_rate"], 0.00027)
+
+        # Sem modulação, a agenda tem uma única taxa
+        flat = build_schedule(policy, multipliers, dict(CONFIG, seasonal_strength=0))
+        self.assertEqual(flat["fee_rates_ppm"], [300])
+
+    def _seasonal_manager(self, strategy="balanced"):
+        """FeeManager com um canal, sazonalidade habilitada e duas semanas de curva com pico às 18h"""
+        client = MagicMock()
+        client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+        policy = {"fee_base_msat": "1000", "fee_rate_milli_msat": "100", "time_lock_delta": 40}
+
+        def update_channel_policy(**kwargs):
+            policy.update(fee_base_msat=str(kwargs["base_fee_msat"]),
+                          fee_rate_milli_msat=str(round(kwargs["fee_rate"] * 1000000)))
+            return {"failed_updates": []}
+
+        client.update_channel_policy.side_effect = update_channel_policy
+        client.get_channel_info.side_effect = lambda chan_id: {
+            "node1_pub": "test_pubkey",
+            "node1_policy": dict(policy),
+            "node2_policy": {"fee_base_msat": "1000", "fee_rate_milli_msat": "200", "time_lock_delta": 40}
+        }
+        client.list_channels.return_value = {"channels": [{
+            "chan_id": "1", "channel_point": "txid:0", "capacity": "1000000", "local_balance": "500000",
+            "remote_balance": "500000", "remote_pubkey": "peer1", "total_satoshis_sent": "0"
+        }]}
+
+        fee_manager = FeeManager(lnd_client=client)
+        fee_manager.update_config({"seasonal_fees": True, "fee_strategy": strategy})
+        with patch("time.time", return_value=MONDAY):
+            fee_manager.collect_channel_data()
+        profile = None
+        for hour in range(1, 2 * HOURS_PER_WEEK + 1):
+            timestamp = MONDAY - 2 * HOURS_PER_WEEK * 3600 + hour * 3600
+            profile = update_profile(profile, timestamp, hourly_volume(timestamp - 3600), 3600)
+        fee_manager.channel_stats["1"]["seasonal_profile"] = profile
+        return fee_manager, client, policy
+
+    def test_fee_manager_schedule(self):
+        """Testa que o agendador aplica a agenda na virada da hora sem recalcular a estratégia"""
+        fee_manager, client, policy = self._seasonal_manager()
+
+        # Segunda-feira, 17h: taxa fora do pico
+        start = MONDAY + 17 * 3600
+        with patch("time.time", return_value=start):
+            fee_manager.update_channel_fees()
+            self.assertEqual(fee_manager.apply_fee_schedules(), 0)
+        schedule = fee_manager.channel_stats["1"]["fee_schedule"]
+        off_peak, peak = schedule["fee_rates_ppm"][:2]
+        self.assertEqual(fee_manager.fee_schedules, {"1": schedule})
+        self.assertEqual(policy["fee_rate_milli_msat"], str(off_peak))
+
+        # Na virada para 18h, a taxa do pico é enviada uma única vez
+        with patch("time.time", return_value=start + 3600):
+            self.assertEqual(fee_manager.apply_fee_schedules(), 1)
+            self.assertEqual(fee_manager.apply_fee_schedules(), 0)
+        self.assertEqual(policy["fee_rate_milli_msat"], str(peak))
+        self.assertEqual(client.update_channel_policy.call_count, 2)
+
+        # O ciclo seguinte encontra a taxa da agenda já em vigor
+        with patch("time.time", return_value=start + 3660):
+            fee_manager.collect_channel_data()
+            fee_manager.update_channel_fees()
+        self.assertEqual(client.update_channel_policy.call_count, 2)
+        self.assertEqual(fee_manager.last_update_stats["applied"], 1)
+
+    def test_fee_manager_schedule_not_compounded(self):
+        """Testa que recálculos no horário de pico partem da taxa da estratégia, e não da taxa já modulada"""
+        fee_manager, client, policy = self._seasonal_manager("controller")
+
+        # Saldo no alvo: o controlador mantém a taxa em vigor, que no pico é a taxa modulada
+        peak_hour = MONDAY + 18 * 3600
+        rates = []
+        for cycle in range(3):
+            with patch("time.time", return_value=peak_hour + cycle * 60):
+                fee_manager.update_channel_fees(force=True)
+            rates.append(int(policy["fee_rate_milli_msat"]))
+            self.assertEqual(fee_manager.channel_stats["1"]["fee_schedule"]["strategy_fee_rate"], 0.0001)
+
+        self.assertGreater(rates[0], 100)
+        self.assertEqual(rates, [rates[0]] * 3)
+
+    def test_bootstrap(self):
+        """Testa que a reconstrução pelo histórico de fluxo é igual à atualização incremental"""
+        flow_history = []
+        profile = None
+        total = 0
+        for hour in range(30):
+            timestamp = MONDAY + hour * 3600
+            total += hourly_volume(timestamp)
+            flow_history.append({"timestamp": timestamp, "forwarding_volume_out": hourly_volume(timestamp),
+                                 "forwarding_volume_out_total": total})
+            if hour:
+                profile = update_profile(profile, timestamp, hourly_volume(timestamp), 3600)
+        self.assertEqual(bootstrap_profile({"flow_history": flow_history}), profile)
+        self.assertIsNone(bootstrap_profile({"flow_history": flow_history[:1]}))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para o arquivamento de canais fechados e peers que saíram
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from stats_archive import archive_entries, read_archive, select_stale
+from fee_manager import FeeManager
+
+DAY = 86400
+
+class TestStatsArchive(unittest.TestCase):
+    """Testes para o arquivo de estatísticas"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+        self.now = 100 * DAY
+        self.channel_stats = {
+            "open": {"remote_pubkey": "peer1", "last_seen": self.now, "flow_history": []},
+            "recent": {"remote_pubkey": "peer2", "last_seen": self.now - DAY, "flow_history": []},
+            "closed": {"remote_pubkey": "peer2", "last_seen": self.now - 10 * DAY, "flow_history": []},
+            "legacy": {"remote_pubkey": "peer3", "flow_history": [{"timestamp": self.now - 30 * DAY}]}
+        }
+        self.peer_fees = {
+            "peer1": [{"timestamp": self.now - 20 * DAY}],
+            "peer2": [{"timestamp": self.now - DAY}],
+            "peer3": [{"timestamp": self.now - 20 * DAY}, {"timestamp": self.now - 15 * DAY}]
+        }
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_select_stale(self):
+        """Testa a seleção de canais e peers ausentes há mais que o período de tolerância"""
+        channels, peers = select_stale(self.channel_stats, self.peer_fees, {"open"}, {"peer1"},
+                                       self.now, grace_seconds=7 * DAY)
+
+        # Canal aberto e canal fechado há pouco tempo continuam no conjunto de trabalho
+        self.assertEqual(sorted(channels), ["closed", "legacy"])
+
+        # peer1 tem canal aberto e peer2 teve taxas registradas há pouco tempo
+        self.assertEqual(peers, ["peer3"])
+
+    def test_archive_roundtrip(self):
+        """Testa que arquivamentos sucessivos são acrescentados ao arquivo compactado"""
+        archive_entries([{"kind": "channel", "key": "1", "data": {"capacity": 1}}], "archive.jsonl.gz")
+        archive_entries([{"kind": "peer", "key": "peer", "data": [{"timestamp": 1}]},
+                         {"kind": "channel", "key": "2", "data": {"capacity": 2}}], "archive.jsonl.gz")
+
+        entries = list(read_archive("archive.jsonl.gz"))
+        self.assertEqual([entry["key"] for entry in entries], ["1", "peer", "2"])
+        self.assertIn("archived_at", entries[0])
+        self.assertEqual([entry["key"] for entry in read_archive("archive.jsonl.gz", kind="channel")], ["1", "2"])
+        self.assertEqual(list(read_archive("archive.jsonl.gz", key="2"))[0]["data"], {"capacity": 2})
+
+        # Arquivo inexistente não tem entradas
+        self.assertEqual(list(read_archive("missing.jsonl.gz")), [])
+
+    def test_fee_manager_prunes_closed_channels(self):
+        """Testa que o FeeManager arquiva e remove canais fechados e peers que saíram"""
+        mock_lnd_client = MagicMock()
+        fee_manager = FeeManager(lnd_client=mock_lnd_client)
+        fee_manager.channel_stats = self.channel_stats
+        fee_manager.peer_fees = self.peer_fees
+
+        channels = [{"chan_id": "open", "remote_pubkey": "peer1"}]
+        fee_manager.config["prune_grace_seconds"] = 0
+        self.assertEqual(fee_manager.prune_stats(channels, self.now), ([], []))
+
+        fee_manager.config["prune_grace_seconds"] = 7 * DAY
+        pruned_channels, pruned_peers = fee_manager.prune_stats(channels, self.now)
+
+        self.assertEqual(sorted(pruned_channels), ["closed", "legacy"])
+        self.assertEqual(sorted(fee_manager.channel_stats), ["open", "recent"])
+        self.assertEqual(sorted(fee_manager.peer_fees), ["peer1", "peer2"])
+
+        archived = {entry["key"]: entry for entry in read_archive(fee_manager.archive_path)}
+        self.assertEqual(archived["closed"]["data"]["last_seen"], self.now - 10 * DAY)
+        self.assertEqual(len(archived["peer3"]["data"]), 2)
+
+    def test_collect_marks_last_seen(self):
+        """Testa que canais abertos, mesmo excluídos da automação, não são arquivados"""
+        mock_lnd_client = MagicMock()
+        mock_lnd_client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+        mock_lnd_client.list_channels.return_value = {"channels": [
+            {"chan_id": "closed", "channel_point": "txid:0", "capacity": "1000000",
+             "local_balance": "500000", "remote_balance": "500000", "remote_pubkey": "peer2"}
+        ]}
+        mock_lnd_client.get_channel_info.return_value = {"error": "sem dados"}
+
+        fee_manager = FeeManager(lnd_client=mock_lnd_client)
+        fee_manager.channel_stats = self.channel_stats
+        fee_manager.peer_fees = self.peer_fees
+        fee_manager.config["excluded_channels"] = ["closed"]
+        fee_manager.collect_channel_data()
+
+        self.assertIn("closed", fee_manager.channel_stats)
+        self.assertGreater(fee_manager.channel_stats["closed"]["last_seen"], self.now)
+        self.assertNotIn("legacy", fee_manager.channel_stats)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para o registro de estratégias de taxas
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from strategies import (ChannelInput, FeeStrategy, StrategyFeatures, available_strategies,
+                        benchmark_strategies, get_strategy, register_strategy, unregister_strategy)
+from backtest import Backtester, synthetic_history
+from flow_estimators import bootstrap_estimators, update_flow_estimators
+from fee_manager import FeeManager
+from engine_snapshot import freeze
+
+CONFIG = {
+    "fee_strategy": "balanced",
+    "update_interval_seconds": 3600,
+    "min_base_fee_msat": 1000,
+    "max_base_fee_msat": 5000,
+    "min_fee_rate": 0.000001,
+    "max_fee_rate": 0.001,
+    "time_lock_delta": 40,
+    "flow_weight": 0.7,
+    "peer_weight": 0.3,
+    "high_flow_threshold": 0.8,
+    "low_flow_threshold": 0.2,
+    "excluded_channels": [],
+    "enabled_channels": []
+}
+
+class FixedStrategy(FeeStrategy):
+    """Estratégia de teste que devolve sempre a mesma taxa"""
+
+    name = "fixed"
+
+    def __init__(self):
+        self.batches = []
+
+    def compute(self, row, features, config):
+        return {"base_fee_msat": 1234, "fee_rate": 0.000321, "time_lock_delta": config["time_lock_delta"]}
+
+    def compute_batch(self, batch, features, config):
+        self.batches.append([row.chan_id for row in batch])
+        return super().compute_batch(batch, features, config)
+
+class TestStrategies(unittest.TestCase):
+    """Testes para o registro de estratégias"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+        register_strategy(FixedStrategy)
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        unregister_strategy("fixed")
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_registry(self):
+        """Testa o registro e a consulta de estratégias"""
+        for name in ("balanced", "competitive", "profitable", "fixed"):
+            self.assertIn(name, available_strategies())
+        self.assertIsInstance(get_strategy("fixed"), FixedStrategy)
+
+        with self.assertRaises(KeyError):
+            get_strategy("unknown")
+
+    def test_features(self):
+        """Testa os atributos compartilhados do lote"""
+        history = [
+            {"timestamp": 1, "balance_ratio": 0.0, "inbound_ratio": 1.0, "outbound_ratio": 0.0},
+            {"timestamp": 2, "balance_ratio": 1.0, "inbound_ratio": 0.0, "outbound_ratio": 1.0}
+        ]
+        channel_stats = {"1": {"remote_pubkey": "peer", "flow_history": history}}
+        peer_fees = {"peer": [
+            {"chan_id": "1", "base_fee_msat": 100, "fee_rate": 0.0001},
+            {"chan_id": "2", "base_fee_msat": 300, "fee_rate": 0.0003},
+            {"chan_id": "1", "base_fee_msat": 500, "fee_rate": 0.0005}
+        ]}
+        batch = [ChannelInput("1", "peer", history[-1], None)]
+
+        features = StrategyFeatures.compute(batch, channel_stats, peer_fees)
+
+        # Mediana das políticas mais recentes de cada canal do peer (500 e 300)
+        self.assertEqual(features.peer_medians["peer"]["base_fee_msat"], 400)
+
+        # Sem estimadores armazenados, eles são reconstruídos a partir do histórico
+        # uma única vez e gravados no canal, assim como as janelas e a demanda
+        self.assertEqual(features.ewma_flows["1"], bootstrap_estimators(channel_stats["1"]))
+        self.assertIs(channel_stats["1"]["estimators"], features.ewma_flows["1"])
+        self.assertIn("volume_windows", channel_stats["1"])
+        self.assertIn("demand", channel_stats["1"])
+
+        # Estimadores mantidos pelo FeeManager são usados diretamente
+        channel_stats["1"]["estimators"] = {"balance_ratio": 0.3}
+        features = StrategyFeatures.compute(batch, channel_stats, peer_fees)
+        self.assertIs(features.ewma_flows["1"], channel_stats["1"]["estimators"])
+
+        # Snapshots imutáveis não são alterados
+        frozen = freeze({"1": {"remote_pubkey": "peer", "flow_history": history}})
+        features = StrategyFeatures.compute(batch, frozen, peer_fees)
+        self.assertEqual(features.ewma_flows["1"], bootstrap_estimators(frozen["1"]))
+        self.assertNotIn("estimators", frozen["1"])
+
+    def test_feature_keys(self):
+        """Testa que apenas os atributos declarados pela estratégia são calculados"""
+        history = [
+            {"timestamp": 0, "inbound_ratio": 0.5, "outbound_ratio": 0.5, "balance_ratio": 0.5},
+            {"timestamp": 3600, "inbound_ratio": 0.2, "outbound_ratio": 0.8, "balance_ratio": 0.8}
+        ]
+        channel_stats = {"1": {"remote_pubkey": "peer", "flow_history": history, "fee_history": []}}
+        peer_fees = {"peer": [{"chan_id": "1", "base_fee_msat": 100, "fee_rate": 0.0001}]}
+        batch = [ChannelInput("1", "peer", history[-1], None)]
+
+        balanced = get_strategy("balanced")
+        features = StrategyFeatures.compute(batch, channel_stats, peer_fees,
+                                            feature_keys=balanced.feature_keys)
+
+        self.assertIn("1", features.ewma_flows)
+        self.assertEqual(features.peer_medians, {})
+        self.assertEqual(features.volume_windows, {})
+        self.assertEqual(features.demand, {})
+        # Estados de atributos não pedidos não são reconstruídos
+        self.assertNotIn("volume_windows", channel_stats["1"])
+        self.assertNotIn("demand", channel_stats["1"])
+
+    def test_fee_manager_uses_registry(self):
+        """Testa que o FeeManager calcula o lote inteiro com a estratégia registrada"""
+        mock_lnd_client = MagicMock()
+        mock_lnd_client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+        mock_lnd_client.list_channels.return_value = {"channels": [
+            {"chan_id": "1", "channel_point": "txid:0", "capacity": "1000000",
+             "local_balance": "500000", "remote_balance": "500000", "remote_pubkey": "peer1"},
+            {"chan_id": "2", "channel_point": "txid:1", "capacity": "1000000",
+             "local_balance": "100000", "remote_balance": "900000", "remote_pubkey": "peer2"}
+        ]}
+        mock_lnd_client.get_channel_info.return_value = {"error": "sem dados"}
+        mock_lnd_client.update_channel_policy.return_value = {"failed_updates": []}
+
+        fee_manager = FeeManager(lnd_client=mock_lnd_client)
+        fee_manager.config = dict(CONFIG, fee_strategy="fixed")
+        fee_manager.collect_channel_data()
+        fee_manager.update_channel_fees()
+
+        self.assertEqual(get_strategy("fixed").batches, [["1", "2"]])
+        self.assertEqual(mock_lnd_client.update_channel_policy.call_count, 2)
+        self.assertEqual(mock_lnd_client.update_channel_policy.call_args.kwargs["base_fee_msat"], 1234)
+
+        # Estratégia desconhecida volta para 'balanced'
+        fee_manager.config = dict(CONFIG, fee_strategy="unknown")
+        self.assertEqual(fee_manager._get_strategy().name, "balanced")
+
+    def test_fee_manager_skips_unchanged_channels(self):
+        """Testa que apenas canais com entradas alteradas são recalculados e enviados"""
+        mock_lnd_client = MagicMock()
+        mock_lnd_client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+        channels = [
+            {"chan_id": "1", "channel_point": "txid:0", "capacity": "1000000",
+             "local_balance": "500000", "remote_balance": "500000", "remote_pubkey": "peer1"},
+            {"chan_id": "2", "channel_point": "txid:1", "capacity": "1000000",
+             "local_balance": "100000", "remote_balance": "900000", "remote_pubkey": "peer2"}
+        ]
+        mock_lnd_client.list_channels.return_value = {"channels": channels}
+        mock_lnd_client.get_channel_info.return_value = {"error": "sem dados"}
+        mock_lnd_client.update_channel_policy.return_value = {"failed_updates": []}
+
+        fee_manager = FeeManager(lnd_client=mock_lnd_client)
+        fee_manager.config = dict(CONFIG, fee_strategy="fixed")
+        fee_manager.collect_channel_data()
+        fee_manager.update_channel_fees()
+        self.assertEqual(mock_lnd_client.update_channel_policy.call_count, 2)
+
+        # Mesmas entradas no ciclo seguinte: nada é recalculado nem enviado
+        fee_manager.collect_channel_data()
+        fee_manager.update_channel_fees()
+        self.assertEqual(get_strategy("fixed").batches[-1], [])
+        self.assertEqual(mock_lnd_client.update_channel_policy.call_count, 2)
+        self.assertEqual(fee_manager.last_update_stats["skipped"], 2)
+
+        # Mudança de saldo em um canal: apenas ele é recalculado
+        channels[1] = dict(channels[1], local_balance="300000", remote_balance="700000")
+        fee_manager.collect_channel_data()
+        fee_manager.update_channel_fees()
+        self.assertEqual(get_strategy("fixed").batches[-1], ["2"])
+
+        # A estratégia devolve a mesma política, que já está em vigor: nada é reenviado
+        self.assertEqual(mock_lnd_client.update_channel_policy.call_count, 2)
+        self.assertEqual(fee_manager.last_update_stats["applied"], 1)
+
+        # Mudança de configuração (a estratégia não declara config_keys) recalcula todos
+        fee_manager.config["time_lock_delta"] = 80
+        fee_manager.update_channel_fees()
+        self.assertEqual(get_strategy("fixed").batches[-1], ["1", "2"])
+
+        # force ignora as impressões digitais e as políticas em vigor
+        fee_manager.update_channel_fees(force=True)
+        self.assertEqual(get_strategy("fixed").batches[-1], ["1", "2"])
+        self.assertEqual(mock_lnd_client.update_channel_policy.call_count, 6)
+
+    def test_fingerprint(self):
+        """Testa a impressão digital das entradas de um canal"""
+        strategy = get_strategy("balanced")
+        flow = {"timestamp": 1, "balance_ratio": 0.5, "inbound_ratio": 0.5, "outbound_ratio": 0.5}
+        peer = {"base_fee_msat": 1000, "fee_rate": 0.0001}
+        row = ChannelInput("1", "peer", flow, peer)
+        features = StrategyFeatures({}, {}, {}, {}, {})
+        fingerprint = strategy.fingerprint(row, features, CONFIG)
+
+        # O horário da amostra e chaves de configuração não usadas não mudam a impressão digital
+        later = ChannelInput("1", "peer", dict(flow, timestamp=2), peer)
+        self.assertEqual(strategy.fingerprint(later, features, dict(CONFIG, update_interval_seconds=60)),
+                         fingerprint)
+
+        # Saldo, política do peer, configuração usada e política em vigor mudam
+        changed = ChannelInput("1", "peer", dict(flow, balance_ratio=0.6), peer)
+        self.assertNotEqual(strategy.fingerprint(changed, features, CONFIG), fingerprint)
+        changed = ChannelInput("1", "peer", flow, dict(peer, fee_rate=0.0002))
+        self.assertNotEqual(strategy.fingerprint(changed, features, CONFIG), fingerprint)
+        self.assertNotEqual(strategy.fingerprint(row, features, dict(CONFIG, flow_weight=0.5)), fingerprint)
+        self.assertNotEqual(strategy.fingerprint(row, features, CONFIG, peer), fingerprint)
+
+        # Taxas arredondadas para o mesmo ppm são a mesma política
+        self.assertEqual(strategy.fingerprint(row, features, CONFIG, {"base_fee_msat": 1000, "fee_rate": 0.0001}),
+                         strategy.fingerprint(row, features, CONFIG, {"base_fee_msat": 1000, "fee_rate": 0.00009999999}))
+
+    def test_controller(self):
+        """Testa que o controlador leva o saldo ao alvo e para de mudar as taxas"""
+        strategy = get_strategy("controller")
+        features = StrategyFeatures()
+        balance_ratio = 0.1
+        estimators = previous = None
+        changes = []
+        settled = []
+        for hour in range(24 * 14):
+            flow_data = {"timestamp": hour * 3600, "balance_ratio": balance_ratio,
+                         "inbound_ratio": 1 - balance_ratio, "outbound_ratio": balance_ratio}
+            estimators = update_flow_estimators(estimators, flow_data, previous)
+            features.ewma_flows["1"] = estimators
+            previous = flow_data
+
+            fees = strategy.compute(ChannelInput("1", "peer1", flow_data, None), features, CONFIG)
+            current = features.current_policies.get("1")
+            if current != fees:
+                changes.append(hour)
+            features.current_policies["1"] = fees
+            if hour >= 24 * 7:
+                settled.append(balance_ratio)
+
+            # Canal simulado: taxas acima de 500 ppm retêm saldo local, abaixo o liberam
+            balance_ratio = min(1.0, max(0.0, balance_ratio + 0.03 * (fees["fee_rate"] * 1000000 - 500) / 500))
+
+        # Saldo baixo começa com taxas altas; o controlador leva o saldo ao alvo e,
+        # como a taxa em vigor é mantida dentro da histerese, passa a mudar só a cada poucos dias
+        self.assertLess(max(abs(ratio - 0.5) for ratio in settled), 0.15)
+        self.assertLess(len(changes), 15)
+        self.assertLessEqual(len([hour for hour in changes if hour >= 24 * 7]), 3)
+
+        # Saídas a menos de um passo da taxa em vigor mantêm a política
+        features.current_policies["1"] = dict(fees, fee_rate=fees["fee_rate"] + 0.00002)
+        held = strategy.compute(ChannelInput("1", "peer1", flow_data, None), features, CONFIG)
+        self.assertEqual(round(held["fee_rate"] * 1000000), round(fees["fee_rate"] * 1000000) + 20)
+
+        # Dentro da zona morta a taxa em vigor é mantida, mesmo longe do meio da faixa
+        row = ChannelInput("1", "peer1", flow_data, None)
+        features.ewma_flows["1"] = {"balance_ratio": 0.5, "balance_ratio_slow": 0.5, "balance_drift_per_hour": 0.0}
+        features.current_policies["1"] = dict(fees, fee_rate=0.0002)
+        self.assertEqual(strategy.compute(row, features, CONFIG)["fee_rate"], 0.0002)
+
+        # Sem política conhecida, a zona morta corresponde ao meio da faixa
+        del features.current_policies["1"]
+        self.assertEqual(strategy.compute(row, features, CONFIG)["fee_rate"], 0.0005)
+
+    def test_backtest_custom_strategy(self):
+        """Testa o replay de uma estratégia registrada sem núcleo próprio"""
+        history = synthetic_history(3, 48)
+        report = Backtester(history, CONFIG).run("fixed")
+
+        self.assertEqual(report["fee_changes"], 0)
+        self.assertEqual(report["fee_levels"][0]["mean_fee_rate_ppm"], 321)
+
+    def test_benchmark(self):
+        """Testa o benchmark das estratégias"""
+        results = benchmark_strategies(CONFIG, n_channels=30, repeat=1, names=["balanced", "fixed"])
+
+        self.assertIn("features", results)
+        for name in ("balanced", "fixed"):
+            self.assertEqual(results[name]["channels"], 30)
+            self.assertGreater(results[name]["channels_per_second"], 0)
+            self.assertGreater(results[name]["peak_memory_bytes"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
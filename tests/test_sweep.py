@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para a varredura de parâmetros das estratégias
+"""
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from backtest import Backtester, ReplayHistory, synthetic_history
+from sweep import build_grid, edge_params, parse_grid, rank_results, run_sweep, write_best_config
+
+CONFIG = {
+    "fee_strategy": "balanced",
+    "min_base_fee_msat": 1000,
+    "max_base_fee_msat": 5000,
+    "min_fee_rate": 0.000001,
+    "max_fee_rate": 0.001,
+    "time_lock_delta": 40,
+    "flow_weight": 0.7,
+    "peer_weight": 0.3,
+    "high_flow_threshold": 0.8,
+    "low_flow_threshold": 0.2
+}
+
+class TestSweep(unittest.TestCase):
+    """Testes para a varredura de parâmetros"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.history = synthetic_history(10, 24 * 14)
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        self.tmp_dir.cleanup()
+
+    def test_build_grid(self):
+        """Testa a geração da grade e o descarte de combinações inválidas"""
+        grid = {"flow_weight": [0.6, 0.8], "low_flow_threshold": [0.2, 0.9]}
+        combinations = build_grid(CONFIG, grid)
+
+        # low_flow_threshold=0.9 >= high_flow_threshold=0.8 é descartado
+        self.assertEqual(len(combinations), 2)
+        for params, config in combinations:
+            self.assertAlmostEqual(params["peer_weight"], 1 - params["flow_weight"])
+            self.assertEqual(config["low_flow_threshold"], 0.2)
+
+        self.assertEqual(parse_grid(["min_base_fee_msat=500,1000"]), {"min_base_fee_msat": [500, 1000]})
+
+    def test_mapped_history_roundtrip(self):
+        """Testa que o histórico mapeado em memória produz o mesmo replay"""
+        path = os.path.join(self.tmp_dir.name, "history.bin")
+        self.history.save(path)
+        mapped = ReplayHistory.open_mapped(path)
+
+        self.assertEqual(mapped.samples, self.history.samples)
+        for strategy in ("balanced", "competitive", "profitable"):
+            expected = Backtester(self.history, CONFIG).run(strategy)
+            actual = Backtester(mapped, CONFIG).run(strategy)
+            self.assertEqual(actual["fee_changes"], expected["fee_changes"])
+            self.assertAlmostEqual(actual["estimated_revenue_sat"], expected["estimated_revenue_sat"])
+            self.assertAlmostEqual(actual["rebalance_pressure"], expected["rebalance_pressure"])
+
+    def test_run_sweep_parallel(self):
+        """Testa a varredura em vários processos e a classificação"""
+        grid = {"flow_weight": [0.5, 0.7, 0.9]}
+        result = run_sweep(self.history, CONFIG, grid, objective="updates", workers=2)
+
+        self.assertEqual(result["configurations"], 3)
+        self.assertEqual(len(result["results"]), 3)
+        changes = [entry["fee_changes"] for entry in result["results"]]
+        self.assertEqual(changes, sorted(changes))
+        self.assertIs(result["best"], result["results"][0])
+
+    def test_revenue_ignores_fee_bounds(self):
+        """Testa que o objetivo revenue não varia os limites de taxa (o volume do replay não responde a elas)"""
+        grid = {"flow_weight": [0.5, 0.7], "max_fee_rate": [0.001, 0.005]}
+        result = run_sweep(self.history, CONFIG, grid, objective="revenue", workers=1)
+
+        self.assertEqual(result["grid"], {"flow_weight": [0.5, 0.7]})
+        self.assertEqual(result["configurations"], 2)
+        self.assertNotIn("max_fee_rate", result["best"]["params"])
+
+        result = run_sweep(self.history, CONFIG, grid, objective="updates", workers=1)
+        self.assertEqual(result["configurations"], 4)
+
+    def test_rank_results(self):
+        """Testa a ordenação por objetivo"""
+        results = [
+            {"estimated_revenue_sat": 10, "rebalance_pressure": 5, "fee_changes": 3},
+            {"estimated_revenue_sat": 20, "rebalance_pressure": 9, "fee_changes": 1}
+        ]
+        self.assertEqual(rank_results(results, "revenue")[0]["estimated_revenue_sat"], 20)
+        self.assertEqual(rank_results(results, "rebalancing")[0]["rebalance_pressure"], 5)
+        with self.assertRaises(ValueError):
+            rank_results(results, "unknown")
+
+    def test_write_best_config(self):
+        """Testa a gravação da melhor configuração"""
+        config_path = os.path.join(self.tmp_dir.name, "fee_config.json")
+        with open(config_path, 'w') as f:
+            json.dump(CONFIG, f)
+
+        sweep_result = {"best": {"params": {"flow_weight": 0.9, "peer_weight": 0.1}}}
+        write_best_config(sweep_result, config_path)
+
+        with open(config_path, 'r') as f:
+            saved = json.load(f)
+        self.assertEqual(saved["flow_weight"], 0.9)
+        self.assertEqual(saved["peer_weight"], 0.1)
+        self.assertEqual(saved["fee_strategy"], "balanced")
+
+        # Melhor valor na borda da grade: a gravação é recusada
+        sweep_result["grid"] = {"flow_weight": [0.5, 0.7, 0.9]}
+        self.assertEqual(edge_params(sweep_result), ["flow_weight"])
+        with self.assertRaises(ValueError):
+            write_best_config(dict(sweep_result, best={"params": {"flow_weight": 0.5, "peer_weight": 0.5}}),
+                              config_path)
+        with open(config_path, 'r') as f:
+            self.assertEqual(json.load(f)["flow_weight"], 0.9)
+
+        sweep_result["best"] = {"params": {"flow_weight": 0.7, "peer_weight": 0.3}}
+        self.assertEqual(edge_params(sweep_result), [])
+        self.assertEqual(write_best_config(sweep_result, config_path)["flow_weight"], 0.7)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para o orçamento de envios de políticas de taxas
+"""
+
+import os
+import sys
+import time
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from update_budget import TokenBucket, UpdateBudget, priority_key
+from fee_manager import FeeManager
+from engine_snapshot import FrozenDict
+
+def entry(chan_id, delta_ppm, balance_ratio=0.5):
+    """Entrada de plano de teste"""
+    return {"chan_id": chan_id, "delta_ppm": delta_ppm, "balance_ratio": balance_ratio}
+
+class TestUpdateBudget(unittest.TestCase):
+    """Testes para o orçamento de envios"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_token_bucket(self):
+        """Testa o consumo e a recuperação das fichas"""
+        bucket = TokenBucket(rate_per_minute=6, burst=2)
+        self.assertTrue(bucket.take(100))
+        self.assertTrue(bucket.take(100))
+        self.assertFalse(bucket.take(100))
+
+        # Uma ficha a cada 10 segundos, até o limite do balde
+        self.assertFalse(bucket.take(105))
+        self.assertTrue(bucket.take(110))
+        self.assertEqual(bucket.available(1000), 2)
+
+        restored = TokenBucket(rate_per_minute=6, burst=2)
+        bucket.take(1000)
+        restored.restore_state(bucket.export_state())
+        self.assertEqual(restored.available(1000), 1)
+
+        unlimited = TokenBucket()
+        self.assertTrue(all(unlimited.take(100) for _ in range(1000)))
+
+    def test_priority(self):
+        """Testa a ordem da fila pela diferença de taxa e pelo desequilíbrio"""
+        entries = [entry("1", 10, 0.9), entry("2", -300, 0.5), entry("3", None, 0.6), entry("4", 50, 0.05)]
+
+        ordered = sorted(entries, key=priority_key)
+        self.assertEqual([item["chan_id"] for item in ordered], ["3", "2", "4", "1"])
+
+        ordered = sorted(entries, key=lambda item: priority_key(item, "imbalance"))
+        self.assertEqual([item["chan_id"] for item in ordered], ["4", "1", "3", "2"])
+
+    def test_due(self):
+        """Testa a seleção com o orçamento global e o intervalo mínimo por canal"""
+        budget = UpdateBudget()
+        budget.configure({"policy_updates_per_minute": 2, "min_update_interval_seconds": 600})
+        budget.schedule([entry("1", 100), entry("2", 200), entry("3", 300), entry("4", 400)])
+
+        # Canal 4 atualizado há pouco: fica na fila sem consumir fichas
+        ready = budget.due(1000, {"4": 900})
+        self.assertEqual([item["chan_id"] for item in ready], ["3", "2"])
+        self.assertEqual(budget.last_drain,
+                         {"sent": 2, "held_by_interval": 1, "held_by_budget": 1, "held_by_backoff": 0})
+        self.assertEqual(len(budget), 2)
+
+        self.assertEqual(budget.due(1010, {"4": 900}), [])
+        ready = budget.due(1600, {"4": 900})
+        self.assertEqual([item["chan_id"] for item in ready], ["4", "1"])
+        self.assertEqual(budget.stats()["pending"], 0)
+
+        # Um novo plano substitui a fila
+        budget.schedule([entry("5", 10)])
+        self.assertEqual(list(budget.queue), ["5"])
+
+    def test_retry(self):
+        """Testa a espera exponencial dos canais que falharam e as falhas permanentes"""
+        budget = UpdateBudget()
+        budget.configure({"policy_retry_base_seconds": 10, "policy_retry_max_attempts": 3})
+        budget.schedule([entry("1", 100), entry("2", 200)])
+        failed, sent = budget.due(1000, {})
+
+        self.assertEqual(budget.fail(failed, 1000, "UPDATE_FAILURE_PENDING"), 1010)
+        self.assertIsNone(budget.fail(sent, 1000, "UPDATE_FAILURE_NOT_FOUND"))
+        self.assertEqual(list(budget.queue), ["2"])
+
+        # Apenas o canal que falhou volta, depois da espera
+        self.assertEqual(budget.due(1005, {}), [])
+        self.assertEqual(budget.last_drain["held_by_backoff"], 1)
+        self.assertEqual(budget.fail(budget.due(1010, {})[0], 1010, "UPDATE_FAILURE_PENDING"), 1030)
+
+        # Um novo plano mantém a espera do canal
+        budget.schedule([entry("2", 250), entry("3", 10)])
+        self.assertEqual([item["chan_id"] for item in budget.due(1020, {})], ["3"])
+        self.assertIsNone(budget.fail(budget.due(1030, {})[0], 1030, "REQUEST_ERROR"))
+
+        stats = budget.stats()
+        self.assertEqual(stats["failures"], {"UPDATE_FAILURE_PENDING": 2, "UPDATE_FAILURE_NOT_FOUND": 1,
+                                             "REQUEST_ERROR": 1})
+        self.assertEqual(stats["abandoned"], 2)
+        self.assertEqual(stats["retrying"], 0)
+
+        budget.schedule([entry("4", 10)])
+        budget.fail(budget.due(2000, {})[0], 2000, "UPDATE_FAILURE_INTERNAL_ERR")
+        budget.succeed(budget.due(2060, {})[0]["chan_id"])
+        self.assertEqual(budget.stats()["retried"], 1)
+
+    def test_fee_manager_failed_updates(self):
+        """Testa que falhas parciais de updatechanpolicy não são registradas e apenas o canal é repetido"""
+        client = MagicMock()
+        client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+        client.list_channels.return_value = {"channels": [
+            {"chan_id": str(index), "channel_point": f"txid:{index}", "capacity": "1000000",
+             "local_balance": str(local), "remote_balance": str(1000000 - local), "remote_pubkey": f"peer{index}"}
+            for index, local in ((1, 500000), (2, 950000))
+        ]}
+        client.get_channel_info.return_value = {
+            "node1_pub": "test_pubkey",
+            "node1_policy": {"fee_base_msat": "1000", "fee_rate_milli_msat": "100", "time_lock_delta": 40},
+            "node2_policy": {"fee_base_msat": "1000", "fee_rate_milli_msat": "200", "time_lock_delta": 40}
+        }
+        pending = {"failed_updates": [{
+            "outpoint": {"txid_str": "txid", "output_index": 2},
+            "reason": "UPDATE_FAILURE_PENDING",
+            "update_error": "channel is pending"
+        }]}
+        client.update_channel_policy.side_effect = lambda **kwargs: \
+            pending if kwargs["chan_point"]["output_index"] == 2 else {"failed_updates": []}
+
+        fee_manager = FeeManager(lnd_client=client)
+        fee_manager.collect_channel_data()
+        fee_manager.update_channel_fees()
+        self.assertEqual(fee_manager.last_update_stats["pushed"], 1)
+        self.assertEqual(fee_manager.last_update_stats["failed"], 1)
+        self.assertEqual(fee_manager.last_update_stats["retrying"], 1)
+        self.assertNotIn("applied_policy", fee_manager.channel_stats["2"])
+        self.assertNotIn("fingerprint", fee_manager.channel_stats["2"])
+        self.assertEqual(fee_manager.channel_stats["2"]["fee_history"][-1]["fee_rate"], 0.0001)
+
+        # A nova tentativa envia apenas o canal que falhou, depois da espera
+        client.update_channel_policy.side_effect = None
+        client.update_channel_policy.return_value = {"failed_updates": []}
+        self.assertEqual(fee_manager.drain_updates(), 0)
+        with patch("time.time", return_value=time.time() + 61):
+            self.assertEqual(fee_manager.drain_updates(), 1)
+        self.assertEqual(client.update_channel_policy.call_args.kwargs["chan_point"]["output_index"], 2)
+        self.assertIn("applied_policy", fee_manager.channel_stats["2"])
+
+        # A API lê o resumo publicado pelo loop no snapshot, nunca a fila em uso
+        stats = fee_manager.get_snapshot().update_budget
+        self.assertIsInstance(stats, FrozenDict)
+        self.assertEqual(stats, fee_manager.update_budget.stats())
+        self.assertEqual(stats["failures"], {"UPDATE_FAILURE_PENDING": 1})
+        self.assertEqual(stats["retried"], 1)
+        self.assertEqual(stats["retrying"], 0)
+
+    def test_fee_manager_budget(self):
+        """Testa o envio em ordem de prioridade e o restante enviado entre os ciclos"""
+        client = MagicMock()
+        client.get_info.return_value = {"identity_pubkey": "test_pubkey"}
+        client.list_channels.return_value = {"channels": [
+            {"chan_id": str(index), "channel_point": f"txid:{index}", "capacity": "1000000",
+             "local_balance": str(local), "remote_balance": str(1000000 - local), "remote_pubkey": f"peer{index}"}
+            for index, local in ((1, 500000), (2, 950000), (3, 100000))
+        ]}
+        client.get_channel_info.return_value = {
+            "node1_pub": "test_pubkey",
+            "node1_policy": {"fee_base_msat": "1000", "fee_rate_milli_msat": "100", "time_lock_delta": 40,
+                             "last_update": 1000},
+            "node2_policy": {"fee_base_msat": "1000", "fee_rate_milli_msat": "200", "time_lock_delta": 40}
+        }
+        client.update_channel_policy.return_value = {}
+
+        fee_manager = FeeManager(lnd_client=client)
+        fee_manager.update_config({"policy_updates_per_minute": 1})
+        fee_manager.collect_channel_data()
+        self.assertEqual(fee_manager.channel_stats["1"]["edge_last_update"], 1000)
+
+        plan = fee_manager.plan_fees()
+        largest = max(plan["entries"], key=lambda item: abs(item["delta_ppm"]))
+        fee_manager.update_channel_fees()
+        self.assertEqual(client.update_channel_policy.call_count, 1)
+        self.assertEqual(client.update_channel_policy.call_args.kwargs["chan_point"]["output_index"],
+                         int(largest["chan_id"]))
+        self.assertEqual(fee_manager.last_update_stats["deferred"], 2)
+
+        # Sem fichas, nada é enviado; um minuto depois, o próximo da fila
+        self.assertEqual(fee_manager.drain_updates(), 0)
+        self.assertEqual(fee_manager.get_snapshot().update_budget["last_drain"]["held_by_budget"], 2)
+        with patch("time.time", return_value=time.time() + 61):
+            self.assertEqual(fee_manager.drain_updates(), 1)
+        self.assertEqual(client.update_channel_policy.call_count, 2)
+        self.assertEqual(fee_manager.last_update_stats["pushed"], 2)
+        self.assertEqual(fee_manager.last_update_stats["deferred"], 1)
+        self.assertEqual(fee_manager.update_budget.stats()["pending"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Testes para o volume encaminhado por intervalo e as janelas móveis
+"""
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Adicionar diretório pai ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar os módulos a serem testados
+from volume_deltas import (VOLUME_WINDOWS, bootstrap_windows, collect_interval, interval_volumes,
+                           update_windows, window_totals)
+from fee_manager import FeeManager
+
+class TestVolumeDeltas(unittest.TestCase):
+    """Testes para o motor de deltas de volume"""
+
+    def setUp(self):
+        """Configuração para cada teste"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_collect_interval(self):
+        """Testa o volume do intervalo a partir dos contadores acumulados"""
+        first = collect_interval(None, total_in=5000, total_out=9000)
+        self.assertEqual((first["forwarding_volume_in"], first["forwarding_volume_out"]), (0, 0))
+        self.assertEqual(first["forwarding_volume_out_total"], 9000)
+
+        second = collect_interval(first, total_in=5500, total_out=12000)
+        self.assertEqual((second["forwarding_volume_in"], second["forwarding_volume_out"]), (500, 3000))
+
+        # Contador reiniciado: o valor atual é o volume do intervalo
+        reset = collect_interval(second, total_in=100, total_out=12000)
+        self.assertEqual((reset["forwarding_volume_in"], reset["forwarding_volume_out"]), (100, 0))
+
+        # Canal reaberto: todo o contador do canal novo pertence ao intervalo
+        reopened = collect_interval(second, total_in=7000, total_out=15000, reopened=True)
+        self.assertEqual((reopened["forwarding_volume_in"], reopened["forwarding_volume_out"]), (7000, 15000))
+
+        # Amostras antigas (contador em forwarding_volume_*) e novas convivem no histórico
+        old = {"forwarding_volume_in": 1000, "forwarding_volume_out": 4000}
+        self.assertEqual(interval_volumes(old, {"forwarding_volume_in": 400, "forwarding_volume_out": 4500}),
+                         (600, 4000))
+        self.assertEqual(interval_volumes(second, old), (500, 3000))
+        self.assertEqual(collect_interval(old, total_in=1200, total_out=4100)["forwarding_volume_out"], 100)
+
+    def test_windows(self):
+        """Testa as janelas móveis de 1h, 24h e 7d"""
+        start = 1700000000 - 1700000000 % 86400
+        windows = None
+        for hour in range(24 * 8):
+            windows = update_windows(windows, start + hour * 3600, 10, 100)
+
+        now = start + (24 * 8 - 1) * 3600
+        totals = window_totals(windows, now)
+        self.assertEqual(totals["1h"], {"in": 10, "out": 100})
+        self.assertEqual(totals["24h"], {"in": 240, "out": 2400})
+        self.assertEqual(totals["7d"]["out"], 100 * 24 * 7)
+
+        # Memória constante: o número de buckets não depende do número de amostras
+        for name, (duration, bucket_seconds) in VOLUME_WINDOWS.items():
+            self.assertEqual(len(windows[name]["out"]), duration // bucket_seconds)
+
+        # Sem novas amostras, o volume sai das janelas com o tempo
+        self.assertEqual(window_totals(windows, now + 2 * 3600)["1h"]["out"], 0)
+        self.assertEqual(window_totals(windows, now + 8 * 86400)["7d"]["out"], 0)
+
+        # As janelas anteriores não são alteradas (podem estar em snapshots)
+        before = json.dumps(windows)
+        update_windows(windows, now + 60, 1, 1)
+        window_totals(windows, now + 86400)
+        self.assertEqual(json.dumps(windows), before)
+
+    def test_fee_manager_deltas(self):
+        """Testa a coleta com deltas de volume, janelas e reabertura de canal"""
+        mock_lnd_client = MagicMock()
+        mock_lnd_client.get_channel_info.return_value = {"error": "sem dados"}
+        fee_manager = FeeManager(lnd_client=mock_lnd_client)
+
+        def collect(timestamp, sent, channel_point="txid:0"):
+            mock_lnd_client.list_channels.return_value = {"channels": [{
+                "chan_id": "1", "channel_point": channel_point, "capacity": "1000000",
+                "local_balance": "500000", "remote_balance": "500000", "remote_pubkey": "peer",
+                "total_satoshis_sent": str(sent), "total_satoshis_received": "0"
+            }]}
+            with patch("fee_manager.time.time", return_value=timestamp):
+                fee_manager.collect_channel_data()
+            return fee_manager.channel_stats["1"]["flow_history"][-1]
+
+        start = 1700000000
+        self.assertEqual(collect(start, 50000000)["forwarding_volume_out"], 0)
+        sample = collect(start + 3600, 50200000)
+        self.assertEqual(sample["forwarding_volume_out"], 200000)
+        self.assertEqual(sample["forwarding_volume_out_total"], 50200000)
+        self.assertEqual(collect(start + 7200, 300000, channel_point="txid2:1")["forwarding_volume_out"], 300000)
+
+        channel = fee_manager.channel_stats["1"]
+        totals = window_totals(channel["volume_windows"], start + 7200)
+        self.assertEqual(totals["24h"]["out"], 500000)
+
+        # Um contador acumulado grande não satura mais a estratégia lucrativa
+        fee_manager.config["fee_strategy"] = "profitable"
+        fee_rate = fee_manager.calculate_optimal_fees("1")["fee_rate"]
+        self.assertLess(fee_rate, fee_manager.config["max_fee_rate"])
+
+        # Estados antigos sem janelas são reconstruídos na carga
+        with open("channel_stats.json", 'r') as f:
+            saved = json.load(f)
+        self.assertEqual(saved["1"]["volume_windows"], channel["volume_windows"])
+        del saved["1"]["volume_windows"]
+        with open("channel_stats.json", 'w') as f:
+            json.dump(saved, f)
+        reloaded = FeeManager(lnd_client=mock_lnd_client)
+        self.assertEqual(reloaded.channel_stats["1"]["volume_windows"], bootstrap_windows(channel["flow_history"]))
+        self.assertEqual(window_totals(reloaded.channel_stats["1"]["volume_windows"], start + 7200)["24h"]["out"],
+                         500000)
+
+if __name__ == "__main__":
+    unittest.main()
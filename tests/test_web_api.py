@@ -211,5 +211,35 @@ class TestWebAPI(unittest.TestCase):
         self.assertEqual(data["success"], True)
         self.assertEqual(data["channel_id"], chan_id)
 
+    def test_api_channels_fees_bulk(self):
+        """Testa a API de atualização de taxas em lote"""
+        self.mock_lnd_client.update_channel_policies.return_value = [
+            {"chan_id": "123456789", "success": True},
+            {"chan_id": "987654321", "success": False, "error": "Canal 987654321 não encontrado"}
+        ]
+        policies = [
+            {"chan_id": "123456789", "base_fee_msat": 2000, "fee_rate": 0.000003},
+            {"chan_id": "987654321", "base_fee_msat": 2000, "fee_rate": 0.000003}
+        ]
+        
+        with patch('web.app.lnd_client', self.mock_lnd_client), patch('web.app.fee_manager', None):
+            response = self.client.post('/api/channels/fees', json={"policies": policies, "max_concurrency": 4})
+            self.assertEqual(response.status_code, 200)
+            data = response.get_json()
+            self.assertEqual(data["success"], False)
+            self.assertEqual(data["updated"], 1)
+            self.assertEqual(data["failed"], 1)
+            self.mock_lnd_client.update_channel_policies.assert_called_once_with(policies, max_concurrency=4)
+            
+            # Lista vazia, políticas que não são objetos e max_concurrency inválido são rejeitados
+            response = self.client.post('/api/channels/fees', json={"policies": []})
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post('/api/channels/fees', json=["123456789"])
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post('/api/channels/fees', json={"policies": policies, "max_concurrency": "x"})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("max_concurrency", response.get_json()["error"])
+            self.mock_lnd_client.update_channel_policies.assert_called_once()
+
 if __name__ == "__main__":
     unittest.main()
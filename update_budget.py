@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Orçamento de envios de políticas de taxas
+Este módulo limita o ritmo dos channel_update gerados pelo motor, que o LND e
+os demais nodes da rede também limitam no gossip: um balde de fichas (token
+bucket) global com um número de envios por minuto, um intervalo mínimo entre
+envios do mesmo canal e uma fila das mudanças pendentes em ordem de prioridade
+(maior diferença de taxa ou maior desequilíbrio primeiro). Envios recusados pelo
+LND voltam para a fila com espera exponencial, apenas para os canais que falharam
+"""
+
+import math
+from typing import Dict, List, Optional
+
+# Critérios de ordenação da fila de envios
+PRIORITIES = ("delta", "imbalance")
+
+# Espera máxima entre tentativas de um canal (segundos)
+RETRY_MAX_SECONDS = 3600
+
+# Falhas que não adiantam repetir (canal inexistente ou parâmetros recusados)
+PERMANENT_FAILURES = ("UPDATE_FAILURE_NOT_FOUND", "UPDATE_FAILURE_INVALID_PARAMETER")
+
+class TokenBucket:
+    """
+    Balde de fichas do número global de envios
+
+    O balde começa cheio e recupera rate_per_minute fichas por minuto, até o
+    limite de burst fichas. Com rate_per_minute igual a zero não há limite.
+    """
+
+    def __init__(self, rate_per_minute: float = 0, burst: Optional[int] = None):
+        """
+        Inicializa o balde
+
+        Args:
+            rate_per_minute: Envios por minuto (0 = sem limite)
+            burst: Envios seguidos permitidos com o balde cheio (padrão: um minuto de envios)
+        """
+        self.tokens = 0.0
+        self.updated_at = 0.0
+        self.configure(rate_per_minute, burst)
+
+    def configure(self, rate_per_minute: float, burst: Optional[int] = None) -> None:
+        """Altera o ritmo e o tamanho do balde, mantendo as fichas disponíveis (cheio se ainda não foi usado)"""
+        self.rate_per_minute = rate_per_minute
+        self.burst = max(1, int(burst or math.ceil(rate_per_minute)))
+        self.tokens = min(self.tokens, self.burst) if self.updated_at else float(self.burst)
+
+    @property
+    def unlimited(self) -> bool:
+        """Indica se o balde não limita os envios"""
+        return self.rate_per_minute <= 0
+
+    def _refill(self, now: float) -> None:
+        """Acrescenta as fichas recuperadas desde a última consulta"""
+        if self.updated_at:
+            elapsed = max(0.0, now - self.updated_at)
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate_per_minute / 60)
+        self.updated_at = now
+
+    def available(self, now: float) -> float:
+        """Fichas disponíveis no momento"""
+        if self.unlimited:
+            return math.inf
+        self._refill(now)
+        return self.tokens
+
+    def take(self, now: float) -> bool:
+        """
+        Consome uma ficha
+
+        Args:
+            now: Momento do envio
+
+        Returns:
+            True se havia uma ficha disponível
+        """
+        if self.available(now) < 1:
+            return False
+        if not self.unlimited:
+            self.tokens -= 1
+        return True
+
+    def export_state(self) -> Dict:
+        """Fichas disponíveis e horário da última consulta, para o checkpoint do motor"""
+        return {"tokens": self.tokens, "updated_at": self.updated_at}
+
+    def restore_state(self, state: Dict) -> None:
+        """Restaura as fichas a partir de export_state"""
+        self.tokens = min(float(state["tokens"]), self.burst)
+        self.updated_at = state["updated_at"]
+
+def priority_key(entry: Dict, priority: str = "delta") -> tuple:
+    """
+    Chave de ordenação de uma mudança pendente (menor primeiro)
+
+    Canais sem política conhecida vêm antes de todos no critério delta.
+
+    Args:
+        entry: Entrada do plano (delta_ppm, balance_ratio e chan_id)
+        priority: Critério principal (delta ou imbalance); o outro desempata
+
+    Returns:
+        Tupla de ordenação
+    """
+    delta = entry.get("delta_ppm")
+    delta = math.inf if delta is None else abs(delta)
+    ratio = entry.get("balance_ratio")
+    imbalance = 0.0 if ratio is None else abs(ratio - 0.5)
+    first, second = (imbalance, delta) if priority == "imbalance" else (delta, imbalance)
+    return (-first, -second, entry["chan_id"])
+
+class UpdateBudget:
+    """
+    Fila de mudanças de política limitada pelo orçamento de envios
+
+    Cada canal tem no máximo uma mudança pendente; um novo plano substitui a
+    fila inteira, pois cobre todos os canais, mas mantém a espera dos canais
+    que falharam. Deve ser usada apenas pela thread que altera o estado do motor.
+    """
+
+    def __init__(self):
+        """Inicializa a fila sem limites"""
+        self.bucket = TokenBucket()
+        self.min_interval = 0
+        self.priority = "delta"
+        self.retry_base = 60
+        self.retry_max_attempts = 5
+        self.queue: Dict[str, Dict] = {}
+        self.last_drain = {"sent": 0, "held_by_interval": 0, "held_by_budget": 0, "held_by_backoff": 0}
+
+        # Tentativas por canal que falhou (attempts, retry_at, reason e error) e contadores de falhas
+        self.retries: Dict[str, Dict] = {}
+        self.failures: Dict[str, int] = {}
+        self.retried = 0
+        self.abandoned = 0
+
+    def configure(self, config: Dict) -> None:
+        """
+        Aplica a configuração do gerenciador
+
+        Args:
+            config: Configuração (policy_updates_per_minute, policy_update_burst,
+                min_update_interval_seconds, policy_update_priority,
+                policy_retry_base_seconds e policy_retry_max_attempts)
+        """
+        self.bucket.configure(config.get("policy_updates_per_minute", 0), config.get("policy_update_burst") or None)
+        self.min_interval = config.get("min_update_interval_seconds", 0)
+        priority = config.get("policy_update_priority", "delta")
+        self.priority = priority if priority in PRIORITIES else "delta"
+        self.retry_base = config.get("policy_retry_base_seconds", 60)
+        self.retry_max_attempts = config.get("policy_retry_max_attempts", 5)
+
+    def schedule(self, entries: List[Dict]) -> None:
+        """
+        Substitui as mudanças pendentes
+
+        Canais que não precisam mais de envio deixam de ser repetidos.
+
+        Args:
+            entries: Entradas do plano a enviar
+        """
+        self.queue = {entry["chan_id"]: entry for entry in entries}
+        self.retries = {chan_id: retry for chan_id, retry in self.retries.items() if chan_id in self.queue}
+
+    def enqueue(self, entries: List[Dict]) -> None:
+        """
+        Acrescenta mudanças à fila sem descartar as pendentes
+
+        Uma entrada de um canal que já está na fila substitui a anterior.
+
+        Args:
+            entries: Entradas a enviar
+        """
+        for entry in entries:
+            self.queue[entry["chan_id"]] = entry
+
+    def due(self, now: float, last_updates: Dict[str, float]) -> List[Dict]:
+        """
+        Retira da fila as mudanças que podem ser enviadas agora
+
+        Percorre a fila em ordem de prioridade. Canais atualizados há menos de
+        min_interval segundos ou aguardando uma nova tentativa continuam na fila
+        sem consumir fichas, assim como todos os canais seguintes quando as
+        fichas acabam.
+
+        Args:
+            now: Momento atual
+            last_updates: Última atualização da política de cada canal (timestamp)
+
+        Returns:
+            Entradas a enviar, em ordem de prioridade
+        """
+        ready = []
+        held_by_interval = 0
+        held_by_budget = 0
+        held_by_backoff = 0
+        for entry in sorted(self.queue.values(), key=lambda entry: priority_key(entry, self.priority)):
+            retry = self.retries.get(entry["chan_id"])
+            if retry and retry["retry_at"] > now:
+                held_by_backoff += 1
+            elif now - last_updates.get(entry["chan_id"], 0) < self.min_interval:
+                held_by_interval += 1
+            elif held_by_budget or not self.bucket.take(now):
+                held_by_budget += 1
+            else:
+                ready.append(entry)
+
+        for entry in ready:
+            del self.queue[entry["chan_id"]]
+        self.last_drain = {"sent": len(ready), "held_by_interval": held_by_interval,
+                           "held_by_budget": held_by_budget, "held_by_backoff": held_by_backoff}
+        return ready
+
+    def fail(self, entry: Dict, now: float, reason: str, error: str = "") -> Optional[float]:
+        """
+        Registra a falha de um envio e recoloca o canal na fila com espera exponencial
+
+        A espera dobra a cada tentativa, a partir de retry_base segundos e até
+        RETRY_MAX_SECONDS. Falhas permanentes e canais que atingiram
+        retry_max_attempts tentativas não são repetidos; o próximo plano os
+        recalcula.
+
+        Args:
+            entry: Entrada do plano que falhou
+            now: Momento da falha
+            reason: Motivo informado pelo LND (ou REQUEST_ERROR)
+            error: Mensagem de erro
+
+        Returns:
+            Momento da nova tentativa ou None se o canal não será repetido
+        """
+        chan_id = entry["chan_id"]
+        self.failures[reason] = self.failures.get(reason, 0) + 1
+        attempts = self.retries.get(chan_id, {}).get("attempts", 0) + 1
+        if reason in PERMANENT_FAILURES or attempts >= self.retry_max_attempts:
+            self.retries.pop(chan_id, None)
+            self.abandoned += 1
+            return None
+
+        retry_at = now + min(self.retry_base * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+        self.retries[chan_id] = {"attempts": attempts, "retry_at": retry_at, "reason": reason, "error": error}
+        self.queue[chan_id] = entry
+        return retry_at
+
+    def succeed(self, chan_id: str) -> None:
+        """Registra um envio confirmado, encerrando as tentativas do canal"""
+        if self.retries.pop(chan_id, None) is not None:
+            self.retried += 1
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+    def stats(self) -> Dict:
+        """
+        Obtém um resumo da fila
+
+        Chamado pela thread do loop, que publica o resumo no snapshot do motor;
+        a API web lê apenas a cópia publicada.
+
+        Returns:
+            Mudanças pendentes, fichas disponíveis, limites, a última seleção e
+            os contadores de falhas e novas tentativas
+        """
+        return {
+            "pending": len(self.queue),
+            "tokens": None if self.bucket.unlimited else round(self.bucket.tokens, 2),
+            "updates_per_minute": self.bucket.rate_per_minute,
+            "min_interval_seconds": self.min_interval,
+            "priority": self.priority,
+            "last_drain": dict(self.last_drain),
+            "retrying": len(self.retries),
+            "next_retry_at": int(min(retry["retry_at"] for retry in self.retries.values())) if self.retries else None,
+            "failures": dict(self.failures),
+            "retried": self.retried,
+            "abandoned": self.abandoned
+        }
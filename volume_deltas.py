@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Volume encaminhado por intervalo
+Este módulo converte os contadores acumulados do LND (total_satoshis_sent e
+total_satoshis_received) em volume por intervalo entre amostras, tratando
+contadores reiniciados e canais reabertos, e mantém janelas móveis de 1h, 24h e
+7d por canal com memória constante
+"""
+
+from typing import Dict, Optional, Tuple
+
+# Janelas móveis: nome -> (duração, tamanho do bucket) em segundos
+VOLUME_WINDOWS = {
+    "1h": (3600, 300),
+    "24h": (86400, 3600),
+    "7d": (7 * 86400, 6 * 3600)
+}
+
+def counter_delta(current: int, previous: Optional[int]) -> int:
+    """
+    Diferença entre duas leituras de um contador acumulado
+
+    Args:
+        current: Leitura atual
+        previous: Leitura anterior (None se não houver)
+
+    Returns:
+        Volume do intervalo (0 sem leitura anterior; a leitura atual se o
+        contador foi reiniciado)
+    """
+    if previous is None:
+        return 0
+    return current - previous if current >= previous else current
+
+def interval_volumes(sample: Dict, previous: Optional[Dict]) -> Tuple[int, int]:
+    """
+    Volume de entrada e saída do intervalo que termina na amostra
+
+    Amostras novas já guardam o volume do intervalo em forwarding_volume_* (e os
+    contadores em forwarding_volume_*_total); amostras antigas guardam o contador
+    acumulado, e o intervalo é calculado pela diferença com a anterior.
+
+    Args:
+        sample: Amostra de fluxo
+        previous: Amostra anterior (None se for a primeira)
+
+    Returns:
+        Tupla (volume_in, volume_out)
+    """
+    if "forwarding_volume_out_total" in sample:
+        return sample.get("forwarding_volume_in", 0), sample.get("forwarding_volume_out", 0)
+
+    def total(record, key):
+        if record is None:
+            return None
+        return record.get(f"{key}_total", record.get(key, 0))
+
+    return (counter_delta(sample.get("forwarding_volume_in", 0), total(previous, "forwarding_volume_in")),
+            counter_delta(sample.get("forwarding_volume_out", 0), total(previous, "forwarding_volume_out")))
+
+def collect_interval(previous: Optional[Dict], total_in: int, total_out: int, reopened: bool = False) -> Dict:
+    """
+    Calcula os campos de volume de uma nova amostra a partir dos contadores do LND
+
+    Args:
+        previous: Amostra anterior do canal (None se for a primeira)
+        total_in: Contador total_satoshis_received atual
+        total_out: Contador total_satoshis_sent atual
+        reopened: O canal foi reaberto (channel_point diferente) desde a amostra anterior
+
+    Returns:
+        forwarding_volume_in/out (intervalo) e forwarding_volume_in/out_total (contadores)
+    """
+    if previous is None:
+        # Primeira leitura: não se sabe em quanto tempo o volume acumulado foi gerado
+        volume_in = volume_out = 0
+    elif reopened:
+        # Canal novo: todo o contador pertence ao intervalo
+        volume_in, volume_out = total_in, total_out
+    else:
+        volume_in = counter_delta(total_in, previous.get("forwarding_volume_in_total",
+                                                         previous.get("forwarding_volume_in", 0)))
+        volume_out = counter_delta(total_out, previous.get("forwarding_volume_out_total",
+                                                           previous.get("forwarding_volume_out", 0)))
+
+    return {
+        "forwarding_volume_in": volume_in,
+        "forwarding_volume_out": volume_out,
+        "forwarding_volume_in_total": total_in,
+        "forwarding_volume_out_total": total_out
+    }
+
+def _advance(window: Dict, bucket: int) -> Dict:
+    """
+    Cópia da janela deslocada até o bucket indicado, com os buckets que saíram zerados
+
+    A janela original não é alterada.
+    """
+    size = len(window["in"])
+    head = window["head"]
+    volume_in = list(window["in"])
+    volume_out = list(window["out"])
+    for index in range(head + 1, min(bucket, head + size) + 1):
+        volume_in[index % size] = 0
+        volume_out[index % size] = 0
+    return {"bucket_seconds": window["bucket_seconds"], "head": max(head, bucket),
+            "in": volume_in, "out": volume_out}
+
+def update_windows(windows: Optional[Dict], timestamp: int, volume_in: int, volume_out: int) -> Dict:
+    """
+    Soma o volume de um intervalo às janelas móveis do canal
+
+    O volume é atribuído ao bucket do fim do intervalo. Novos dicionários são
+    devolvidos; os anteriores não são alterados (podem estar em snapshots).
+
+    Args:
+        windows: Janelas atuais (None para começar)
+        timestamp: Fim do intervalo
+        volume_in: Volume de entrada do intervalo
+        volume_out: Volume de saída do intervalo
+
+    Returns:
+        Janelas atualizadas
+    """
+    updated = {}
+    for name, (duration, bucket_seconds) in VOLUME_WINDOWS.items():
+        size = duration // bucket_seconds
+        bucket = timestamp // bucket_seconds
+        window = (windows or {}).get(name)
+        if not window or window["bucket_seconds"] != bucket_seconds or len(window["in"]) != size:
+            window = {"bucket_seconds": bucket_seconds, "head": bucket, "in": [0] * size, "out": [0] * size}
+
+        window = _advance(window, bucket)
+        # Intervalos mais antigos que a janela são descartados
+        if bucket > window["head"] - size:
+            window["in"][bucket % size] += volume_in
+            window["out"][bucket % size] += volume_out
+        updated[name] = window
+    return updated
+
+def bootstrap_windows(flow_history) -> Optional[Dict]:
+    """
+    Reconstrói as janelas móveis a partir do histórico de fluxo armazenado
+
+    Usado uma única vez para estados gravados antes das janelas existirem.
+
+    Args:
+        flow_history: Amostras de fluxo em ordem cronológica
+
+    Returns:
+        Janelas ou None se não houver amostras
+    """
+    windows = None
+    previous = None
+    for sample in flow_history:
+        volume_in, volume_out = interval_volumes(sample, previous)
+        windows = update_windows(windows, sample.get("timestamp", 0), volume_in, volume_out)
+        previous = sample
+    return windows
+
+def window_totals(windows: Optional[Dict], now: int) -> Dict[str, Dict[str, int]]:
+    """
+    Volume de entrada e saída em cada janela móvel
+
+    Args:
+        windows: Janelas do canal
+        now: Momento de referência
+
+    Returns:
+        Totais por janela ({"1h": {"in": ..., "out": ...}, ...})
+    """
+    totals = {}
+    for name in VOLUME_WINDOWS:
+        window = (windows or {}).get(name)
+        if not window:
+            totals[name] = {"in": 0, "out": 0}
+            continue
+        window = _advance(window, now // window["bucket_seconds"])
+        totals[name] = {"in": sum(window["in"]), "out": sum(window["out"])}
+    return totals
@@ -17,8 +17,9 @@ from flask import Flask, render_template, request, jsonify, redirect, url_for
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Importar os módulos do projeto
-from lnd_client_rest import LNDClient
+from lnd_client_rest import LNDClient, DEFAULT_MAX_CONCURRENCY
 from fee_manager import FeeManager
+from rollups import query_range
 
 # Configurar logging
 logging.basicConfig(
@@ -103,21 +104,46 @@ def api_channel_info(chan_id):
     try:
         channel_info = lnd_client.get_channel_info(chan_id)
         
-        # Adicionar estatísticas do canal se disponíveis
-        if fee_manager and chan_id in fee_manager.channel_stats:
-            channel_info["stats"] = fee_manager.channel_stats[chan_id]
+        # Adicionar estatísticas do canal se disponíveis (snapshot imutável, sem locks)
+        if fee_manager:
+            snapshot = fee_manager.get_snapshot()
+            if chan_id in snapshot.channel_stats:
+                channel_info["stats"] = snapshot.channel_stats[chan_id]
         
         return jsonify(channel_info)
     except Exception as e:
         logger.error(f"Erro ao obter informações do canal {chan_id}: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/channel/<chan_id>/history')
+def api_channel_history(chan_id):
+    """API para consultar o histórico de um canal em um intervalo de tempo"""
+    try:
+        if not fee_manager:
+            return jsonify({"error": "Gerenciador de taxas não inicializado"}), 500
+        
+        # Históricos completos (lidos do armazenamento com lazy_history)
+        channel = fee_manager.load_history(chan_id)
+        if channel is None:
+            return jsonify({"error": f"Canal {chan_id} não encontrado nas estatísticas"}), 404
+        
+        end = request.args.get("end", default=int(time.time()), type=int)
+        start = request.args.get("start", default=end - 7 * 86400, type=int)
+        tier = request.args.get("tier")
+        
+        return jsonify(query_range(channel, start, end, tier))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao consultar o histórico do canal {chan_id}: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/config', methods=['GET'])
 def api_get_config():
     """API para obter configuração atual"""
     try:
         if fee_manager:
-            return jsonify(fee_manager.config)
+            return jsonify(fee_manager.get_snapshot().config)
         else:
             return jsonify({"error": "Gerenciador de taxas não inicializado"}), 500
     except Exception as e:
@@ -134,15 +160,10 @@ def api_update_config():
         # Obter nova configuração do corpo da requisição
         new_config = request.json
         
-        # Atualizar configuração
-        for key, value in new_config.items():
-            if key in fee_manager.config:
-                fee_manager.config[key] = value
+        # Atualizar e salvar configuração (troca atômica, sem alterar o dicionário em uso)
+        config = fee_manager.update_config(new_config)
         
-        # Salvar configuração
-        fee_manager.save_config()
-        
-        return jsonify({"success": True, "config": fee_manager.config})
+        return jsonify({"success": True, "config": config})
     except Exception as e:
         logger.error(f"Erro ao atualizar configuração: {e}")
         return jsonify({"error": str(e)}), 500
@@ -162,6 +183,19 @@ def api_update_fees():
         logger.error(f"Erro ao atualizar taxas: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/fees/plan')
+def api_fee_plan():
+    """API para simular a atualização de taxas sem enviar ao LND"""
+    try:
+        if not fee_manager:
+            return jsonify({"error": "Gerenciador de taxas não inicializado"}), 500
+        
+        force = request.args.get("force", "false").lower() in ("1", "true")
+        return jsonify(fee_manager.plan_fees(force=force))
+    except Exception as e:
+        logger.error(f"Erro ao simular a atualização de taxas: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/fees/start', methods=['POST'])
 def api_start_fee_manager():
     """API para iniciar o gerenciador de taxas"""
@@ -199,15 +233,66 @@ def api_fee_manager_status():
         if not fee_manager:
             return jsonify({"error": "Gerenciador de taxas não inicializado"}), 500
         
+        snapshot = fee_manager.get_snapshot()
+        
         return jsonify({
             "running": fee_manager.running,
-            "update_interval": fee_manager.config["update_interval_seconds"],
-            "strategy": fee_manager.config["fee_strategy"]
+            "update_interval": snapshot.config["update_interval_seconds"],
+            "strategy": snapshot.config["fee_strategy"],
+            "snapshot": snapshot.summary(),
+            "graph_index": fee_manager.graph_index.stats(),
+            "centrality": fee_manager.graph_analytics.stats(),
+            "last_update": fee_manager.last_update_stats,
+            "update_budget": snapshot.update_budget,
+            "persistence": fee_manager.state_writer.stats()
         })
     except Exception as e:
         logger.error(f"Erro ao verificar status do gerenciador de taxas: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/peers')
+def api_peer_aggregates():
+    """API para obter a liquidez combinada e a política de cada peer no último cálculo"""
+    try:
+        if not fee_manager:
+            return jsonify({"error": "Gerenciador de taxas não inicializado"}), 500
+        
+        return jsonify(fee_manager.peer_aggregates)
+    except Exception as e:
+        logger.error(f"Erro ao obter agregados dos peers: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/graph/fees/<pubkey>')
+def api_graph_fees(pubkey):
+    """API para obter os quantis das taxas da rede para chegar a um node"""
+    try:
+        if not fee_manager:
+            return jsonify({"error": "Gerenciador de taxas não inicializado"}), 500
+        
+        quantiles = fee_manager.graph_index.node_quantiles(pubkey)
+        if quantiles is None:
+            return jsonify({"error": f"Node {pubkey} não encontrado no índice de taxas"}), 404
+        
+        return jsonify(quantiles)
+    except Exception as e:
+        logger.error(f"Erro ao obter taxas da rede para o node {pubkey}: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/graph/centrality')
+def api_graph_centrality():
+    """API para obter a centralidade dos nossos canais no grafo da rede"""
+    try:
+        if not fee_manager:
+            return jsonify({"error": "Gerenciador de taxas não inicializado"}), 500
+        
+        return jsonify({
+            "channels": fee_manager.graph_analytics.channel_scores(),
+            "stats": fee_manager.graph_analytics.stats()
+        })
+    except Exception as e:
+        logger.error(f"Erro ao obter a centralidade dos canais: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/channel/<chan_id>/fees', methods=['POST'])
 def api_update_channel_fees(chan_id):
     """API para atualizar taxas de um canal específico"""
@@ -221,26 +306,12 @@ def api_update_channel_fees(chan_id):
         fee_rate = data.get("fee_rate")
         time_lock_delta = data.get("time_lock_delta")
         
-        # Obter informações do canal para construir o chan_point
-        channels = lnd_client.list_channels()
-        channel = None
-        
-        for ch in channels.get("channels", []):
-            if ch["chan_id"] == chan_id:
-                channel = ch
-                break
+        # Resolver o chan_point pelo índice em cache do cliente
+        chan_point = lnd_client.get_chan_point(chan_id)
         
-        if not channel:
+        if not chan_point:
             return jsonify({"error": f"Canal {chan_id} não encontrado"}), 404
         
-        # Preparar ponto do canal
-        funding_txid = channel["channel_point"].split(":")[0]
-        output_index = int(channel["channel_point"].split(":")[1])
-        chan_point = {
-            "funding_txid_str": funding_txid,
-            "output_index": output_index
-        }
-        
         # Atualizar taxas do canal
         result = lnd_client.update_channel_policy(
             global_update=False,
@@ -255,6 +326,50 @@ def api_update_channel_fees(chan_id):
         logger.error(f"Erro ao atualizar taxas do canal {chan_id}: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/channels/fees', methods=['POST'])
+def api_update_channels_fees():
+    """API para atualizar taxas de vários canais de uma vez"""
+    try:
+        if not lnd_client:
+            return jsonify({"error": "Cliente LND não inicializado"}), 500
+        
+        # Aceitar {"policies": [...], "max_concurrency": N} ou apenas a lista de políticas
+        data = request.json
+        if isinstance(data, list):
+            policies = data
+            max_concurrency = DEFAULT_MAX_CONCURRENCY
+        else:
+            policies = data.get("policies", [])
+            max_concurrency = data.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)
+        
+        if not isinstance(policies, list) or not policies:
+            return jsonify({"error": "Nenhuma política informada"}), 400
+        if not all(isinstance(policy, dict) for policy in policies):
+            return jsonify({"error": "Cada política deve ser um objeto com chan_id, base_fee_msat e fee_rate"}), 400
+        if isinstance(max_concurrency, bool) or not isinstance(max_concurrency, int):
+            return jsonify({"error": "max_concurrency deve ser um número inteiro"}), 400
+        
+        # Usar o time_lock_delta da configuração quando não informado
+        if fee_manager:
+            default_time_lock_delta = fee_manager.get_snapshot().config["time_lock_delta"]
+            policies = [
+                policy if "time_lock_delta" in policy else dict(policy, time_lock_delta=default_time_lock_delta)
+                for policy in policies
+            ]
+        
+        results = lnd_client.update_channel_policies(policies, max_concurrency=max_concurrency)
+        failed = [result for result in results if not result["success"]]
+        
+        return jsonify({
+            "success": not failed,
+            "updated": len(results) - len(failed),
+            "failed": len(failed),
+            "results": results
+        })
+    except Exception as e:
+        logger.error(f"Erro ao atualizar taxas em lote: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/dev/mode', methods=['POST'])
 def api_set_dev_mode():
     """API para ativar/desativar modo de desenvolvimento"""
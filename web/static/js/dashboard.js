@@ -487,6 +487,8 @@ function formatStrategy(strategy) {
             return 'Competitiva';
         case 'profitable':
             return 'Lucrativa';
+        case 'controller':
+            return 'Controlador';
         default:
             return strategy;
     }